@@ -0,0 +1,311 @@
+# host/fleet.py
+"""
+fleet.py
+Flotte de sondes virtuelles pour tester la montée en charge (PC).
+
+Rôle :
+- Faire tourner N sondes dans un seul processus (asyncio), de 10 à
+  10 000, contre un vrai broker (ou le broker factice des tests).
+- Chaque sonde reprend le code de l'ESP : Techniques (capteurs),
+  PublishPlan et AsyncMQTTHandler (connexion, QoS, mode "batch",
+  codecs), avec une interface Wi-Fi simulée (VirtualWLAN) et des
+  capteurs synthétiques.
+- Calendrier réaliste : une mesure toutes les `interval` secondes, avec
+  un décalage aléatoire par sonde (pas de publication synchronisée).
+- Adresse MAC simulée propre à chaque sonde : client_id déduit comme sur
+  l'ESP (device_id), topics <prefix>/{device}/<clé> (mode "topics")
+  ou <prefix>/{device}/batch.
+- Rapport : connexions, valeurs publiées, erreurs, débit, et centiles de latence
+  (connexion, puis publication d'un cycle ; en QoS 1 jusqu'au dernier
+  PUBACK, donc aller-retour complet avec le broker).
+
+Utilisation :
+    python host/fleet.py --server 192.168.1.20 --devices 1000 \\
+        --interval 10 --duration 120 --qos 1
+
+    # en parallèle, pour mesurer l'ingestion :
+    python host/ingest.py --server 192.168.1.20 --topic "fleet/#"
+"""
+import argparse
+import asyncio
+import contextlib
+import math
+import os
+import random
+import sys
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SRC = os.path.join(_ROOT, "src")  # code de la sonde
+if _SRC not in sys.path:
+    sys.path.append(_SRC)
+
+from technique_sensors import Techniques
+from mqtt_async import AsyncMQTTHandler
+from mqtt_client import device_id
+
+SENSORS = [
+    {"name": "T", "type": "DHT22", "pin": 4},
+    {"name": "lumiere", "type": "analog", "pin": 34},
+    {"name": "porte", "type": "digital", "pin": 5},
+]
+
+
+def synthetic_techniques(seed, sensors=SENSORS):
+    """
+    Techniques réel dont les lectures matérielles sont synthétiques.
+
+    - DHT22 : température et humidité lentement variables, erreur de
+      lecture occasionnelle (1 %)
+    - analogique : cycle jour/nuit bruité (0-4095)
+    - digital : état qui change rarement
+
+    Args:
+        seed (int): Graine de la sonde (valeurs différentes par sonde).
+        sensors (list): Capteurs configurés.
+
+    Returns:
+        Techniques: Capteurs prêts pour AsyncMQTTHandler.compile().
+    """
+    rng = random.Random(seed)
+    base = 18 + rng.random() * 6
+    state = {"porte": 0}
+
+    def read_dht22(pin):
+        if rng.random() < 0.01:
+            return {"status": "error", "message": "timeout"}
+        t = time.time() / 600 + seed
+        return {"temperature": round(base + math.sin(t) + rng.gauss(0, 0.05), 2),
+                "humidity": round(55 + 10 * math.cos(t) + rng.gauss(0, 0.5), 2),
+                "status": "ok"}
+
+    def read_analog(pin):
+        day = (math.sin(time.time() / 3600 + seed) + 1) / 2
+        return max(0, min(4095, int(day * 4000 + rng.gauss(0, 20))))
+
+    def read_digital(pin):
+        if rng.random() < 0.02:
+            state["porte"] ^= 1
+        return state["porte"]
+
+    tech = Techniques("fichier_absent.json")
+    tech.sensors = sensors
+    tech.methods = {"analog": read_analog, "digital": read_digital, "DHT22": read_dht22}
+    return tech
+
+
+def percentile(values, p):
+    """
+    Centile par rang le plus proche.
+
+    Args:
+        values (list): Mesures (non vide).
+        p (float): Centile (0-100).
+
+    Returns:
+        float: Valeur du centile.
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class FleetStats:
+    """
+    Mesures collectées par toutes les sondes.
+
+    Attributes:
+        connect_ms (list): Durées de connexion réussies.
+        cycle_ms (list): Durées de publication d'un cycle.
+        connected (int): Sondes connectées au moins une fois.
+        cycles (int): Cycles publiés.
+        failures (int): Cycles non publiés (mis en file ou perdus).
+        values (int): Valeurs publiées (un message chacune en mode "topics").
+        drops (int): Sessions trouvées perdues au début d'un cycle.
+    """
+
+    def __init__(self):
+        self.connect_ms = []
+        self.cycle_ms = []
+        self.connected = 0
+        self.cycles = 0
+        self.failures = 0
+        self.values = 0
+        self.drops = 0
+
+    def summary(self, elapsed):
+        """
+        Args:
+            elapsed (float): Durée de l'essai en secondes.
+
+        Returns:
+            dict: Compteurs, débit et centiles (p50, p90, p99, max) en ms.
+        """
+        result = {"connected": self.connected, "cycles": self.cycles,
+                  "failures": self.failures, "values": self.values,
+                  "drops": self.drops,
+                  "values_per_s": self.values / elapsed}
+        for name, values in (("connect", self.connect_ms), ("cycle", self.cycle_ms)):
+            if values:
+                result[name] = {"p50": percentile(values, 50), "p90": percentile(values, 90),
+                                "p99": percentile(values, 99), "max": max(values)}
+        return result
+
+
+class VirtualWLAN:
+    """
+    Interface Wi-Fi minimale d'une sonde virtuelle : adresse MAC (lue par
+    device_id) et connexion toujours réussie.
+    """
+
+    def __init__(self, mac):
+        """
+        Args:
+            mac (bytes): Adresse MAC (6 octets).
+        """
+        self.mac = mac
+        self.connected = False
+
+    def config(self, name):
+        return self.mac if name == "mac" else None
+
+    def active(self, state=None):
+        return True
+
+    def connect(self, ssid, password):
+        self.connected = True
+
+    def isconnected(self):
+        return self.connected
+
+
+class VirtualProbe:
+    """
+    Sonde virtuelle : Wi-Fi simulé, capteurs synthétiques, MQTT réel.
+    """
+
+    def __init__(self, index, mqtt_config, stats, prefix="fleet"):
+        """
+        Args:
+            index (int): Numéro de la sonde.
+            mqtt_config (dict): Configuration "mqtt" commune (server, port,
+                qos, payload, codec...).
+            stats (FleetStats): Mesures partagées.
+            prefix (str): Premier niveau des topics.
+        """
+        # une adresse MAC par carte (préfixe constructeur Espressif)
+        self.wlan = VirtualWLAN(b"\x24\x0a\xc4" + index.to_bytes(3, "big"))
+        config = dict(mqtt_config)
+        config.setdefault("client_id", device_id(self.wlan))
+        config.setdefault("topic", prefix + "/{device}/")
+        config["queue_file"] = None  # pas de file sur disque par sonde
+        # mises sous tension déjà étalées par run() : pas de gigue en plus
+        config["backoff"] = dict(config.get("backoff", {}))
+        config["backoff"].setdefault("initial_ms", 0)
+        self.mqtt = AsyncMQTTHandler(config)
+        self.name = self.mqtt.client_id
+        self.plan = self.mqtt.compile(synthetic_techniques(index))
+        self.stats = stats
+
+    async def run(self, interval, duration):
+        """
+        Connexion puis cycles de mesure jusqu'à la fin de l'essai.
+
+        Args:
+            interval (float): Période de mesure en secondes.
+            duration (float): Durée de l'essai en secondes.
+        """
+        self.wlan.active(True)
+        self.wlan.connect("fleet", "simulation")
+        # sondes mises sous tension à des instants différents
+        await asyncio.sleep(random.random() * interval)
+        end = time.monotonic() + duration
+        start = time.monotonic()
+        if await self.mqtt.connect():
+            self.stats.connect_ms.append((time.monotonic() - start) * 1000)
+            self.stats.connected += 1
+        next_cycle = time.monotonic()
+        while time.monotonic() < end:
+            self.plan.read()
+            if self.mqtt.connected and not self.mqtt.check_alive():
+                self.stats.drops += 1
+            start = time.monotonic()
+            ok = await self.mqtt.publish_cycle(self.plan)
+            if ok and self.mqtt.qos:
+                ok = await self.mqtt.client.flush(10000)
+            if ok:
+                self.stats.cycles += 1
+                self.stats.cycle_ms.append((time.monotonic() - start) * 1000)
+                self.stats.values += len(self.plan.values())
+            else:
+                self.stats.failures += 1
+            next_cycle += interval
+            await asyncio.sleep(max(0, next_cycle - time.monotonic()))
+        await self.mqtt.disconnect()
+
+
+async def run_fleet(devices, mqtt_config, interval=10, duration=60, prefix="fleet",
+                    quiet=True):
+    """
+    Lance une flotte de sondes virtuelles et mesure son comportement.
+
+    Args:
+        devices (int): Nombre de sondes.
+        mqtt_config (dict): Configuration MQTT commune (voir MQTTHandler).
+        interval (float): Période de mesure de chaque sonde (s).
+        duration (float): Durée de l'essai (s).
+        prefix (str): Premier niveau des topics.
+        quiet (bool): Masque les messages de chaque sonde.
+
+    Returns:
+        dict: Résumé (voir FleetStats.summary).
+    """
+    stats = FleetStats()
+    probes = [VirtualProbe(i, mqtt_config, stats, prefix) for i in range(devices)]
+    start = time.monotonic()
+    # print() ne fait rien quand sys.stdout vaut None
+    with contextlib.redirect_stdout(None if quiet else sys.stdout):
+        await asyncio.gather(*(p.run(interval, duration) for p in probes))
+    return stats.summary(time.monotonic() - start)
+
+
+def print_report(summary):
+    """
+    Affiche le résumé d'un essai.
+    """
+    print("sondes connectées : %d" % summary["connected"])
+    print("cycles : %d publiés, %d en échec, %d sessions perdues"
+          % (summary["cycles"], summary["failures"], summary["drops"]))
+    print("valeurs publiées : %d (%.0f /s)" % (summary["values"], summary["values_per_s"]))
+    for name in ("connect", "cycle"):
+        if name in summary:
+            s = summary[name]
+            print("%-8s p50 %7.2f ms  p90 %7.2f ms  p99 %7.2f ms  max %7.2f ms"
+                  % (name, s["p50"], s["p90"], s["p99"], s["max"]))
+
+
+def main(argv=None):
+    """
+    Point d'entrée en ligne de commande.
+    """
+    parser = argparse.ArgumentParser(description="Flotte de sondes virtuelles")
+    parser.add_argument("--server", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--qos", type=int, default=0, choices=(0, 1))
+    parser.add_argument("--payload", default="topics", choices=("topics", "batch"))
+    parser.add_argument("--codec", default="json", choices=("json", "msgpack", "struct"))
+    parser.add_argument("--prefix", default="fleet")
+    args = parser.parse_args(argv)
+
+    config = {"server": args.server, "port": args.port, "qos": args.qos,
+              "payload": args.payload, "codec": args.codec}
+    summary = asyncio.run(run_fleet(args.devices, config, args.interval,
+                                    args.duration, args.prefix))
+    print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+# host/ingest.py
+"""
+ingest.py
+Service d'ingestion, côté PC (Raspberry Pi) : broker MQTT → base SQLite.
+
+Rôle :
+- S'abonner aux topics publiés par les sondes (topic + clé, messages
+  groupés <topic>/batch, dispositions <topic>/layout).
+- Décoder chaque message (mqtt_decode.decode_message).
+- Écrire les mesures dans SQLite en mode WAL, par transactions groupées :
+  une écriture tous les `batch` mesures ou toutes les `flush_ms`
+  millisecondes, au premier des deux termes.
+- Table lisible directement par Grafana (source de données SQLite).
+
+Table :
+    measures(ts REAL, device TEXT, key TEXT, value REAL, text TEXT)
+    device = topic sans son dernier niveau ("maison/sonde1/temperature"
+    → "maison/sonde1") ; value pour les nombres, text pour les statuts.
+
+Utilisation :
+    python host/ingest.py --server 192.168.1.20 --topic "maison/#" \\
+        --db houblon.db
+
+Client MQTT 3.1.1 minimal intégré (CONNECT, SUBSCRIBE, PINGREQ, PUBACK) :
+aucune dépendance hors bibliothèque standard.
+"""
+import argparse
+import socket
+import sqlite3
+import struct
+import time
+
+from mqtt_decode import decode_message
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measures (
+    ts REAL NOT NULL,
+    device TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value REAL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS measures_device_key_ts ON measures (device, key, ts);
+"""
+
+
+# ==================== Stockage ====================
+
+class Store:
+    """
+    Écriture groupée des mesures dans SQLite (mode WAL).
+
+    Attributes:
+        rows (int): Mesures écrites.
+        flushes (int): Transactions validées.
+        failures (int): Transactions annulées (mesures gardées en attente).
+    """
+
+    def __init__(self, path, batch=500, flush_ms=1000):
+        """
+        Args:
+            path (str): Fichier SQLite.
+            batch (int): Mesures en attente déclenchant une écriture.
+            flush_ms (int): Délai maximal avant écriture des mesures en attente.
+        """
+        # un seul écrivain, mais pas forcément le thread qui ouvre la base
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL : pas de fsync à chaque transaction, base cohérente
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.batch = batch
+        self.flush_ms = flush_ms
+        self.pending = []
+        self.rows = 0
+        self.flushes = 0
+        self.failures = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, device, ts, key, value):
+        """
+        Met une mesure en attente d'écriture.
+
+        Args:
+            device (str): Sonde (préfixe du topic).
+            ts (float): Heure Unix de la mesure.
+            key (str): Clé (temperature, humidity, nom du capteur...).
+            value (int | float | str | None): Valeur décodée.
+        """
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.pending.append((ts, device, key, value, None))
+        else:
+            self.pending.append((ts, device, key, None, str(value)))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def maybe_flush(self):
+        """
+        Écrit les mesures en attente si flush_ms est écoulé.
+        """
+        if self.pending and (time.monotonic() - self._last_flush) * 1000 >= self.flush_ms:
+            self.flush()
+
+    def flush(self):
+        """
+        Écrit les mesures en attente dans une seule transaction.
+
+        En cas d'erreur SQLite (base verrouillée, disque plein...), la
+        transaction est annulée et les mesures restent en attente pour
+        l'écriture suivante.
+        """
+        self._last_flush = time.monotonic()
+        if not self.pending:
+            return
+        try:
+            self.db.execute("BEGIN")
+            self.db.executemany("INSERT INTO measures VALUES (?, ?, ?, ?, ?)", self.pending)
+            self.db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            self.failures += 1
+            print("Écriture SQLite annulée :", e)
+            return
+        self.rows += len(self.pending)
+        self.flushes += 1
+        self.pending = []
+
+    def close(self):
+        """
+        Écrit les mesures en attente puis ferme la base.
+        """
+        self.flush()
+        self.db.close()
+
+
+class Ingestor:
+    """
+    Décodage des messages reçus et écriture dans un Store.
+
+    Attributes:
+        messages (int): Messages reçus.
+        errors (int): Messages indécodables (ignorés).
+        layouts (dict): Dispositions "struct" reçues.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store (Store): Stockage des mesures.
+        """
+        self.store = store
+        self.layouts = {}
+        self.messages = 0
+        self.errors = 0
+
+    def handle(self, topic, payload, now=None):
+        """
+        Décode un message et met ses mesures en attente d'écriture.
+
+        Args:
+            topic (str): Topic reçu.
+            payload (bytes): Contenu reçu.
+            now (float, optionnel): Heure de réception (messages unitaires).
+        """
+        self.messages += 1
+        try:
+            measures = decode_message(topic, payload, now=now, layouts=self.layouts)
+        except Exception as e:
+            # un message malformé (même retenu) ne doit pas arrêter le service
+            self.errors += 1
+            print("Message ignoré sur", topic, ":", e)
+            return
+        device = topic.rsplit("/", 1)[0]
+        for ts, key, value in measures:
+            self.store.add(device, ts, key, value)
+
+
+# ==================== Client MQTT ====================
+
+def _field(text):
+    """
+    Chaîne MQTT : longueur sur 2 octets puis texte UTF-8.
+    """
+    data = text.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+def _packet(first, body):
+    """
+    Paquet MQTT : premier octet, longueur restante, corps.
+    """
+    out = bytearray((first,))
+    n = len(body)
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out) + body
+
+
+class Subscriber:
+    """
+    Abonné MQTT 3.1.1 minimal (lecture des PUBLISH reçus).
+    """
+
+    def __init__(self, server, port=1883, client_id="houblon-ingest",
+                 keepalive=60, user=None, password=None):
+        """
+        Args:
+            server (str): Adresse du broker.
+            port (int): Port du broker.
+            client_id (str): Identifiant MQTT.
+            keepalive (int): Keepalive en secondes.
+            user (str | None): Utilisateur.
+            password (str | None): Mot de passe.
+        """
+        self.server = server
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self.user = user
+        self.password = password
+        self.sock = None
+        self._buf = bytearray()
+        self._last_io = 0
+
+    def connect(self, filters):
+        """
+        Ouvre la session et s'abonne aux filtres (QoS 0).
+
+        Args:
+            filters (list): Filtres de topics ("maison/#").
+
+        Raises:
+            OSError: Si le broker est injoignable ou refuse la connexion.
+        """
+        self.sock = socket.create_connection((self.server, self.port), timeout=10)
+        self._buf = bytearray()
+        flags = 0x02
+        payload = _field(self.client_id)
+        if self.user is not None:
+            flags |= 0x80
+            payload += _field(self.user)
+            if self.password is not None:
+                flags |= 0x40
+                payload += _field(self.password)
+        var = b"\x00\x04MQTT\x04" + bytes((flags,)) + struct.pack("!H", self.keepalive)
+        self.sock.sendall(_packet(0x10, var + payload))
+        first, body = self._wait_packet()
+        if first != 0x20 or body[1] != 0:
+            raise OSError("connexion MQTT refusée : %r" % bytes(body))
+        topics = b"".join(_field(f) + b"\x00" for f in filters)
+        self.sock.sendall(_packet(0x82, b"\x00\x01" + topics))
+        first, body = self._wait_packet()
+        if first != 0x90:
+            raise OSError("SUBACK attendu")
+        self._last_io = time.monotonic()
+
+    def _wait_packet(self):
+        """
+        Attend un paquet complet (connexion, abonnement).
+        """
+        while True:
+            packet = self._next_packet()
+            if packet is not None:
+                return packet
+            self._recv()
+
+    def _recv(self):
+        """
+        Lit les octets disponibles dans le tampon.
+
+        Raises:
+            OSError: Si le broker a fermé la connexion.
+        """
+        data = self.sock.recv(65536)
+        if not data:
+            raise OSError("connexion fermée par le broker")
+        self._buf += data
+
+    def _next_packet(self):
+        """
+        Extrait un paquet complet du tampon.
+
+        Returns:
+            tuple | None: (premier_octet, corps) ou None si incomplet.
+        """
+        buf = self._buf
+        length = 0
+        shift = 0
+        pos = 1
+        while True:
+            if pos >= len(buf):
+                return None
+            byte = buf[pos]
+            length |= (byte & 0x7F) << shift
+            pos += 1
+            if not byte & 0x80:
+                break
+            shift += 7
+        end = pos + length
+        if end > len(buf):
+            return None
+        packet = (buf[0], bytes(buf[pos:end]))
+        del buf[:end]
+        return packet
+
+    def poll(self, timeout=0.2):
+        """
+        Lit les messages reçus, en attendant au plus timeout secondes.
+
+        Entretient la session (PINGREQ) et acquitte les PUBLISH QoS 1.
+
+        Args:
+            timeout (float): Attente maximale en secondes.
+
+        Returns:
+            list: Tuples (topic, payload) reçus.
+
+        Raises:
+            OSError: Si la connexion est perdue.
+        """
+        if self.keepalive and time.monotonic() - self._last_io > self.keepalive / 2:
+            self.sock.sendall(b"\xc0\x00")
+            self._last_io = time.monotonic()
+        self.sock.settimeout(timeout)
+        try:
+            self._recv()
+        except socket.timeout:
+            return []
+        messages = []
+        while True:
+            packet = self._next_packet()
+            if packet is None:
+                return messages
+            first, body = packet
+            if first & 0xF0 != 0x30:
+                continue  # PINGRESP, SUBACK
+            size = struct.unpack_from("!H", body)[0]
+            topic = body[2:2 + size].decode()
+            pos = 2 + size
+            if first & 0x06:
+                self.sock.sendall(b"\x40\x02" + body[pos:pos + 2])
+                pos += 2
+            messages.append((topic, body[pos:]))
+
+    def close(self):
+        """
+        Envoie DISCONNECT et ferme la connexion (erreurs ignorées).
+        """
+        if self.sock is None:
+            return
+        try:
+            self.sock.sendall(b"\xe0\x00")
+        except OSError:
+            pass
+        self.sock.close()
+        self.sock = None
+
+
+def run(subscriber, ingestor, filters, stop=None, retry_s=5):
+    """
+    Boucle d'ingestion : réception, décodage, écriture groupée.
+
+    La connexion est rétablie après une coupure (pause retry_s, doublée
+    à chaque échec jusqu'à 60 s).
+
+    Args:
+        subscriber (Subscriber): Client MQTT.
+        ingestor (Ingestor): Décodage et stockage.
+        filters (list): Filtres de topics.
+        stop (threading.Event, optionnel): Arrêt demandé (tests, service).
+        retry_s (float): Pause après le premier échec de connexion.
+    """
+    delay = retry_s
+    store = ingestor.store
+    while stop is None or not stop.is_set():
+        try:
+            subscriber.connect(filters)
+            print("Ingestion : abonné à", ", ".join(filters))
+            delay = retry_s
+            while stop is None or not stop.is_set():
+                now = time.time()
+                for topic, payload in subscriber.poll():
+                    ingestor.handle(topic, payload, now)
+                store.maybe_flush()
+        except OSError as e:
+            print("Ingestion : connexion perdue :", e, "- nouvel essai dans", delay, "s")
+            subscriber.close()
+            store.flush()
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+            delay = min(delay * 2, 60)
+    subscriber.close()
+    store.flush()
+
+
+def main(argv=None):
+    """
+    Point d'entrée en ligne de commande.
+    """
+    parser = argparse.ArgumentParser(description="Ingestion MQTT → SQLite")
+    parser.add_argument("--server", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--topic", action="append",
+                        help="filtre d'abonnement (répétable), par défaut #")
+    parser.add_argument("--db", default="houblon.db")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--flush-ms", type=int, default=1000)
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    args = parser.parse_args(argv)
+
+    store = Store(args.db, args.batch, args.flush_ms)
+    subscriber = Subscriber(args.server, args.port, user=args.user,
+                            password=args.password)
+    try:
+        run(subscriber, Ingestor(store), args.topic or ["#"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
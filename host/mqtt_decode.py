@@ -0,0 +1,255 @@
+# host/mqtt_decode.py
+"""
+mqtt_decode.py
+Décodage, côté PC (Raspberry Pi), des messages publiés par les sondes.
+
+Rôle :
+- Décoder les messages groupés (mode "batch" de MQTTHandler) en mesures
+  horodatées.
+- Décoder les messages unitaires (mode "topics" : topic + clé → valeur).
+- Reconnaître l'encodage des messages groupés : JSON, MessagePack ou
+  disposition binaire fixe (codec "struct", voir src/payload_codec.py).
+- Fournir une fonction unique decode_message() qui reconnaît le format.
+
+Mesure décodée :
+    (timestamp_unix, clé, valeur)
+
+Utilisation :
+    from mqtt_decode import decode_message
+    layouts = {}   # dispositions "struct" reçues sur <topic>/layout
+    for ts, key, value in decode_message(topic, payload, "maison/sonde1/",
+                                         layouts=layouts):
+        ...
+"""
+import json
+import math
+import struct
+import time
+
+STRUCT_MAGIC = 0xC1
+_HEADER = "<BHIB"
+
+# valeurs « absentes » du codec struct, par format
+_MISSING = {"H": 0xFFFF, "B": 0xFF}
+
+
+def parse_value(text):
+    """
+    Convertit la valeur texte d'un message unitaire.
+
+    Args:
+        text (str | bytes): Payload (ex : "21.5", "0", "error").
+
+    Returns:
+        int | float | str: Nombre si possible, sinon le texte.
+    """
+    if isinstance(text, (bytes, bytearray)):
+        text = text.decode("utf-8", "replace")
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def unpack(data):
+    """
+    Décode un message MessagePack (réels 32 bits arrondis à 7 chiffres
+    significatifs, comme à l'encodage).
+
+    Args:
+        data (bytes): Message encodé.
+
+    Returns:
+        Objet décodé.
+
+    Raises:
+        ValueError: Si le message est tronqué ou contient un type inconnu.
+    """
+    try:
+        obj, pos = _unpack(bytes(data), 0)
+    except (IndexError, struct.error) as e:
+        raise ValueError("MessagePack tronqué : " + str(e))
+    if pos != len(data):
+        raise ValueError("octets en trop après le message MessagePack")
+    return obj
+
+
+_FIXED = {
+    0xCA: (">f", 4), 0xCB: (">d", 8),
+    0xCC: (">B", 1), 0xCD: (">H", 2), 0xCE: (">I", 4), 0xCF: (">Q", 8),
+    0xD0: (">b", 1), 0xD1: (">h", 2), 0xD2: (">i", 4), 0xD3: (">q", 8),
+}
+_LENGTHS = {0xC4: 1, 0xC5: 2, 0xC6: 4, 0xD9: 1, 0xDA: 2, 0xDB: 4,
+            0xDC: 2, 0xDD: 4, 0xDE: 2, 0xDF: 4}
+_LENGTH_FORMATS = {1: ">B", 2: ">H", 4: ">I"}
+
+
+def _unpack(data, pos):
+    """
+    Returns:
+        tuple: (objet, position après l'objet).
+    """
+    code = data[pos]
+    pos += 1
+    if code < 0x80:
+        return code, pos
+    if code >= 0xE0:
+        return code - 0x100, pos
+    if code == 0xC0:
+        return None, pos
+    if code in (0xC2, 0xC3):
+        return code == 0xC3, pos
+    if code in _FIXED:
+        fmt, size = _FIXED[code]
+        value = struct.unpack_from(fmt, data, pos)[0]
+        if code == 0xCA:
+            value = float("%.7g" % value)
+        return value, pos + size
+    if 0xA0 <= code < 0xC0:
+        kind, n = "str", code & 0x1F
+    elif 0x90 <= code < 0xA0:
+        kind, n = "list", code & 0x0F
+    elif 0x80 <= code < 0x90:
+        kind, n = "dict", code & 0x0F
+    elif code in _LENGTHS:
+        size = _LENGTHS[code]
+        n = struct.unpack_from(_LENGTH_FORMATS[size], data, pos)[0]
+        pos += size
+        kind = ("bin" if code <= 0xC6 else "str" if code <= 0xDB
+                else "list" if code <= 0xDD else "dict")
+    else:
+        raise ValueError("type MessagePack non pris en charge : 0x%02x" % code)
+    if kind in ("str", "bin"):
+        raw = data[pos:pos + n]
+        if len(raw) < n:
+            raise IndexError("chaîne tronquée")
+        return (raw.decode("utf-8") if kind == "str" else raw), pos + n
+    if kind == "list":
+        items = []
+        for _ in range(n):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return items, pos
+    result = {}
+    for _ in range(n):
+        key, pos = _unpack(data, pos)
+        result[key], pos = _unpack(data, pos)
+    return result, pos
+
+
+def decode_struct(payload, layouts):
+    """
+    Décode un message groupé binaire (codec "struct").
+
+    Args:
+        payload (bytes): Message commençant par 0xC1.
+        layouts (dict): Identifiant → disposition {"fmt": ..., "k": [...]}
+            reçue sur <topic>/layout.
+
+    Returns:
+        list: Tuples (timestamp, clé, valeur), valeurs absentes ignorées.
+
+    Raises:
+        ValueError: Si la disposition est inconnue ou le message tronqué.
+    """
+    try:
+        magic, layout_id, t0, count = struct.unpack_from(_HEADER, payload, 0)
+    except struct.error:
+        raise ValueError("message struct tronqué")
+    layout = (layouts or {}).get(layout_id)
+    if layout is None:
+        raise ValueError("disposition struct inconnue : %d" % layout_id)
+    fmt = layout["fmt"]
+    row = "<H" + fmt
+    try:
+        size = struct.calcsize(row)
+    except struct.error:
+        raise ValueError("disposition struct invalide : " + fmt)
+    pos = struct.calcsize(_HEADER)
+    if len(payload) < pos + size * count:
+        raise ValueError("message struct tronqué")
+    measures = []
+    for _ in range(count):
+        values = struct.unpack_from(row, payload, pos)
+        pos += size
+        ts = t0 + values[0]
+        for key, code, value in zip(layout["k"], fmt, values[1:]):
+            if code == "f":
+                if math.isnan(value):
+                    continue
+                value = float("%.7g" % value)
+            elif value == _MISSING.get(code):
+                continue
+            measures.append((ts, key, value))
+    return measures
+
+
+def decode_batch(payload, layouts=None):
+    """
+    Décode un message groupé produit par MQTTHandler.cycle_messages.
+
+    Args:
+        payload (str | bytes): {"t0": ..., "k": [...], "s": [[dt, v...], ...]}
+            en JSON ou MessagePack, ou message binaire "struct".
+        layouts (dict, optionnel): Dispositions "struct" connues.
+
+    Returns:
+        list: Tuples (timestamp, clé, valeur), valeurs absentes (null) ignorées.
+
+    Raises:
+        ValueError: Si le payload n'est pas un message groupé valide.
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        if payload[:1] == bytes((STRUCT_MAGIC,)):
+            return decode_struct(payload, layouts)
+        if payload[:1] != b"{":
+            msg = unpack(payload)
+        else:
+            msg = json.loads(payload.decode("utf-8"))
+    else:
+        msg = json.loads(payload)
+    try:
+        t0, keys, rows = msg["t0"], msg["k"], msg["s"]
+    except (KeyError, TypeError) as e:
+        raise ValueError("message groupé invalide : " + str(e))
+    measures = []
+    try:
+        for row in rows:
+            ts = t0 + row[0]
+            for key, value in zip(keys, row[1:]):
+                if value is not None:
+                    measures.append((ts, key, value))
+    except (IndexError, TypeError) as e:
+        raise ValueError("ligne de message groupé invalide : " + str(e))
+    return measures
+
+
+def decode_message(topic, payload, base_topic="", now=None, layouts=None):
+    """
+    Décode un message de sonde quel que soit son format.
+
+    Args:
+        topic (str): Topic reçu.
+        payload (str | bytes): Contenu reçu.
+        base_topic (str): Préfixe des topics de la sonde (mqtt.topic).
+        now (float, optionnel): Heure de réception pour les messages
+            unitaires, qui ne portent pas d'horodatage (par défaut time.time()).
+        layouts (dict, optionnel): Dispositions "struct" connues, complété
+            par les messages <topic>/layout reçus.
+
+    Returns:
+        list: Tuples (timestamp, clé, valeur) (vide pour une disposition).
+    """
+    if topic.endswith("/layout"):
+        layout = json.loads(payload)
+        if layouts is not None:
+            layouts[layout["id"]] = layout
+        return []
+    if topic.endswith("/batch"):
+        return decode_batch(payload, layouts)
+    key = topic[len(base_topic):] if base_topic and topic.startswith(base_topic) else topic.rsplit("/", 1)[-1]
+    return [(time.time() if now is None else now, key, parse_value(payload))]
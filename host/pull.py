@@ -0,0 +1,204 @@
+# host/pull.py
+"""
+pull.py
+Récupération des fichiers de données d'une sonde, côté PC.
+
+Rôle :
+- Lister les fichiers proposés par le serveur web de la sonde (liens
+  /download?file=... de la page d'accueil).
+- Télécharger chaque fichier dans <dest>.part, puis le renommer une
+  fois complet : un fichier sans suffixe est toujours entier.
+- Reprise : si un <dest>.part existe (transfert coupé, Wi-Fi perdu),
+  la requête porte "Range: bytes=<taille>-" et seuls les octets
+  manquants sont transférés (réponse 206 de la sonde).
+    - 200 : le serveur ignore la plage, on repart de zéro
+    - 416 : rien au-delà de la partie reçue ; complet si la taille
+      annoncée est celle de la partie, sinon le fichier a été remplacé
+      sur la sonde et on repart de zéro
+- Nouvel essai après une coupure, tant que chaque tentative fait
+  progresser le transfert ; abandon après `retries` échecs successifs
+  sans nouvel octet.
+
+Utilisation :
+    python host/pull.py --server 192.168.4.1 --dest releves/
+    python host/pull.py --server 192.168.4.1 data.jsonl
+
+Bibliothèque standard uniquement (http.client).
+"""
+import argparse
+import http.client
+import os
+import re
+import time
+
+CHUNK_SIZE = 4096
+
+_LINK = re.compile(r'href="/download\?file=([^"]+)"')
+_CONTENT_RANGE = re.compile(r"bytes\s+(?:(\d+)-\d+|\*)/(\d+)")
+
+
+class _Restart(Exception):
+    """La partie locale ne correspond plus au fichier distant."""
+
+
+def list_files(server, port=8080, timeout=10):
+    """
+    Liste les fichiers téléchargeables de la sonde.
+
+    Args:
+        server (str): Adresse de la sonde.
+        port (int): Port du serveur web.
+        timeout (float): Délai réseau (s).
+
+    Returns:
+        list: Noms de fichiers, dans l'ordre de la page.
+    """
+    conn = http.client.HTTPConnection(server, port, timeout=timeout)
+    try:
+        conn.request("GET", "/")
+        page = conn.getresponse().read().decode("utf-8", "replace")
+    finally:
+        conn.close()
+    return _LINK.findall(page)
+
+
+def content_range(value):
+    """
+    Interprète un en-tête Content-Range.
+
+    Args:
+        value (str): "bytes 100-199/1000" ou "bytes */1000".
+
+    Returns:
+        tuple: (début ou None, taille totale), ou None si illisible.
+    """
+    match = _CONTENT_RANGE.match(value or "")
+    if not match:
+        return None
+    start = match.group(1)
+    return (int(start) if start is not None else None, int(match.group(2)))
+
+
+def _fetch(server, port, filename, part, stats, timeout):
+    """
+    Une tentative : demande la suite de `part` et l'ajoute au fichier.
+
+    Returns:
+        bool: True si le fichier est complet.
+
+    Raises:
+        OSError: Coupure réseau, réponse incomplète ou inattendue.
+        _Restart: Partie locale à jeter.
+    """
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    conn = http.client.HTTPConnection(server, port, timeout=timeout)
+    try:
+        headers = {"Range": "bytes=%d-" % offset} if offset else {}
+        conn.request("GET", "/download?file=" + filename, headers=headers)
+        resp = conn.getresponse()
+        stats["requests"] += 1
+
+        if resp.status == 416:
+            span = content_range(resp.getheader("Content-Range"))
+            if span and span[1] == offset:
+                return True
+            raise _Restart()
+        if resp.status == 200:
+            mode = "wb"
+        elif resp.status == 206:
+            span = content_range(resp.getheader("Content-Range"))
+            if not span or span[0] != offset:
+                raise OSError("Content-Range inattendu : %s" % resp.getheader("Content-Range"))
+            mode = "ab"
+            stats["resumed"] += 1
+        else:
+            raise OSError("HTTP %d %s" % (resp.status, resp.reason))
+
+        # écrit au fil de l'eau : une coupure laisse une partie réutilisable
+        with open(part, mode) as f:
+            while True:
+                data = resp.read(CHUNK_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                stats["received"] += len(data)
+        if resp.length:
+            raise OSError("réponse incomplète (%d octets manquants)" % resp.length)
+        return True
+    except http.client.HTTPException as e:
+        raise OSError("réponse invalide : %r" % e)
+    finally:
+        conn.close()
+
+
+def pull(server, filename, dest=None, port=8080, timeout=10, retries=5, retry_s=1.0):
+    """
+    Télécharge un fichier de la sonde, avec reprise après coupure.
+
+    Args:
+        server (str): Adresse de la sonde.
+        filename (str): Nom du fichier sur la sonde.
+        dest (str): Fichier local (par défaut : même nom, dossier courant).
+        port (int): Port du serveur web.
+        timeout (float): Délai réseau par opération (s).
+        retries (int): Échecs successifs sans progression tolérés.
+        retry_s (float): Attente entre deux tentatives (s).
+
+    Returns:
+        dict: {"size", "received", "requests", "resumed"} ; received
+        compte les octets transférés, reprises comprises.
+
+    Raises:
+        OSError: Échec après `retries` tentatives sans progression.
+    """
+    dest = dest or filename
+    part = dest + ".part"
+    stats = {"size": 0, "received": 0, "requests": 0, "resumed": 0}
+    failures = 0
+    while True:
+        before = stats["received"]
+        try:
+            if _fetch(server, port, filename, part, stats, timeout):
+                break
+        except _Restart:
+            # fichier remplacé sur la sonde : la partie locale est caduque
+            os.remove(part)
+            continue
+        except OSError as e:
+            failures = 0 if stats["received"] > before else failures + 1
+            if failures >= retries:
+                raise OSError("%s : abandon après %d échecs (%s)" % (filename, failures, e))
+            print("%s : transfert interrompu (%s), reprise..." % (filename, e))
+            time.sleep(retry_s)
+
+    if not os.path.exists(part):
+        open(part, "wb").close()  # fichier vide
+    os.replace(part, dest)
+    stats["size"] = os.path.getsize(dest)
+    return stats
+
+
+def main(argv=None):
+    """
+    Point d'entrée en ligne de commande.
+    """
+    parser = argparse.ArgumentParser(description="Récupération des fichiers d'une sonde")
+    parser.add_argument("files", nargs="*", help="fichiers à récupérer (défaut : tous)")
+    parser.add_argument("--server", default="192.168.4.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--dest", default=".")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--retries", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    files = args.files or list_files(args.server, args.port, args.timeout)
+    os.makedirs(args.dest, exist_ok=True)
+    for name in files:
+        stats = pull(args.server, name, os.path.join(args.dest, name), args.port,
+                     args.timeout, args.retries)
+        print("%-28s %9d octets  %d requête(s)  %d reprise(s)"
+              % (name, stats["size"], stats["requests"], stats["resumed"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# src/backoff.py
+"""
+backoff.py
+Délais de nouvelle tentative exponentiels, avec gigue et disjoncteur.
+
+Rôle :
+- Espacer les tentatives de connexion (broker MQTT, Wi-Fi) après un échec :
+  base, base x 2, base x 4... plafonné à cap_ms.
+- Ajouter une gigue aléatoire à chaque délai : après une coupure de
+  courant, une flotte de sondes ne se reconnecte pas au même instant.
+- Retarder aussi la première tentative d'un délai aléatoire dans
+  [0, initial_ms] : sans lui, toutes les sondes redémarrées ensemble
+  font leur premier essai au même moment.
+- Après `threshold` échecs consécutifs, ouvrir le disjoncteur : plus
+  aucune tentative pendant cooldown_ms, puis un seul essai (semi-ouvert).
+  Un succès referme le disjoncteur, un échec le rouvre.
+
+Utilisation :
+    retry = Backoff(base_ms=1000, cap_ms=60000, initial_ms=5000)
+    if retry.ready():
+        if connect():
+            retry.success()
+        else:
+            retry.failure()   # délai avant la prochaine tentative
+"""
+import time
+import random
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+# États du disjoncteur
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+def jittered(ms, jitter=0.5):
+    """
+    Retire au délai une part aléatoire (au plus jitter x ms).
+
+    Args:
+        ms (int): Délai nominal en millisecondes.
+        jitter (float): Part aléatoire, de 0 (aucune) à 1 (délai dans [0, ms]).
+
+    Returns:
+        int: Délai dans [ms x (1 - jitter), ms].
+    """
+    # getrandbits : disponible sur MicroPython (random.random ne l'est pas toujours)
+    return int(ms - ms * jitter * random.getrandbits(16) / 65536)
+
+class Backoff:
+    """
+    Politique de nouvelle tentative avec disjoncteur.
+
+    Attributes:
+        failures (int): Échecs consécutifs.
+        state (str): CLOSED, OPEN ou HALF_OPEN.
+        delay_ms (int): Délai en cours avant la prochaine tentative.
+        trips (int): Nombre d'ouvertures du disjoncteur.
+    """
+
+    def __init__(self, base_ms=1000, cap_ms=300000, factor=2, jitter=0.5,
+                 threshold=5, cooldown_ms=600000, initial_ms=0):
+        """
+        Args:
+            base_ms (int): Délai après le premier échec.
+            cap_ms (int): Délai maximal entre deux tentatives.
+            factor (int): Multiplicateur du délai à chaque échec.
+            jitter (float): Part aléatoire du délai (voir jittered()).
+            threshold (int): Échecs consécutifs avant ouverture du disjoncteur.
+            cooldown_ms (int): Pause (avec gigue) quand le disjoncteur est ouvert.
+            initial_ms (int): Délai maximal avant la première tentative
+                (tiré dans [0, initial_ms] ; 0 = immédiate).
+        """
+        self.base_ms = base_ms
+        self.cap_ms = cap_ms
+        self.factor = factor
+        self.jitter = jitter
+        self.threshold = threshold
+        self.cooldown_ms = cooldown_ms
+        self.failures = 0
+        self.state = CLOSED
+        # gigue de démarrage : délai entièrement aléatoire
+        self.delay_ms = jittered(initial_ms, 1) if initial_ms else 0
+        self.trips = 0
+        self._since = ticks_ms()
+
+    def failure(self):
+        """
+        Enregistre un échec et calcule le délai avant la tentative suivante.
+
+        Returns:
+            int: Délai en millisecondes.
+        """
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self.delay_ms = jittered(self.cooldown_ms, self.jitter)
+        else:
+            delay = self.base_ms * self.factor ** (self.failures - 1)
+            self.delay_ms = jittered(min(delay, self.cap_ms), self.jitter)
+        self._since = ticks_ms()
+        return self.delay_ms
+
+    def success(self):
+        """
+        Enregistre un succès : délai remis à zéro, disjoncteur fermé.
+        """
+        self.failures = 0
+        self.state = CLOSED
+        self.delay_ms = 0
+
+    def remaining_ms(self):
+        """
+        Returns:
+            int: Temps restant avant la prochaine tentative autorisée.
+        """
+        if not self.delay_ms:
+            return 0
+        return max(0, self.delay_ms - ticks_diff(ticks_ms(), self._since))
+
+    def ready(self):
+        """
+        Indique si une tentative est autorisée maintenant.
+
+        Disjoncteur ouvert et pause écoulée : passe en semi-ouvert (un essai).
+
+        Returns:
+            bool: True si l'appelant peut tenter de se connecter.
+        """
+        if self.remaining_ms():
+            return False
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+        return True
+
+    def wait(self):
+        """
+        Attend (bloquant) que la prochaine tentative soit autorisée.
+        """
+        left = self.remaining_ms()
+        if left:
+            time.sleep(left / 1000)
@@ -10,6 +10,7 @@ Initialisation minimale pour l'ESP (MicroPython).
 """
 
 import time, os, json
+import buffered_writer
 
 try:
     ticks_ms = time.ticks_ms # MicroPython
@@ -20,9 +21,17 @@ except AttributeError:
 LOG_FILE = "boot.log"
 CONFIG_FILE = "config.json"
 
+# Les lignes de log sont regroupées avant écriture sur la flash
+LOG_BUFFER_SIZE = 256
+LOG_MAX_AGE_MS = 10000
+
 def log(msg):
     """
     Écrit un message dans le log et l'affiche.
+
+    La ligne passe par un tampon (voir buffered_writer) : elle est écrite
+    sur la flash quand le tampon est plein, après LOG_MAX_AGE_MS, ou
+    lors d'un flush_log().
     
     Args:
         msg (str): Message à enregistrer.
@@ -31,9 +40,17 @@ def log(msg):
     line = "[{:.2f}] ".format(t) + msg + "\n"
     print(line, end="")
     try:
-        with open(LOG_FILE, "a") as f:
-            f.write(line)
+        buffered_writer.get_writer(LOG_FILE, LOG_BUFFER_SIZE, LOG_MAX_AGE_MS).write(line)
+
+    except Exception as e:
+        print("Une erreur est survenue : " + str(e))
 
+def flush_log():
+    """
+    Écrit immédiatement les lignes de log en attente.
+    """
+    try:
+        buffered_writer.flush_file(LOG_FILE)
     except Exception as e:
         print("Une erreur est survenue : " + str(e))
 
@@ -43,6 +60,7 @@ def clear_old_log():
     """
     try:
         if LOG_FILE in os.listdir() and os.stat(LOG_FILE)[6] > 100_000:
+            buffered_writer.release(LOG_FILE, discard=True)
             os.remove(LOG_FILE)
             print("Log effacé (trop volumineux).")
     except:
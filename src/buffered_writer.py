@@ -0,0 +1,213 @@
+# src/buffered_writer.py
+"""
+buffered_writer.py
+Regroupement des petites écritures flash dans un tampon préalloué.
+
+Rôle :
+- Accumuler les petits enregistrements (logs, mesures) dans un
+  bytearray alloué une seule fois, au lieu d'ouvrir / écrire / fermer
+  le fichier à chaque ligne (mise à jour des métadonnées LittleFS/FAT
+  et usure de la flash à chaque fois).
+- Vider le tampon sur la flash quand il est plein, quand la donnée la
+  plus ancienne dépasse un âge maximal, ou sur flush() explicite.
+- Partager un écrivain par fichier (get_writer) et tout vider d'un coup
+  avant un redémarrage (flush_all).
+- Compter les écritures logiques, les vidages et les octets écrits pour
+  mesurer la réduction d'amplification d'écriture.
+
+Utilisation :
+    w = get_writer("boot.log", size=256)
+    w.write("ligne\\n")
+    ...
+    flush_all()   # avant machine.reset()
+"""
+import time
+import storage_events
+
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+# écrivains partagés, par nom de fichier
+_writers = {}
+
+class BufferedWriter:
+    """
+    Tampon d'écriture en ajout pour un fichier.
+
+    Attributes:
+        filename (str): Fichier de destination (ouvert en ajout).
+        size (int): Taille du tampon en octets.
+        max_age_ms (int | None): Âge maximal d'une donnée non écrite.
+        write_count (int): Nombre d'appels à write().
+        flush_count (int): Nombre d'écritures effectives sur la flash.
+        bytes_written (int): Octets écrits sur la flash.
+    """
+
+    def __init__(self, filename, size=512, max_age_ms=30000):
+        """
+        Args:
+            filename (str): Fichier de destination.
+            size (int): Taille du tampon (par défaut 512 octets).
+            max_age_ms (int | None): Vidage si la donnée la plus ancienne
+                du tampon a plus de max_age_ms (None = jamais sur l'âge).
+        """
+        self.filename = filename
+        self.size = size
+        self.max_age_ms = max_age_ms
+        self._buf = bytearray(size)
+        self._len = 0
+        self._since = 0
+        self.write_count = 0
+        self.flush_count = 0
+        self.bytes_written = 0
+
+    def pending(self):
+        """
+        Returns:
+            int: Nombre d'octets en attente dans le tampon.
+        """
+        return self._len
+
+    def write(self, data):
+        """
+        Ajoute des données au tampon (vidage automatique si nécessaire).
+
+        Args:
+            data (str | bytes): Données à écrire.
+
+        Returns:
+            int: Nombre d'octets acceptés.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        self.write_count += 1
+        if self._len + n > self.size:
+            self.flush()
+        if n > self.size:
+            # plus grand que le tampon : écriture directe
+            self._write_file(data)
+            return n
+        if self._len == 0:
+            self._since = ticks_ms()
+        self._buf[self._len:self._len + n] = data
+        self._len += n
+        self.check_age()
+        return n
+
+    def check_age(self):
+        """
+        Vide le tampon si sa donnée la plus ancienne est trop vieille.
+
+        Peut aussi être appelée périodiquement par la boucle principale.
+
+        Returns:
+            bool: True si un vidage a eu lieu.
+        """
+        if (self._len and self.max_age_ms is not None
+                and ticks_diff(ticks_ms(), self._since) >= self.max_age_ms):
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """
+        Écrit le contenu du tampon sur la flash (une ouverture de fichier).
+        """
+        if not self._len:
+            return
+        self._write_file(memoryview(self._buf)[:self._len])
+        self._len = 0
+
+    def _write_file(self, data):
+        """
+        Écrit des données en fin de fichier et met à jour les compteurs.
+        """
+        with open(self.filename, "ab") as f:
+            f.write(data)
+        storage_events.written(self.filename)
+        self.flush_count += 1
+        self.bytes_written += len(data)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Compteurs (écritures logiques, vidages, octets écrits, en attente).
+        """
+        return {
+            "writes": self.write_count,
+            "flushes": self.flush_count,
+            "bytes_written": self.bytes_written,
+            "pending": self._len,
+        }
+
+def get_writer(filename, size=512, max_age_ms=30000):
+    """
+    Retourne l'écrivain partagé d'un fichier (créé au premier appel).
+
+    Args:
+        filename (str): Fichier de destination.
+        size (int): Taille du tampon à la création.
+        max_age_ms (int | None): Âge maximal à la création.
+
+    Returns:
+        BufferedWriter: Écrivain associé au fichier.
+    """
+    writer = _writers.get(filename)
+    if writer is None:
+        writer = _writers[filename] = BufferedWriter(filename, size, max_age_ms)
+    return writer
+
+def flush_file(filename):
+    """
+    Vide le tampon d'un fichier s'il en a un (avant une lecture).
+
+    Args:
+        filename (str): Fichier concerné.
+    """
+    writer = _writers.get(filename)
+    if writer is not None:
+        writer.flush()
+
+def release(filename, discard=False):
+    """
+    Vide puis oublie l'écrivain d'un fichier (libère son tampon).
+
+    Args:
+        filename (str): Fichier concerné.
+        discard (bool): True pour jeter les données en attente
+                        (fichier supprimé).
+    """
+    writer = _writers.pop(filename, None)
+    if writer is not None and not discard:
+        writer.flush()
+
+def flush_all():
+    """
+    Vide tous les tampons, par exemple avant safe_restart / machine.reset.
+    Les erreurs d'écriture sont ignorées pour ne pas bloquer le redémarrage.
+    """
+    for writer in list(_writers.values()):
+        try:
+            writer.flush()
+        except Exception as e:
+            print("Erreur vidage " + writer.filename + " : " + str(e))
+
+def check_all():
+    """
+    Applique la politique d'âge à tous les tampons (tâche périodique).
+    """
+    for writer in list(_writers.values()):
+        writer.check_age()
+
+def stats():
+    """
+    Returns:
+        dict: Compteurs de chaque écrivain, par nom de fichier.
+    """
+    return dict((name, w.stats()) for name, w in _writers.items())
@@ -0,0 +1,148 @@
+# src/journal.py
+"""
+journal.py
+Journal de mesures en ajout seul (une ligne JSON par enregistrement).
+
+Rôle :
+- Ajouter de nouveaux enregistrements en fin de fichier sans relire
+  l'historique (coût d'écriture proportionnel aux seules nouvelles données).
+- Relire le journal ligne par ligne (mémoire constante côté ESP).
+- Migrer une seule fois un ancien data.json (tableau JSON) vers le journal.
+
+Format :
+    {"name": "S1", "type": "analog", "value": 42, "timestamp": 1700000000}\n
+    {"name": "S2", "type": "digital", "value": 0, "timestamp": 1700000000}\n
+
+Utilisation :
+    journal = Journal("data.jsonl")
+    journal.append([{"name": "S1", "value": 42}])
+    for record in journal:
+        print(record)
+"""
+import os
+try:
+    import ujson as json
+except ImportError:
+    import json
+import buffered_writer
+import storage_events
+
+JOURNAL_FILE = "data.jsonl"
+LEGACY_FILE = "data.json"
+
+def file_exists(filename):
+    """
+    Indique si un fichier existe (os.path absent sur MicroPython).
+
+    Args:
+        filename (str): Chemin du fichier.
+
+    Returns:
+        bool: True si le fichier existe.
+    """
+    try:
+        os.stat(filename)
+        return True
+    except OSError:
+        return False
+
+class Journal:
+    """
+    Journal ligne par ligne en ajout seul.
+
+    Attributes:
+        filename (str): Chemin du fichier journal.
+        buffered (bool): Écritures regroupées via buffered_writer.
+    """
+
+    def __init__(self, filename=JOURNAL_FILE, buffered=False):
+        """
+        Args:
+            filename (str): Chemin du fichier journal (par défaut data.jsonl).
+            buffered (bool): Si True, les lignes passent par le tampon
+                partagé du fichier (voir buffered_writer) au lieu d'une
+                ouverture du fichier par appel.
+        """
+        self.filename = filename
+        self.buffered = buffered
+
+    def append(self, records):
+        """
+        Ajoute des enregistrements en fin de journal.
+
+        Seules les nouvelles lignes sont écrites : le fichier existant
+        n'est jamais relu ni réécrit.
+
+        Args:
+            records (list): Liste de dictionnaires sérialisables en JSON.
+
+        Returns:
+            int: Nombre d'octets écrits.
+        """
+        lines = "".join(json.dumps(r) + "\n" for r in records).encode()
+        if not lines:
+            return 0
+        if self.buffered:
+            buffered_writer.get_writer(self.filename).write(lines)
+        else:
+            with open(self.filename, "ab") as f:
+                f.write(lines)
+            storage_events.written(self.filename)
+        return len(lines)
+
+    def __iter__(self):
+        """
+        Parcourt le journal enregistrement par enregistrement.
+
+        Les lignes vides ou corrompues (ex : coupure pendant une écriture)
+        sont ignorées. Les lignes encore en tampon sont d'abord écrites.
+
+        Yields:
+            dict: Enregistrement décodé.
+        """
+        buffered_writer.flush_file(self.filename)
+        try:
+            f = open(self.filename, "r")
+        except OSError:
+            return
+        with f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def migrate_json_array(legacy_file=LEGACY_FILE, journal_file=JOURNAL_FILE):
+    """
+    Migre un ancien fichier tableau JSON vers le journal (une seule fois).
+
+    Le contenu du tableau est ajouté au journal puis l'ancien fichier est
+    renommé en <legacy_file>.bak, ce qui rend la migration idempotente.
+
+    Args:
+        legacy_file (str): Ancien fichier au format [ {...}, {...} ].
+        journal_file (str): Journal de destination.
+
+    Returns:
+        int: Nombre d'enregistrements migrés (0 si rien à faire).
+    """
+    if not file_exists(legacy_file):
+        return 0
+    try:
+        with open(legacy_file, "r") as f:
+            existing = json.load(f)
+    except (OSError, ValueError):
+        existing = []
+    if not isinstance(existing, list):
+        existing = [existing]
+
+    Journal(journal_file).append(existing)
+    backup = legacy_file + ".bak"
+    if file_exists(backup):
+        os.remove(backup)
+    os.rename(legacy_file, backup)
+    storage_events.notify(storage_events.DELETED, legacy_file)
+    return len(existing)
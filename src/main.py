@@ -8,12 +8,22 @@ Rôle :
 - Lancer le serveur web (si nécessaire)
 - Lire les capteurs et publier les données via MQTT
 - Gérer les erreurs, bascules automatiques et redémarrages sécurisés
+- Faire tourner serveur web, mesures, publication MQTT et maintenance
+  ensemble (Runtime, uasyncio) : les mesures continuent pendant un
+  téléchargement
 
 Structure :
     - safe_restart()
         Redémarrage de l'ESP32 après un délai
+    - log_mqtt_down()
+        Log d'un cycle non publié + délai avant reconnexion
     - read_and_publish_sensors()
         Lecture des capteurs + enregistrement + publication MQTT
+        (boucle synchrone, sans serveur web)
+    - open_storage()
+        Stockage des mesures (segments par jour, agrégats optionnels)
+    - Runtime / run_runtime()
+        Tâches concurrentes : serveur web, mesures, publication, maintenance
     - mode_ap()
         Démarrage en point d'accès + serveur web + mesures
     - mode_sta()
@@ -29,7 +39,8 @@ Fonctionnement général :
     1. boot.py exécute l'initialisation et charge la configuration
     2. main.py récupère la configuration (mode, Wi-Fi, MQTT)
     3. main.py configure MQTT, Wi-Fi, serveur web selon le mode
-    4. Les capteurs sont lus périodiquement, enregistrés et publiés
+    4. Les capteurs sont lus périodiquement, enregistrés et publiés,
+       pendant que le serveur web répond (run_runtime)
     5. Redémarrage automatique en cas d'erreur critique
 
 Modules externes :
@@ -41,21 +52,45 @@ Modules externes :
 
 Compatibilité MicroPython :
     - machine.reset est encapsulé pour permettre les tests PC
-    - time.sleep est utilisé pour temporiser le publish MQTT
+    - time.sleep temporise les cycles de read_and_publish_sensors
+    - uasyncio (asyncio sur PC) ordonnance les tâches du Runtime ;
+      testable sur PC avec une horloge virtuelle (tests/virtual_clock.py)
 
 Ce fichier constitue la boucle opérationnelle centrale du projet.
 """
 import boot
 import wifi_utils
+import buffered_writer
+import gc
 import time
+try:
+    import uasyncio as asyncio  # MicroPython
+except ImportError:
+    import asyncio
 try:
     import machine
 except ImportError:
     import types
     machine = types.SimpleNamespace(reset=lambda: None)
-from network_setup import start_server
+import network_setup
+from network_setup import WebServer
 from technique_sensors import Techniques
-from mqtt_client import MQTTHandler
+from segment_store import SegmentStore
+from mqtt_async import AsyncMQTTHandler
+from backoff import OPEN
+
+# Période de mesure par défaut (s), clé "interval" de config.json
+INTERVAL_S = 10
+# Pause du serveur web quand aucun client n'est actif
+SERVER_IDLE_MS = 20
+# Période de la maintenance (tampons sur la flash, ramasse-miettes)
+HOUSEKEEPING_S = 60
+# Période du bilan dans boot.log (bande morte, limiteur de débit)
+REPORT_S = 3600
+# Cycles gardés en RAM en attendant la publication ; au-delà, file sur la flash
+OUTBOX_CYCLES = 6
+# Marque d'un cycle dont les valeurs sont encore dans le plan (mode "topics")
+CYCLE = object()
 
 def safe_restart():
     """
@@ -63,6 +98,7 @@ def safe_restart():
 
     Rôle :
         - Informer via les logs qu’un redémarrage va avoir lieu
+        - Écrire sur la flash les tampons en attente (logs, mesures)
         - Attendre 5 secondes (permet de lire l’erreur éventuelle)
         - Effectuer un reset matériel de l’ESP32
 
@@ -73,30 +109,67 @@ def safe_restart():
         - Sur PC (tests), machine.reset est mocké pour éviter un vrai reboot.
     """
     boot.log("Redémarrage de l'ESP32 dans 5 secondes...")
+    buffered_writer.flush_all()
     time.sleep(5)
     machine.reset()
 
-def read_and_publish_sensors(mqtt, iterations=2):
+def log_mqtt_down(mqtt):
+    """
+    Journalise l'échec d'un cycle MQTT et le délai avant la prochaine
+    tentative de reconnexion (voir MQTTHandler.backoff).
+
+    Args:
+        mqtt (MQTTHandler): Gestionnaire MQTT.
+    """
+    wait_s = mqtt.backoff.remaining_ms() // 1000
+    if mqtt.backoff.state == OPEN:
+        boot.log("MQTT non connecté - disjoncteur ouvert, essai dans " + str(wait_s) + " s")
+    elif wait_s:
+        boot.log("MQTT non connecté - nouvel essai dans " + str(wait_s) + " s")
+    else:
+        boot.log("MQTT non connecté")
+
+def read_and_publish_sensors(mqtt, iterations=2, store=None):
     """
     Lit les capteurs, sauvegarde les données et publie les valeurs via MQTT.
 
     Args:
         mqtt (MQTTHandler): Instance configurée pour communiquer avec le broker.
         iterations (int): Nombre de cycles de mesures (défaut 2).
+        store (SegmentStore, optionnel): Stockage des mesures (voir
+            open_storage) ; sans lui, les mesures ne sont pas enregistrées.
 
     Fonctionnement :
-        - Initialise la classe Techniques pour lire tous les capteurs
-        - Enregistre les mesures dans data.json
+        - Initialise la classe Techniques et compile le plan de publication
+          (topics encodés, lecteurs résolus) une seule fois
+        - Enregistre les mesures dans le segment du jour (si store)
         - Publie chaque valeur sur un topic MQTT dédié
         - Ajoute une pause de 10 secondes entre chaque cycle
 
     Publication MQTT :
-        Pour chaque mesure :
+        Pour chaque mesure (mode "topics", par défaut) :
             topic = mqtt.topic + clé_de_mesure
             valeur = str(valeur_mesurée)
+        En mode "batch" : un seul message JSON par cycle (ou par N cycles),
+        voir MQTTHandler.cycle_messages.
+        Les capteurs configurés avec une bande morte ("deadband") ne
+        publient que les changements significatifs (voir PublishPlan) ;
+        le nombre de messages évités est journalisé en fin de mesures.
+
+    Session MQTT :
+        - La connexion ouverte par main() est réutilisée d'un cycle à
+          l'autre (keepalive géré par MQTTHandler.ensure_connected)
+        - Reconnexion automatique uniquement si la session est perdue
 
     Gestion des erreurs :
-        - Si la connexion MQTT échoue : log "MQTT non connecté"
+        - Si la connexion MQTT échoue : log "MQTT non connecté", les
+          messages du cycle sont mis en file sur la flash
+        - Les reconnexions sont espacées (délai exponentiel avec gigue,
+          disjoncteur après plusieurs échecs) : les cycles suivants
+          continuent de mesurer et de mettre en file sans solliciter
+          le broker
+        - À la connexion suivante, un lot de messages en attente est
+          renvoyé (du plus ancien au plus récent) avant ceux du cycle
         - Le programme continue son exécution
 
     Notes :
@@ -104,35 +177,307 @@ def read_and_publish_sensors(mqtt, iterations=2):
         - Pensé pour fonctionner aussi bien en AP qu’en STA
     """
     tech = Techniques("config.json")
+    # topics, lecteurs et formatage compilés une seule fois
+    plan = mqtt.compile(tech)
     for _ in range(iterations):
-        data = tech.read_all()
-        print(data)
-
-        #tech.save_measure(data)
-
+        plan.read()
+        if store is not None:
+            tech.save_measure(plan.records(), store=store)
         try:
-            boot.log("Avant la connection au mqtt")
-            mqtt.connect()  #une connection par cycle
-            boot.log("Premiere connection au mqtt ???")
-            time.sleep(1)
-
-            for item in data:
-                capteur = item["name"]
-                type_capteur = item["type"]
-                valeur = item["value"]
-
-                for cle, val in valeur.items():
-                    topic = mqtt.topic + cle
-                    mqtt.client.publish(topic, str(val))
+            # session MQTT persistante : reconnexion seulement si perdue
+            if not mqtt.publish_cycle(plan):
+                log_mqtt_down(mqtt)
         except Exception as e:
             print("MQTT : publish impossible :", e)
             boot.log("MQTT non connecté")
-        finally:
-            try:
-                mqtt.disconnect()
-            except:
-                pass
         time.sleep(10)
+    if plan.suppressed:
+        boot.log("Bande morte : " + str(plan.suppressed) + " valeurs non publiées sur "
+                 + str(plan.checked))
+
+# ==================== Stockage des mesures ====================
+
+def open_storage(tech, storage=None):
+    """
+    Ouvre le stockage des mesures décrit par la section "storage" de
+    config.json.
+
+    Args:
+        tech (Techniques): Capteurs (agrégats activés dessus si demandé).
+        storage (dict, optionnel): Paramètres :
+            - "enabled" (bool): False pour ne rien enregistrer.
+            - "prefix" (str): Préfixe des fichiers (par défaut "").
+            - "max_bytes" (int): Quota de taille (par niveau avec agrégats).
+            - "rollups" (bool): Agrégats minute / heure / jour (rollups.py),
+              mesures brutes gardées "raw_days" jours (2 par défaut).
+
+    Returns:
+        SegmentStore | None: Stockage des mesures brutes (segments par jour).
+    """
+    storage = storage or {}
+    if not storage.get("enabled", True):
+        return None
+    prefix = storage.get("prefix", "")
+    if storage.get("rollups"):
+        from rollups import tier_stores
+        stores = tier_stores(prefix, raw_days=storage.get("raw_days", 2),
+                             max_bytes=storage.get("max_bytes", 100_000))
+        tech.enable_rollups(stores)
+        return stores["raw"]
+    return SegmentStore(prefix + "data", max_bytes=storage.get("max_bytes", 200_000))
+
+# ==================== Runtime coopératif ====================
+
+class Runtime:
+    """
+    Tâches concurrentes (uasyncio) : serveur web, mesures, publication
+    MQTT et maintenance.
+
+    - mesures : lecture des capteurs toutes les `interval` secondes,
+      enregistrement dans le stockage (segments, agrégats) ; le cycle est
+      confié à la publication, sans l'attendre
+    - publication : session MQTT, file sur la flash, envoi des cycles
+      (une reconnexion lente ne retarde pas les mesures). En mode
+      "topics", le cycle reste dans le plan et part par
+      AsyncMQTTHandler.publish_plan (aucune chaîne allouée) ; il n'est
+      converti en messages que s'il doit attendre (nouvelle lecture
+      avant sa publication, ou mise en file)
+    - serveur web : un tour de WebServer.poll() à la fois, pause de
+      SERVER_IDLE_MS sans client actif
+    - maintenance : tampons trop anciens écrits sur la flash,
+      ramasse-miettes, bilan dans boot.log toutes les REPORT_S secondes
+
+    Une erreur dans un tour de mesure, de serveur ou de maintenance est
+    journalisée ; la tâche continue au tour suivant.
+
+    Attributes:
+        cycles (int): Cycles de mesure effectués.
+        published (int): Cycles publiés.
+        queued (int): Cycles mis en file sur la flash.
+        outbox (list): Cycles en attente de publication : liste de
+            messages, ou CYCLE (valeurs encore dans le plan).
+    """
+
+    def __init__(self, mqtt, plan, server=None, interval=INTERVAL_S, iterations=None,
+                 tech=None, store=None):
+        """
+        Args:
+            mqtt (AsyncMQTTHandler): Gestionnaire MQTT asynchrone.
+            plan (PublishPlan): Plan compilé (mqtt.compile(tech)).
+            server (WebServer, optionnel): Serveur déjà ouvert.
+            interval (float): Période de mesure en secondes.
+            iterations (int, optionnel): Nombre de cycles (None : sans fin).
+            tech (Techniques, optionnel): Capteurs du plan (enregistrement).
+            store (SegmentStore, optionnel): Stockage des mesures (voir
+                open_storage) ; sans lui, rien n'est enregistré.
+        """
+        self.mqtt = mqtt
+        self.plan = plan
+        self.server = server
+        self.tech = tech
+        self.store = store
+        self.interval = interval
+        self.iterations = iterations
+        self.outbox = []
+        self.ready = asyncio.Event()
+        # tenu pendant la publication du plan : pas de lecture en même temps
+        self.plan_lock = asyncio.Lock()
+        self.busy = False
+        self.cycles = 0
+        self.published = 0
+        self.queued = 0
+
+    def _take(self):
+        """
+        Retire le plus ancien cycle de self.outbox.
+
+        Returns:
+            list: Messages du cycle (construits depuis le plan pour CYCLE).
+        """
+        entry = self.outbox.pop(0)
+        return self.plan.messages() if entry is CYCLE else entry
+
+    def _queue(self, messages):
+        """
+        Met les messages d'un cycle dans la file sur la flash.
+        """
+        self.mqtt.enqueue(messages)
+        self.queued += 1
+
+    async def sample(self):
+        """
+        Tâche de mesure : lit les capteurs et confie chaque cycle à la
+        publication.
+        """
+        plan = self.plan
+        slots = plan.slots
+        batch = self.mqtt.payload_mode == "batch"
+        while self.iterations is None or self.cycles < self.iterations:
+            self.cycles += 1
+            try:
+                async with self.plan_lock:
+                    if self.outbox and self.outbox[-1] is CYCLE:
+                        # cycle précédent pas encore publié : mis de côté
+                        self.outbox[-1] = plan.messages()
+                    plan.read()
+                    if batch:
+                        entry = self.mqtt.cycle_messages(plan.values())
+                    else:
+                        entry = CYCLE if slots.count(None) < len(slots) else None
+                    if entry:
+                        if len(self.outbox) >= OUTBOX_CYCLES:
+                            # publication bloquée : le plus ancien cycle part sur la flash
+                            self._queue(self._take())
+                        self.outbox.append(entry)
+                        self.ready.set()
+                    if self.store is not None:
+                        self.tech.save_measure(plan.records(), store=self.store)
+            except Exception as e:
+                boot.log("Mesure en erreur : " + str(e))
+            if self.iterations is None or self.cycles < self.iterations:
+                await asyncio.sleep(self.interval)
+
+    async def publish(self):
+        """
+        Tâche de publication : envoie les cycles en attente.
+        """
+        mqtt = self.mqtt
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            self.busy = True
+            while self.outbox:
+                # le cycle reste dans self.outbox jusqu'à son envoi : une
+                # lecture pendant la reconnexion peut encore le mettre de côté
+                entry = None
+                try:
+                    if not await mqtt.ensure_connected():
+                        self._queue(self._take())
+                        log_mqtt_down(mqtt)
+                        continue
+                    await mqtt.drain_queue()
+                    entry = self.outbox.pop(0)
+                    if entry is CYCLE:
+                        async with self.plan_lock:
+                            ok = await mqtt.publish_plan(self.plan)
+                    else:
+                        ok = await mqtt.send(entry)
+                    if ok:
+                        self.published += 1
+                    else:
+                        self.queued += 1
+                        log_mqtt_down(mqtt)
+                except Exception as e:
+                    print("MQTT : publish impossible :", e)
+                    boot.log("MQTT non connecté")
+                    if entry is None and self.outbox:
+                        self._queue(self._take())  # pas de boucle sur la même erreur
+            self.busy = False
+
+    async def serve(self):
+        """
+        Tâche du serveur web, jusqu'à /stop (les mesures continuent).
+        """
+        server = self.server
+        while not network_setup.stop_server_flag:
+            try:
+                busy = server.poll(0)
+            except Exception as e:
+                boot.log("Serveur web en erreur : " + str(e))
+                await asyncio.sleep(1)  # pas de rafale de logs sur la flash
+                continue
+            if busy:
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(SERVER_IDLE_MS / 1000)
+        server.close()
+        boot.log("Serveur web arrêté, mesures poursuivies")
+
+    async def housekeeping(self):
+        """
+        Tâche de maintenance périodique.
+        """
+        rounds = 0
+        while True:
+            await asyncio.sleep(HOUSEKEEPING_S)
+            rounds += 1
+            try:
+                # politique d'âge : les tampons récents continuent de grouper
+                buffered_writer.check_all()
+                if rounds * HOUSEKEEPING_S >= REPORT_S:
+                    rounds = 0
+                    self.report()
+            except Exception as e:
+                boot.log("Maintenance en erreur : " + str(e))
+            gc.collect()
+
+    def report(self):
+        """
+        Bilan dans boot.log : valeurs retenues par la bande morte et
+        attentes imposées par le limiteur de débit.
+        """
+        plan = self.plan
+        if plan.suppressed:
+            boot.log("Bande morte : " + str(plan.suppressed) + " valeurs non publiées sur "
+                     + str(plan.checked))
+        limiter = self.mqtt.limiter
+        if limiter is not None:
+            stats = limiter.stats()
+            boot.log("Débit MQTT : " + ", ".join(k + "=" + str(stats[k]) for k in sorted(stats)))
+
+    async def run(self):
+        """
+        Lance les tâches ; se termine après `iterations` cycles (publiés
+        ou mis en file), sinon jamais.
+        """
+        tasks = [asyncio.create_task(self.publish()),
+                 asyncio.create_task(self.housekeeping())]
+        if self.server is not None:
+            tasks.append(asyncio.create_task(self.serve()))
+        try:
+            await self.sample()
+            while self.outbox or self.busy:
+                await asyncio.sleep(SERVER_IDLE_MS / 1000)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.sleep(0)
+            if self.server is not None:
+                self.server.close()
+            await self.mqtt.disconnect()
+            buffered_writer.flush_all()
+        self.report()
+
+def run_runtime(net, mode, mqtt, interval=INTERVAL_S, iterations=None, port=8080,
+                storage=None):
+    """
+    Démarre le serveur web et les mesures ensemble (bloquant).
+
+    Args:
+        net: Interface réseau active (AP ou STA).
+        mode (str): "AP" ou "STA" (affiché par le serveur).
+        mqtt (AsyncMQTTHandler): Gestionnaire MQTT asynchrone.
+        interval (float): Période de mesure en secondes.
+        iterations (int, optionnel): Nombre de cycles (None : sans fin).
+        port (int): Port du serveur web.
+        storage (dict, optionnel): Section "storage" de config.json
+            (voir open_storage).
+
+    Returns:
+        Runtime: Runtime terminé (compteurs).
+    """
+    network_setup.stop_server_flag = False
+    tech = Techniques("config.json")
+    store = open_storage(tech, storage)
+    server = WebServer(net, mode, port, store=store)
+    if not server.open():
+        boot.log("Serveur web indisponible, mesures seules")
+        server = None
+    # topics, lecteurs et formatage compilés une seule fois
+    plan = mqtt.compile(tech)
+    runtime = Runtime(mqtt, plan, server, interval, iterations, tech, store)
+    asyncio.run(runtime.run())
+    return runtime
 
 def mode_ap(cfg, mqtt):
     """
@@ -140,12 +485,12 @@ def mode_ap(cfg, mqtt):
 
     Args:
         cfg (dict): Configuration complète chargée depuis config.json.
-        mqtt (MQTTHandler): Gestionnaire MQTT déjà initialisé.
+        mqtt (AsyncMQTTHandler): Gestionnaire MQTT déjà initialisé.
 
     Fonctionnement :
         - Active le point d’accès Wi-Fi avec ssid/password de cfg["ap"]
-        - Démarre le serveur web embarqué
-        - Lance la lecture des capteurs + publication MQTT
+        - Démarre le serveur web embarqué et, en même temps, la lecture
+          des capteurs + publication MQTT (run_runtime)
 
     Cas d'erreur :
         - Si l’AP ne peut pas démarrer → redémarrage sécurisé
@@ -157,44 +502,42 @@ def mode_ap(cfg, mqtt):
     ap = wifi_utils.start_ap(cfg["ap"])
     if ap:
         boot.log("Point d'accès actif, lancement du server web...")
-        start_server(ap, "AP")
-        read_and_publish_sensors(mqtt)
+        run_runtime(ap, "AP", mqtt, cfg.get("interval", INTERVAL_S),
+                    storage=cfg.get("storage"))
     else:
         boot.log("Impossible de démarrer le Wifi AP. Redémarrage...")
         safe_restart()
 
 def mode_sta(cfg, mqtt):
     """
-    Démarre l'ESP32 en mode Point d'Accès (AP).
+    Démarre l'ESP32 en mode station (STA).
 
     Args:
         cfg (dict): Configuration complète chargée depuis config.json.
-        mqtt (MQTTHandler): Gestionnaire MQTT déjà initialisé.
+        mqtt (AsyncMQTTHandler): Gestionnaire MQTT déjà initialisé.
 
     Fonctionnement :
-        - Active le point d’accès Wi-Fi avec ssid/password de cfg["ap"]
-        - Démarre le serveur web embarqué
-        - Lance la lecture des capteurs + publication MQTT
+        - Se connecte au Wi-Fi avec cfg["sta"]
+        - Démarre le serveur web embarqué et, en même temps, la lecture
+          des capteurs + publication MQTT (run_runtime)
 
     Cas d'erreur :
-        - Si l’AP ne peut pas démarrer → redémarrage sécurisé
-
-    Utilisation :
-        Mode utile si l’ESP doit servir de réseau indépendant
-        (ex : configuration initiale, absence de Wi-Fi local).
+        - Si la connexion échoue → bascule en point d'accès (cfg["ap"])
+        - Si l’AP ne peut pas démarrer non plus → redémarrage sécurisé
     """
     sta = wifi_utils.start_sta(cfg["sta"])
     if not sta:
         boot.log("Connexion STA échouée - bascule en AP")
         ap = wifi_utils.start_ap(cfg["ap"])
         if ap:
-            start_server(ap, "AP")
+            run_runtime(ap, "AP", mqtt, cfg.get("interval", INTERVAL_S),
+                        storage=cfg.get("storage"))
         else:
             safe_restart()
     else:
         boot.log("Connexion STA réussie.")
-        #start_server(sta, "STA")  # décommenter si serveur STA souhaité
-        read_and_publish_sensors(mqtt)
+        run_runtime(sta, "STA", mqtt, cfg.get("interval", INTERVAL_S),
+                    storage=cfg.get("storage"))
 
 def mode_unknown(cfg, mqtt):
     """
@@ -202,7 +545,7 @@ def mode_unknown(cfg, mqtt):
 
     Args:
         cfg (dict): Configuration chargée depuis le fichier JSON.
-        mqtt (MQTTHandler): Instance active du gestionnaire MQTT.
+        mqtt (AsyncMQTTHandler): Instance du gestionnaire MQTT.
 
     Fonctionnement :
         - Enregistre un log indiquant que le mode est invalide
@@ -226,7 +569,8 @@ def main():
 
     Rôle :
         - Charger la configuration complète (Wi-Fi, MQTT…)
-        - Initialiser le gestionnaire MQTT
+        - Initialiser le gestionnaire MQTT (asynchrone, connecté par
+          la tâche de publication du Runtime)
         - Sélectionner le mode réseau (AP/STA)
         - Démarrer la logique correspondante via MODE_FUNCTIONS
         - Nettoyer la connexion MQTT avant sortie
@@ -236,7 +580,7 @@ def main():
         2. Initialisation MQTT
         3. Log du mode choisi
         4. Appel dynamique de la fonction correspondant au mode
-        5. Déconnexion MQTT propre
+        5. Déconnexion MQTT propre (en fin de Runtime)
 
     Notes :
         - Toute erreur critique dans un mode déclenche un restart.
@@ -245,8 +589,7 @@ def main():
     cfg = boot.load_config()
     mode = cfg.get("mode","AP").upper()
     boot.log("Chargement du mode" + str(mode))
-    mqtt = MQTTHandler(cfg["mqtt"])
-    mqtt.connect()
+    mqtt = AsyncMQTTHandler(cfg["mqtt"])
     boot.log("Démarrage en mode : " + mode)
 
     # Choix du mode via dictionnaire, fallback vers inconnu
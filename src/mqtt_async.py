@@ -0,0 +1,587 @@
+# src/mqtt_async.py
+"""
+mqtt_async.py
+Client et gestionnaire MQTT asynchrones (uasyncio sur l'ESP, asyncio sur PC).
+
+Rôle :
+- Connexion, publication et keepalive sans bloquer la boucle d'événements :
+  lecture des capteurs, serveur web et échanges MQTT avancent ensemble
+  au lieu d'attendre les uns derrière les autres (time.sleep, socket).
+- Une tâche de lecture traite les PUBACK / PINGRESP dès leur arrivée.
+- Une tâche de maintenance envoie les PINGREQ, détecte une session
+  morte et renvoie les messages QoS 1 non acquittés.
+- AsyncMQTTHandler reprend la configuration, la file sur la flash et le
+  mode "batch" de MQTTHandler, avec des méthodes à attendre (await).
+
+Utilisation :
+    mqtt = AsyncMQTTHandler(cfg["mqtt"])
+    await mqtt.connect()
+    plan = mqtt.compile(tech)
+    while True:
+        plan.read()
+        await mqtt.publish_cycle(plan)
+        await asyncio.sleep(10)
+"""
+import struct
+import time
+try:
+    import uasyncio as asyncio  # MicroPython
+except ImportError:
+    import asyncio
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+from mqtt_qos import (PUBLISH, PUBACK, PINGREQ, PINGRESP, DISCONNECT, DUP_FLAG,
+                      connect_packet, check_connack, publish_packet)
+from mqtt_client import MQTTHandler
+
+class AsyncMQTTClient:
+    """
+    Client MQTT 3.1.1 asynchrone (QoS 0 et QoS 1 avec fenêtre en vol).
+
+    Attributes:
+        window (int): Nombre maximal de messages QoS 1 non acquittés.
+        retry_ms (int): Délai avant renvoi d'un message non acquitté.
+        inflight (dict): Identifiant → [paquet, heure_envoi_ms].
+        connected (bool): True tant que la session est ouverte.
+        acked (int): Nombre de PUBACK reçus.
+        retransmits (int): Nombre de renvois.
+        pings (int): Nombre de PINGREQ envoyés.
+    """
+
+    def __init__(self, client_id, server, port=0, user=None, password=None,
+                 keepalive=0, window=8, retry_ms=5000, timeout=10):
+        """
+        Args:
+            client_id (str): Identifiant du client.
+            server (str): Adresse du broker.
+            port (int): Port du broker (0 = 1883).
+            user (str | None): Utilisateur.
+            password (str | None): Mot de passe.
+            keepalive (int): Keepalive en secondes (0 = pas de PINGREQ).
+            window (int): Messages QoS 1 en vol au maximum.
+            retry_ms (int): Délai de renvoi d'un message non acquitté.
+            timeout (int): Délai maximal de connexion et d'attente d'une place
+                dans la fenêtre QoS 1 (s).
+        """
+        self.client_id = client_id
+        self.server = server
+        self.port = port or 1883
+        self.user = user
+        self.password = password
+        self.keepalive = keepalive
+        self.window = window
+        self.retry_ms = retry_ms
+        self.timeout = timeout
+        self.inflight = {}
+        self.connected = False
+        self.acked = 0
+        self.retransmits = 0
+        self.pings = 0
+        self._pid = 0
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._slot = asyncio.Event()
+        self._last_tx = ticks_ms()
+        self._ping_sent = None
+
+    # ==================== Réseau ====================
+
+    async def _read_packet(self):
+        """
+        Returns:
+            tuple: (premier_octet, corps) du prochain paquet reçu.
+
+        Raises:
+            EOFError | OSError: Si la connexion est fermée.
+        """
+        first = (await self._reader.readexactly(1))[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = (await self._reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        body = await self._reader.readexactly(length) if length else b""
+        return first, body
+
+    def _write(self, pkt, fresh=True):
+        """
+        Place un paquet dans le tampon d'envoi (à suivre d'un drain()).
+
+        Args:
+            pkt (bytes | bytearray): Paquet à envoyer.
+            fresh (bool): False pour un renvoi, qui ne retarde pas le
+                PINGREQ : un broker muet doit rester détectable.
+
+        Raises:
+            OSError: Si la session est fermée.
+        """
+        if not self.connected:
+            raise OSError("MQTT non connecté")
+        self._writer.write(pkt)
+        if fresh:
+            self._last_tx = ticks_ms()
+
+    async def _drain(self):
+        """
+        Attend que le tampon d'envoi soit transmis.
+        """
+        try:
+            await self._writer.drain()
+        except (OSError, EOFError):
+            self.close()
+            raise OSError("connexion MQTT perdue")
+
+    async def _read_loop(self):
+        """
+        Tâche de lecture : PUBACK, PINGRESP et messages entrants.
+        """
+        writer = self._writer
+        try:
+            while True:
+                first, body = await self._read_packet()
+                kind = first & 0xF0
+                if kind == PUBACK:
+                    pid = struct.unpack("!H", body[:2])[0]
+                    if self.inflight.pop(pid, None) is not None:
+                        self.acked += 1
+                        self._slot.set()
+                elif kind == PINGRESP:
+                    self._ping_sent = None
+                elif kind == PUBLISH and first & 0x06:
+                    topic_len = struct.unpack("!H", body[:2])[0]
+                    self._write(bytes((PUBACK, 2)) + body[2 + topic_len:4 + topic_len])
+        except (OSError, EOFError) as e:
+            print("MQTT : session perdue :", e)
+        finally:
+            # ne pas fermer une connexion plus récente (reconnexion en cours)
+            if self._writer is writer:
+                self.close()
+
+    async def _timer_loop(self):
+        """
+        Tâche de maintenance : renvois QoS 1, PINGREQ et détection
+        d'une session morte (pas de PINGRESP sous keepalive/2).
+        """
+        half = self.keepalive * 500
+        period = min(self.retry_ms, half) if half else self.retry_ms
+        while self.connected:
+            await asyncio.sleep(period / 2000)
+            if not self.connected:
+                return
+            now = ticks_ms()
+            if self._ping_sent is not None and ticks_diff(now, self._ping_sent) >= half:
+                print("MQTT : pas de réponse au PINGREQ")
+                self.close()
+                return
+            try:
+                self.retransmit()
+                if half and self._ping_sent is None and ticks_diff(now, self._last_tx) >= half:
+                    self._write(bytes((PINGREQ, 0)))
+                    self._ping_sent = now
+                    self.pings += 1
+                await self._drain()
+            except OSError:
+                return
+
+    # ==================== Session ====================
+
+    async def connect(self, clean_session=True):
+        """
+        Ouvre la connexion et la session MQTT sans bloquer la boucle.
+
+        Les messages encore en vol sont renvoyés avec le drapeau DUP.
+
+        Args:
+            clean_session (bool): Demande une session neuve au broker.
+
+        Returns:
+            bool: True si le broker a repris une session existante.
+
+        Raises:
+            MQTTException: Si le broker refuse la connexion.
+            OSError: En cas d'erreur réseau ou de délai dépassé.
+        """
+        self.close()
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.server, self.port), self.timeout)
+            self._writer.write(connect_packet(self.client_id, self.user, self.password,
+                                              self.keepalive, clean_session))
+            await self._writer.drain()
+            first, body = await asyncio.wait_for(self._read_packet(), self.timeout)
+        except (EOFError, asyncio.TimeoutError) as e:
+            self.close()
+            raise OSError("MQTT : connexion impossible (%r)" % e)
+        try:
+            present = check_connack(first, body)
+        except Exception:
+            self.close()
+            raise
+        self.connected = True
+        self._ping_sent = None
+        for pid in sorted(self.inflight):
+            self._resend(pid)
+        await self._drain()
+        self._tasks = [asyncio.create_task(self._read_loop()),
+                       asyncio.create_task(self._timer_loop())]
+        return present
+
+    def close(self):
+        """
+        Ferme la connexion sans DISCONNECT (messages en vol conservés)
+        et réveille les publications en attente d'une place.
+        """
+        self.connected = False
+        self._slot.set()
+        try:
+            current = asyncio.current_task()
+        except RuntimeError:
+            current = None  # appel hors de la boucle
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        self._tasks = []
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except OSError:
+                pass
+            self._writer = None
+            self._reader = None
+
+    async def disconnect(self):
+        """
+        Envoie DISCONNECT puis ferme la connexion.
+        """
+        try:
+            if self.connected:
+                self._write(bytes((DISCONNECT, 0)))
+                await self._drain()
+        finally:
+            self.close()
+
+    # ==================== Publication ====================
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        """
+        Publie un message.
+
+        En QoS 1, n'attend que si la fenêtre de messages en vol est pleine
+        (les autres tâches continuent pendant ce temps), et au plus
+        self.timeout secondes : sans PUBACK, la session est fermée.
+
+        Args:
+            topic (str | bytes): Topic.
+            msg (str | bytes | memoryview): Payload (copié avant toute attente).
+            retain (bool): Drapeau retain.
+            qos (int): 0 ou 1.
+
+        Returns:
+            int: Identifiant du paquet (0 en QoS 0).
+
+        Raises:
+            OSError: Si la session est fermée ou perdue, ou si aucune place
+                ne se libère dans la fenêtre avant self.timeout.
+        """
+        if not qos:
+            self._write(publish_packet(topic, msg, 0, 0, retain))
+            await self._drain()
+            return 0
+        msg = bytes(msg) if isinstance(msg, memoryview) else msg
+        start = ticks_ms()
+        while len(self.inflight) >= self.window:
+            if not self.connected:
+                raise OSError("MQTT non connecté")
+            left = self.timeout * 1000 - ticks_diff(ticks_ms(), start)
+            self._slot.clear()
+            try:
+                await asyncio.wait_for(self._slot.wait(), max(0, left) / 1000)
+            except asyncio.TimeoutError:
+                self.close()  # broker muet : session considérée comme morte
+                raise OSError("MQTT : fenêtre pleine, aucun PUBACK")
+        pid = self._next_pid()
+        pkt = publish_packet(topic, msg, 1, pid, retain)
+        self._write(pkt)
+        # enregistré avant drain() : le PUBACK peut arriver pendant l'attente
+        self.inflight[pid] = [pkt, ticks_ms()]
+        try:
+            await self._drain()
+        except OSError:
+            self.inflight.pop(pid, None)
+            raise
+        return pid
+
+    def _next_pid(self):
+        """
+        Returns:
+            int: Identifiant de paquet libre (1 à 65535).
+        """
+        while True:
+            self._pid = self._pid % 0xFFFF + 1
+            if self._pid not in self.inflight:
+                return self._pid
+
+    def _resend(self, pid):
+        """
+        Renvoie un message en vol avec le drapeau DUP.
+        """
+        entry = self.inflight[pid]
+        entry[0][0] |= DUP_FLAG
+        self._write(entry[0], fresh=False)
+        entry[1] = ticks_ms()
+        self.retransmits += 1
+
+    def retransmit(self):
+        """
+        Renvoie les messages en vol non acquittés depuis retry_ms.
+
+        Returns:
+            int: Nombre de messages renvoyés.
+        """
+        now = ticks_ms()
+        count = 0
+        for pid in list(self.inflight):
+            if ticks_diff(now, self.inflight[pid][1]) >= self.retry_ms:
+                self._resend(pid)
+                count += 1
+        return count
+
+    async def flush(self, timeout_ms=5000):
+        """
+        Attend l'acquittement de tous les messages en vol.
+
+        Args:
+            timeout_ms (int): Attente maximale.
+
+        Returns:
+            bool: True si plus aucun message n'est en vol.
+        """
+        start = ticks_ms()
+        while self.inflight and self.connected and ticks_diff(ticks_ms(), start) < timeout_ms:
+            await asyncio.sleep(0.01)
+        return not self.inflight
+
+class AsyncMQTTHandler(MQTTHandler):
+    """
+    Variante asynchrone de MQTTHandler.
+
+    Même configuration (topic, file sur la flash, "payload", "qos",
+    "inflight", "retry_ms", "keepalive") ; connect(), publish_cycle(),
+    send(), drain_queue() et disconnect() sont des coroutines. Le
+    keepalive est entretenu en tâche de fond par AsyncMQTTClient.
+    """
+
+    def _make_client(self, config):
+        """
+        Returns:
+            AsyncMQTTClient: Client asynchrone non connecté.
+        """
+        return AsyncMQTTClient(
+            client_id=self.client_id,
+            server=self.server,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            keepalive=self.keepalive,
+            window=config.get("inflight", 8),
+            retry_ms=config.get("retry_ms", 5000)
+        )
+
+    async def connect(self):
+        """
+        Établit la connexion avec le serveur MQTT.
+
+        Returns:
+            bool: True si la connexion réussit, False sinon.
+        """
+        try:
+            # en QoS 1 la session est conservée : messages en vol renvoyés
+            await self.client.connect(clean_session=not self.qos)
+            print("MQTT connecté à :", self.server)
+            self.connected = True
+            self.backoff.success()
+            return True
+        except Exception as e:
+            print("Erreur connexion MQTT :", e)
+            self.connected = False
+            self._retry_later()
+            return False
+
+    def check_alive(self):
+        """
+        Returns:
+            bool: True si la session est toujours vivante (surveillée par
+                  les tâches de fond du client).
+        """
+        self.connected = self.connected and self.client.connected
+        return self.connected
+
+    async def ensure_connected(self):
+        """
+        Returns:
+            bool: True si la session est ouverte (reconnexion si besoin,
+                  une fois le délai de self.backoff écoulé ; la gigue de
+                  démarrage est attendue sans bloquer les autres tâches).
+        """
+        if self.check_alive():
+            return True
+        if not self.backoff.failures:
+            left = self.backoff.remaining_ms()
+            if left:
+                await asyncio.sleep(left / 1000)
+            return await self.connect()
+        if not self.backoff.ready():
+            return False
+        return await self.connect()
+
+    def _drop(self):
+        """
+        Ferme une session considérée comme perdue.
+        """
+        self.connected = False
+        self.client.close()
+
+    async def publish(self, data):
+        """
+        Publie des données sur le topic MQTT configuré (via publish_one :
+        qualité de service et limiteur de débit appliqués).
+
+        Args:
+            data (dict | str): Données à envoyer (dict converti en JSON).
+        """
+        try:
+            if isinstance(data, dict):
+                data = self.codec.encode(data)
+            await self.publish_one(self.topic, data)
+            print("MQTT publish :", data)
+        except Exception as e:
+            print("Erreur envoi MQTT :", e)
+
+    async def publish_one(self, topic, payload):
+        """
+        Publie un message avec la qualité de service configurée
+        (disposition binaire retenue, voir MQTTHandler.publish_one).
+
+        Avec un limiteur de débit, attend sans bloquer les autres tâches.
+        """
+        if self.limiter is not None:
+            await self.limiter.acquire_async(len(topic) + len(payload))
+        await self.client.publish(topic, payload, topic == self.layout_topic, self.qos)
+
+    async def publish_cycle(self, plan):
+        """
+        Publie les valeurs d'un cycle déjà lues dans le plan
+        (voir MQTTHandler.publish_cycle).
+
+        Args:
+            plan (PublishPlan): Plan dont read() vient d'être appelé.
+
+        Returns:
+            bool: True si le cycle a été publié (ou mis en lot).
+        """
+        connected = await self.ensure_connected()
+        if connected:
+            await self.drain_queue()
+        if self.payload_mode == "batch":
+            messages = self.cycle_messages(plan.values())
+            if connected:
+                return await self.send(messages)
+            self.enqueue(messages)
+            return False
+        if not connected:
+            self.enqueue(plan.messages())
+            return False
+        return await self.publish_plan(plan)
+
+    async def publish_plan(self, plan):
+        """
+        Publie les sorties d'un plan sur la session ouverte, sans chaîne
+        allouée (voir PublishPlan.publish_async) ; en cas d'erreur, la
+        suite du cycle est mise en file.
+
+        Args:
+            plan (PublishPlan): Plan dont read() vient d'être appelé.
+
+        Returns:
+            bool: True si toutes les sorties ont été publiées.
+        """
+        try:
+            await plan.publish_async(self.publish_one)
+        except Exception as e:
+            print("Erreur envoi MQTT :", e)
+            self._drop()
+            self.enqueue(plan.messages(plan.position))
+            return False
+        return True
+
+    async def send(self, messages):
+        """
+        Publie une liste de messages ; le reste est mis en file en cas d'erreur.
+
+        Returns:
+            bool: True si tous les messages ont été publiés.
+        """
+        for i, (topic, payload) in enumerate(messages):
+            try:
+                await self.publish_one(topic, payload)
+            except Exception as e:
+                print("Erreur envoi MQTT :", e)
+                self._drop()
+                self.enqueue(messages[i:])
+                return False
+        return True
+
+    async def drain_queue(self):
+        """
+        Renvoie un lot de messages en attente (au plus drain_batch, et
+        dans la limite des jetons hors réserve du limiteur de débit,
+        attendus au plus drain_ms sans bloquer les autres tâches).
+
+        Returns:
+            int: Nombre de messages renvoyés.
+        """
+        if self.queue is None or not len(self.queue):
+            return 0
+        if self.limiter is not None:
+            self.limiter.begin_drain(self.drain_ms)
+        sent = 0
+        done = 0
+        head = None
+        for topic, payload, pos in self.queue.peek(self.drain_batch):
+            if topic is not None:
+                if self.limiter is not None:
+                    if not await self.limiter.try_acquire_async(len(topic) + len(payload)):
+                        break
+                try:
+                    await self.client.publish(topic, payload,
+                                              topic == self.layout_topic, self.qos)
+                except Exception as e:
+                    print("File MQTT : publication interrompue :", e)
+                    break
+                sent += 1
+            head = pos
+            done += 1
+        self.queue.commit(head, done)
+        return sent
+
+    async def disconnect(self):
+        """
+        Ferme la connexion (en QoS 1, après avoir attendu au plus deux
+        délais de renvoi les derniers accusés). Les exceptions sont ignorées.
+        """
+        try:
+            if self.qos and self.connected:
+                await self.client.flush(2 * self.client.retry_ms)
+            await self.client.disconnect()
+        except Exception:
+            pass
+        self.connected = False
@@ -7,6 +7,57 @@ try:
 except ImportError:
     from unittest.mock import MagicMock
     MQTTClient = MagicMock()
+try:
+    import network  # vrai module sur l'ESP
+except ImportError:
+    try:
+        import network_mock as network  # version simulée pour PC
+    except ImportError:
+        network = None  # outils PC : device_id(wlan) reçoit l'interface
+try:
+    from ubinascii import hexlify  # MicroPython
+except ImportError:
+    from binascii import hexlify
+try:
+    ticks_ms = time.ticks_ms # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+from mqtt_queue import OutboundQueue, QUEUE_FILE
+from publish_plan import PublishPlan
+from mqtt_qos import QoSClient
+from backoff import Backoff, OPEN
+from payload_codec import make_codec, StructLayout, MAX_ROWS, MAX_DT
+from rate_limit import RateLimiter
+
+# MicroPython (ESP) compte le temps depuis 2000-01-01, le PC depuis 1970
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+# attente cumulée permise au vidage de la file limité en débit (ms)
+DRAIN_MS = 5000
+# délai maximal avant la première connexion (gigue de démarrage, ms)
+START_JITTER_MS = 5000
+
+def device_id(wlan=None, prefix="houblon-"):
+    """
+    Identifiant stable et unique de la sonde, déduit de l'adresse MAC Wi-Fi.
+
+    Deux sondes avec le même client_id se déconnectent mutuellement du
+    broker (chaque CONNECT ferme la session de l'autre) : l'adresse MAC
+    garantit un identifiant différent par carte, identique à chaque
+    démarrage.
+
+    Args:
+        wlan (WLAN, optionnel): Interface Wi-Fi (par défaut l'interface station).
+        prefix (str): Préfixe de l'identifiant.
+
+    Returns:
+        str: Ex. "houblon-240ac4123456".
+    """
+    if wlan is None:
+        wlan = network.WLAN(network.STA_IF)
+    return prefix + hexlify(wlan.config("mac")).decode()
 
 class MQTTHandler:
     
@@ -14,16 +65,38 @@ class MQTTHandler:
     Classe pour gérer la connexion et la publication de données vers un serveur MQTT.
 
     Cette classe encapsule les opérations courantes pour :
-    - Se connecter à un broker MQTT
-    - Publier des messages sur un topic
+    - Se connecter à un broker MQTT et garder la session ouverte
+      (keepalive PINGREQ, détection de coupure, reconnexion transparente)
+    - Publier des messages sur un topic, en QoS 0 ou en QoS 1 pipeliné
+      (plusieurs messages en vol, renvoi des messages non acquittés)
+    - Publier les mesures d'un cycle soit un message par valeur
+      (topic + clé), soit en un seul message groupé (mode "batch")
+    - Mettre en file (sur la flash) les messages non publiés et les
+      renvoyer à la connexion suivante
+    - Espacer les reconnexions après un échec (délai exponentiel avec
+      gigue, disjoncteur : voir backoff.py)
     - Se déconnecter proprement
 
     Attributes:
         server (str): Adresse IP ou nom du serveur MQTT.
         port (int): Port du serveur MQTT (par défaut 1883).
-        client_id (str): Identifiant unique du client MQTT.
+        client_id (str): Identifiant unique du client MQTT (device_id()
+                         si non configuré).
         topic (str): Topic sur lequel publier les messages.
         client (MQTTClient): Instance du client MQTT.
+        queue (OutboundQueue | None): File des messages non publiés.
+        drain_batch (int): Nombre maximal de messages renvoyés par drain_queue().
+        keepalive (int): Intervalle keepalive MQTT en secondes.
+        payload_mode (str): "topics" (un message par valeur) ou "batch".
+        batch_topic (str): Topic des messages groupés.
+        batch_cycles (int): Nombre de cycles regroupés par message.
+        connected (bool): True tant que la session est considérée vivante.
+        qos (int): Qualité de service des mesures (0 ou 1).
+        backoff (Backoff): Délais entre tentatives de reconnexion.
+        codec (JsonCodec | MsgpackCodec): Encodage des objets publiés.
+        layout (StructLayout | None): Disposition binaire (codec "struct").
+        limiter (RateLimiter | None): Limitation du débit (None = illimité).
+        drain_ms (int): Attente de jetons permise par vidage de la file.
     """
 
     def __init__(self, config):
@@ -34,33 +107,134 @@ class MQTTHandler:
             config (dict): Dictionnaire contenant les clés suivantes :
                 - "server" (str): Adresse du serveur MQTT.
                 - "port" (int, optionnel): Port du serveur (par défaut 1883).
-                - "client_id" (str, optionnel): Identifiant du client (par défaut "esp8266").
-                - "topic" (str, optionnel): Topic pour la publication (par défaut "esp/data").
+                - "client_id" (str, optionnel): Identifiant du client (par
+                  défaut déduit de l'adresse MAC, voir device_id()).
+                - "topic" (str, optionnel): Topic pour la publication (par défaut
+                  "esp/data"). "{device}" y est remplacé par client_id
+                  (ex : "maison/{device}/"), comme dans "batch_topic".
+                - "queue_file" (str | None, optionnel): Fichier de la file des
+                  messages non publiés (par défaut "mqtt.queue", None = désactivée).
+                - "queue_max" (int, optionnel): Capacité de la file (par défaut 500).
+                - "drain_batch" (int, optionnel): Messages renvoyés par
+                  reconnexion (par défaut 20).
+                - "keepalive" (int, optionnel): Keepalive MQTT en secondes
+                  (par défaut 60). Un PINGREQ est envoyé après keepalive/2
+                  secondes sans échange.
+                - "payload" (str, optionnel): "topics" (par défaut) ou "batch".
+                - "batch_topic" (str, optionnel): Topic des messages groupés
+                  (par défaut topic + "/batch").
+                - "batch_cycles" (int, optionnel): Cycles par message groupé
+                  (par défaut 1, au plus 255 avec le codec "struct").
+                - "qos" (int, optionnel): 0 (par défaut) ou 1. En QoS 1 le
+                  client mqtt_qos.QoSClient remplace umqtt.simple.
+                - "inflight" (int, optionnel): Messages QoS 1 en vol au
+                  maximum (par défaut 8).
+                - "retry_ms" (int, optionnel): Délai de renvoi d'un message
+                  QoS 1 non acquitté (par défaut 5000).
+                - "backoff" (dict, optionnel): Paramètres de Backoff
+                  (base_ms, cap_ms, jitter, threshold, cooldown_ms,
+                  initial_ms : gigue avant la première connexion, par
+                  défaut 5000).
+                - "codec" (str, optionnel): Encodage des messages groupés et
+                  de publish(dict) : "json" (par défaut), "msgpack" ou
+                  "struct" (disposition binaire fixe, voir payload_codec).
+                - "rate" (dict, optionnel): Débit maximal, paramètres de
+                  RateLimiter (msgs_per_s, bytes_per_s, burst_s, reserve).
+                  Les mesures en direct attendent leurs jetons, le
+                  vidage de la file ne prend que ceux hors réserve.
+                - "drain_ms" (int, optionnel): Attente de jetons permise à
+                  chaque vidage de la file limité en débit (par défaut
+                  5000) ; au-delà il s'interrompt jusqu'au cycle suivant.
 
         Raises:
             KeyError: Si la clé "server" est absente du dictionnaire.
+            ValueError: Si batch_cycles dépasse 255 avec le codec "struct".
 
         config doit contenir :
         {
             "server": "192.168.1.20",
             "port": 1883,
-            "client_id": "ESP8266_01",
-            "topic": "mesures/capteurs"
+            "topic": "mesures/{device}/"
         }
+        (sans "client_id", chaque sonde d'une flotte a son propre identifiant)
         """
         self.server = config["server"]
         self.port = config.get("port", 1883)
-        self.client_id = config.get("client_id", "esp8266")
-        self.topic = config.get("topic", "esp/data")
+        self.client_id = config.get("client_id") or device_id()
+        self.topic = self._expand(config.get("topic", "esp/data"))
         self.user = config.get("user", None)
         self.password = config.get("password", None)
+        queue_file = config.get("queue_file", QUEUE_FILE)
+        self.queue = None
+        if queue_file:
+            self.queue = OutboundQueue(queue_file, config.get("queue_max", 500))
+        self.drain_batch = config.get("drain_batch", 20)
+        self.keepalive = config.get("keepalive", 60)
+        self.payload_mode = config.get("payload", "topics")
+        self.batch_topic = self._expand(config.get("batch_topic",
+                                                   self.topic.rstrip("/") + "/batch"))
+        self.batch_cycles = config.get("batch_cycles", 1)
+        self._batch_rows = []
+        self.connected = False
+        self._last_io = ticks_ms()
+        self.qos = config.get("qos", 0)
+        backoff = {"initial_ms": START_JITTER_MS}
+        backoff.update(config.get("backoff", {}))
+        self.backoff = Backoff(**backoff)
+        self.codec_name = config.get("codec", "json")
+        self.codec = make_codec(self.codec_name)
+        if self.codec_name == "struct" and self.batch_cycles > MAX_ROWS:
+            raise ValueError("batch_cycles > %d impossible avec le codec struct" % MAX_ROWS)
+        self.layout = None
+        self.layout_topic = self.topic.rstrip("/") + "/layout"
+        self._layout_sent = False
+        rate = config.get("rate")
+        self.limiter = RateLimiter(**rate) if rate else None
+        self.drain_ms = config.get("drain_ms", DRAIN_MS)
+
+        self.client = self._make_client(config)
+
+    def _expand(self, topic):
+        """
+        Remplace "{device}" par l'identifiant de la sonde dans un topic.
+
+        Args:
+            topic (str): Modèle de topic.
+
+        Returns:
+            str: Topic de cette sonde.
+        """
+        return topic.replace("{device}", self.client_id)
+
+    def _make_client(self, config):
+        """
+        Crée le client MQTT bas niveau (redéfini par AsyncMQTTHandler).
+
+        Args:
+            config (dict): Configuration MQTT (voir __init__).
 
-        self.client = MQTTClient(
+        Returns:
+            MQTTClient | QoSClient: Client non connecté.
+        """
+        if self.qos:
+            # umqtt.simple attend chaque PUBACK : client à fenêtre en QoS 1
+            return QoSClient(
+                client_id=self.client_id,
+                server=self.server,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                keepalive=self.keepalive,
+                window=config.get("inflight", 8),
+                retry_ms=config.get("retry_ms", 5000)
+            )
+        return MQTTClient(
             client_id=self.client_id,
             server=self.server,
             port=self.port,
             user=self.user,
-            password=self.password
+            password=self.password,
+            keepalive=self.keepalive
         )
 
     def connect(self):
@@ -73,12 +247,94 @@ class MQTTHandler:
         Affiche un message en cas de succès ou d'erreur.
         """
         try:
-            self.client.connect()
+            if self.qos:
+                # session conservée : les messages en vol sont renvoyés
+                self.client.connect(clean_session=False)
+            else:
+                self.client.connect()
             print("MQTT connecté à :", self.server)
+            self.connected = True
+            self._last_io = ticks_ms()
+            self.backoff.success()
             return True
         except Exception as e:
             print("Erreur connexion MQTT :", e)
+            self.connected = False
+            self._retry_later()
+            return False
+
+    def _retry_later(self):
+        """
+        Enregistre un échec de connexion et affiche le délai avant la
+        prochaine tentative.
+        """
+        delay = self.backoff.failure()
+        if self.backoff.state == OPEN:
+            print("MQTT : disjoncteur ouvert, nouvel essai dans", delay // 1000, "s")
+        else:
+            print("MQTT : nouvel essai dans", delay // 1000, "s")
+
+    def check_alive(self):
+        """
+        Entretient la session : envoie un PINGREQ si la connexion est restée
+        inactive plus de keepalive/2 secondes, et traite la réponse.
+
+        Une erreur réseau marque la session comme perdue.
+
+        Returns:
+            bool: True si la session est toujours vivante.
+        """
+        if not self.connected:
+            return False
+        try:
+            if self.qos:
+                # PUBACK reçus et renvois à chaque cycle
+                self.client.check_msg()
+        except Exception as e:
+            print("MQTT : session perdue :", e)
+            self._drop()
+            return False
+        if ticks_diff(ticks_ms(), self._last_io) < self.keepalive * 500:
+            return True
+        try:
+            self.client.ping()
+            self.client.check_msg()  # lit le PINGRESP s'il est arrivé
+            self._last_io = ticks_ms()
+        except Exception as e:
+            print("MQTT : session perdue :", e)
+            self._drop()
+        return self.connected
+
+    def ensure_connected(self):
+        """
+        Retourne une session utilisable, en se reconnectant si besoin.
+
+        La première connexion attend la gigue de démarrage (des sondes
+        remises sous tension ensemble ne se connectent pas au même
+        instant) ; une reconnexion n'est tentée que si le délai imposé par
+        self.backoff après l'échec précédent est écoulé.
+
+        Returns:
+            bool: True si la session est ouverte.
+        """
+        if self.check_alive():
+            return True
+        if not self.backoff.failures:
+            self.backoff.wait()
+            return self.connect()
+        if not self.backoff.ready():
             return False
+        return self.connect()
+
+    def _drop(self):
+        """
+        Ferme silencieusement une session considérée comme perdue.
+        """
+        self.connected = False
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
 
     def publish(self, data):
         """
@@ -90,22 +346,274 @@ class MQTTHandler:
 
         Affiche un message en cas de succès ou d'erreur.
         data doit être un dictionnaire ou string
+        Passe par publish_one : qualité de service et limiteur de débit
+        s'appliquent comme aux mesures.
         """
         try:
             if isinstance(data, dict):
-                import json
-                data = json.dumps(data)
-            self.client.publish(self.topic, data)
+                data = self.codec.encode(data)
+            self.publish_one(self.topic, data)
             print("MQTT publish :", data)
         except Exception as e:
             print("Erreur envoi MQTT :", e)
 
+    def compile(self, tech):
+        """
+        Compile une fois le plan de publication des capteurs (topics encodés,
+        formatage sans allocation).
+
+        Args:
+            tech (Techniques): Capteurs configurés.
+
+        Avec le codec "struct", la disposition binaire des messages
+        groupés est déduite ici de la configuration des capteurs.
+
+        Returns:
+            PublishPlan: Plan à lire (plan.read()) puis publier (publish_cycle).
+        """
+        if self.codec_name == "struct":
+            self.layout = StructLayout.from_sensors(tech.sensors, tech.SERIES_KEYS)
+            self._layout_sent = False
+        return PublishPlan(tech, self.topic)
+
+    def publish_cycle(self, plan):
+        """
+        Publie les valeurs d'un cycle déjà lues dans le plan.
+
+        - Session rétablie si besoin, puis un lot de la file renvoyé
+        - Mode "topics" : publication directe depuis le plan
+        - Mode "batch" : accumulation puis message groupé
+        - Hors connexion ou en cas d'erreur : mise en file
+
+        Args:
+            plan (PublishPlan): Plan dont read() vient d'être appelé.
+
+        Returns:
+            bool: True si le cycle a été publié (ou mis en lot).
+        """
+        connected = self.ensure_connected()
+        if connected:
+            self.drain_queue()
+        if self.payload_mode == "batch":
+            messages = self.cycle_messages(plan.values())
+            if connected:
+                return self.send(messages)
+            self.enqueue(messages)
+            return False
+        if not connected:
+            self.enqueue(plan.messages())
+            return False
+        try:
+            plan.publish(self.publish_one)
+        except Exception as e:
+            print("Erreur envoi MQTT :", e)
+            self._drop()
+            self.enqueue(plan.messages(plan.position))
+            return False
+        self._last_io = ticks_ms()
+        return True
+
+    def cycle_messages(self, values, timestamp=None):
+        """
+        Construit les messages MQTT d'un cycle de mesures.
+
+        Mode "topics" : un message par valeur, topic + clé → str(valeur)
+        (compatible avec les abonnés existants).
+        Mode "batch" : les valeurs sont accumulées et un seul message JSON
+        compact est produit tous les batch_cycles cycles :
+            {"t0": 1700000000, "k": ["temperature", "humidity"],
+             "s": [[0, 21.5, 60], [10, 21.6, 59]]}
+        t0 est l'heure Unix du premier cycle, chaque ligne de "s" commence
+        par l'écart en secondes avec t0 puis les valeurs dans l'ordre de "k"
+        (null si absente). Décodage côté PC : host/mqtt_decode.py.
+        Avec le codec "msgpack" la même structure est encodée en
+        MessagePack ; avec "struct" les lignes suivent self.layout et la
+        disposition est publiée une fois sur layout_topic.
+
+        Args:
+            values (list): Tuples (clé, valeur) du cycle.
+            timestamp (int | float, optionnel): Heure du cycle (par défaut time.time()).
+
+        Returns:
+            list: Tuples (topic, payload) à publier (vide si le lot n'est pas complet).
+        """
+        if self.payload_mode != "batch":
+            return [(self.topic + key, str(val)) for key, val in values]
+
+        if timestamp is None:
+            timestamp = time.time()
+        t = int(timestamp) + EPOCH_OFFSET
+        messages = []
+        if self.layout is not None and self._batch_rows:
+            dt = t - self._batch_rows[0][0]
+            if dt < 0 or dt > MAX_DT:
+                # saut d'horloge (NTP) : écart hors du champ dt, lot clos
+                messages.append((self.batch_topic, self.flush_batch()))
+        self._batch_rows.append((t, values))
+        if len(self._batch_rows) >= self.batch_cycles:
+            messages.append((self.batch_topic, self.flush_batch()))
+        if not messages:
+            return []
+        if self.layout is not None and not self._layout_sent:
+            # disposition publiée (retenue) avant le premier message binaire
+            messages.insert(0, (self.layout_topic, self.layout.describe()))
+            self._layout_sent = True
+        return messages
+
+    def flush_batch(self):
+        """
+        Encode les cycles accumulés en un message groupé et vide le lot.
+
+        Returns:
+            str | bytearray | None: Payload (JSON, MessagePack ou binaire
+                selon le codec), ou None si aucun cycle en attente.
+        """
+        if not self._batch_rows:
+            return None
+        if self.layout is not None:
+            t0 = self._batch_rows[0][0]
+            rows = [(t - t0, dict(values)) for t, values in self._batch_rows]
+            self._batch_rows = []
+            return self.layout.encode_batch(t0, rows)
+        keys = []
+        for _, values in self._batch_rows:
+            for key, _ in values:
+                if key not in keys:
+                    keys.append(key)
+        t0 = self._batch_rows[0][0]
+        rows = []
+        for t, values in self._batch_rows:
+            found = dict(values)
+            rows.append([t - t0] + [found.get(k) for k in keys])
+        self._batch_rows = []
+        return self.codec.encode({"t0": t0, "k": keys, "s": rows})
+
+    def send(self, messages):
+        """
+        Publie une liste de messages ; ceux qui n'ont pas pu partir sont
+        mis en file pour la prochaine connexion.
+
+        Args:
+            messages (list): Tuples (topic, payload).
+
+        Returns:
+            bool: True si tous les messages ont été publiés.
+        """
+        for i, (topic, payload) in enumerate(messages):
+            try:
+                self.publish_one(topic, payload)
+            except Exception as e:
+                print("Erreur envoi MQTT :", e)
+                self._drop()
+                self.enqueue(messages[i:])
+                return False
+        self._last_io = ticks_ms()
+        return True
+
+    def publish_one(self, topic, payload):
+        """
+        Publie un message avec la qualité de service configurée.
+
+        En QoS 1 l'appel ne bloque que si la fenêtre de messages en vol
+        est pleine.
+
+        La disposition binaire (layout_topic) est publiée retenue pour
+        qu'un décodeur démarré plus tard la reçoive.
+
+        Avec un limiteur de débit, attend si besoin les jetons du message.
+
+        Args:
+            topic (str | bytes): Topic.
+            payload (str | bytes | memoryview): Payload.
+        """
+        if self.limiter is not None:
+            self.limiter.acquire(len(topic) + len(payload))
+        self._publish(topic, payload)
+
+    def _publish(self, topic, payload):
+        """
+        Publie un message sans limitation de débit (voir publish_one).
+        """
+        retain = topic == self.layout_topic
+        if self.qos or retain:
+            self.client.publish(topic, payload, retain, self.qos)
+        else:
+            self.client.publish(topic, payload)
+
+    def enqueue(self, messages):
+        """
+        Met des messages en file sur la flash (sans tentative d'envoi).
+
+        Args:
+            messages (list): Tuples (topic, payload).
+        """
+        if self.queue is None or not messages:
+            return
+        dropped = self.queue.put_many(messages)
+        if dropped:
+            print("File MQTT pleine :", dropped, "messages abandonnés")
+
+    def drain_queue(self):
+        """
+        Renvoie un lot de messages en attente, du plus ancien au plus récent.
+
+        À appeler après une connexion réussie. Le lot est borné par
+        drain_batch pour ne pas retarder les mesures du cycle, et par le
+        limiteur de débit : les jetons hors réserve sont attendus au plus
+        drain_ms en tout, le reste attend le cycle suivant.
+
+        Returns:
+            int: Nombre de messages renvoyés.
+        """
+        if self.queue is None or not len(self.queue):
+            return 0
+        if self.limiter is None:
+            sent = self.queue.drain(self.publish_one, self.drain_batch)
+        else:
+            sent = self._drain_limited()
+        if sent:
+            self._last_io = ticks_ms()
+        return sent
+
+    def _drain_limited(self):
+        """
+        Vidage de la file soumis au limiteur (jetons hors réserve seulement).
+
+        Returns:
+            int: Nombre de messages renvoyés.
+        """
+        self.limiter.begin_drain(self.drain_ms)
+        sent = 0
+        done = 0
+        head = None
+        for topic, payload, pos in self.queue.peek(self.drain_batch):
+            if topic is not None:
+                if not self.limiter.try_acquire(len(topic) + len(payload)):
+                    break
+                try:
+                    self._publish(topic, payload)
+                except Exception as e:
+                    print("File MQTT : publication interrompue :", e)
+                    break
+                sent += 1
+            head = pos
+            done += 1
+        self.queue.commit(head, done)
+        return sent
+
     def disconnect(self):
         """
-        Ferme la connexion avec le serveur MQTT.
+        Ferme la connexion avec le serveur MQTT (en QoS 1, après avoir
+        attendu au plus deux délais de renvoi les derniers accusés).
 
         Cette méthode ignore les exceptions pour éviter les plantages.
         """
+        try:
+            if self.qos and self.connected:
+                self.client.flush(2 * self.client.retry_ms)
+        except Exception:
+            pass
+        self.connected = False
         try:
             self.client.disconnect()
         except:
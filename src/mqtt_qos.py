@@ -0,0 +1,503 @@
+# src/mqtt_qos.py
+"""
+mqtt_qos.py
+Client MQTT 3.1.1 minimal avec publication QoS 1 pipelinée.
+
+Rôle :
+- Publier en QoS 1 sans attendre le PUBACK de chaque message : jusqu'à
+  `window` messages sont « en vol » en même temps (umqtt.simple attend
+  l'accusé de chaque publication QoS 1 avant d'envoyer la suivante).
+- Suivre les messages en vol par identifiant de paquet et les retirer
+  à réception de leur PUBACK.
+- Renvoyer (drapeau DUP) les messages non acquittés après retry_ms,
+  et tous les messages en vol après une reconnexion.
+
+Interface compatible avec umqtt.simple.MQTTClient pour ce qu'utilise
+MQTTHandler : connect(), publish(), ping(), check_msg(), disconnect().
+
+Utilisation :
+    client = QoSClient("esp8266", "192.168.1.20", window=8)
+    client.connect()
+    client.publish(b"maison/t", b"21.5", qos=1)   # ne bloque pas
+    client.check_msg()                            # traite les PUBACK
+    client.flush(5000)                            # attend les derniers accusés
+"""
+import socket
+import struct
+import time
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+# Types de paquets MQTT (4 bits de poids fort du premier octet)
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+DUP_FLAG = 0x08
+
+# errno « pas de donnée » (EAGAIN, ETIMEDOUT) ou message de timeout CPython
+_NO_DATA = (11, 110, "timed out")
+
+def encode_length(n):
+    """
+    Encode la « longueur restante » d'un paquet (1 à 4 octets).
+
+    Args:
+        n (int): Longueur à encoder.
+
+    Returns:
+        bytearray: Octets encodés.
+    """
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return out
+
+def decode_packet(buf):
+    """
+    Extrait le premier paquet complet d'un tampon de réception.
+
+    Args:
+        buf (bytearray): Octets reçus.
+
+    Returns:
+        tuple | None: (premier_octet, corps, taille_totale),
+                      ou None si le paquet est incomplet.
+    """
+    length = 0
+    shift = 0
+    pos = 1
+    while True:
+        if pos >= len(buf):
+            return None
+        byte = buf[pos]
+        length |= (byte & 0x7F) << shift
+        pos += 1
+        if not byte & 0x80:
+            break
+        shift += 7
+    end = pos + length
+    if len(buf) < end:
+        return None
+    return buf[0], bytes(buf[pos:end]), end
+
+def _field(data):
+    """
+    Returns:
+        bytes: Chaîne MQTT (longueur sur 2 octets puis contenu).
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    return struct.pack("!H", len(data)) + data
+
+def publish_packet(topic, msg, qos=0, pid=0, retain=False):
+    """
+    Construit un paquet PUBLISH.
+
+    Args:
+        topic (str | bytes): Topic.
+        msg (str | bytes | memoryview): Payload (copié dans le paquet).
+        qos (int): 0 ou 1.
+        pid (int): Identifiant de paquet (QoS 1).
+        retain (bool): Drapeau retain.
+
+    Returns:
+        bytearray: Paquet prêt à envoyer.
+    """
+    if isinstance(topic, str):
+        topic = topic.encode()
+    if isinstance(msg, str):
+        msg = msg.encode()
+    size = 2 + len(topic) + len(msg) + (2 if qos else 0)
+    pkt = bytearray()
+    pkt.append(PUBLISH | qos << 1 | (1 if retain else 0))
+    pkt += encode_length(size)
+    pkt += struct.pack("!H", len(topic))
+    pkt += topic
+    if qos:
+        pkt += struct.pack("!H", pid)
+    pkt += msg
+    return pkt
+
+def connect_packet(client_id, user=None, password=None, keepalive=0, clean_session=True):
+    """
+    Construit un paquet CONNECT (MQTT 3.1.1).
+
+    Args:
+        client_id (str): Identifiant du client.
+        user (str | None): Utilisateur.
+        password (str | None): Mot de passe (ignoré sans utilisateur).
+        keepalive (int): Keepalive en secondes.
+        clean_session (bool): Demande une session neuve.
+
+    Returns:
+        bytearray: Paquet prêt à envoyer.
+    """
+    flags = 0x02 if clean_session else 0
+    payload = _field(client_id)
+    if user is not None:
+        flags |= 0x80
+        payload += _field(user)
+        if password is not None:
+            flags |= 0x40
+            payload += _field(password)
+    var = b"\x00\x04MQTT\x04" + bytes((flags,)) + struct.pack("!H", keepalive)
+    pkt = bytearray((CONNECT,))
+    pkt += encode_length(len(var) + len(payload))
+    pkt += var + payload
+    return pkt
+
+def check_connack(first, body):
+    """
+    Vérifie la réponse du broker à un CONNECT.
+
+    Args:
+        first (int): Premier octet du paquet reçu.
+        body (bytes): Corps du paquet.
+
+    Returns:
+        bool: True si le broker a repris une session existante.
+
+    Raises:
+        MQTTException: Si la réponse est inattendue ou la connexion refusée.
+    """
+    if first & 0xF0 != CONNACK or len(body) < 2:
+        raise MQTTException("réponse inattendue au CONNECT")
+    if body[1] != 0:
+        raise MQTTException("connexion refusée, code %d" % body[1])
+    return bool(body[0] & 1)
+
+class MQTTException(Exception):
+    """
+    Erreur de protocole MQTT (connexion refusée, paquet inattendu).
+    """
+    pass
+
+class QoSClient:
+    """
+    Client MQTT avec fenêtre de messages QoS 1 en vol.
+
+    Attributes:
+        window (int): Nombre maximal de messages QoS 1 non acquittés.
+        retry_ms (int): Délai avant renvoi d'un message non acquitté.
+        inflight (dict): Identifiant → [paquet, heure_envoi_ms].
+        acked (int): Nombre de PUBACK reçus.
+        retransmits (int): Nombre de renvois.
+    """
+
+    def __init__(self, client_id, server, port=0, user=None, password=None,
+                 keepalive=0, window=8, retry_ms=5000, timeout=10):
+        """
+        Args:
+            client_id (str): Identifiant du client.
+            server (str): Adresse du broker.
+            port (int): Port du broker (0 = 1883).
+            user (str | None): Utilisateur.
+            password (str | None): Mot de passe.
+            keepalive (int): Keepalive en secondes (0 = désactivé).
+            window (int): Messages QoS 1 en vol au maximum (1 = stop-and-wait).
+            retry_ms (int): Délai de renvoi d'un message non acquitté.
+            timeout (int): Délai maximal d'une opération réseau bloquante (s).
+        """
+        self.client_id = client_id
+        self.server = server
+        self.port = port or 1883
+        self.user = user
+        self.password = password
+        self.keepalive = keepalive
+        self.window = window
+        self.retry_ms = retry_ms
+        self.timeout = timeout
+        self.sock = None
+        self.inflight = {}
+        self.acked = 0
+        self.retransmits = 0
+        self._pid = 0
+        self._rx = bytearray()
+
+    # ==================== Réseau ====================
+
+    def _send(self, data):
+        """
+        Envoie un paquet complet (bloquant, borné par timeout).
+        """
+        if self.sock is None:
+            raise OSError("MQTT non connecté")
+        self.sock.settimeout(self.timeout)
+        self.sock.sendall(data)
+
+    def _recv(self, timeout_ms):
+        """
+        Lit les octets disponibles dans le tampon de réception.
+
+        Args:
+            timeout_ms (int): Attente maximale (0 = non bloquant).
+
+        Returns:
+            bool: True si des octets ont été reçus.
+
+        Raises:
+            OSError: Si la connexion est fermée ou en erreur.
+        """
+        if self.sock is None:
+            raise OSError("MQTT non connecté")
+        self.sock.settimeout(timeout_ms / 1000)
+        try:
+            data = self.sock.recv(256)
+        except OSError as e:
+            if e.args and e.args[0] in _NO_DATA:
+                return False
+            raise
+        if not data:
+            raise OSError("connexion MQTT fermée par le broker")
+        self._rx += data
+        return True
+
+    def _next_packet(self):
+        """
+        Returns:
+            tuple | None: (premier_octet, corps) du prochain paquet reçu complet.
+        """
+        found = decode_packet(self._rx)
+        if found is None:
+            return None
+        first, body, size = found
+        self._rx = self._rx[size:]
+        return first, body
+
+    def _handle(self, first, body):
+        """
+        Traite un paquet reçu.
+
+        Returns:
+            int: Type du paquet.
+        """
+        kind = first & 0xF0
+        if kind == PUBACK:
+            pid = struct.unpack("!H", body[:2])[0]
+            if self.inflight.pop(pid, None) is not None:
+                self.acked += 1
+        elif kind == PUBLISH and first & 0x06:
+            # message entrant QoS 1 : accusé obligatoire (contenu ignoré)
+            topic_len = struct.unpack("!H", body[:2])[0]
+            pid = body[2 + topic_len:4 + topic_len]
+            self._send(bytes((PUBACK, 2)) + pid)
+        return kind
+
+    # ==================== Session ====================
+
+    def connect(self, clean_session=True):
+        """
+        Ouvre la connexion et la session MQTT.
+
+        Les messages encore en vol (session précédente interrompue) sont
+        renvoyés avec le drapeau DUP.
+
+        Args:
+            clean_session (bool): Demande une session neuve au broker.
+
+        Returns:
+            bool: True si le broker a repris une session existante.
+
+        Raises:
+            MQTTException: Si le broker refuse la connexion.
+            OSError: En cas d'erreur réseau.
+        """
+        self.close()
+        addr = socket.getaddrinfo(self.server, self.port)[0][-1]
+        self.sock = socket.socket()
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(addr)
+        self._rx = bytearray()
+
+        self._send(connect_packet(self.client_id, self.user, self.password,
+                                  self.keepalive, clean_session))
+
+        deadline = ticks_ms() + self.timeout * 1000
+        packet = self._next_packet()
+        while packet is None:
+            if ticks_diff(deadline, ticks_ms()) <= 0 or not self._recv(self.timeout * 1000):
+                raise OSError("MQTT : pas de CONNACK")
+            packet = self._next_packet()
+        present = check_connack(*packet)
+        for pid in sorted(self.inflight):
+            self._resend(pid)
+        return present
+
+    def close(self):
+        """
+        Ferme le socket sans envoyer DISCONNECT (messages en vol conservés).
+        """
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def disconnect(self):
+        """
+        Envoie DISCONNECT et ferme le socket.
+
+        Les messages encore en vol sont conservés et renvoyés au
+        prochain connect().
+        """
+        try:
+            self._send(bytes((DISCONNECT, 0)))
+        finally:
+            self.close()
+
+    def ping(self):
+        """
+        Envoie un PINGREQ (la réponse est lue par check_msg()).
+        """
+        self._send(bytes((PINGREQ, 0)))
+
+    # ==================== Publication ====================
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        """
+        Publie un message.
+
+        En QoS 1, l'appel ne bloque que si la fenêtre est pleine : il
+        attend alors qu'un PUBACK libère une place, au plus timeout
+        secondes.
+
+        Args:
+            topic (str | bytes): Topic.
+            msg (str | bytes | memoryview): Payload.
+            retain (bool): Drapeau retain.
+            qos (int): 0 ou 1.
+
+        Returns:
+            int: Identifiant du paquet (0 en QoS 0).
+
+        Raises:
+            OSError: En cas d'erreur réseau ou si aucune place ne se libère
+                dans la fenêtre (le message n'est pas en vol).
+        """
+        if not qos:
+            self._send(publish_packet(topic, msg, 0, 0, retain))
+            return 0
+        self.check_msg()
+        start = ticks_ms()
+        while len(self.inflight) >= self.window:
+            # broker muet (TCP ouvert, plus de PUBACK) : attente bornée
+            left = self.timeout * 1000 - ticks_diff(ticks_ms(), start)
+            if left <= 0:
+                raise OSError("MQTT : fenêtre pleine, aucun PUBACK")
+            self.wait_msg(min(left, self.retry_ms))
+        pid = self._next_pid()
+        pkt = publish_packet(topic, msg, 1, pid, retain)
+        self._send(pkt)
+        self.inflight[pid] = [pkt, ticks_ms()]
+        return pid
+
+    def _next_pid(self):
+        """
+        Returns:
+            int: Identifiant de paquet libre (1 à 65535).
+        """
+        while True:
+            self._pid = self._pid % 0xFFFF + 1
+            if self._pid not in self.inflight:
+                return self._pid
+
+    def _resend(self, pid):
+        """
+        Renvoie un message en vol avec le drapeau DUP.
+        """
+        entry = self.inflight[pid]
+        entry[0][0] |= DUP_FLAG
+        self._send(entry[0])
+        entry[1] = ticks_ms()
+        self.retransmits += 1
+
+    def retransmit(self):
+        """
+        Renvoie les messages en vol non acquittés depuis retry_ms.
+
+        Returns:
+            int: Nombre de messages renvoyés.
+        """
+        now = ticks_ms()
+        count = 0
+        for pid in list(self.inflight):
+            if ticks_diff(now, self.inflight[pid][1]) >= self.retry_ms:
+                self._resend(pid)
+                count += 1
+        return count
+
+    def check_msg(self):
+        """
+        Traite sans bloquer les paquets reçus (PUBACK, PINGRESP...) puis
+        renvoie les messages dont l'accusé a expiré.
+
+        Returns:
+            int: Nombre de paquets traités.
+        """
+        count = 0
+        while True:
+            packet = self._next_packet()
+            if packet is None:
+                if not self._recv(0):
+                    break
+                continue
+            self._handle(*packet)
+            count += 1
+        if self.inflight:
+            self.retransmit()
+        return count
+
+    def wait_msg(self, timeout_ms=None):
+        """
+        Attend et traite un paquet, puis renvoie les messages dont
+        l'accusé a expiré.
+
+        Args:
+            timeout_ms (int | None): Attente maximale (par défaut retry_ms).
+
+        Returns:
+            int | None: Type du paquet traité, None si délai écoulé.
+        """
+        if timeout_ms is None:
+            timeout_ms = self.retry_ms
+        packet = self._next_packet()
+        while packet is None:
+            if not self._recv(timeout_ms):
+                self.retransmit()
+                return None
+            packet = self._next_packet()
+        kind = self._handle(*packet)
+        self.retransmit()
+        return kind
+
+    def flush(self, timeout_ms=5000):
+        """
+        Attend l'acquittement de tous les messages en vol.
+
+        Args:
+            timeout_ms (int): Attente maximale.
+
+        Returns:
+            bool: True si plus aucun message n'est en vol.
+        """
+        start = ticks_ms()
+        while self.inflight:
+            left = timeout_ms - ticks_diff(ticks_ms(), start)
+            if left <= 0:
+                break
+            self.wait_msg(min(left, self.retry_ms))
+        return not self.inflight
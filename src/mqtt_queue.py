@@ -0,0 +1,257 @@
+# src/mqtt_queue.py
+"""
+mqtt_queue.py
+File d'attente persistante des messages MQTT non publiés.
+
+Rôle :
+- Conserver sur la flash les messages (topic, payload) qui n'ont pas pu
+  être publiés (broker injoignable, Wi-Fi instable).
+- Les restituer du plus ancien au plus récent, par lots bornés, à la
+  prochaine connexion réussie.
+- Limiter la taille de la file (les plus anciens messages sont abandonnés
+  au-delà de max_messages).
+
+Format :
+    mqtt.queue       une ligne JSON ["topic", "payload"] par message
+                     (["topic", "base64", 1] pour un payload binaire)
+    mqtt.queue.pos   position (octets) du premier message non envoyé
+
+Le fichier de données n'est jamais réécrit message par message : seule la
+petite position est mise à jour, et le fichier est supprimé (ou compacté)
+une fois consommé.
+
+Utilisation :
+    queue = OutboundQueue("mqtt.queue", max_messages=500)
+    queue.put_many([("esp/data/t", "21.5")])
+    queue.drain(client.publish, batch=20)
+"""
+import os
+try:
+    import ujson as json
+except ImportError:
+    import json
+try:
+    from ubinascii import a2b_base64, b2a_base64  # MicroPython
+except ImportError:
+    from binascii import a2b_base64, b2a_base64
+from journal import file_exists
+
+QUEUE_FILE = "mqtt.queue"
+
+# Compaction quand la partie consommée dépasse cette taille
+_COMPACT_BYTES = 4096
+
+def _entry(topic, payload):
+    """
+    Returns:
+        list: Ligne JSON d'un message (payload binaire encodé en base64).
+    """
+    if isinstance(topic, (bytes, bytearray)):
+        topic = topic.decode()
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return [topic, b2a_base64(payload).decode().strip(), 1]
+    return [topic, payload]
+
+class OutboundQueue:
+    """
+    File FIFO persistante de messages MQTT.
+
+    Attributes:
+        filename (str): Fichier des messages.
+        max_messages (int): Nombre maximal de messages conservés.
+    """
+
+    def __init__(self, filename=QUEUE_FILE, max_messages=500):
+        """
+        Ouvre la file et compte les messages en attente.
+
+        Args:
+            filename (str): Fichier des messages (par défaut mqtt.queue).
+            max_messages (int): Capacité maximale (par défaut 500).
+        """
+        self.filename = filename
+        self.pos_file = filename + ".pos"
+        self.max_messages = max_messages
+        self._head = self._load_head()
+        self._count = sum(1 for _ in self._lines(self._head))
+
+    # ==================== Position ====================
+
+    def _load_head(self):
+        """
+        Returns:
+            int: Position du premier message non envoyé.
+        """
+        try:
+            with open(self.pos_file, "r") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _save_head(self):
+        """
+        Enregistre la position de lecture, ou supprime la file si elle est vide.
+        """
+        if self._count == 0:
+            self.clear()
+            return
+        if self._head >= _COMPACT_BYTES:
+            self._compact()
+        with open(self.pos_file, "w") as f:
+            f.write(str(self._head))
+
+    def _lines(self, start, limit=None):
+        """
+        Lit les lignes à partir d'une position.
+
+        Yields:
+            tuple: (ligne_brute, position_après_la_ligne).
+        """
+        if not file_exists(self.filename):
+            return
+        with open(self.filename, "rb") as f:
+            f.seek(start)
+            pos = start
+            n = 0
+            while limit is None or n < limit:
+                line = f.readline()
+                if not line:
+                    return
+                pos += len(line)
+                if not line.endswith(b"\n"):
+                    return  # ligne incomplète (coupure pendant l'écriture)
+                n += 1
+                yield line, pos
+
+    def _compact(self):
+        """
+        Réécrit la partie non consommée dans un nouveau fichier.
+        """
+        tmp = self.filename + ".tmp"
+        with open(self.filename, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(self._head)
+            while True:
+                chunk = src.read(512)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.remove(self.filename)
+        os.rename(tmp, self.filename)
+        self._head = 0
+
+    # ==================== File ====================
+
+    def __len__(self):
+        """
+        Returns:
+            int: Nombre de messages en attente.
+        """
+        return self._count
+
+    def put_many(self, messages):
+        """
+        Ajoute des messages en fin de file (une seule écriture).
+
+        Si la capacité est dépassée, les messages les plus anciens sont
+        abandonnés.
+
+        Args:
+            messages (list): Tuples (topic, payload).
+
+        Returns:
+            int: Nombre de messages abandonnés.
+        """
+        if not messages:
+            return 0
+        lines = "".join(json.dumps(_entry(t, p)) + "\n" for t, p in messages)
+        with open(self.filename, "ab") as f:
+            f.write(lines.encode())
+        self._count += len(messages)
+
+        dropped = 0
+        overflow = self._count - self.max_messages
+        if overflow > 0:
+            for _, pos in self._lines(self._head, overflow):
+                self._head = pos
+                dropped += 1
+            self._count -= dropped
+            self._save_head()
+        return dropped
+
+    def peek(self, n):
+        """
+        Lit les n plus anciens messages sans les retirer.
+
+        Args:
+            n (int): Nombre maximal de messages.
+
+        Returns:
+            list: Tuples (topic, payload, position_après).
+        """
+        batch = []
+        for line, pos in self._lines(self._head, n):
+            try:
+                entry = json.loads(line)
+                topic, payload = entry[0], entry[1]
+                if len(entry) > 2:
+                    payload = a2b_base64(payload)
+            except (ValueError, IndexError, TypeError):
+                topic, payload = None, None
+            batch.append((topic, payload, pos))
+        return batch
+
+    def drain(self, publish, batch=20):
+        """
+        Publie au plus `batch` messages, du plus ancien au plus récent.
+
+        Un message n'est retiré de la file qu'après une publication
+        réussie ; à la première erreur le drainage s'arrête.
+
+        Args:
+            publish (callable): Fonction publish(topic, payload).
+            batch (int): Nombre maximal de messages par appel.
+
+        Returns:
+            int: Nombre de messages publiés.
+        """
+        sent = 0
+        done = 0
+        head = self._head
+        for topic, payload, pos in self.peek(batch):
+            if topic is not None:
+                try:
+                    publish(topic, payload)
+                except Exception as e:
+                    print("File MQTT : publication interrompue :", e)
+                    break
+                sent += 1
+            head = pos
+            done += 1
+        self.commit(head, done)
+        return sent
+
+    def commit(self, pos, count):
+        """
+        Retire de la file les messages lus par peek() et publiés.
+
+        Args:
+            pos (int): Position après le dernier message publié.
+            count (int): Nombre de messages retirés.
+        """
+        if not count:
+            return
+        self._head = pos
+        self._count -= count
+        self._save_head()
+
+    def clear(self):
+        """
+        Vide la file (supprime ses fichiers).
+        """
+        for name in (self.filename, self.pos_file):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+        self._head = 0
+        self._count = 0
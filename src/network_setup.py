@@ -1,6 +1,5 @@
 #src/network_setup.py
 #initialisation du server + creation des pages 
-#actuellement le telechargement ne fonctionne pas il faudra le modifier
 #penser a parametrer le html
 #cette ligne est dupliquée cl.send("HTTP/1.0 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n".encode())
 
@@ -16,15 +15,48 @@ Rôle :
     - Télécharger des fichiers JSON présents sur l'ESP
 - Afficher des informations réseau (IP, mode).
 
+Plusieurs clients à la fois :
+- Boucle d'événements select.poll() non bloquante : socket d'écoute et
+  sockets clients (MAX_CLIENTS au plus) surveillés ensemble.
+- Une machine à états par connexion (Connection) : lecture de la requête
+  (tampon d'entrée), puis envoi de la réponse (tampon de sortie), puis
+  fermeture. Un client lent ou silencieux ne bloque plus les autres ;
+  il est fermé après CLIENT_TIMEOUT_MS sans activité.
+- WebServer.poll() traite un tour d'événements et rend la main : la
+  boucle peut tourner seule (start_server) ou être appelée par un
+  autre ordonnanceur.
+
+Téléchargement :
+- Fichier lu sur la flash par blocs de CHUNK_SIZE octets dans le tampon
+  de la connexion (memoryview, aucune copie) : mémoire constante quelle
+  que soit la taille du fichier.
+- Un bloc envoyé par connexion et par tour : les téléchargements
+  simultanés avancent ensemble ; envois partiels repris au tour suivant.
+- Reprise : en-tête Range (une seule plage, "bytes=N-", "bytes=N-M" ou
+  "bytes=-N") → 206 Partial Content avec Content-Range ; plage hors du
+  fichier → 416. Accept-Ranges et Content-Length toujours présents
+  (client de reprise côté PC : host/pull.py).
+
+Page d'accueil :
+- Liste des fichiers et page HTML (en-têtes compris) construites une
+  fois puis servies telles quelles (octets déjà encodés).
+- Cache vidé par la couche de stockage (storage_events) lorsqu'un
+  fichier .json / .jsonl est créé, qu'un segment est ouvert ou qu'un
+  fichier est supprimé : plus de os.listdir() à chaque requête.
+
 Limitations :
-- Téléchargement des fichiers à améliorer (actuellement basique).
 - HTML statique, à paramétrer pour personnalisation.
+- Fichier copié sur la flash hors de la couche de stockage (mpremote) :
+  visible après le prochain évènement de stockage ou redémarrage du serveur.
 
 Utilisation :
 Appelé par main.py après configuration du réseau.
 """
 
-import socket, os, time
+import socket, os, time, json
+import select, errno
+import buffered_writer
+import storage_events
 try:
     import machine
 except ImportError:
@@ -37,11 +69,38 @@ except ImportError:
             print("Fake reset called")
 
     machine = MockMachine()
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
 
 
 # Flag global pour arrêter le serveur
 stop_server_flag = False
 
+# Taille des blocs lus sur la flash et envoyés (téléchargement)
+CHUNK_SIZE = 512
+# Connexions simultanées au plus (les suivantes attendent dans listen())
+MAX_CLIENTS = 4
+# Connexions en attente dans listen() au-delà (file pleine : le client
+# ne réessaie qu'une seconde plus tard)
+LISTEN_BACKLOG = 8
+# Taille maximale d'une requête (ligne + en-têtes)
+MAX_REQUEST = 1024
+# Client fermé après ce délai sans activité
+CLIENT_TIMEOUT_MS = 10000
+
+# Erreurs « réessayer plus tard » des sockets non bloquantes
+_WOULD_BLOCK = (errno.EAGAIN, getattr(errno, "EWOULDBLOCK", errno.EAGAIN))
+
+# États d'une connexion
+READING = 0
+WRITING = 1
+CLOSED = 2
+
 def stop_server():
     """
     Arrête le serveur web en définissant le flag global.
@@ -49,107 +108,417 @@ def stop_server():
     global stop_server_flag
     stop_server_flag = True
 
-def start_server(net, mode, port=8080):    
+def query_param(request_line, name):
     """
-    Démarre un serveur HTTP minimaliste sur l'ESP.
+    Extrait un paramètre de la chaîne de requête.
 
     Args:
-        net: Objet réseau (AP ou STA) configuré.
-        mode (str): Mode réseau ("AP" ou "STA").
-        port (int): Port d'écoute (par défaut 8080).
+        request_line (str): Ligne de requête (ex : "GET /range?from=1 HTTP/1.1").
+        name (str): Nom du paramètre.
 
-    Fonctionnalités :
-    - Affiche l'IP et le mode.
-    - Gère les requêtes GET pour :
-        /stop      → Arrêter le serveur
-        /restart   → Redémarrer l'ESP
-        /download?file=xxx.json → Télécharger un fichier JSON
-    - Génère une page HTML avec :
-        - IP et mode
-        - Liste des fichiers JSON disponibles
-        - Boutons STOP et REDEMARRER
+    Returns:
+        str | None: Valeur du paramètre, ou None s'il est absent.
+    """
+    path = request_line.split(" ")[1] if " " in request_line else request_line
+    if "?" not in path:
+        return None
+    for pair in path.split("?", 1)[1].split("&"):
+        key, _, value = pair.partition("=")
+        if key == name:
+            return value
+    return None
 
-    Boucle :
-    - Accepte les connexions jusqu'à ce que stop_server_flag soit True.
+def header_value(request, name):
     """
+    Extrait un en-tête de la requête.
 
-    global stop_server_flag
-    stop_server_flag = False #Réinitialise à chaque lancement
+    Args:
+        request (str): Requête complète (ligne de requête + en-têtes).
+        name (str): Nom de l'en-tête (insensible à la casse).
+
+    Returns:
+        str | None: Valeur de l'en-tête, ou None s'il est absent.
+    """
+    prefix = name.lower() + ":"
+    for line in request.split("\r\n")[1:]:
+        if line.lower().startswith(prefix):
+            return line[len(prefix):].strip()
+    return None
+
+def parse_range(value, size):
+    """
+    Interprète un en-tête Range portant sur un fichier.
+
+    Une valeur absente, mal formée (dont une fin avant le début) ou à
+    plusieurs plages est ignorée (fichier entier), comme le prévoit HTTP.
+
+    Args:
+        value (str | None): Valeur de l'en-tête Range.
+        size (int): Taille du fichier.
+
+    Returns:
+        tuple | None: (début, fin incluse), ou None pour le fichier entier.
 
-    addr = socket.getaddrinfo("0.0.0.0", port)[0][-1]
-    s = socket.socket()
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    Raises:
+        ValueError: Si la plage est hors du fichier (réponse 416).
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, _, last = value[6:].strip().partition("-")
     try:
-        s.bind(addr)
-    except OSError as e:
-        print("Erreur bind port " + str(port) + " :", e)
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None  # bytes=5-3 : syntaxe invalide, pas une plage vide
+        else:
+            start = size - int(last)  # N derniers octets
+            end = size - 1
+    except ValueError:
+        return None
+    if start < 0:
+        start = 0
+    if end >= size:
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError("plage non satisfiable")
+    return start, end
+
+class Connection:
+    """
+    Connexion cliente : lecture de la requête, puis envoi de la réponse.
+
+    Attributes:
+        sock (socket): Socket client (non bloquante).
+        addr (tuple): Adresse du client.
+        state (int): READING, WRITING ou CLOSED.
+        last (int): Dernière activité (ticks_ms).
+        after (callable | None): Appelé une fois la réponse envoyée.
+    """
+
+    def __init__(self, sock, addr=None, now=0):
+        """
+        Args:
+            sock (socket): Socket client.
+            addr (tuple, optionnel): Adresse du client.
+            now (int): Heure d'ouverture (ticks_ms).
+        """
+        self.sock = sock
+        self.addr = addr
+        self.state = READING
+        self.last = now
+        self.after = None
+        self.inbuf = bytearray()
+        # tampon de sortie propre à la connexion, réutilisé bloc après bloc
+        self.buf = bytearray(CHUNK_SIZE)
+        self.view = memoryview(self.buf)
+        self.out = None
+        self.fp = None
+        self.remaining = None
+        self.chunks = None
+
+    def on_readable(self):
+        """
+        Lit les octets reçus.
+
+        Returns:
+            str | None: Requête complète, ou None si elle ne l'est pas
+                encore (ou si le client est parti : state vaut alors CLOSED,
+                la socket reste à fermer par le serveur).
+        """
+        try:
+            data = self.sock.recv(MAX_REQUEST - len(self.inbuf))
+        except OSError as e:
+            if e.args and e.args[0] in _WOULD_BLOCK:
+                return None
+            self.state = CLOSED
+            return None
+        if not data:
+            if not self.inbuf:
+                self.state = CLOSED
+                return None
+        else:
+            self.inbuf += data
+            if b"\r\n\r\n" not in self.inbuf and len(self.inbuf) < MAX_REQUEST:
+                return None
+        try:
+            request = bytes(self.inbuf).decode()
+        except UnicodeError:
+            # pas une requête HTTP (ex. poignée de main TLS) : on ferme
+            self.state = CLOSED
+            return None
+        self.inbuf = bytearray()
+        return request
+
+    def respond(self, head, fp=None, chunks=None, length=None):
+        """
+        Prépare la réponse ; l'envoi se fait ensuite par on_writable().
+
+        Args:
+            head (bytes): En-têtes (et corps court éventuel).
+            fp (optionnel): Fichier ouvert en binaire, envoyé par blocs
+                depuis sa position courante.
+            chunks (optionnel): Itérable de bytes envoyés à la suite.
+            length (int, optionnel): Octets de fp à envoyer (None : jusqu'à
+                la fin du fichier).
+        """
+        self.state = WRITING
+        self.out = memoryview(head)
+        self.fp = fp
+        self.remaining = length
+        self.chunks = chunks
+
+    def _refill(self):
+        """
+        Charge le bloc suivant du corps dans le tampon de sortie.
+
+        Returns:
+            bool: False si tout a été envoyé.
+        """
+        if self.fp is not None:
+            remaining = self.remaining
+            if remaining is None or remaining >= CHUNK_SIZE:
+                n = self.fp.readinto(self.buf)
+            else:
+                n = self.fp.readinto(self.view[:remaining]) if remaining else 0
+            if n:
+                if remaining is not None:
+                    self.remaining = remaining - n
+                self.out = self.view[:n]
+                return True
+            self.fp.close()
+            self.fp = None
+        if self.chunks is not None:
+            for data in self.chunks:
+                self.out = memoryview(data)
+                return True
+            self.chunks = None
+        return False
+
+    def on_writable(self):
+        """
+        Envoie au plus un bloc de la réponse (reprise des envois partiels).
+
+        Returns:
+            bool: True quand la réponse est entièrement envoyée.
+
+        Raises:
+            OSError: Si la connexion est fermée en cours d'envoi.
+        """
+        if not len(self.out) and not self._refill():
+            return True
+        while len(self.out):
+            try:
+                sent = self.sock.send(self.out)
+            except OSError as e:
+                if e.args and e.args[0] in _WOULD_BLOCK:
+                    return False
+                raise
+            if not sent:
+                raise OSError("connexion fermée pendant l'envoi")
+            self.out = self.out[sent:]
+        return False
+
+    def close(self):
+        """
+        Ferme le fichier en cours et la socket.
+        """
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        self.chunks = None
+        self.state = CLOSED
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+def serve_download(conn, filename, range_header=None):
+    """
+    Répond à /download : en-têtes (avec Content-Length) puis contenu du
+    fichier envoyé par blocs ; avec un en-tête Range, seule la plage
+    demandée (206), pour reprendre un téléchargement interrompu.
+
+    Args:
+        conn (Connection): Connexion cliente.
+        filename (str): Fichier présent sur la flash.
+        range_header (str, optionnel): Valeur de l'en-tête Range.
+    """
+    fp = None
+    try:
+        # dernières mesures encore en tampon : sur la flash avant la taille
+        buffered_writer.flush_file(filename)
+        fp = open(filename, "rb")
+        # fichier tourné ou supprimé entre open et stat : même réponse
+        size = os.stat(filename)[6]
+    except Exception:
+        if fp is not None:
+            fp.close()
+        conn.respond("HTTP/1.0 500 ERROR\r\n\r\nErreur lecture fichier.".encode())
+        return
+    try:
+        span = parse_range(range_header, size)
+    except ValueError:
+        fp.close()
+        conn.respond(("HTTP/1.0 416 RANGE NOT SATISFIABLE\r\nContent-Range: bytes */"
+                      + str(size) + "\r\nContent-Length: 0\r\n\r\n").encode())
+        return
+    ctype = "application/x-ndjson" if filename.endswith(".jsonl") else "application/json"
+    head = "Content-Type: " + ctype + "; charset=utf-8\r\nAccept-Ranges: bytes\r\n"
+    if span is None:
+        conn.respond(("HTTP/1.0 200 OK\r\n" + head + "Content-Length: " + str(size)
+                      + "\r\n\r\n").encode(), fp=fp, length=size)
+        return
+    start, end = span
+    try:
+        fp.seek(start)
+    except OSError:
+        fp.close()
+        conn.respond("HTTP/1.0 500 ERROR\r\n\r\nErreur lecture fichier.".encode())
         return
+    conn.respond(("HTTP/1.0 206 PARTIAL CONTENT\r\n" + head + "Content-Range: bytes "
+                  + str(start) + "-" + str(end) + "/" + str(size) + "\r\nContent-Length: "
+                  + str(end - start + 1) + "\r\n\r\n").encode(),
+                 fp=fp, length=end - start + 1)
 
-    s.listen(1)
-    s.settimeout(1)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
-    ip = net.ifconfig()[0]
-    print("Serveur web actif sur http://" + ip + ":" + str(port))
+def serve_range(conn, store, request_line):
+    """
+    Répond à /range : mesures d'une plage de temps (une ligne JSON par mesure).
+
+    Seuls les segments recouvrant la plage sont lus (voir SegmentStore),
+    au fil de l'envoi.
+
+    Args:
+        conn (Connection): Connexion cliente.
+        store (SegmentStore): Stockage segmenté des mesures.
+        request_line (str): Ligne de requête contenant from= et/ou to=.
+    """
+    try:
+        t0 = query_param(request_line, "from")
+        t1 = query_param(request_line, "to")
+        t0 = int(t0) if t0 else None
+        t1 = int(t1) if t1 else None
+    except ValueError:
+        conn.respond("HTTP/1.0 400 BAD REQUEST\r\n\r\nParamètres from/to invalides.".encode())
+        return
+    records = store.read_range(t0, t1)
+    conn.respond("HTTP/1.0 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n\r\n".encode(),
+                 chunks=((json.dumps(record) + "\n").encode() for record in records))
 
-    while not stop_server_flag:
+class WebServer:
+    """
+    Serveur HTTP non bloquant (select.poll) pour plusieurs clients.
+
+    Attributes:
+        sock (socket): Socket d'écoute (après open()).
+        conns (dict): Socket → Connection des clients en cours.
+        served (int): Réponses envoyées en entier.
+        renders (int): Constructions de la page d'accueil (cache vide).
+    """
+
+    def __init__(self, net, mode, port=8080, store=None, max_clients=MAX_CLIENTS):
+        """
+        Args:
+            net: Objet réseau (AP ou STA) configuré.
+            mode (str): Mode réseau ("AP" ou "STA").
+            port (int): Port d'écoute.
+            store (SegmentStore, optionnel): Stockage segmenté, active /range.
+            max_clients (int): Connexions traitées simultanément.
+        """
+        self.net = net
+        self.mode = mode
+        self.port = port
+        self.store = store
+        self.max_clients = max_clients
+        self.sock = None
+        self.poller = None
+        self.conns = {}
+        self._socks = {}
+        self._accepting = True
+        self.ip = None
+        self.served = 0
+        self.renders = 0
+        self._files = None
+        self._page = None
+        # même objet pour s'abonner et se désabonner (méthode liée)
+        self._listener = self.invalidate
+
+    def open(self):
+        """
+        Ouvre la socket d'écoute.
+
+        Returns:
+            bool: False si le port n'a pas pu être réservé.
+        """
+        addr = socket.getaddrinfo("0.0.0.0", self.port)[0][-1]
+        s = socket.socket()
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
-            cl, addr = s.accept()
-            request = cl.recv(1024).decode()
-        except Exception:
-            continue
+            s.bind(addr)
+        except OSError as e:
+            print("Erreur bind port " + str(self.port) + " :", e)
+            s.close()
+            return False
+        s.listen(LISTEN_BACKLOG)
+        s.setblocking(False)
+        self.sock = s
+        self.poller = select.poll()
+        self._register(s, select.POLLIN)
+        self.ip = self.net.ifconfig()[0]
+        self.invalidate()
+        storage_events.add_listener(self._listener)
+        print("Serveur web actif sur http://" + self.ip + ":" + str(self.port))
+        return True
 
-        print("Client connecté depuis", addr)
-        if not request:
-            cl.close()
-            continue
-        request_line = request.split('\r\n')[0]   # ex: "GET /stop HTTP/1.1"
+    def invalidate(self, event=None, filename=None):
+        """
+        Vide le cache de la liste des fichiers et de la page d'accueil
+        (abonné de storage_events).
 
-        # --- STOP via URL ---
-        if request_line.startswith("GET /stop"):
-            cl.send("HTTP/1.0 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n".encode())
-            cl.send("<html><body><h1>Serveur arrêté</h1></body></html>".encode())
-            stop_server_flag = True
-            cl.close()
-            break
+        Args:
+            event (str, optionnel): Évènement de stockage.
+            filename (str, optionnel): Fichier concerné ; seuls les
+                .json / .jsonl changent la liste.
+        """
+        if filename is None or filename.endswith('.json') or filename.endswith('.jsonl'):
+            self._files = None
+            self._page = None
 
-        # --- REDEMARRER via URL ---
-        if request_line.startswith("GET /restart"):
-            cl.send("HTTP/1.0 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n".encode())
-            cl.send("<html><body><h1>Redémarrage...</h1></body></html>".encode())
-            cl.close()
-            machine.reset() #Redémarre l'ESP
-            break
+    def files(self):
+        """
+        Returns:
+            list: Fichiers téléchargeables (.json, .jsonl), depuis le cache.
+        """
+        if self._files is None:
+            self._files = [f for f in os.listdir() if f.endswith('.json') or f.endswith('.jsonl')]
+        return self._files
 
+    def page(self):
+        """
+        Returns:
+            bytes: Réponse complète de la page d'accueil (en-têtes et
+                HTML encodés), depuis le cache.
+        """
+        if self._page is None:
+            self._page = self._render()
+            self.renders += 1
+        return self._page
+
+    def _render(self):
+        """
+        Construit la page d'accueil.
+        """
         # --- Génération des liens fichiers ---
-        files = [f for f in os.listdir() if f.endswith('.json')]
         file_links = ''.join(
             '<li><a href="/download?file=' + f + '">Télécharger ' + f + '</a></li>'
-            for f in files
+            for f in self.files()
         )
 
-        # --- Téléchargement ---
-        if "/download?file=" in request:
-            filename = request.split("/download?file=")[1].split(" ")[0]
-            if filename in files:
-                try:
-                    with open(filename,"r", encoding="utf-8") as fp:
-                        content = fp.read()
-                    header = "HTTP/1.0 200 OK\r\nContent-Type: application/json; charset=utf-8\r\n\r\n"
-                    cl.send(header.encode())
-                    cl.send(content.encode("utf-8"))
-                except Exception as e:
-                    cl.send("HTTP/1.0 500 ERROR\r\n\r\nErreur lecture fichier.".encode())
-            else:
-                cl.send("HTTP/1.0 404 NOT FOUND\r\n\r\nFichier non trouvé.".encode())
-            cl.close()
-            continue
-
         # --- HTML (version allégée pour ESP8266 avec boutons STOP et REDEMARRER) ---
         html = (
             "<html><body>"
-            "<h1>ESP8266 " + mode + "</h1>"
-            "<p>IP : " + ip + "</p>"
+            "<h1>ESP8266 " + self.mode + "</h1>"
+            "<p>IP : " + self.ip + "</p>"
             "<h3>Fichiers :</h3><ul>"
             + file_links +
             "</ul>"
@@ -164,7 +533,219 @@ def start_server(net, mode, port=8080):
         )
 
         response = "HTTP/1.0 200 OK\r\nContent-Type: text/html; charset=utf8\r\n\r\n" + html
-        cl.send(response.encode())
-        cl.close()
-    print("Arret du serveur.")
-    s.close()
+        return response.encode()
+
+    def _register(self, sock, flags):
+        """
+        Surveille une socket (poll() rend un descripteur sous CPython,
+        l'objet socket sous MicroPython).
+        """
+        self.poller.register(sock, flags)
+        fileno = getattr(sock, "fileno", None)
+        if fileno is not None:
+            self._socks[fileno()] = sock
+
+    def _drop(self, conn):
+        """
+        Ferme une connexion et libère sa place.
+        """
+        self.poller.unregister(conn.sock)
+        self._socks.pop(getattr(conn.sock, "fileno", lambda: None)(), None)
+        self.conns.pop(conn.sock, None)
+        conn.close()
+        if not self._accepting:
+            self._accepting = True
+            self.poller.modify(self.sock, select.POLLIN)
+
+    def _accept(self, now):
+        """
+        Accepte un client en attente.
+        """
+        try:
+            cl, addr = self.sock.accept()
+        except OSError:
+            return
+        print("Client connecté depuis", addr)
+        cl.setblocking(False)
+        self.conns[cl] = Connection(cl, addr, now)
+        self._register(cl, select.POLLIN)
+        if len(self.conns) >= self.max_clients:
+            # plus de place : les suivants attendent dans la file de listen()
+            self._accepting = False
+            self.poller.modify(self.sock, 0)
+
+    def _write(self, conn):
+        """
+        Fait avancer l'envoi d'une réponse ; ferme la connexion à la fin.
+        """
+        try:
+            done = conn.on_writable()
+        except Exception as e:
+            # client parti, ou erreur de lecture du corps en cours d'envoi
+            print("Envoi interrompu :", e)
+            self._drop(conn)
+            return
+        if done:
+            self.served += 1
+            self._drop(conn)
+            if conn.after is not None:
+                conn.after()
+
+    def poll(self, timeout_ms=1000):
+        """
+        Traite un tour d'événements (connexions, lectures, envois).
+
+        Args:
+            timeout_ms (int): Attente maximale d'un événement (0 : aucune).
+
+        Returns:
+            int: Nombre d'événements traités.
+        """
+        events = self.poller.poll(timeout_ms)
+        now = ticks_ms()
+        for item in events:
+            # MicroPython : les tuples peuvent compter plus de 2 éléments
+            obj, ev = item[0], item[1]
+            sock = self._socks.get(obj, obj)
+            if sock is self.sock:
+                self._accept(now)
+                continue
+            conn = self.conns.get(sock)
+            if conn is None:
+                continue
+            conn.last = now
+            if conn.state == READING and ev & (select.POLLIN | select.POLLHUP):
+                request = conn.on_readable()
+                if conn.state == CLOSED:
+                    self._drop(conn)
+                elif request is not None:
+                    try:
+                        self.handle(conn, request)
+                    except Exception as e:
+                        # une requête en erreur ne doit pas arrêter le serveur
+                        print("Erreur de traitement de requête :", e)
+                        conn.respond(b"HTTP/1.0 500 INTERNAL SERVER ERROR\r\n\r\n")
+                    self.poller.modify(sock, select.POLLOUT)
+                    # socket presque toujours prête : premier bloc tout de suite
+                    self._write(conn)
+            elif conn.state == WRITING and ev & select.POLLOUT:
+                self._write(conn)
+            elif ev & (select.POLLERR | select.POLLHUP):
+                self._drop(conn)
+        for conn in list(self.conns.values()):
+            if ticks_diff(now, conn.last) > CLIENT_TIMEOUT_MS:
+                print("Client inactif fermé :", conn.addr)
+                self._drop(conn)
+        return len(events)
+
+    def serve(self):
+        """
+        Boucle jusqu'à ce que stop_server_flag soit True, puis ferme tout.
+        """
+        try:
+            while not stop_server_flag:
+                self.poll()
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Ferme les connexions en cours et la socket d'écoute.
+        """
+        for conn in list(self.conns.values()):
+            self._drop(conn)
+        if self.sock is not None:
+            print("Arret du serveur.")
+            storage_events.remove_listener(self._listener)
+            self.sock.close()
+            self.sock = None
+
+    def _restart(self):
+        """
+        Redémarre l'ESP une fois la réponse envoyée.
+        """
+        global stop_server_flag
+        buffered_writer.flush_all() # tampons (logs, mesures) sur la flash
+        stop_server_flag = True
+        machine.reset() #Redémarre l'ESP
+
+    def handle(self, conn, request):
+        """
+        Prépare la réponse à une requête.
+
+        Args:
+            conn (Connection): Connexion cliente.
+            request (str): Requête reçue.
+        """
+        global stop_server_flag
+        request_line = request.split('\r\n')[0]   # ex: "GET /stop HTTP/1.1"
+
+        # --- STOP via URL ---
+        if request_line.startswith("GET /stop"):
+            conn.respond(("HTTP/1.0 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n"
+                          "<html><body><h1>Serveur arrêté</h1></body></html>").encode())
+            stop_server_flag = True
+            return
+
+        # --- REDEMARRER via URL ---
+        if request_line.startswith("GET /restart"):
+            conn.respond(("HTTP/1.0 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n"
+                          "<html><body><h1>Redémarrage...</h1></body></html>").encode())
+            conn.after = self._restart
+            return
+
+        # --- Plage de mesures (segments concernés uniquement) ---
+        if self.store is not None and request_line.startswith("GET /range"):
+            try:
+                serve_range(conn, self.store, request_line)
+            except Exception:
+                conn.respond("HTTP/1.0 500 ERROR\r\n\r\nErreur lecture mesures.".encode())
+            return
+
+        # --- Téléchargement ---
+        if "/download?file=" in request_line:
+            filename = request_line.split("/download?file=")[1].split(" ")[0]
+            if filename in self.files():
+                # flux par blocs : jamais le fichier entier en mémoire
+                serve_download(conn, filename, header_value(request, "Range"))
+            else:
+                conn.respond("HTTP/1.0 404 NOT FOUND\r\n\r\nFichier non trouvé.".encode())
+            return
+
+        # --- Page d'accueil, déjà encodée ---
+        conn.respond(self.page())
+
+def start_server(net, mode, port=8080, store=None):    
+    """
+    Démarre un serveur HTTP minimaliste sur l'ESP (bloquant).
+
+    Args:
+        net: Objet réseau (AP ou STA) configuré.
+        mode (str): Mode réseau ("AP" ou "STA").
+        port (int): Port d'écoute (par défaut 8080).
+        store (SegmentStore, optionnel): Stockage segmenté, active /range.
+
+    Fonctionnalités :
+    - Affiche l'IP et le mode.
+    - Gère les requêtes GET pour :
+        /stop      → Arrêter le serveur
+        /restart   → Redémarrer l'ESP
+        /download?file=xxx.json → Télécharger un fichier JSON (ou journal .jsonl)
+        /range?from=t0&to=t1    → Mesures d'une plage de temps (si store)
+    - Génère une page HTML avec :
+        - IP et mode
+        - Liste des fichiers JSON disponibles
+        - Boutons STOP et REDEMARRER
+
+    Boucle :
+    - Sert les clients (plusieurs à la fois, voir WebServer) jusqu'à ce
+      que stop_server_flag soit True.
+    """
+
+    global stop_server_flag
+    stop_server_flag = False #Réinitialise à chaque lancement
+
+    server = WebServer(net, mode, port, store)
+    if not server.open():
+        return
+    server.serve()
@@ -0,0 +1,282 @@
+# src/payload_codec.py
+"""
+payload_codec.py
+Encodages compacts des messages MQTT (alternative à JSON).
+
+Rôle :
+- "msgpack" : encodeur MessagePack minimal en Python pur (nil, booléens,
+  entiers, réels 32 bits, textes, octets, listes, dictionnaires).
+  Même structure que le JSON, 30 à 40 % d'octets en moins.
+- "struct" : disposition binaire fixe déduite de la configuration des
+  capteurs (StructLayout). Les clés ne sont pas transmises : seules les
+  valeurs, à position et taille fixes.
+- "json" : comportement historique (texte lisible).
+
+Message groupé "struct" (little-endian) :
+    en-tête  0xC1 | id_disposition (H) | t0 (I) | nombre_de_lignes (B)
+    ligne    dt (H) | valeurs selon StructLayout.fmt
+0xC1 n'est jamais le premier octet d'un message JSON ou MessagePack :
+le décodeur côté PC (host/mqtt_decode.py) reconnaît ainsi le format.
+La disposition est publiée (retenue) sur <topic>/layout au format JSON.
+
+Valeurs absentes en "struct" : NaN (réels), 0xFFFF (analogique),
+0xFF (digital). Au plus MAX_ROWS lignes par message, et un dt entre 0
+et MAX_DT secondes (MQTTHandler clôt le lot sinon).
+
+Utilisation :
+    codec = make_codec("msgpack")
+    payload = codec.encode({"t0": 1700000000, "k": ["t"], "s": [[0, 21.5]]})
+"""
+import json
+import struct
+try:
+    from ubinascii import crc32  # MicroPython
+except ImportError:
+    from binascii import crc32
+
+STRUCT_MAGIC = 0xC1
+_HEADER = "<BHIB"
+_ROW = "H"
+# bornes des champs nombre_de_lignes (B) et dt (H)
+MAX_ROWS = 0xFF
+MAX_DT = 0xFFFF
+
+# format struct et valeur « absente » par type de capteur
+FIELD_FORMATS = {
+    "analog": ("H", 0xFFFF),
+    "digital": ("B", 0xFF),
+}
+# sorties des capteurs à valeurs multiples (DHT22) : réels 32 bits
+SERIES_FORMAT = ("f", float("nan"))
+
+# ==================== MessagePack ====================
+
+def pack(obj, out=None):
+    """
+    Encode un objet en MessagePack.
+
+    Les réels sont encodés sur 32 bits (7 chiffres significatifs,
+    largement assez pour des mesures arrondies au centième).
+
+    Args:
+        obj: None, bool, int, float, str, bytes, list, tuple ou dict.
+        out (bytearray, optionnel): Tampon de sortie (créé si absent).
+
+    Returns:
+        bytearray: Message encodé.
+
+    Raises:
+        TypeError: Si un type n'est pas pris en charge.
+    """
+    if out is None:
+        out = bytearray()
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True:
+        out.append(0xC3)
+    elif obj is False:
+        out.append(0xC2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        out += struct.pack(">Bf", 0xCA, obj)
+    elif isinstance(obj, str):
+        data = obj.encode()
+        _pack_head(len(data), out, 0xA0, 32, 0xD9, 0xDA)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        _pack_head(len(obj), out, None, 0, 0xC4, 0xC5)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        _pack_head(len(obj), out, 0x90, 16, None, 0xDC)
+        for item in obj:
+            pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_head(len(obj), out, 0x80, 16, None, 0xDE)
+        for key, value in obj.items():
+            pack(key, out)
+            pack(value, out)
+    else:
+        raise TypeError("type non pris en charge : " + str(type(obj)))
+    return out
+
+def _pack_head(n, out, fix, fix_max, code8, code16):
+    """
+    Écrit l'en-tête de longueur d'un texte, d'octets, d'une liste ou d'un dict.
+    """
+    if fix is not None and n < fix_max:
+        out.append(fix | n)
+    elif code8 is not None and n < 0x100:
+        out += struct.pack(">BB", code8, n)
+    elif n < 0x10000:
+        out += struct.pack(">BH", code16, n)
+    else:
+        out += struct.pack(">BI", code16 + 1, n)
+
+def _pack_int(n, out):
+    """
+    Écrit un entier dans la plus petite représentation MessagePack.
+    """
+    if 0 <= n < 0x80:
+        out.append(n)
+    elif -32 <= n < 0:
+        out.append(n & 0xFF)
+    elif 0 <= n < 0x100:
+        out += struct.pack(">BB", 0xCC, n)
+    elif 0 <= n < 0x10000:
+        out += struct.pack(">BH", 0xCD, n)
+    elif 0 <= n < 0x100000000:
+        out += struct.pack(">BI", 0xCE, n)
+    elif -0x80 <= n < 0:
+        out += struct.pack(">Bb", 0xD0, n)
+    elif -0x8000 <= n < 0:
+        out += struct.pack(">Bh", 0xD1, n)
+    elif -0x80000000 <= n < 0:
+        out += struct.pack(">Bi", 0xD2, n)
+    elif n > 0:
+        out += struct.pack(">BQ", 0xCF, n)
+    else:
+        out += struct.pack(">Bq", 0xD3, n)
+
+# ==================== Disposition fixe ====================
+
+class StructLayout:
+    """
+    Disposition binaire fixe des valeurs d'un cycle.
+
+    Attributes:
+        keys (list): Clé de chaque valeur (comme PublishPlan.keys).
+        fmt (str): Format struct d'une ligne (sans le préfixe "<").
+        id (int): Empreinte (16 bits) des clés et du format.
+    """
+
+    def __init__(self, keys, fields):
+        """
+        Args:
+            keys (list): Clés des valeurs, dans l'ordre.
+            fields (list): Tuples (format_struct, valeur_absente) par clé.
+        """
+        self.keys = list(keys)
+        self._missing = [m for _, m in fields]
+        self.fmt = "".join(f for f, _ in fields)
+        self._row = "<" + _ROW + self.fmt
+        self.row_size = struct.calcsize(self._row)
+        self.id = crc32((self.fmt + "," + ",".join(self.keys)).encode()) & 0xFFFF
+
+    @classmethod
+    def from_sensors(cls, sensors, series_keys):
+        """
+        Déduit la disposition de la configuration des capteurs.
+
+        Les sorties non numériques (statut DHT22) ne sont pas transmises.
+
+        Args:
+            sensors (list): Capteurs de config.json (name, type, pin).
+            series_keys (dict): Type → clés numériques (Techniques.SERIES_KEYS).
+
+        Returns:
+            StructLayout: Disposition.
+
+        Raises:
+            ValueError: Si un type de capteur n'a pas de format connu.
+        """
+        keys = []
+        fields = []
+        for sensor in sensors:
+            kind = sensor["type"]
+            if kind in series_keys:
+                for key in series_keys[kind]:
+                    keys.append(key)
+                    fields.append(SERIES_FORMAT)
+            elif kind in FIELD_FORMATS:
+                keys.append(sensor["name"])
+                fields.append(FIELD_FORMATS[kind])
+            else:
+                raise ValueError("Type de capteur sans format binaire : " + kind)
+        return cls(keys, fields)
+
+    def describe(self):
+        """
+        Returns:
+            str: Description JSON publiée pour le décodeur côté PC.
+        """
+        return json.dumps({"id": self.id, "fmt": self.fmt, "k": self.keys})
+
+    def encode_batch(self, t0, rows):
+        """
+        Encode des cycles de mesures.
+
+        Args:
+            t0 (int): Heure Unix du premier cycle.
+            rows (list): Tuples (écart_en_secondes, {clé: valeur}).
+
+        Returns:
+            bytearray: Message groupé binaire.
+        """
+        out = bytearray(struct.calcsize(_HEADER) + self.row_size * len(rows))
+        struct.pack_into(_HEADER, out, 0, STRUCT_MAGIC, self.id, t0, len(rows))
+        pos = struct.calcsize(_HEADER)
+        for dt, found in rows:
+            values = [dt]
+            for key, missing in zip(self.keys, self._missing):
+                value = found.get(key)
+                values.append(missing if value is None or isinstance(value, str) else value)
+            struct.pack_into(self._row, out, pos, *values)
+            pos += self.row_size
+        return out
+
+# ==================== Choix du codec ====================
+
+class JsonCodec:
+    """
+    Encodage JSON (historique).
+    """
+    name = "json"
+
+    def encode(self, obj):
+        """
+        Returns:
+            str: Objet encodé en JSON.
+        """
+        return json.dumps(obj)
+
+class MsgpackCodec:
+    """
+    Encodage MessagePack (même structure que JSON).
+    """
+    name = "msgpack"
+
+    def encode(self, obj):
+        """
+        Returns:
+            bytearray: Objet encodé en MessagePack.
+        """
+        return pack(obj)
+
+CODECS = {
+    "json": JsonCodec,
+    "msgpack": MsgpackCodec,
+}
+
+def make_codec(name):
+    """
+    Retourne le codec d'objets correspondant à un nom de configuration.
+
+    "struct" ne concerne que les messages groupés (voir StructLayout) ;
+    les autres objets sont alors encodés en MessagePack.
+
+    Args:
+        name (str): "json", "msgpack" ou "struct".
+
+    Returns:
+        JsonCodec | MsgpackCodec: Codec.
+
+    Raises:
+        ValueError: Si le nom est inconnu.
+    """
+    if name == "struct":
+        return MsgpackCodec()
+    cls = CODECS.get(name)
+    if cls is None:
+        raise ValueError("Codec inconnu : " + str(name))
+    return cls()
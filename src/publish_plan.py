@@ -0,0 +1,352 @@
+# src/publish_plan.py
+"""
+publish_plan.py
+Plan de publication MQTT compilé une seule fois à partir de la config.
+
+Rôle :
+- Résoudre au démarrage, pour chaque capteur, la fonction de lecture,
+  la broche et les topics (déjà encodés en bytes).
+- Lire les capteurs dans des cases préallouées (pas de dictionnaires
+  reconstruits à chaque cycle pour les capteurs simples).
+- Formater les nombres directement dans un tampon réutilisé et publier
+  des vues (memoryview) précalculées sur ce tampon : le chemin de
+  publication courant n'alloue presque rien sur le tas.
+- Bande morte par capteur (optionnelle) : une valeur n'est publiée que
+  si elle s'écarte de plus de `deadband` de la dernière valeur publiée,
+  ou si elle n'a pas été publiée depuis `heartbeat` secondes.
+
+Formatage :
+    entier  → "123"
+    réel    → arrondi à `decimals` décimales, zéros finaux retirés
+              (21.5 → "21.5", 21.0 → "21.0", 0.1 + 0.2 → "0.3")
+    texte   → encodé tel quel (cas rare : statut DHT22 en erreur)
+
+Bande morte (config.json, par capteur) :
+    {"name": "T", "type": "DHT22", "pin": 4,
+     "deadband": {"temperature": 0.2, "humidity": 1}, "heartbeat": 900}
+    {"name": "porte", "type": "digital", "pin": 5, "deadband": 0}
+    deadband   écart minimal (nombre, ou dictionnaire par clé pour les
+               capteurs à valeurs multiples) ; 0 = publication aux
+               seuls changements. Les sorties texte (statut) sont
+               publiées à chaque changement.
+    heartbeat  silence maximal en secondes (par défaut 3600).
+
+Utilisation :
+    plan = PublishPlan(tech, "maison/sonde1/")
+    plan.read()
+    plan.publish(client.publish)
+"""
+import time
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+# sorties supplémentaires non numériques publiées pour compatibilité
+# ("message" : raison d'une erreur de lecture, absente si la lecture réussit)
+EXTRA_KEYS = {
+    "DHT22": ("status", "message")
+}
+
+HEARTBEAT_S = 3600
+
+_DIGITS = b"0123456789"
+# au-delà, un réel mis à l'échelle n'est plus un entier exact (2**53)
+_MAX_SCALED = 1e15
+
+def format_value(buf, value, decimals=2):
+    """
+    Écrit la représentation texte d'un nombre dans un tampon.
+
+    Les réels non finis (nan, inf) ou trop grands pour la mise à l'échelle
+    entière sont écrits tels que str() les représente (1e+30, inf...).
+
+    Args:
+        buf (bytearray): Tampon de sortie (24 octets suffisent).
+        value (int | float): Valeur à formater.
+        decimals (int): Décimales maximales pour un réel.
+
+    Returns:
+        int: Nombre d'octets écrits au début de buf.
+    """
+    if isinstance(value, float) and not -_MAX_SCALED < value * 10 ** decimals < _MAX_SCALED:
+        # cas rare : l'allocation de str() est acceptable (24 octets au plus)
+        text = str(value).encode()
+        buf[:len(text)] = text
+        return len(text)
+    pos = 0
+    if value < 0:
+        buf[0] = 45  # "-"
+        pos = 1
+        value = -value
+    if isinstance(value, float):
+        scale = 10 ** decimals
+        scaled = int(value * scale + 0.5)
+        whole = scaled // scale
+        frac = scaled - whole * scale
+        pos = _write_int(buf, pos, whole)
+        buf[pos] = 46  # "."
+        pos += 1
+        if frac == 0:
+            buf[pos] = 48  # "0"
+            return pos + 1
+        # décimales avec zéros de tête, sans zéros finaux
+        while frac % 10 == 0:
+            frac //= 10
+            decimals -= 1
+        start = pos
+        pos += decimals
+        for i in range(pos - 1, start - 1, -1):
+            buf[i] = _DIGITS[frac % 10]
+            frac //= 10
+        return pos
+    return _write_int(buf, pos, value)
+
+def _write_int(buf, pos, n):
+    """
+    Écrit un entier positif en base 10 à partir de pos.
+
+    Returns:
+        int: Position après le dernier chiffre.
+    """
+    if n == 0:
+        buf[pos] = 48
+        return pos + 1
+    end = pos
+    m = n
+    while m:
+        m //= 10
+        end += 1
+    i = end - 1
+    while n:
+        buf[i] = _DIGITS[n % 10]
+        n //= 10
+        i -= 1
+    return end
+
+class PublishPlan:
+    """
+    Lecture et publication des capteurs précompilées.
+
+    Attributes:
+        readers (list): [fonction_lecture, broche, index_première_sortie, clés]
+                        par capteur.
+        sensors (list): Capteur de config.json de chaque lecteur.
+        readings (list): Dernière lecture brute de chaque capteur (avant
+                         bande morte, voir records()).
+        keys (list): Clé publiée pour chaque sortie (nom du capteur ou clé DHT22).
+        topics (list): Topic encodé (bytes) de chaque sortie.
+        slots (list): Dernière valeur lue de chaque sortie (None = absente
+                      ou retenue par la bande morte).
+        position (int): Index de la prochaine sortie à publier
+                        (permet de reprendre après une erreur).
+        checked (int): Valeurs lues soumises à une bande morte.
+        suppressed (int): Valeurs non publiées grâce à la bande morte.
+    """
+
+    def __init__(self, tech, topic, decimals=2):
+        """
+        Compile le plan à partir des capteurs de Techniques.
+
+        Args:
+            tech (Techniques): Capteurs configurés.
+            topic (str): Préfixe des topics (mqtt.topic).
+            decimals (int): Décimales publiées pour les réels.
+
+        Raises:
+            ValueError: Si un type de capteur est inconnu.
+        """
+        self.decimals = decimals
+        self.readers = []
+        self.sensors = []
+        self.keys = []
+        self.topics = []
+        # [index, écart, heartbeat_ms] des sorties soumises à une bande morte
+        self._deadbands = []
+        for reader, pin, sensor in tech.compile():
+            keys = tech.SERIES_KEYS.get(sensor["type"])
+            first = len(self.keys)
+            self.sensors.append(sensor)
+            if keys is None:
+                # capteur simple : publié sous son nom
+                self.readers.append([reader, pin, first, None])
+                self.keys.append(sensor["name"])
+            else:
+                keys = keys + EXTRA_KEYS.get(sensor["type"], ())
+                self.readers.append([reader, pin, first, keys])
+                self.keys.extend(keys)
+            self._add_deadbands(sensor, first)
+        for key in self.keys:
+            self.topics.append((topic + key).encode())
+        self.slots = [None] * len(self.keys)
+        self.readings = [None] * len(self.readers)
+        self.position = 0
+        self.checked = 0
+        self.suppressed = 0
+        # dernière valeur publiée et instant de publication, par sortie
+        self._sent = [None] * len(self.keys)
+        self._sent_at = [0] * len(self.keys)
+        self._buf = bytearray(24)
+        view = memoryview(self._buf)
+        # une vue par longueur possible : aucune vue créée en publication
+        self._views = [view[:n] for n in range(len(self._buf) + 1)]
+
+    def _add_deadbands(self, sensor, first):
+        """
+        Enregistre la bande morte configurée pour les sorties d'un capteur.
+
+        Args:
+            sensor (dict): Capteur de config.json.
+            first (int): Index de sa première sortie.
+        """
+        deadband = sensor.get("deadband")
+        if deadband is None:
+            return
+        heartbeat_ms = sensor.get("heartbeat", HEARTBEAT_S) * 1000
+        for i in range(first, len(self.keys)):
+            if isinstance(deadband, dict):
+                # sortie absente du dictionnaire : publication aux changements
+                band = deadband.get(self.keys[i], 0)
+            else:
+                band = deadband
+            self._deadbands.append([i, band, heartbeat_ms])
+
+    def read(self):
+        """
+        Lit tous les capteurs et range les valeurs dans les cases du plan.
+
+        Les valeurs retenues par la bande morte sont remplacées par None
+        (non publiées) et comptées dans self.suppressed.
+        """
+        slots = self.slots
+        readings = self.readings
+        j = 0
+        for reader, pin, first, keys in self.readers:
+            value = reader(pin)
+            readings[j] = value
+            j += 1
+            if keys is None:
+                slots[first] = value
+            else:
+                is_dict = isinstance(value, dict)
+                i = first
+                for key in keys:
+                    slots[i] = value.get(key) if is_dict else None
+                    i += 1
+        self.position = 0
+        if self._deadbands:
+            self._apply_deadbands()
+
+    def _apply_deadbands(self):
+        """
+        Retire des cases les valeurs trop proches de la dernière publiée.
+        """
+        slots = self.slots
+        sent = self._sent
+        now = ticks_ms()
+        for i, band, heartbeat_ms in self._deadbands:
+            value = slots[i]
+            if value is None:
+                continue
+            self.checked += 1
+            last = sent[i]
+            if last is not None and ticks_diff(now, self._sent_at[i]) < heartbeat_ms:
+                if isinstance(value, str) or isinstance(last, str):
+                    moved = value != last
+                else:
+                    moved = abs(value - last) > band
+                if not moved:
+                    slots[i] = None
+                    self.suppressed += 1
+                    continue
+            sent[i] = value
+            self._sent_at[i] = now
+
+    def payload(self, i):
+        """
+        Formate la valeur d'une sortie.
+
+        Args:
+            i (int): Index de la sortie.
+
+        Returns:
+            memoryview | bytes | None: Payload prêt à publier
+                (vue sur le tampon partagé, valable jusqu'au prochain appel).
+        """
+        value = self.slots[i]
+        if value is None:
+            return None
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return self._views[format_value(self._buf, value, self.decimals)]
+        return str(value).encode()
+
+    def publish(self, publish_fn):
+        """
+        Publie les valeurs lues, à partir de self.position.
+
+        En cas d'exception, self.position désigne la sortie qui a échoué
+        (voir messages() pour mettre le reste en file).
+
+        Args:
+            publish_fn (callable): publish(topic_bytes, payload).
+        """
+        topics = self.topics
+        n = len(topics)
+        while self.position < n:
+            payload = self.payload(self.position)
+            if payload is not None:
+                publish_fn(topics[self.position], payload)
+            self.position += 1
+
+    async def publish_async(self, publish):
+        """
+        Variante asynchrone de publish() (voir mqtt_async).
+
+        Args:
+            publish (callable): Coroutine publish(topic_bytes, payload).
+        """
+        topics = self.topics
+        n = len(topics)
+        while self.position < n:
+            payload = self.payload(self.position)
+            if payload is not None:
+                await publish(topics[self.position], payload)
+            self.position += 1
+
+    def values(self):
+        """
+        Returns:
+            list: Tuples (clé, valeur) des sorties présentes (mode "batch").
+        """
+        return [(self.keys[i], v) for i, v in enumerate(self.slots) if v is not None]
+
+    def records(self):
+        """
+        Lectures du dernier cycle au format de Techniques.read_all(),
+        pour l'enregistrement (voir Techniques.save_measure).
+
+        Returns:
+            list: Dictionnaires {"name", "type", "value"}.
+        """
+        return [{"name": s["name"], "type": s["type"], "value": v}
+                for s, v in zip(self.sensors, self.readings)]
+
+    def messages(self, start=0):
+        """
+        Construit les messages texte (chemin d'erreur : mise en file).
+
+        Args:
+            start (int): Première sortie à inclure.
+
+        Returns:
+            list: Tuples (topic, payload) en str.
+        """
+        messages = []
+        for i in range(start, len(self.topics)):
+            payload = self.payload(i)
+            if payload is not None:
+                messages.append((self.topics[i].decode(), bytes(payload).decode()))
+        return messages
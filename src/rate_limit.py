@@ -0,0 +1,259 @@
+# src/rate_limit.py
+"""
+rate_limit.py
+Limitation du débit de publication MQTT (seau à jetons).
+
+Rôle :
+- Borner le nombre de messages et d'octets envoyés par seconde, pour ne
+  saturer ni le broker ni le tampon d'émission TCP de l'ESP (cadence de
+  mesure élevée, vidage d'une file accumulée hors connexion).
+- Donner la priorité aux mesures en direct : elles attendent leurs jetons,
+  alors que le vidage de la file ne consomme que les jetons au-delà d'une
+  réserve. Il attend qu'ils se reconstituent dans la limite d'un budget
+  de temps par vidage (begin_drain), puis s'interrompt (reprise au cycle
+  suivant) : le débit de la file suit celui configuré.
+- Mesurer les attentes imposées (nombre, cumul, maximum).
+
+Seau à jetons :
+    Chaque seau se remplit de `rate` jetons par seconde, jusqu'à
+    `rate x burst_s` jetons. Un message consomme 1 jeton du seau
+    « messages » et len(topic) + len(payload) jetons du seau « octets ».
+    Un message plus gros que le seau n'attend que de le trouver plein :
+    le solde devient négatif et retarde les suivants d'autant.
+
+Utilisation :
+    limiter = RateLimiter(msgs_per_s=20, bytes_per_s=4096)
+    limiter.acquire(len(payload))            # direct : attend si besoin
+    limiter.begin_drain(5000)                # file : 5 s d'attente au plus
+    while limiter.try_acquire(len(payload)):
+        ...
+"""
+import time
+try:
+    ticks_ms = time.ticks_ms  # MicroPython
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    # fallback pour tests PC
+    ticks_ms = lambda: int(time.time() * 1000)
+    ticks_diff = lambda a, b: a - b
+
+async def sleep_ms_async(ms):
+    """
+    Attente asynchrone ; uasyncio n'est importé que par les utilisateurs
+    de acquire_async().
+    """
+    try:
+        import uasyncio as asyncio  # MicroPython
+    except ImportError:
+        import asyncio
+    await asyncio.sleep(ms / 1000)
+
+class TokenBucket:
+    """
+    Seau à jetons.
+
+    Attributes:
+        rate (float): Jetons ajoutés par seconde.
+        capacity (float): Jetons au plus dans le seau.
+        tokens (float): Jetons disponibles (négatif après un gros message).
+    """
+
+    def __init__(self, rate, burst_s=1):
+        """
+        Args:
+            rate (float): Jetons par seconde (> 0).
+            burst_s (float): Capacité du seau, en secondes de débit.
+        """
+        self.rate = rate
+        self.capacity = rate * burst_s
+        self.tokens = self.capacity
+        self._stamp = ticks_ms()
+
+    def _refill(self):
+        """
+        Ajoute les jetons accumulés depuis le dernier appel.
+        """
+        now = ticks_ms()
+        elapsed = ticks_diff(now, self._stamp)
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate / 1000)
+        self._stamp = now
+
+    def delay_ms(self, n=1):
+        """
+        Args:
+            n (float): Jetons demandés.
+
+        Returns:
+            int: Attente en millisecondes avant que n jetons soient
+                disponibles (0 si disponibles maintenant).
+        """
+        self._refill()
+        missing = min(n, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0
+        return int(missing * 1000 / self.rate) + 1
+
+    def take(self, n=1):
+        """
+        Consomme n jetons (le solde peut devenir négatif).
+        """
+        self._refill()
+        self.tokens -= n
+
+class RateLimiter:
+    """
+    Limiteur de débit en messages et en octets par seconde.
+
+    Attributes:
+        waits (int): Publications en direct qui ont dû attendre.
+        wait_ms (int): Cumul des attentes en millisecondes.
+        max_wait_ms (int): Plus longue attente.
+        deferred (int): Vidages de file interrompus faute de jetons.
+        drain_wait_ms (int): Cumul des attentes du vidage de la file.
+    """
+
+    def __init__(self, msgs_per_s=0, bytes_per_s=0, burst_s=1, reserve=0.5):
+        """
+        Args:
+            msgs_per_s (float): Messages par seconde (0 = illimité).
+            bytes_per_s (float): Octets par seconde (0 = illimité).
+            burst_s (float): Capacité des seaux, en secondes de débit.
+            reserve (float): Part de chaque seau laissée aux mesures en
+                direct par le vidage de la file (0 à 1).
+        """
+        self.buckets = []
+        if msgs_per_s:
+            self.buckets.append((TokenBucket(msgs_per_s, burst_s), False))
+        if bytes_per_s:
+            self.buckets.append((TokenBucket(bytes_per_s, burst_s), True))
+        self.reserve = reserve
+        self.waits = 0
+        self.wait_ms = 0
+        self.max_wait_ms = 0
+        self.deferred = 0
+        self.drain_wait_ms = 0
+        self._budget_ms = 0
+
+    def delay_ms(self, size):
+        """
+        Args:
+            size (int): Taille du message en octets.
+
+        Returns:
+            int: Attente nécessaire avant de pouvoir l'envoyer.
+        """
+        delay = 0
+        for bucket, per_byte in self.buckets:
+            delay = max(delay, bucket.delay_ms(size if per_byte else 1))
+        return delay
+
+    def _take(self, size):
+        """
+        Consomme les jetons d'un message dans chaque seau.
+        """
+        for bucket, per_byte in self.buckets:
+            bucket.take(size if per_byte else 1)
+
+    def _record(self, delay):
+        """
+        Comptabilise une attente imposée.
+        """
+        self.waits += 1
+        self.wait_ms += delay
+        if delay > self.max_wait_ms:
+            self.max_wait_ms = delay
+
+    def acquire(self, size):
+        """
+        Attend (bloquant) de pouvoir envoyer un message en direct.
+
+        Args:
+            size (int): Taille du message en octets.
+        """
+        delay = self.delay_ms(size)
+        if delay:
+            self._record(delay)
+            time.sleep(delay / 1000)
+        self._take(size)
+
+    async def acquire_async(self, size):
+        """
+        Variante asynchrone de acquire() (voir mqtt_async).
+        """
+        delay = self.delay_ms(size)
+        if delay:
+            self._record(delay)
+            await sleep_ms_async(delay)
+        self._take(size)
+
+    def begin_drain(self, budget_ms):
+        """
+        Ouvre un vidage de la file : ses messages pourront attendre leurs
+        jetons, au total au plus budget_ms.
+
+        Args:
+            budget_ms (int): Attente cumulée permise (0 : jamais d'attente).
+        """
+        self._budget_ms = budget_ms
+
+    def _drain_delay(self, size):
+        """
+        Returns:
+            int | None: Attente avant de pouvoir envoyer un message de la
+                file sans entamer la réserve, None si elle dépasse le
+                budget du vidage (compté comme vidage interrompu).
+        """
+        delay = 0
+        for bucket, per_byte in self.buckets:
+            n = size if per_byte else 1
+            delay = max(delay, bucket.delay_ms(n + bucket.capacity * self.reserve))
+        if delay > self._budget_ms:
+            self.deferred += 1
+            return None
+        self._budget_ms -= delay
+        self.drain_wait_ms += delay
+        return delay
+
+    def try_acquire(self, size):
+        """
+        Réserve des jetons pour un message de la file.
+
+        L'envoi ne doit pas entamer la réserve des mesures en direct ;
+        l'attente éventuelle est prise sur le budget de begin_drain().
+
+        Args:
+            size (int): Taille du message en octets.
+
+        Returns:
+            bool: True si le message peut être envoyé maintenant.
+        """
+        delay = self._drain_delay(size)
+        if delay is None:
+            return False
+        if delay:
+            time.sleep(delay / 1000)
+        self._take(size)
+        return True
+
+    async def try_acquire_async(self, size):
+        """
+        Variante asynchrone de try_acquire().
+        """
+        delay = self._drain_delay(size)
+        if delay is None:
+            return False
+        if delay:
+            await sleep_ms_async(delay)
+        self._take(size)
+        return True
+
+    def stats(self):
+        """
+        Returns:
+            dict: Statistiques d'attente (waits, wait_ms, max_wait_ms,
+                deferred, drain_wait_ms).
+        """
+        return {"waits": self.waits, "wait_ms": self.wait_ms,
+                "max_wait_ms": self.max_wait_ms, "deferred": self.deferred,
+                "drain_wait_ms": self.drain_wait_ms}
@@ -0,0 +1,161 @@
+# src/ring_store.py
+"""
+ring_store.py
+Stockage binaire circulaire de taille fixe pour les mesures (flash ESP).
+
+Rôle :
+- Préallouer un fichier de `capacity` enregistrements à la création.
+- Écrire chaque mesure sous forme d'une structure binaire fixe :
+  un seul seek + write, sans encodage JSON.
+- Écraser les enregistrements les plus anciens une fois le fichier plein :
+  l'occupation flash reste bornée quelle que soit la durée de la sonde.
+- Relire les mesures dans l'ordre chronologique.
+
+Format d'un enregistrement (14 octets, little-endian) :
+    seq (uint32)        numéro d'écriture croissant, 0 = case vide
+    timestamp (uint32)  secondes (time.time())
+    index (uint16)      index de la série (voir Techniques.series)
+    value (float32)     valeur mesurée
+
+Le numéro de séquence permet de retrouver la position d'écriture à
+l'ouverture sans fichier d'en-tête à mettre à jour.
+
+Utilisation :
+    store = RingStore("data.ring", capacity=4096)
+    store.append(1700000000, 0, 21.5)
+    for timestamp, index, value in store:
+        print(timestamp, index, value)
+"""
+import struct
+from journal import file_exists
+
+RECORD_FORMAT = "<IIHf"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RING_FILE = "data.ring"
+
+# Nombre d'enregistrements lus par bloc lors d'un parcours
+_READ_BATCH = 32
+
+class RingStore:
+    """
+    Fichier circulaire d'enregistrements binaires de taille fixe.
+
+    Attributes:
+        filename (str): Chemin du fichier.
+        capacity (int): Nombre maximal d'enregistrements conservés.
+        seq (int): Numéro de séquence du dernier enregistrement écrit.
+    """
+
+    def __init__(self, filename=RING_FILE, capacity=4096):
+        """
+        Ouvre (ou crée et préalloue) le fichier circulaire.
+
+        Args:
+            filename (str): Chemin du fichier (par défaut data.ring).
+            capacity (int): Nombre d'enregistrements (par défaut 4096, ~56 Ko).
+
+        Raises:
+            ValueError: Si la taille du fichier existant ne correspond pas
+                        à la capacité demandée.
+        """
+        self.filename = filename
+        self.capacity = capacity
+        self._record = bytearray(RECORD_SIZE)
+
+        if not file_exists(filename):
+            self._preallocate()
+        self._file = open(filename, "r+b")
+        self._file.seek(0, 2)
+        if self._file.tell() != capacity * RECORD_SIZE:
+            self._file.close()
+            raise ValueError("Taille de " + filename + " incompatible avec capacity")
+        self.seq = self._scan_last_seq()
+
+    def _preallocate(self):
+        """
+        Crée le fichier rempli de zéros (cases vides) par blocs.
+        """
+        block = bytes(RECORD_SIZE * _READ_BATCH)
+        remaining = self.capacity * RECORD_SIZE
+        with open(self.filename, "wb") as f:
+            while remaining > 0:
+                n = min(remaining, len(block))
+                f.write(block[:n])
+                remaining -= n
+
+    def _records(self, start_slot=0):
+        """
+        Parcourt les cases du fichier à partir de start_slot, en boucle.
+
+        Yields:
+            tuple: (seq, timestamp, index, value) pour chaque case.
+        """
+        buf = bytearray(RECORD_SIZE * _READ_BATCH)
+        slot = start_slot
+        remaining = self.capacity
+        while remaining > 0:
+            n = min(_READ_BATCH, remaining, self.capacity - slot)
+            self._file.seek(slot * RECORD_SIZE)
+            view = memoryview(buf)[:n * RECORD_SIZE]
+            self._file.readinto(view)
+            for i in range(n):
+                yield struct.unpack_from(RECORD_FORMAT, buf, i * RECORD_SIZE)
+            remaining -= n
+            slot = (slot + n) % self.capacity
+
+    def _scan_last_seq(self):
+        """
+        Retrouve le plus grand numéro de séquence présent.
+
+        Returns:
+            int: Dernier numéro écrit (0 si le fichier est vide).
+        """
+        last = 0
+        for record in self._records():
+            if record[0] > last:
+                last = record[0]
+        return last
+
+    def __len__(self):
+        """
+        Returns:
+            int: Nombre d'enregistrements actuellement conservés.
+        """
+        return min(self.seq, self.capacity)
+
+    def append(self, timestamp, index, value):
+        """
+        Écrit un enregistrement (un seek + un write).
+
+        Args:
+            timestamp (int | float): Horodatage en secondes.
+            index (int): Index de la série.
+            value (int | float): Valeur mesurée.
+        """
+        self.seq += 1
+        struct.pack_into(RECORD_FORMAT, self._record, 0,
+                         self.seq, int(timestamp), index, value)
+        self._file.seek(((self.seq - 1) % self.capacity) * RECORD_SIZE)
+        self._file.write(self._record)
+        self._file.flush()
+
+    def __iter__(self):
+        """
+        Parcourt les enregistrements du plus ancien au plus récent.
+
+        Yields:
+            tuple: (timestamp, index, value).
+        """
+        start = self.seq % self.capacity if self.seq >= self.capacity else 0
+        for seq, timestamp, index, value in self._records(start):
+            if seq:
+                yield timestamp, index, value
+
+    def close(self):
+        """
+        Ferme le fichier (les écritures sont déjà sur la flash).
+        """
+        try:
+            self._file.close()
+        except Exception:
+            pass
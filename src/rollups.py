@@ -0,0 +1,143 @@
+# src/rollups.py
+"""
+rollups.py
+Agrégats glissants (min / max / moyenne) par minute, heure et jour.
+
+Rôle :
+- Maintenir, pour chaque série et chaque niveau, un seul agrégat en cours
+  (mémoire O(1) par série et par niveau, quelle que soit la durée).
+- À la fermeture d'une tranche (minute, heure, jour), écrire un
+  enregistrement résumé dans le stockage du niveau correspondant.
+- Fournir des stockages par niveau avec des rétentions différentes :
+  mesures brutes conservées peu de temps, agrégats sur toute la saison.
+
+Enregistrement émis :
+    {"name": "T.temperature", "timestamp": debut_tranche,
+     "min": 18.2, "max": 19.0, "mean": 18.6, "count": 60}
+
+Utilisation :
+    stores = tier_stores()
+    tech.enable_rollups(stores)
+    tech.update_rollups(tech.read_all())
+    stores["hour"].read_range(t0, t1)
+"""
+from segment_store import SegmentStore
+
+# (nom du niveau, durée d'une tranche en secondes)
+TIERS = (
+    ("minute", 60),
+    ("hour", 3600),
+    ("day", 86400),
+)
+
+DAY = 86400
+
+def tier_stores(prefix="", raw_days=2, minute_days=14, max_bytes=100_000):
+    """
+    Crée les stockages segmentés des différents niveaux.
+
+    Args:
+        prefix (str): Préfixe de chemin commun (ex : "" ou "mesures/").
+        raw_days (int): Rétention des mesures brutes en jours.
+        minute_days (int): Rétention des agrégats minute en jours.
+        max_bytes (int): Quota de taille par niveau.
+
+    Returns:
+        dict: {"raw", "minute", "hour", "day"} → SegmentStore.
+    """
+    return {
+        "raw": SegmentStore(prefix + "data", span=DAY,
+                            max_bytes=max_bytes, max_age=raw_days * DAY),
+        "minute": SegmentStore(prefix + "roll_m", span=DAY,
+                               max_bytes=max_bytes, max_age=minute_days * DAY),
+        "hour": SegmentStore(prefix + "roll_h", span=30 * DAY, max_bytes=max_bytes),
+        "day": SegmentStore(prefix + "roll_d", span=365 * DAY, max_bytes=max_bytes),
+    }
+
+class Rollups:
+    """
+    Agrégateur incrémental multi-niveaux.
+
+    Attributes:
+        stores (dict): Nom de niveau → stockage (méthode append(records, timestamp)).
+        tiers (tuple): Niveaux (nom, durée) à calculer.
+    """
+
+    def __init__(self, stores, tiers=TIERS):
+        """
+        Args:
+            stores (dict): Stockages par niveau (voir tier_stores()).
+                           Les niveaux absents ne sont pas calculés.
+            tiers (tuple): Niveaux (nom, durée en secondes).
+        """
+        self.stores = stores
+        self.tiers = tuple(t for t in tiers if t[0] in stores)
+        # (niveau, série) → [debut, count, total, min, max]
+        self._current = {}
+
+    def add(self, timestamp, name, value):
+        """
+        Intègre une mesure dans les agrégats de tous les niveaux.
+
+        Args:
+            timestamp (int | float): Horodatage en secondes.
+            name (str): Nom de la série.
+            value (int | float): Valeur mesurée.
+        """
+        timestamp = int(timestamp)
+        for tier, period in self.tiers:
+            start = timestamp - timestamp % period
+            key = (tier, name)
+            agg = self._current.get(key)
+            if agg is not None and agg[0] != start:
+                self._emit(tier, name, agg)
+                agg = None
+            if agg is None:
+                self._current[key] = [start, 1, value, value, value]
+            else:
+                agg[1] += 1
+                agg[2] += value
+                if value < agg[3]:
+                    agg[3] = value
+                if value > agg[4]:
+                    agg[4] = value
+
+    def current(self, tier, name):
+        """
+        Retourne l'agrégat de la tranche en cours (non encore écrit).
+
+        Args:
+            tier (str): Niveau ("minute", "hour", "day").
+            name (str): Nom de la série.
+
+        Returns:
+            dict | None: Résumé de la tranche en cours.
+        """
+        agg = self._current.get((tier, name))
+        return None if agg is None else self._record(name, agg)
+
+    def _record(self, name, agg):
+        """
+        Returns:
+            dict: Enregistrement résumé d'un agrégat.
+        """
+        start, count, total, vmin, vmax = agg
+        return {"name": name, "timestamp": start, "min": vmin, "max": vmax,
+                "mean": total / count, "count": count}
+
+    def _emit(self, tier, name, agg):
+        """
+        Écrit un agrégat terminé dans le stockage de son niveau.
+        """
+        self.stores[tier].append([self._record(name, agg)], agg[0])
+
+    def flush(self):
+        """
+        Écrit les agrégats en cours (tranches incomplètes) et les oublie.
+
+        À appeler avant un arrêt volontaire : la tranche suivante repart
+        de zéro.
+        """
+        for (tier, name), agg in list(self._current.items()):
+            self._emit(tier, name, agg)
+        self._current = {}
@@ -0,0 +1,274 @@
+# src/segment_store.py
+"""
+segment_store.py
+Stockage des mesures en segments temporels avec index et quota.
+
+Rôle :
+- Répartir les mesures dans des journaux (voir journal.py) couvrant
+  chacun une tranche de temps fixe (par défaut une journée).
+- Tenir un petit fichier index (JSON) : début de tranche -> segment.
+- Supprimer les segments les plus anciens lorsqu'un quota de taille
+  totale ou d'âge est dépassé.
+- Relire une plage de temps en n'ouvrant que les segments concernés.
+
+Fichiers produits (prefix = "data", span = 86400) :
+    data.idx                 index [[debut, "data_<debut>.jsonl"], ...]
+    data_1700006400.jsonl    mesures de la tranche [debut, debut + span[
+
+L'index n'est réécrit qu'à la création ou à la suppression d'un segment,
+jamais à chaque mesure. Ces deux évènements sont aussi signalés aux
+abonnés de storage_events (cache du serveur web). Les lignes des segments passent par
+buffered_writer (tampon libéré à la fermeture du segment).
+
+Utilisation :
+    store = SegmentStore("data", span=86400, max_bytes=200_000)
+    store.append([{"name": "S1", "value": 42}], timestamp=time.time())
+    for record in store.read_range(t0, t1):
+        print(record)
+"""
+import os
+import time
+try:
+    import ujson as json
+except ImportError:
+    import json
+from journal import Journal, file_exists
+import buffered_writer
+import storage_events
+
+class SegmentStore:
+    """
+    Ensemble de journaux segmentés par tranche de temps.
+
+    Attributes:
+        prefix (str): Préfixe des fichiers (segments et index).
+        span (int): Durée d'un segment en secondes.
+        max_bytes (int | None): Taille totale maximale des segments.
+        max_age (int | None): Âge maximal d'un segment en secondes.
+        segments (list): Index en mémoire [[debut, fichier], ...] trié.
+    """
+
+    def __init__(self, prefix="data", span=86400, max_bytes=200_000, max_age=None):
+        """
+        Ouvre le stockage et charge (ou reconstruit) l'index.
+
+        Args:
+            prefix (str): Préfixe des fichiers (par défaut "data").
+            span (int): Durée d'un segment en secondes (par défaut 1 jour).
+            max_bytes (int | None): Quota de taille totale (None = illimité).
+            max_age (int | None): Quota d'âge en secondes (None = illimité).
+        """
+        self.prefix = prefix
+        self.span = span
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_file = prefix + ".idx"
+        self.segments = self._load_index()
+        self._sizes = {}
+        for _, name in self.segments:
+            self._sizes[name] = self._file_size(name)
+
+    # ==================== Index ====================
+
+    def _file_size(self, name):
+        """
+        Returns:
+            int: Taille du fichier en octets (0 s'il est absent).
+        """
+        try:
+            return os.stat(name)[6]
+        except OSError:
+            return 0
+
+    def _load_index(self):
+        """
+        Charge l'index, ou le reconstruit si le fichier est absent ou corrompu.
+
+        Returns:
+            list: [[debut, fichier], ...] trié par début croissant.
+        """
+        try:
+            with open(self.index_file, "r") as f:
+                segments = json.load(f)
+            return [s for s in segments if file_exists(s[1])]
+        except (OSError, ValueError):
+            return self.rebuild_index()
+
+    def rebuild_index(self):
+        """
+        Reconstruit l'index à partir des fichiers segments présents.
+
+        Returns:
+            list: [[debut, fichier], ...] trié par début croissant.
+        """
+        folder, _, base = self.prefix.rpartition("/")
+        head = base + "_"
+        segments = []
+        for f in os.listdir(folder or "."):
+            if f.startswith(head) and f.endswith(".jsonl"):
+                try:
+                    start = int(f[len(head):-len(".jsonl")])
+                except ValueError:
+                    continue
+                segments.append([start, (folder + "/" if folder else "") + f])
+        segments.sort()
+        self.segments = segments
+        self._save_index()
+        return segments
+
+    def _save_index(self):
+        """
+        Écrit l'index sur la flash (petit fichier, réécrit rarement).
+        """
+        with open(self.index_file, "w") as f:
+            json.dump(self.segments, f)
+
+    # ==================== Écriture ====================
+
+    def segment_start(self, timestamp):
+        """
+        Args:
+            timestamp (int | float): Horodatage en secondes.
+
+        Returns:
+            int: Début de la tranche contenant timestamp.
+        """
+        timestamp = int(timestamp)
+        return timestamp - timestamp % self.span
+
+    def segment_name(self, start):
+        """
+        Args:
+            start (int): Début de tranche.
+
+        Returns:
+            str: Nom du fichier segment.
+        """
+        return self.prefix + "_" + str(start) + ".jsonl"
+
+    def append(self, records, timestamp=None):
+        """
+        Ajoute des mesures dans le segment de leur tranche de temps.
+
+        Args:
+            records (list): Mesures (dict) à enregistrer.
+            timestamp (int | float, optionnel): Horodatage commun
+                (par défaut time.time()). Ajouté aux mesures qui n'en ont pas.
+
+        Returns:
+            str: Nom du segment utilisé.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        for r in records:
+            if "timestamp" not in r:
+                r["timestamp"] = timestamp
+
+        start = self.segment_start(timestamp)
+        name = self.segment_name(start)
+        if name not in self._sizes:
+            # segment précédent terminé : on libère son tampon d'écriture
+            if self.segments:
+                buffered_writer.release(self.segments[-1][1])
+            self.segments.append([start, name])
+            self.segments.sort()
+            self._save_index()
+            self._sizes[name] = 0
+            storage_events.notify(storage_events.ROTATED, name)
+
+        self._sizes[name] = self._sizes.get(name, 0) + Journal(name, buffered=True).append(records)
+        self.enforce_quota(timestamp)
+        return name
+
+    # ==================== Rétention ====================
+
+    def total_bytes(self):
+        """
+        Returns:
+            int: Taille totale des segments connus.
+        """
+        return sum(self._sizes.get(name, 0) for _, name in self.segments)
+
+    def _evict_oldest(self):
+        """
+        Supprime le segment le plus ancien (fichier + entrée d'index).
+        """
+        start, name = self.segments.pop(0)
+        self._sizes.pop(name, None)
+        buffered_writer.release(name, discard=True)
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+        storage_events.notify(storage_events.DELETED, name)
+
+    def enforce_quota(self, now=None):
+        """
+        Supprime les segments trop anciens ou en excès de taille.
+
+        Le segment le plus récent (en cours d'écriture) n'est jamais supprimé.
+
+        Args:
+            now (int | float, optionnel): Heure de référence (par défaut time.time()).
+
+        Returns:
+            int: Nombre de segments supprimés.
+        """
+        if now is None:
+            now = time.time()
+        evicted = 0
+        while len(self.segments) > 1:
+            start = self.segments[0][0]
+            too_old = self.max_age is not None and start + self.span <= now - self.max_age
+            too_big = self.max_bytes is not None and self.total_bytes() > self.max_bytes
+            if not (too_old or too_big):
+                break
+            self._evict_oldest()
+            evicted += 1
+        if evicted:
+            self._save_index()
+        return evicted
+
+    # ==================== Lecture ====================
+
+    def segments_for(self, t0=None, t1=None):
+        """
+        Sélectionne les segments recouvrant la plage [t0, t1].
+
+        Args:
+            t0 (int | float | None): Début de plage (None = depuis l'origine).
+            t1 (int | float | None): Fin de plage (None = jusqu'à maintenant).
+
+        Returns:
+            list: Noms des segments concernés, du plus ancien au plus récent.
+        """
+        names = []
+        for start, name in self.segments:
+            if t0 is not None and start + self.span <= t0:
+                continue
+            if t1 is not None and start > t1:
+                continue
+            names.append(name)
+        return names
+
+    def read_range(self, t0=None, t1=None):
+        """
+        Parcourt les mesures dont l'horodatage est dans [t0, t1].
+
+        Seuls les segments recouvrant la plage sont ouverts.
+
+        Args:
+            t0 (int | float | None): Début de plage inclus.
+            t1 (int | float | None): Fin de plage incluse.
+
+        Yields:
+            dict: Mesure horodatée.
+        """
+        for name in self.segments_for(t0, t1):
+            for record in Journal(name):
+                ts = record.get("timestamp", 0)
+                if t0 is not None and ts < t0:
+                    continue
+                if t1 is not None and ts > t1:
+                    continue
+                yield record
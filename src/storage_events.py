@@ -0,0 +1,78 @@
+# src/storage_events.py
+"""
+storage_events.py
+Notification des changements de fichiers par la couche de stockage.
+
+Rôle :
+- Prévenir les abonnés (cache du serveur web) lorsqu'un fichier de
+  données apparaît, qu'un segment est ouvert (rotation) ou qu'un
+  fichier est supprimé, sans relire le système de fichiers.
+- La première écriture d'un fichier depuis le démarrage est signalée
+  comme une création (un simple test d'appartenance à un ensemble,
+  pas de os.stat() à chaque écriture) ; au pire un abonné est
+  prévenu une fois de trop.
+
+Évènements :
+    CREATED  premier enregistrement écrit dans le fichier
+    ROTATED  nouveau segment ouvert (SegmentStore)
+    DELETED  fichier supprimé ou renommé
+
+Utilisation :
+    add_listener(lambda event, filename: ...)
+    written("data.jsonl")     # appelé par buffered_writer / journal
+"""
+
+CREATED = "created"
+ROTATED = "rotated"
+DELETED = "deleted"
+
+# abonnés : fonctions (évènement, nom_de_fichier)
+_listeners = []
+# fichiers déjà écrits depuis le démarrage
+_seen = set()
+
+def add_listener(fn):
+    """
+    Abonne une fonction aux changements de fichiers.
+
+    Args:
+        fn (callable): Appelée avec (évènement, nom_de_fichier).
+    """
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+def remove_listener(fn):
+    """
+    Désabonne une fonction (sans effet si elle n'était pas abonnée).
+    """
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+def notify(event, filename):
+    """
+    Prévient les abonnés. Leurs erreurs sont ignorées : le stockage ne
+    doit jamais échouer à cause d'un abonné.
+
+    Args:
+        event (str): CREATED, ROTATED ou DELETED.
+        filename (str): Fichier concerné.
+    """
+    if event == DELETED:
+        _seen.discard(filename)
+    for fn in list(_listeners):
+        try:
+            fn(event, filename)
+        except Exception as e:
+            print("Abonné stockage en erreur :", e)
+
+def written(filename):
+    """
+    Signale une écriture ; seule la première depuis le démarrage (ou
+    depuis la suppression du fichier) est notifiée.
+
+    Args:
+        filename (str): Fichier écrit.
+    """
+    if filename not in _seen:
+        _seen.add(filename)
+        notify(CREATED, filename)
@@ -9,7 +9,8 @@ Rôle :
     - Analogiques
     - Digitaux
     - DHT22 (température et humidité)
-- Sauvegarder les mesures dans un fichier JSON avec horodatage.
+- Sauvegarder les mesures horodatées dans un journal en ajout seul
+  (voir journal.py).
 
 Utilisation :
 Instancier la classe Techniques avec le chemin du fichier de configuration.
@@ -17,9 +18,14 @@ Exemple :
     tech = Techniques("config.json")
     data = tech.read_all()
     tech.save_measure(data)
+
+    # ou stockage binaire circulaire de taille bornée
+    store = RingStore("data.ring", capacity=4096)
+    tech.save_measure_ring(data, store)
 """
 import ujson
 import time
+from journal import Journal, migrate_json_array, JOURNAL_FILE
 try:
     import dht
 except ImportError:
@@ -44,6 +50,12 @@ class Techniques:
         except (OSError, ValueError):
             self.sensors = []
 
+        # migration data.json -> journal effectuée au premier save_measure
+        self._migrated = False
+
+        # agrégats minute/heure/jour (voir enable_rollups)
+        self.rollups = None
+
         # dictionnaire de fonctions selon le type de capteur
         self.methods = {
             "analog": self.read_analog,
@@ -51,6 +63,11 @@ class Techniques:
             "DHT22": self.read_dht22
         }
 
+    # clés numériques produites par les capteurs à valeurs multiples
+    SERIES_KEYS = {
+        "DHT22": ("temperature", "humidity")
+    }
+
     # =====================================================
     # Abstraction pour machine (MicroPython)
     # =====================================================
@@ -149,6 +166,27 @@ class Techniques:
             raise ValueError("Type de capteur inconnu: " + sensor["type"])
         return func(sensor["pin"])
 
+    def compile(self):
+        """
+        Résout une fois pour toutes la fonction de lecture de chaque capteur.
+
+        Utilisé par PublishPlan pour éviter les recherches dans
+        self.methods à chaque cycle.
+
+        Returns:
+            list: Tuples (fonction_lecture, broche, capteur).
+
+        Raises:
+            ValueError: Si un type de capteur est inconnu.
+        """
+        compiled = []
+        for s in self.sensors:
+            func = self.methods.get(s["type"])
+            if func is None:
+                raise ValueError("Type de capteur inconnu: " + s["type"])
+            compiled.append((func, s["pin"], s))
+        return compiled
+
     def read_all(self):
         """
         Lit tous les capteurs définis dans la configuration.
@@ -162,28 +200,155 @@ class Techniques:
             results.append({"name": s["name"], "type": s["type"], "value": value})
         return results
 
+    # ==================== Séries numériques ====================
+
+    def series(self):
+        """
+        Liste les séries numériques déduites de la configuration.
+
+        Un capteur simple (analog, digital) donne une série "nom",
+        un DHT22 donne "nom.temperature" et "nom.humidity".
+        L'ordre suit la configuration : l'index d'une série est stable
+        tant que la liste des capteurs ne change pas.
+
+        Returns:
+            list: Noms des séries.
+        """
+        names = []
+        for s in self.sensors:
+            keys = self.SERIES_KEYS.get(s["type"])
+            if keys is None:
+                names.append(s["name"])
+            else:
+                for key in keys:
+                    names.append(s["name"] + "." + key)
+        return names
+
+    def iter_series(self, data):
+        """
+        Aplatit un résultat de read_all() en valeurs numériques indexées.
+
+        Les valeurs non numériques (statut, message d'erreur) et les
+        capteurs absents de la configuration sont ignorés.
+
+        Args:
+            data (list): Résultat de read_all().
+
+        Returns:
+            list: Tuples (index, nom_série, valeur).
+        """
+        index = {}
+        for i, name in enumerate(self.series()):
+            index[name] = i
+        values = []
+        for item in data:
+            value = item["value"]
+            if isinstance(value, dict):
+                pairs = [(item["name"] + "." + k, v) for k, v in value.items()]
+            else:
+                pairs = [(item["name"], value)]
+            for name, v in pairs:
+                if name in index and isinstance(v, (int, float)) and not isinstance(v, bool):
+                    values.append((index[name], name, v))
+        return values
+
     # ==================== Sauvegarde JSON ====================
 
-    def save_measure(self, data, filename="data.json"):      
+    def save_measure(self, data, filename=JOURNAL_FILE, store=None):
         """
-        Sauvegarde les mesures dans un fichier JSON avec horodatage.
+        Ajoute les mesures horodatées au journal (une ligne JSON par mesure).
+
+        Seules les nouvelles mesures sont écrites : le fichier n'est plus
+        relu ni réécrit à chaque appel, et les lignes sont regroupées par
+        buffered_writer avant d'aller sur la flash. Au premier appel, un ancien
+        data.json (tableau JSON) est migré dans le journal.
 
         Args:
             data (list): Liste des mesures à sauvegarder.
-            filename (str): Nom du fichier de sortie (par défaut data.json).
+            filename (str): Nom du journal de sortie (par défaut data.jsonl).
+            store (SegmentStore, optionnel): Si fourni, les mesures sont
+                rangées dans le segment de leur journée au lieu de filename
+                (et les agrégats sont mis à jour si enable_rollups() a été appelé).
         """
-
-        import json
-        try:
-            with open(filename, "r") as f:
-                existing = json.load(f)
-        except (OSError, ValueError):
-            existing = []
+        if store is not None:
+            timestamp = time.time()
+            store.append(data, timestamp)
+            self.update_rollups(data, timestamp)
+            return
+
+        filename = str(filename)
+        if not self._migrated:
+            # data.jsonl -> data.json (ancien format dans le même dossier)
+            if filename.endswith(".jsonl"):
+                migrate_json_array(filename[:-1], filename)
+            self._migrated = True
 
         timestamp = time.time()
         for sensor_data in data:
             sensor_data["timestamp"] = timestamp
-            existing.append(sensor_data)
+        Journal(filename, buffered=True).append(data)
+
+    def load_measures(self, filename=JOURNAL_FILE):
+        """
+        Parcourt les mesures enregistrées dans le journal.
 
-        with open(filename, "w") as f:
-            json.dump(existing, f)
+        Args:
+            filename (str): Nom du journal (par défaut data.jsonl).
+
+        Returns:
+            iterator: Mesures horodatées (dict), dans l'ordre d'écriture.
+        """
+        return iter(Journal(str(filename)))
+
+    # ==================== Sauvegarde binaire ====================
+
+    def save_measure_ring(self, data, store, timestamp=None):
+        """
+        Sauvegarde les mesures dans un stockage binaire.
+
+        Alternative compacte à save_measure : chaque valeur numérique
+        devient un enregistrement (timestamp, index, valeur).
+
+        Args:
+            data (list): Résultat de read_all().
+            store (RingStore | CompressedStore): Stockage binaire ouvert
+                (circulaire borné, ou compressé delta/varint).
+            timestamp (int, optionnel): Horodatage (par défaut time.time()).
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        for index, _, value in self.iter_series(data):
+            store.append(timestamp, index, value)
+
+    # ==================== Agrégats ====================
+
+    def enable_rollups(self, stores):
+        """
+        Active le calcul des agrégats minute / heure / jour.
+
+        Args:
+            stores (dict): Stockages par niveau (voir rollups.tier_stores()).
+
+        Returns:
+            Rollups: Agrégateur créé.
+        """
+        from rollups import Rollups
+        self.rollups = Rollups(stores)
+        return self.rollups
+
+    def update_rollups(self, data, timestamp=None):
+        """
+        Intègre un résultat de read_all() dans les agrégats.
+
+        Sans effet si enable_rollups() n'a pas été appelé.
+
+        Args:
+            data (list): Résultat de read_all().
+            timestamp (int | float, optionnel): Horodatage (par défaut time.time()).
+        """
+        if self.rollups is None:
+            return
+        if timestamp is None:
+            timestamp = time.time()
+        for _, name, value in self.iter_series(data):
+            self.rollups.add(timestamp, name, value)
@@ -0,0 +1,316 @@
+# src/ts_codec.py
+"""
+ts_codec.py
+Encodage compact de séries temporelles (delta-of-delta + varint zig-zag).
+
+Rôle :
+- Encoder un bloc de mesures d'une même série en colonnes :
+    - horodatages : premier timestamp, premier écart, puis écart d'écart
+      (quasi toujours 0 pour un échantillonnage régulier → 1 octet)
+    - valeurs : mises à l'échelle en entiers (decimals), puis différence
+      avec la valeur précédente (petite pour T°, humidité, ADC)
+  Chaque entier est écrit en varint zig-zag (1 octet pour |n| < 64).
+- Décoder un bloc (même code sur l'ESP et sur le PC).
+- CompressedStore : stockage sur flash par blocs, même interface
+  append(timestamp, index, value) que RingStore.
+
+Format d'un bloc :
+    version (1 octet) | decimals (1 octet) | nombre N (varint)
+    t0 (varint) | d0 (zig-zag) | dd1..dd(N-2) (zig-zag)
+    v0 (zig-zag) | dv1..dv(N-1) (zig-zag)
+
+Format du fichier CompressedStore (suite d'enregistrements) :
+    longueur (varint) | index série (varint) | bloc
+
+Utilisation sur PC :
+    python src/ts_codec.py data.tsc   → affiche les mesures en JSON lignes
+"""
+VERSION = 1
+TSC_FILE = "data.tsc"
+
+# ==================== Entiers variables ====================
+
+def zigzag(n):
+    """
+    Args:
+        n (int): Entier signé.
+
+    Returns:
+        int: Entier non signé (0, -1, 1, -2... → 0, 1, 2, 3...).
+    """
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+def unzigzag(n):
+    """
+    Args:
+        n (int): Entier non signé issu de zigzag().
+
+    Returns:
+        int: Entier signé d'origine.
+    """
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+def write_varint(out, n):
+    """
+    Ajoute un entier non signé en varint (7 bits par octet).
+
+    Args:
+        out (bytearray): Tampon de sortie.
+        n (int): Entier >= 0.
+    """
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def read_varint(data, pos):
+    """
+    Lit un varint.
+
+    Args:
+        data (bytes): Données encodées.
+        pos (int): Position de lecture.
+
+    Returns:
+        tuple: (valeur, nouvelle_position).
+
+    Raises:
+        ValueError: Si les données sont tronquées.
+    """
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("varint tronqué")
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+# ==================== Blocs ====================
+
+def encode_block(timestamps, values, decimals=1):
+    """
+    Encode une série (timestamps, valeurs) en un bloc compact.
+
+    Args:
+        timestamps (list): Horodatages en secondes (entiers, croissants).
+        values (list): Valeurs numériques.
+        decimals (int): Nombre de décimales conservées (par défaut 1).
+
+    Returns:
+        bytes: Bloc encodé.
+    """
+    out = bytearray()
+    out.append(VERSION)
+    out.append(decimals)
+    n = len(timestamps)
+    write_varint(out, n)
+    if n == 0:
+        return bytes(out)
+
+    prev_t = int(timestamps[0])
+    write_varint(out, prev_t)
+    prev_d = 0
+    for i in range(1, n):
+        t = int(timestamps[i])
+        d = t - prev_t
+        write_varint(out, zigzag(d - prev_d) if i > 1 else zigzag(d))
+        prev_t, prev_d = t, d
+
+    scale = 10 ** decimals
+    prev_v = 0
+    for v in values:
+        iv = int(round(v * scale))
+        write_varint(out, zigzag(iv - prev_v))
+        prev_v = iv
+    return bytes(out)
+
+def decode_block(data, pos=0):
+    """
+    Décode un bloc produit par encode_block().
+
+    Args:
+        data (bytes): Données encodées.
+        pos (int): Position du début du bloc.
+
+    Returns:
+        tuple: (timestamps, values, position_fin).
+
+    Raises:
+        ValueError: Si la version est inconnue ou les données tronquées.
+    """
+    if pos + 2 > len(data) or data[pos] != VERSION:
+        raise ValueError("bloc invalide")
+    decimals = data[pos + 1]
+    n, pos = read_varint(data, pos + 2)
+    timestamps = []
+    values = []
+    if n == 0:
+        return timestamps, values, pos
+
+    t, pos = read_varint(data, pos)
+    timestamps.append(t)
+    d = 0
+    for i in range(1, n):
+        z, pos = read_varint(data, pos)
+        d = unzigzag(z) if i == 1 else d + unzigzag(z)
+        t += d
+        timestamps.append(t)
+
+    scale = 10 ** decimals
+    v = 0
+    for _ in range(n):
+        z, pos = read_varint(data, pos)
+        v += unzigzag(z)
+        values.append(v / scale if decimals else v)
+    return timestamps, values, pos
+
+# ==================== Stockage par blocs ====================
+
+class CompressedStore:
+    """
+    Stockage de mesures compressées, un encodeur de bloc par série.
+
+    Les mesures sont gardées en mémoire (block_size par série au plus)
+    puis écrites en un seul bloc. Appeler flush() avant un redémarrage.
+
+    Attributes:
+        filename (str): Fichier de sortie.
+        block_size (int): Nombre de mesures par bloc.
+        decimals (int): Décimales conservées.
+    """
+
+    def __init__(self, filename=TSC_FILE, block_size=64, decimals=1):
+        """
+        Args:
+            filename (str): Fichier de sortie (par défaut data.tsc).
+            block_size (int): Mesures par bloc (par défaut 64).
+            decimals (int): Décimales conservées (par défaut 1).
+        """
+        self.filename = filename
+        self.block_size = block_size
+        self.decimals = decimals
+        self._pending = {}
+
+    def append(self, timestamp, index, value):
+        """
+        Ajoute une mesure ; écrit le bloc de la série s'il est plein.
+
+        Args:
+            timestamp (int | float): Horodatage en secondes.
+            index (int): Index de la série.
+            value (int | float): Valeur mesurée.
+        """
+        pending = self._pending.get(index)
+        if pending is None:
+            pending = self._pending[index] = ([], [])
+        pending[0].append(int(timestamp))
+        pending[1].append(value)
+        if len(pending[0]) >= self.block_size:
+            self._write_block(index)
+
+    def _write_block(self, index):
+        """
+        Encode et écrit le bloc en attente d'une série.
+        """
+        timestamps, values = self._pending.pop(index)
+        block = encode_block(timestamps, values, self.decimals)
+        out = bytearray()
+        write_varint(out, len(block))
+        write_varint(out, index)
+        out.extend(block)
+        with open(self.filename, "ab") as f:
+            f.write(out)
+
+    def flush(self):
+        """
+        Écrit tous les blocs partiels en attente.
+        """
+        for index in list(self._pending):
+            self._write_block(index)
+
+    def __iter__(self):
+        """
+        Parcourt les mesures écrites, bloc par bloc.
+
+        L'ordre est chronologique à l'intérieur d'une série ; les blocs
+        de séries différentes sont entrelacés dans l'ordre d'écriture.
+
+        Yields:
+            tuple: (timestamp, index, value).
+        """
+        return iter_file(self.filename)
+
+def _read_varint_file(f, one):
+    """
+    Lit un varint directement dans un fichier, octet par octet.
+
+    Args:
+        f: Fichier ouvert en binaire.
+        one (bytearray): Tampon d'un octet, réutilisé.
+
+    Returns:
+        int | None: Valeur lue, None en fin de fichier (ou varint tronqué).
+    """
+    result = 0
+    shift = 0
+    while True:
+        if not f.readinto(one):
+            return None
+        b = one[0]
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result
+        shift += 7
+
+def iter_file(filename):
+    """
+    Décode un fichier produit par CompressedStore.
+
+    Lecture enregistrement par enregistrement dans un tampon réutilisé :
+    la mémoire ne dépend que de la taille d'un bloc, pas du fichier.
+    Un enregistrement tronqué en fin de fichier (coupure), ou dont la
+    longueur dépasse le reste du fichier (octet corrompu), termine la
+    lecture sans allouer de tampon démesuré.
+
+    Args:
+        filename (str): Fichier .tsc.
+
+    Yields:
+        tuple: (timestamp, index, value).
+    """
+    try:
+        f = open(filename, "rb")
+    except OSError:
+        return
+    one = bytearray(1)
+    buf = bytearray(64)
+    with f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        while True:
+            length = _read_varint_file(f, one)
+            index = _read_varint_file(f, one) if length is not None else None
+            if index is None or length > size - f.tell():
+                return
+            if length > len(buf):
+                buf = bytearray(length)
+            block = memoryview(buf)[:length]
+            if f.readinto(block) != length:
+                return
+            try:
+                timestamps, values, _ = decode_block(block)
+            except ValueError:
+                return
+            for t, v in zip(timestamps, values):
+                yield t, index, v
+
+if __name__ == "__main__":
+    import sys
+    import json
+    for t, i, v in iter_file(sys.argv[1] if len(sys.argv) > 1 else TSC_FILE):
+        print(json.dumps({"timestamp": t, "index": i, "value": v}))
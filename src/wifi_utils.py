@@ -15,6 +15,7 @@ Importé par main.py pour configurer le réseau selon config.json.
 """
 import time
 import boot
+from backoff import Backoff
 
 # --- Détection automatique : ESP32 ou simulation PC ---
 try:
@@ -72,10 +73,44 @@ def start_sta(cfg):
     """
     Connecte l'ESP en mode Station (STA) à un réseau existant.
 
+    La première tentative attend un délai aléatoire (start_jitter_ms au
+    plus) ; en cas d'échec, la connexion est retentée après un délai
+    exponentiel avec gigue (voir backoff.py) : des sondes redémarrées
+    ensemble ne sollicitent pas le point d'accès au même instant.
+
     Args:
         cfg (dict): Configuration STA avec clés :
             - ssid (str): Nom du réseau Wi-Fi.
             - password (str): Mot de passe.
+            - attempts (int, optionnel): Nombre de tentatives (par défaut 3).
+            - retry_ms (int, optionnel): Délai après le premier échec
+              (par défaut 2000, doublé à chaque échec).
+            - retry_max_ms (int, optionnel): Délai maximal (par défaut 30000).
+            - start_jitter_ms (int, optionnel): Délai maximal avant la
+              première tentative (par défaut 3000, 0 = immédiate).
+
+    Returns:
+        network.WLAN: Objet STA connecté si succès, sinon None.
+    """
+    attempts = cfg.get("attempts", 3)
+    retry = Backoff(base_ms=cfg.get("retry_ms", 2000),
+                    cap_ms=cfg.get("retry_max_ms", 30000),
+                    threshold=attempts + 1,
+                    initial_ms=cfg.get("start_jitter_ms", 3000))
+    for attempt in range(attempts):
+        if attempt:
+            boot.log("Nouvel essai STA dans " + str(retry.delay_ms) + " ms")
+        retry.wait()
+        sta = _join_sta(cfg)
+        if sta:
+            return sta
+        retry.failure()
+    boot.log("Echec connexion STA.")
+    return None
+
+def _join_sta(cfg):
+    """
+    Une tentative de connexion STA (10 secondes au plus).
 
     Returns:
         network.WLAN: Objet STA connecté si succès, sinon None.
@@ -89,7 +124,6 @@ def start_sta(cfg):
             boot.log(" Connecté à " + cfg['ssid'] + " - IP: " + sta.ifconfig()[0])
             return sta
         time.sleep(0.5)
-    boot.log("Echec connexion STA.")
     sta.active(False)
     return None
 # --- Optionnel : petit log pour savoir sur quoi on tourne ---
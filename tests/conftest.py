@@ -1,7 +1,99 @@
 # tests/conftest.py
 
 import os
+import socket
+import threading
+import time
 import pytest
+from unittest.mock import MagicMock
+import mqtt_client
+import network_setup
+from technique_sensors import Techniques
+
+# ==================== Capteurs simulés ====================
+
+SENSORS = [
+    {"name": "T", "type": "DHT22", "pin": 4},
+    {"name": "L", "type": "analog", "pin": 1},
+    {"name": "D", "type": "digital", "pin": 2},
+]
+READINGS = {4: {"temperature": 21.5, "humidity": 60.25, "status": "ok"}, 1: 2047, 2: 1}
+
+def fake_techniques(sensors, readings):
+    """Techniques réel dont les lectures matérielles sont simulées."""
+    tech = Techniques("fichier_absent.json")
+    tech.sensors = sensors
+    read = lambda pin: readings[pin]
+    tech.methods = {"analog": read, "digital": read, "DHT22": read}
+    return tech
+
+def make_tech(readings):
+    """Trois capteurs (DHT22, analogique, numérique) lus dans `readings`."""
+    return fake_techniques([dict(s) for s in SENSORS], readings)
+
+# ==================== Serveur web sur localhost ====================
+
+def fake_net():
+    net = MagicMock()
+    net.ifconfig.return_value = ("192.168.4.1", "", "", "")
+    return net
+
+@pytest.fixture
+def web(monkeypatch, tmp_path):
+    """
+    Démarre un WebServer sur un port libre, servi dans un thread ;
+    os.listdir() voit le contenu de tmp_path.
+    """
+    monkeypatch.chdir(tmp_path)
+    network_setup.stop_server_flag = False
+    running = []
+
+    def start(store=None, **kwargs):
+        server = network_setup.WebServer(fake_net(), "AP", port=0, store=store, **kwargs)
+        assert server.open()
+        server.port = server.sock.getsockname()[1]
+
+        def loop():
+            while not network_setup.stop_server_flag:
+                server.poll(20)
+            server.close()
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        running.append(thread)
+        return server
+
+    yield start
+    network_setup.stop_server_flag = True
+    for thread in running:
+        thread.join(5)
+
+def http_get(port, path, timeout=5, headers=""):
+    """Envoie une requête GET et lit la réponse jusqu'à la fermeture."""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as c:
+        c.sendall(("GET " + path + " HTTP/1.1\r\nHost: esp\r\n" + headers + "\r\n").encode())
+        chunks = []
+        while True:
+            data = c.recv(65536)
+            if not data:
+                return b"".join(chunks)
+            chunks.append(data)
+
+def wait_for(cond, timeout=5):
+    end = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < end, "condition non atteinte"
+        time.sleep(0.01)
+
+# ==================== Fixtures communes ====================
+
+@pytest.fixture(autouse=True)
+def no_start_jitter(monkeypatch):
+    """
+    Pas de gigue de démarrage MQTT dans les tests (première connexion
+    immédiate), sauf configuration explicite de backoff.initial_ms.
+    """
+    monkeypatch.setattr(mqtt_client, "START_JITTER_MS", 0)
 
 @pytest.fixture(autouse=True, scope="session")
 def clean_after_tests():
@@ -0,0 +1,249 @@
+# tests/fake_broker.py
+"""
+Broker MQTT 3.1.1 factice pour les tests (localhost, un thread par client).
+
+- Répond CONNACK, PUBACK (QoS 1), SUBACK et PINGRESP
+- Refuse (CONNACK 0x01) un CONNECT qui n'est pas en MQTT 3.1.1
+- Un CONNECT avec un client_id déjà connecté ferme l'ancienne connexion
+  (comme un vrai broker) : compté dans takeovers
+- Relaie les PUBLISH aux abonnés (QoS 0, jokers + et #)
+- ack_delay : retard de chaque PUBACK en secondes
+- drop_acks : nombre de PUBACK ignorés (les premiers reçus)
+- Enregistre les PUBLISH reçus : (topic, payload, qos, dup, pid),
+  les CONNECT (corps brut), le nombre de PINGREQ, SUBSCRIBE et DISCONNECT,
+  et les octets reçus (bytes_in, tous paquets confondus)
+"""
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+
+def encode_packet(first, body):
+    """Paquet MQTT : premier octet, longueur restante, corps."""
+    out = bytearray((first,))
+    n = len(body)
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out) + body
+
+
+def topic_matches(pattern, topic):
+    """Filtre d'abonnement MQTT (+ : un niveau, # : la suite)."""
+    parts = topic.split("/")
+    for i, level in enumerate(pattern.split("/")):
+        if level == "#":
+            return True
+        if i >= len(parts) or (level != "+" and level != parts[i]):
+            return False
+    return len(parts) == len(pattern.split("/"))
+
+
+def read_packet(conn):
+    """Lit un paquet complet : (premier_octet, corps) ou None si fermé."""
+    head = conn.recv(1)
+    if not head:
+        return None
+    length, shift = 0, 0
+    while True:
+        byte = conn.recv(1)
+        if not byte:
+            return None
+        length |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            break
+        shift += 7
+    body = b""
+    while len(body) < length:
+        chunk = conn.recv(length - len(body))
+        if not chunk:
+            return None
+        body += chunk
+    return head[0], body
+
+
+class FakeBroker:
+
+    def __init__(self, ack_delay=0.0, drop_acks=0):
+        self.ack_delay = ack_delay
+        self.drop_acks = drop_acks
+        self.published = []
+        self.connects = []
+        self.pings = 0
+        self.disconnects = 0
+        self.subscribes = 0
+        self.takeovers = 0
+        self.sessions = {}  # client_id → connexion
+        self.bytes_in = 0
+        # (filtre, fonction d'envoi) des abonnements en cours
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.server = socket.socket()
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(128)
+        self.port = self.server.getsockname()[1]
+        self.clients = []
+        self._running = True
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while self._running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.clients.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        # les accusés partent dans l'ordre, chacun à son heure d'échéance
+        acks = deque()
+        ready = threading.Condition()
+
+        def sender():
+            while True:
+                with ready:
+                    while not acks:
+                        ready.wait()
+                    due, data = acks.popleft()
+                if data is None:
+                    return
+                wait = due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    return
+
+        def reply(data, delay=0.0):
+            with ready:
+                acks.append((time.monotonic() + delay, data))
+                ready.notify()
+
+        sending = threading.Thread(target=sender, daemon=True)
+        sending.start()
+        try:
+            while True:
+                try:
+                    packet = read_packet(conn)
+                except OSError:
+                    return
+                if packet is None:
+                    return
+                first, body = packet
+                with self.lock:
+                    self.bytes_in += len(encode_packet(first, body))
+                kind = first & 0xF0
+                if kind == 0x10:
+                    self.connects.append(body)
+                    if body[:7] != b"\x00\x04MQTT\x04":
+                        reply(b"\x20\x02\x00\x01")  # protocole refusé
+                        return
+                    self._take_session(body, conn)
+                    reply(b"\x20\x02\x00\x00")
+                elif kind == 0x30:
+                    self._publish(first, body, reply)
+                elif kind == 0x80:
+                    self._subscribe(body, reply)
+                elif kind == 0xC0:
+                    self.pings += 1
+                    reply(b"\xd0\x00")
+                elif kind == 0xE0:
+                    self.disconnects += 1
+                    return
+        finally:
+            with self.lock:
+                self.subscriptions = [s for s in self.subscriptions if s[1] is not reply]
+            reply(None)
+            sending.join(1.0)  # réponses en attente envoyées avant fermeture
+            conn.close()
+
+    def _take_session(self, body, conn):
+        size = struct.unpack("!H", body[10:12])[0]
+        client_id = body[12:12 + size].decode()
+        with self.lock:
+            old = self.sessions.get(client_id)
+            self.sessions[client_id] = conn
+        if old is not None and old is not conn:
+            self.takeovers += 1
+            try:
+                old.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _publish(self, first, body, reply):
+        qos = (first >> 1) & 3
+        topic_len = struct.unpack("!H", body[:2])[0]
+        topic = body[2:2 + topic_len].decode()
+        pos = 2 + topic_len
+        pid = None
+        if qos:
+            pid = struct.unpack("!H", body[pos:pos + 2])[0]
+            pos += 2
+        with self.lock:
+            self.published.append((topic, body[pos:], qos, bool(first & 0x08), pid))
+            drop = qos and self.drop_acks > 0
+            if drop:
+                self.drop_acks -= 1
+        if qos and not drop:
+            reply(b"\x40\x02" + struct.pack("!H", pid), self.ack_delay)
+        with self.lock:
+            targets = [send for pattern, send in self.subscriptions
+                       if topic_matches(pattern, topic)]
+        if targets:
+            raw = topic.encode()
+            packet = encode_packet(0x30, struct.pack("!H", len(raw)) + raw + body[pos:])
+            for send in targets:
+                send(packet)
+
+    def _subscribe(self, body, reply):
+        pid = body[:2]
+        pos = 2
+        codes = b""
+        while pos < len(body):
+            size = struct.unpack("!H", body[pos:pos + 2])[0]
+            pattern = body[pos + 2:pos + 2 + size].decode()
+            pos += 3 + size
+            with self.lock:
+                self.subscriptions.append((pattern, reply))
+            codes += b"\x00"  # accordé en QoS 0
+        with self.lock:
+            self.subscribes += 1
+        reply(encode_packet(0x90, pid + codes))
+
+    def payloads(self):
+        """Payloads distincts reçus (doublons DUP retirés), dans l'ordre."""
+        seen = []
+        for _, payload, _, _, _ in self.published:
+            if payload not in seen:
+                seen.append(payload)
+        return seen
+
+    def wait_published(self, count, timeout=2.0):
+        """Attend que count PUBLISH aient été reçus."""
+        deadline = time.monotonic() + timeout
+        while len(self.published) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return len(self.published) >= count
+
+    def kick(self):
+        """Coupe brutalement toutes les connexions clientes."""
+        for conn in self.clients:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+        self.clients = []
+
+    def close(self):
+        self._running = False
+        self.kick()
+        self.server.close()
@@ -10,7 +10,8 @@ class MockWLAN:
         self.mode = mode
         self._active = False
         self._connected = False
-        self._cfg = {}
+        # adresse MAC propre à chaque interface, comme sur l'ESP
+        self._cfg = {"mac": b"\x24\x0a\xc4\x12\x34" + bytes((0x56 + mode,))}
         #IP différente selon mode
         self._ip = "192.168.4.1" if mode == AP_IF else "192.168.1.42"
 
@@ -32,7 +33,10 @@ class MockWLAN:
     def ifconfig(self):
         return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "8.8.8.8")
 
-    def config(self, **kwargs):
+    def config(self, *args, **kwargs):
+        # config("mac") lit un paramètre, config(essid=...) les modifie
+        if args:
+            return self._cfg.get(args[0])
         self._cfg.update(kwargs)
 # --- Fonction globale attendue par wifi_utils ---
 def WLAN(mode):
@@ -0,0 +1,82 @@
+import pytest
+import backoff
+from backoff import Backoff, jittered, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"ms": 0}
+    monkeypatch.setattr(backoff, "ticks_ms", lambda: now["ms"])
+    return now
+
+def test_jitter_bounds():
+    delays = [jittered(1000, 0.5) for _ in range(200)]
+    assert all(500 <= d <= 1000 for d in delays)
+    assert len(set(delays)) > 50  # réellement aléatoire
+    assert jittered(1000, 0) == 1000
+
+def test_exponential_delay_is_capped(clock):
+    retry = Backoff(base_ms=1000, cap_ms=8000, jitter=0, threshold=100)
+    assert [retry.failure() for _ in range(6)] == [1000, 2000, 4000, 8000, 8000, 8000]
+
+def test_ready_after_delay(clock):
+    retry = Backoff(base_ms=1000, jitter=0)
+    assert retry.ready()
+    retry.failure()
+    assert not retry.ready()
+    assert retry.remaining_ms() == 1000
+    clock["ms"] = 999
+    assert not retry.ready()
+    clock["ms"] = 1000
+    assert retry.ready()
+    retry.success()
+    assert retry.failures == 0 and retry.remaining_ms() == 0
+
+def test_circuit_breaker_cycle(clock):
+    retry = Backoff(base_ms=100, jitter=0, threshold=3, cooldown_ms=60000)
+    retry.failure()
+    retry.failure()
+    assert retry.state == CLOSED
+    assert retry.failure() == 60000
+    assert retry.state == OPEN and retry.trips == 1
+
+    clock["ms"] = 60000
+    assert retry.ready()
+    assert retry.state == HALF_OPEN
+    # essai semi-ouvert raté : nouvelle pause complète
+    assert retry.failure() == 60000
+    assert retry.state == OPEN and retry.trips == 2
+
+    clock["ms"] = 120000
+    assert retry.ready()
+    retry.success()
+    assert retry.state == CLOSED
+
+def test_fleet_reconnections_are_spread():
+    """100 sondes coupées en même temps : premières tentatives étalées."""
+    delays = sorted(Backoff(base_ms=10000, jitter=1.0).failure() for _ in range(100))
+    assert delays[-1] - delays[0] > 5000
+    # sans gigue les 100 tomberaient dans la même seconde
+    per_second = {}
+    for d in delays:
+        per_second[d // 1000] = per_second.get(d // 1000, 0) + 1
+    assert max(per_second.values()) <= 25
+
+def test_first_attempt_is_spread_over_initial_delay(clock):
+    delays = sorted(Backoff(initial_ms=10000).remaining_ms() for _ in range(100))
+    assert delays[0] < 2000 and delays[-1] > 8000
+    retry = Backoff(initial_ms=10000)
+    assert not retry.ready() or retry.delay_ms == 0
+    clock["ms"] = 10000
+    assert retry.ready()
+    assert Backoff().ready()  # sans gigue de démarrage : immédiat
+
+def test_wait_sleeps_remaining(clock, monkeypatch):
+    slept = []
+    monkeypatch.setattr(backoff.time, "sleep", slept.append)
+    retry = Backoff(base_ms=1500, jitter=0)
+    retry.wait()
+    retry.failure()
+    clock["ms"] = 500
+    retry.wait()
+    assert slept == [1.0]
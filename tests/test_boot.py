@@ -26,6 +26,7 @@ def test_load_config_custom():
 
 def test_log_creates_file():
     boot.log("Hello test")
+    boot.flush_log()
     assert "boot.log" in os.listdir()
     with open("boot.log") as f:
         assert "Hello test" in f.read()
@@ -70,3 +71,18 @@ def test_load_config_raises_oserror():
     with patch("builtins.open", side_effect=OSError("Permission denied")):
         cfg = boot.load_config()
         assert cfg["mode"] == "AP"
+
+def test_log_is_buffered():
+    import buffered_writer
+    boot.flush_log()
+    writer = buffered_writer.get_writer(boot.LOG_FILE)
+    flushes = writer.flush_count
+
+    boot.log("a")
+    boot.log("b")
+
+    # pas d'écriture flash par ligne : tout reste dans le tampon
+    assert writer.flush_count == flushes
+    assert writer.pending() > 0
+    boot.flush_log()
+    assert writer.flush_count == flushes + 1
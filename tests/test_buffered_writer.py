@@ -0,0 +1,98 @@
+import buffered_writer
+from buffered_writer import BufferedWriter, get_writer, release, flush_all
+
+
+def test_write_is_buffered_until_flush(tmp_path):
+    path = tmp_path / "log.txt"
+    w = BufferedWriter(str(path), size=64)
+
+    w.write("abc\n")
+    w.write(b"def\n")
+    assert not path.exists()
+    assert w.pending() == 8
+
+    w.flush()
+    assert path.read_bytes() == b"abc\ndef\n"
+    assert w.stats() == {"writes": 2, "flushes": 1, "bytes_written": 8, "pending": 0}
+
+def test_flush_when_full(tmp_path):
+    path = tmp_path / "log.txt"
+    w = BufferedWriter(str(path), size=10)
+
+    for _ in range(5):
+        w.write("1234\n")
+
+    # 2 lignes de 5 octets par vidage
+    assert w.flush_count == 2
+    assert path.read_bytes() == b"1234\n" * 4
+    w.flush()
+    assert path.read_bytes() == b"1234\n" * 5
+
+def test_oversized_write_goes_direct(tmp_path):
+    path = tmp_path / "log.txt"
+    w = BufferedWriter(str(path), size=4)
+
+    w.write("ab")
+    w.write("0123456789")
+
+    assert path.read_bytes() == b"ab0123456789"
+    assert w.pending() == 0
+
+def test_flush_on_age(tmp_path, monkeypatch):
+    now = {"ms": 0}
+    monkeypatch.setattr(buffered_writer, "ticks_ms", lambda: now["ms"])
+    path = tmp_path / "log.txt"
+    w = BufferedWriter(str(path), size=64, max_age_ms=1000)
+
+    w.write("a")
+    now["ms"] = 500
+    w.write("b")
+    assert w.flush_count == 0
+    now["ms"] = 1000
+    assert w.check_age() is True
+    assert path.read_bytes() == b"ab"
+    assert w.check_age() is False
+
+def test_shared_writers_and_flush_all(tmp_path):
+    a = str(tmp_path / "a.log")
+    b = str(tmp_path / "b.log")
+    assert get_writer(a) is get_writer(a)
+    get_writer(a).write("x")
+    get_writer(b).write("y")
+
+    assert buffered_writer.stats()[a]["pending"] == 1
+    flush_all()
+    buffered_writer.check_all()
+
+    assert (tmp_path / "a.log").read_text() == "x"
+    assert (tmp_path / "b.log").read_text() == "y"
+    release(a)
+    release(b)
+    assert a not in buffered_writer.stats()
+
+def test_release_discard(tmp_path):
+    path = str(tmp_path / "gone.log")
+    get_writer(path).write("perdu")
+    release(path, discard=True)
+
+    assert not (tmp_path / "gone.log").exists()
+
+def test_flush_all_ignores_errors(tmp_path, capsys):
+    path = str(tmp_path / "missing_dir" / "x.log")
+    get_writer(path).write("x")
+
+    flush_all()
+
+    assert "Erreur vidage" in capsys.readouterr().out
+    release(path, discard=True)
+
+def test_write_amplification_reduced(tmp_path):
+    w = BufferedWriter(str(tmp_path / "data.jsonl"), size=512)
+    line = '{"name": "T", "value": 21.5, "timestamp": 700000000}\n'
+    for _ in range(100):
+        w.write(line)
+    w.flush()
+
+    # 100 écritures logiques -> une poignée d'ouvertures de fichier
+    assert w.write_count == 100
+    assert w.flush_count <= 100 // (512 // len(line)) + 1
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from fake_broker import FakeBroker
+from fleet import run_fleet, percentile, synthetic_techniques, main
+
+
+@pytest.fixture
+def broker():
+    b = FakeBroker()
+    yield b
+    b.close()
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 90) == 7
+
+def test_fleet_does_not_need_the_tests_directory():
+    host = os.path.join(os.path.dirname(os.path.dirname(__file__)), "host")
+    code = ("import sys; sys.path.insert(0, %r); import fleet; "
+            "print(fleet.VirtualProbe(7, {'server': 'x'}, None).name, "
+            "'network_mock' in sys.modules)" % host)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=host, env=dict(os.environ, PYTHONPATH=""), check=True).stdout
+    assert out.split() == ["houblon-240ac4000007", "False"]
+
+def test_synthetic_sensors_are_plausible():
+    tech = synthetic_techniques(3)
+    for _ in range(50):
+        for item in tech.read_all():
+            value = item["value"]
+            if item["type"] == "DHT22":
+                assert value["status"] in ("ok", "error")
+                if value["status"] == "ok":
+                    assert 10 < value["temperature"] < 30
+                    assert 0 < value["humidity"] < 100
+            elif item["type"] == "analog":
+                assert 0 <= value <= 4095
+            else:
+                assert value in (0, 1)
+
+def test_fleet_topics_qos1(broker):
+    summary = asyncio.run(run_fleet(30, {"server": "127.0.0.1", "port": broker.port,
+                                         "qos": 1}, interval=0.2, duration=0.6))
+    assert summary["connected"] == 30
+    assert summary["failures"] == 0
+    assert summary["cycles"] >= 60
+    assert summary["cycle"]["p50"] <= summary["cycle"]["p99"] <= summary["cycle"]["max"]
+    # une session par sonde, topics <prefix>/<client_id>/<clé>
+    assert len({c[12:] for c in broker.connects}) == 30
+    topics = {t for t, _, _, _, _ in broker.published}
+    assert "fleet/houblon-240ac4000007/humidity" in topics
+    assert broker.wait_published(summary["values"])
+
+def test_fleet_batch_struct(broker, capsys):
+    main(["--port", str(broker.port), "--devices", "5", "--interval", "0.1",
+          "--duration", "0.5", "--payload", "batch", "--codec", "struct"])
+    out = capsys.readouterr().out
+    assert "sondes connectées : 5" in out
+    assert "cycle" in out
+    topics = {t for t, _, _, _, _ in broker.published}
+    assert "fleet/houblon-240ac4000004/layout" in topics
+    assert "fleet/houblon-240ac4000004/batch" in topics
+
+def test_benchmark_fleet_scaling():
+    """Latence de publication (QoS 1) de 10 puis 200 sondes sur le broker local."""
+    print()
+    for devices in (10, 200):
+        broker = FakeBroker()
+        try:
+            summary = asyncio.run(run_fleet(devices, {"server": "127.0.0.1",
+                                                      "port": broker.port, "qos": 1},
+                                            interval=0.5, duration=1.0))
+        finally:
+            broker.close()
+        cycle = summary["cycle"]
+        print("%4d sondes : %5.0f valeurs/s, cycle p50 %.2f ms p99 %.2f ms, connexion p99 %.2f ms"
+              % (devices, summary["values_per_s"], cycle["p50"], cycle["p99"],
+                 summary["connect"]["p99"]))
+        assert summary["connected"] == devices
+        assert summary["failures"] == 0
+
+def test_mac_derived_ids_keep_sessions_stable(broker):
+    """20 sondes : identifiants déduits de la MAC contre un identifiant partagé."""
+    config = {"server": "127.0.0.1", "port": broker.port,
+              "backoff": {"base_ms": 50, "cap_ms": 200}}
+    stable = asyncio.run(run_fleet(20, config, interval=0.1, duration=1.0))
+    assert broker.takeovers == 0
+    assert stable["drops"] == 0
+    assert stable["connected"] == 20
+    assert len(broker.sessions) == 20
+
+    shared = FakeBroker()
+    try:
+        thrash = asyncio.run(run_fleet(20, dict(config, port=shared.port,
+                                                client_id="esp8266"),
+                                       interval=0.1, duration=1.0))
+    finally:
+        shared.close()
+    # chaque connexion ferme la précédente : tempête de reconnexions
+    assert shared.takeovers >= 19
+    assert thrash["drops"] > 0
+    assert len(shared.sessions) == 1
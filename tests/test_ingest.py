@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+import time
+import pytest
+from fake_broker import FakeBroker
+from ingest import Store, Ingestor, Subscriber, run
+from mqtt_qos import QoSClient
+
+
+@pytest.fixture
+def broker():
+    b = FakeBroker()
+    yield b
+    b.close()
+
+def rows(path):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute("SELECT ts, device, key, value, text FROM measures "
+                          "ORDER BY rowid").fetchall()
+    finally:
+        db.close()
+
+def test_store_batches_and_uses_wal(tmp_path):
+    path = str(tmp_path / "h.db")
+    store = Store(path, batch=3, flush_ms=60000)
+    store.add("s1", 1.0, "t", 21.5)
+    store.add("s1", 1.0, "status", "ok")
+    assert rows(path) == []
+    store.add("s1", 2.0, "t", 21.6)
+    assert store.flushes == 1
+    assert rows(path) == [(1.0, "s1", "t", 21.5, None), (1.0, "s1", "status", None, "ok"),
+                          (2.0, "s1", "t", 21.6, None)]
+    assert store.db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+def test_store_flush_interval(tmp_path, monkeypatch):
+    import ingest
+    now = {"s": 0.0}
+    monkeypatch.setattr(ingest.time, "monotonic", lambda: now["s"])
+    store = Store(str(tmp_path / "h.db"), batch=100, flush_ms=500)
+    store.add("s1", 1.0, "t", 1)
+    store.maybe_flush()
+    assert store.rows == 0
+    now["s"] = 0.5
+    store.maybe_flush()
+    assert store.rows == 1
+    store.close()
+
+def test_ingestor_decodes_topics_and_batches(tmp_path):
+    store = Store(str(tmp_path / "h.db"))
+    ingestor = Ingestor(store)
+    ingestor.handle("maison/salon/temperature", b"21.5", now=10)
+    ingestor.handle("maison/salon/batch",
+                    b'{"t0": 100, "k": ["h"], "s": [[0, 60], [10, null]]}')
+    ingestor.handle("maison/salon/batch", b"pas du json")
+    store.close()
+    assert rows(str(tmp_path / "h.db")) == [
+        (10.0, "maison/salon", "temperature", 21.5, None),
+        (100.0, "maison/salon", "h", 60.0, None),
+    ]
+    assert ingestor.messages == 3
+    assert ingestor.errors == 1
+
+def test_ingestor_survives_malformed_payloads(tmp_path):
+    store = Store(str(tmp_path / "h.db"))
+    ingestor = Ingestor(store)
+    ingestor.handle("maison/salon/layout", b'{"id": 7, "fmt": "Hf", "k": ["L", "t"]}')
+    ingestor.handle("maison/salon/batch", b"\xc1\x07")  # struct tronqué
+    ingestor.handle("maison/salon/batch", b'{"t0": 100, "k": ["h"], "s": [[]]}')
+    ingestor.handle("maison/salon/batch", b'{"t0": 100, "k": ["h"], "s": [5]}')
+    ingestor.handle("maison/salon/layout", b'{"fmt": "H"}')  # sans identifiant
+    ingestor.handle("maison/salon/temperature", b"21.5", now=10)
+    store.close()
+    assert rows(str(tmp_path / "h.db")) == [(10.0, "maison/salon", "temperature", 21.5, None)]
+    assert ingestor.errors == 4
+
+def test_store_failed_flush_rolls_back_and_retries(tmp_path):
+    store = Store(str(tmp_path / "h.db"), batch=100)
+    store.db.execute("CREATE TRIGGER full BEFORE INSERT ON measures "
+                     "BEGIN SELECT RAISE(ABORT, 'disque plein'); END")
+    store.add("s1", 1.0, "t", 21.5)
+    store.flush()
+    assert not store.db.in_transaction
+    assert store.failures == 1 and store.rows == 0
+    store.db.execute("DROP TRIGGER full")
+    store.flush()
+    assert store.rows == 1
+    store.close()
+    assert rows(str(tmp_path / "h.db")) == [(1.0, "s1", "t", 21.5, None)]
+
+def test_subscriber_reconnects_after_broker_cut(broker, tmp_path):
+    store = Store(str(tmp_path / "h.db"), flush_ms=50)
+    ingestor = Ingestor(store)
+    stop = threading.Event()
+    thread = threading.Thread(target=run, args=(Subscriber("127.0.0.1", broker.port),
+                                                ingestor, ["maison/#"], stop, 0.05))
+    thread.start()
+    try:
+        client = QoSClient("s1", "127.0.0.1", broker.port)
+        for value in ("1", "2"):
+            while broker.subscribes < int(value):
+                time.sleep(0.01)
+            client.connect()
+            client.publish("maison/s1/t", value, qos=1)
+            assert client.flush(2000)
+            deadline = time.monotonic() + 2
+            while ingestor.messages < int(value) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            broker.kick()  # coupe aussi l'abonné
+            client.close()
+    finally:
+        stop.set()
+        thread.join(5)
+    assert [r[3] for r in rows(str(tmp_path / "h.db"))] == [1.0, 2.0]
+
+def test_load_simulated_fleet(broker, tmp_path):
+    """20 sondes x 250 messages (topics) via le broker local, en parallèle."""
+    devices, per_device = 20, 250
+    path = str(tmp_path / "h.db")
+    store = Store(path, batch=500, flush_ms=200)
+    ingestor = Ingestor(store)
+    stop = threading.Event()
+    thread = threading.Thread(target=run, args=(Subscriber("127.0.0.1", broker.port),
+                                                ingestor, ["fleet/#"], stop))
+    thread.start()
+    while not broker.subscriptions:
+        time.sleep(0.01)
+
+    def device(n):
+        client = QoSClient("d%d" % n, "127.0.0.1", broker.port)
+        client.connect()
+        for i in range(per_device):
+            client.publish("fleet/d%d/%s" % (n, ("temperature", "humidity")[i % 2]),
+                           str(20 + i % 10))
+        client.disconnect()
+
+    total = devices * per_device
+    start = time.monotonic()
+    senders = [threading.Thread(target=device, args=(n,)) for n in range(devices)]
+    for t in senders:
+        t.start()
+    for t in senders:
+        t.join()
+    deadline = time.monotonic() + 20
+    while ingestor.messages < total and time.monotonic() < deadline:
+        time.sleep(0.005)
+    elapsed = time.monotonic() - start
+    stop.set()
+    thread.join(5)
+    store.close()
+
+    count, = sqlite3.connect(path).execute("SELECT COUNT(*) FROM measures").fetchone()
+    print("\ningestion : %d messages en %.2f s (%.0f msg/s), %d transactions"
+          % (total, elapsed, total / elapsed, store.flushes))
+    assert count == total
+    assert store.flushes < total / 50
+    assert total / elapsed > 1000
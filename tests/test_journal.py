@@ -0,0 +1,49 @@
+import json
+from journal import Journal, migrate_json_array
+
+
+def test_append_and_iterate(tmp_path):
+    journal = Journal(str(tmp_path / "data.jsonl"))
+
+    written = journal.append([{"v": 1}, {"v": 2}])
+    journal.append([{"v": 3}])
+
+    assert written > 0
+    assert [r["v"] for r in journal] == [1, 2, 3]
+
+def test_append_empty_writes_nothing(tmp_path):
+    path = tmp_path / "data.jsonl"
+    journal = Journal(str(path))
+
+    assert journal.append([]) == 0
+    assert not path.exists()
+
+def test_iterate_missing_file(tmp_path):
+    assert list(Journal(str(tmp_path / "absent.jsonl"))) == []
+
+def test_iterate_skips_corrupted_lines(tmp_path):
+    path = tmp_path / "data.jsonl"
+    # dernière ligne tronquée (coupure de courant pendant l'écriture)
+    path.write_text('{"v": 1}\n\n{"v": 2}\n{"v": ')
+
+    assert [r["v"] for r in Journal(str(path))] == [1, 2]
+
+def test_migrate_json_array(tmp_path):
+    legacy = tmp_path / "data.json"
+    legacy.write_text(json.dumps([{"v": 1}, {"v": 2}]))
+    target = tmp_path / "data.jsonl"
+
+    assert migrate_json_array(str(legacy), str(target)) == 2
+    # Deuxième appel : plus rien à migrer
+    assert migrate_json_array(str(legacy), str(target)) == 0
+
+    assert [r["v"] for r in Journal(str(target))] == [1, 2]
+    assert (tmp_path / "data.json.bak").exists()
+
+def test_migrate_invalid_legacy_file(tmp_path):
+    legacy = tmp_path / "data.json"
+    legacy.write_text("{pas du json")
+    target = tmp_path / "data.jsonl"
+
+    assert migrate_json_array(str(legacy), str(target)) == 0
+    assert not legacy.exists()
@@ -1,6 +1,12 @@
+import asyncio
+import time
 import pytest
 from unittest.mock import MagicMock, patch
 import main
+import network_setup
+from virtual_clock import VirtualClock
+from mqtt_client import MQTTHandler
+from conftest import fake_techniques
 
 # empêche les vrais reset()
 main.machine.reset = MagicMock()
@@ -19,8 +25,9 @@ def fake_wifi(monkeypatch):
 
 @pytest.fixture
 def fake_server(monkeypatch):
+    """Runtime (serveur web + mesures) simulé."""
     srv = MagicMock()
-    monkeypatch.setattr(main, "start_server", srv)
+    monkeypatch.setattr(main, "run_runtime", srv)
     return srv
 
 def test_main_mode_ap_ok(fake_boot, fake_wifi, fake_server, monkeypatch):
@@ -34,7 +41,7 @@ def test_main_mode_ap_ok(fake_boot, fake_wifi, fake_server, monkeypatch):
             "topic": "mesures/capteurs"} 
     }
 
-    fake_wifi.start_ap.return_value = MagicMock()
+    ap = fake_wifi.start_ap.return_value = MagicMock()
 
     # Patch sleep pour que le test soit rapide
     monkeypatch.setattr(main.time, "sleep", lambda x: None)
@@ -43,6 +50,9 @@ def test_main_mode_ap_ok(fake_boot, fake_wifi, fake_server, monkeypatch):
 
     fake_wifi.start_ap.assert_called_once()
     fake_server.assert_called_once()
+    net, mode, mqtt, interval = fake_server.call_args.args
+    assert (net, mode, interval) == (ap, "AP", main.INTERVAL_S)
+    assert isinstance(mqtt, main.AsyncMQTTHandler)
     fake_boot.log.assert_any_call("Point d'accès actif, lancement du server web...")
 
 def test_main_mode_ap_fail(fake_boot, fake_wifi, fake_server, monkeypatch):
@@ -75,12 +85,14 @@ def test_main_sta_ok(fake_boot, fake_wifi, fake_server):
             "topic": "maison/etage/chambre1/"}  
     }
 
-    fake_wifi.start_sta.return_value = MagicMock()
+    sta = fake_wifi.start_sta.return_value = MagicMock()
 
     main.main()
 
     fake_wifi.start_sta.assert_called_once()
-    #fake_server.assert_called_once() actuellement j'ai enlevé le lancement du server
+    # serveur web et mesures ensemble, aussi en STA
+    fake_server.assert_called_once()
+    assert fake_server.call_args.args[:2] == (sta, "STA")
     fake_boot.log.assert_any_call("Connexion STA réussie.")
 
 def test_main_sta_fail_fallback(fake_boot, fake_wifi, fake_server):
@@ -96,12 +108,13 @@ def test_main_sta_fail_fallback(fake_boot, fake_wifi, fake_server):
     }
 
     fake_wifi.start_sta.return_value = None
-    fake_wifi.start_ap.return_value = MagicMock()
+    ap = fake_wifi.start_ap.return_value = MagicMock()
 
     main.main()
 
     fake_wifi.start_ap.assert_called_once()
     fake_server.assert_called_once()
+    assert fake_server.call_args.args[:2] == (ap, "AP")
     fake_boot.log.assert_any_call("Connexion STA échouée - bascule en AP")
 
 def test_main_sta_fail_and_ap_fail(fake_boot, fake_wifi):
@@ -163,44 +176,471 @@ def test_main_unknown_mode(fake_boot, fake_wifi, fake_server, monkeypatch):
     # Vérifie qu'aucun serveur n'est démarré
     fake_server.assert_not_called()
 
-def test_read_and_publish_sensors(monkeypatch):
-    # Fake MQTTHandler
-    mock_mqtt = MagicMock()
-    mock_mqtt.topic = "test/topic/"
-    mock_mqtt.client.publish = MagicMock()
-
-    # Fake capteurs
-    fake_data = [
-        {
-            "name": "Temp",
-            "type": "DHT22",
-            "value": {"t": 22.5, "h": 40}
-        }
-    ]
+def recording_client(sent):
+    """Client MQTT simulé qui copie chaque publication (tampons réutilisés)."""
+    as_str = lambda x: x if isinstance(x, str) else bytes(x).decode()
+    client = MagicMock()
+    client.publish.side_effect = lambda t, p: sent.append((as_str(t), as_str(p)))
+    return client
 
-    # Fake Techniques instance
-    mock_tech = MagicMock()
-    mock_tech.read_all.return_value = fake_data
+def test_read_and_publish_sensors(monkeypatch, tmp_path):
+    # MQTTHandler réel, client MQTT simulé
+    mqtt = MQTTHandler({"server": "x", "topic": "test/topic/",
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    sent = []
+    mqtt.client = recording_client(sent)
 
-    # Patch Techniques() to return fake object
-    monkeypatch.setattr(main, "Techniques", lambda cfg: mock_tech)
+    # Fake capteurs
+    tech = fake_techniques(
+        [{"name": "Temp", "type": "DHT22", "pin": 4}],
+        {4: {"temperature": 22.5, "humidity": 40, "status": "ok"}})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
 
     # Patch sleep to avoid real delay
     monkeypatch.setattr(main.time, "sleep", lambda x: None)
 
     # Call the function
-    main.read_and_publish_sensors(mock_mqtt, iterations=1)
-
-    # Assertions
-    mock_tech.read_all.assert_called_once()
-    #mock_tech.save_measure.assert_called_once_with(fake_data)
+    main.read_and_publish_sensors(mqtt, iterations=1)
 
-    # MQTT connect/disconnect called once per capteur
-    assert mock_mqtt.connect.call_count == 1
-    assert mock_mqtt.disconnect.call_count == 1
+    # Session ouverte une fois, pas de déconnexion en fin de cycle
+    assert mqtt.client.connect.call_count == 1
+    assert mqtt.client.disconnect.call_count == 0
 
     # Each key in "value" must be published
-    assert mock_mqtt.client.publish.call_count == 2
+    assert sent == [
+        ("test/topic/temperature", "22.5"),
+        ("test/topic/humidity", "40"),
+        ("test/topic/status", "ok"),
+    ]
+
+def test_read_and_publish_sensors_store_and_forward(monkeypatch, tmp_path):
+    mqtt = MQTTHandler({"server": "x", "topic": "t/",
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    sent = []
+    mqtt.client = recording_client(sent)
+    readings = {1: 1}
+    tech = fake_techniques([{"name": "A", "type": "analog", "pin": 1}], readings)
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    monkeypatch.setattr(main.time, "sleep", lambda x: None)
 
-    mock_mqtt.client.publish.assert_any_call("test/topic/t", "22.5")
-    mock_mqtt.client.publish.assert_any_call("test/topic/h", "40")
+    # Cycle 1 : broker injoignable -> messages conservés
+    mqtt.client.connect.side_effect = OSError("broker down")
+    main.read_and_publish_sensors(mqtt, iterations=1)
+    assert sent == []
+    assert len(mqtt.queue) == 1
+
+    # Cycle 2 : connexion OK après le délai de reconnexion
+    # -> ancien message puis message du cycle
+    readings[1] = 2
+    mqtt.client.connect.side_effect = None
+    mqtt.backoff.delay_ms = 0
+    main.read_and_publish_sensors(mqtt, iterations=1)
+
+    assert sent == [("t/A", "1"), ("t/A", "2")]
+    assert len(mqtt.queue) == 0
+
+def test_read_and_publish_sensors_reuses_session(monkeypatch, tmp_path):
+    mqtt = MQTTHandler({"server": "x", "topic": "t/",
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    mqtt.client = MagicMock()
+    mqtt.connect()
+    tech = fake_techniques([{"name": "A", "type": "analog", "pin": 1}], {1: 1})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    sleeps = []
+    monkeypatch.setattr(main.time, "sleep", sleeps.append)
+
+    main.read_and_publish_sensors(mqtt, iterations=3)
+
+    # pas de nouvelle connexion ni de pause d'une seconde par cycle
+    assert mqtt.client.connect.call_count == 1
+    assert mqtt.client.publish.call_count == 3
+    assert sleeps == [10, 10, 10]
+
+def test_read_and_publish_sensors_batch_mode(monkeypatch, tmp_path):
+    mqtt = MQTTHandler({"server": "x", "topic": "t/", "payload": "batch",
+                        "batch_cycles": 2,
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    mqtt.client = MagicMock()
+    tech = fake_techniques(
+        [{"name": "T", "type": "DHT22", "pin": 4},
+         {"name": "L", "type": "analog", "pin": 1}],
+        {4: {"temperature": 21.5, "humidity": 60, "status": "ok"}, 1: 300})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    monkeypatch.setattr(main.time, "sleep", lambda x: None)
+
+    main.read_and_publish_sensors(mqtt, iterations=4)
+
+    # 4 cycles -> 2 messages groupés
+    assert mqtt.client.publish.call_count == 2
+    topic, payload = mqtt.client.publish.call_args.args
+    assert topic == "t/batch"
+    import json
+    decoded = json.loads(payload)
+    assert decoded["k"] == ["temperature", "humidity", "status", "L"]
+    assert [row[1:] for row in decoded["s"]] == [[21.5, 60, "ok", 300]] * 2
+
+def test_read_and_publish_sensors_backs_off(monkeypatch, tmp_path):
+    import backoff
+    now = {"ms": 0}
+    monkeypatch.setattr(backoff, "ticks_ms", lambda: now["ms"])
+    mqtt = MQTTHandler({"server": "x", "topic": "t/",
+                        "backoff": {"base_ms": 20000, "jitter": 0, "threshold": 3},
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    mqtt.client = MagicMock()
+    mqtt.client.connect.side_effect = OSError("broker down")
+    tech = fake_techniques([{"name": "A", "type": "analog", "pin": 1}], {1: 1})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    logs = []
+    monkeypatch.setattr(main.boot, "log", logs.append)
+
+    def advance(seconds):
+        now["ms"] += seconds * 1000
+    monkeypatch.setattr(main.time, "sleep", advance)
+
+    # 10 cycles de 10 s : essais à 0, 20 s et 60 s puis disjoncteur ouvert
+    main.read_and_publish_sensors(mqtt, iterations=10)
+
+    assert mqtt.client.connect.call_count == 3
+    assert mqtt.backoff.trips == 1
+    assert len(mqtt.queue) == 10
+    assert logs[0] == "MQTT non connecté - nouvel essai dans 20 s"
+    assert logs[-1].startswith("MQTT non connecté - disjoncteur ouvert")
+
+def test_read_and_publish_sensors_deadband(monkeypatch, tmp_path):
+    mqtt = MQTTHandler({"server": "x", "topic": "t/",
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    sent = []
+    mqtt.client = recording_client(sent)
+    tech = fake_techniques([{"name": "D", "type": "digital", "pin": 2,
+                             "deadband": 0}], {2: 1})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    monkeypatch.setattr(main.time, "sleep", lambda x: None)
+    logs = []
+    monkeypatch.setattr(main.boot, "log", logs.append)
+
+    main.read_and_publish_sensors(mqtt, iterations=5)
+
+    assert sent == [("t/D", "1")]
+    assert logs == ["Bande morte : 4 valeurs non publiées sur 5"]
+
+# ==================== Runtime coopératif (horloge virtuelle) ====================
+
+class VirtualMQTTClient:
+    """Client MQTT asynchrone simulé : note l'heure de chaque publication."""
+
+    def __init__(self, up=True):
+        self.up = up
+        self.connected = False
+        self.retry_ms = 0
+        self.published = []
+
+    async def connect(self, clean_session=True):
+        if not self.up:
+            raise OSError("broker injoignable")
+        self.connected = True
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        if not self.connected:
+            raise OSError("non connecté")
+        now = asyncio.get_event_loop().time()
+        # vue sur le tampon du plan : copiée comme le ferait le socket
+        self.published.append((now, topic, bytes(msg) if isinstance(msg, memoryview) else msg))
+
+    async def disconnect(self):
+        self.connected = False
+
+    def close(self):
+        self.connected = False
+
+class SlowDownloadServer:
+    """
+    WebServer simulé : un téléchargement de `chunks` blocs, un bloc toutes
+    les `every` secondes (liaison Wi-Fi lente en bordure de champ).
+    """
+
+    def __init__(self, chunks, every):
+        self.chunks = chunks
+        self.every = every
+        self.sent = 0
+        self.polls = 0
+        self.done_at = None
+        self.closed = False
+        self._next = 0
+
+    def poll(self, timeout_ms=0):
+        self.polls += 1
+        now = asyncio.get_event_loop().time()
+        if self.sent < self.chunks and now >= self._next:
+            self.sent += 1
+            self._next = now + self.every
+            if self.sent == self.chunks:
+                self.done_at = now
+            return 1
+        return 0
+
+    def close(self):
+        self.closed = True
+
+def make_runtime(tmp_path, client, server=None, iterations=5, store=None, **extra):
+    config = {"server": "x", "topic": "champ/", "queue_file": str(tmp_path / "q")}
+    config.update(extra)
+    mqtt = main.AsyncMQTTHandler(config)
+    mqtt.client = client
+    reads = []
+    tech = fake_techniques([{"name": "L", "type": "analog", "pin": 1}], {1: 2047})
+    tech.methods["analog"] = lambda pin: reads.append(asyncio.get_event_loop().time()) or 2047
+    plan = mqtt.compile(tech)
+    return main.Runtime(mqtt, plan, server, interval=10, iterations=iterations,
+                        tech=tech, store=store), reads
+
+def test_virtual_clock_skips_idle_time():
+    clock = VirtualClock()
+
+    async def scenario():
+        await asyncio.sleep(3600)
+        return asyncio.get_event_loop().time()
+
+    start = time.monotonic()
+    assert clock.run(scenario()) == 3600
+    assert time.monotonic() - start < 1
+
+def test_runtime_measures_during_download(tmp_path, monkeypatch):
+    network_setup.stop_server_flag = False
+    client = VirtualMQTTClient()
+    # 600 blocs de 512 o, un bloc toutes les 50 ms au mieux : plus de 30 s
+    server = SlowDownloadServer(600, 0.05)
+    runtime, reads = make_runtime(tmp_path, client, server)
+
+    VirtualClock().run(runtime.run())
+
+    # mesures à l'heure, pendant tout le téléchargement
+    assert reads == pytest.approx([0, 10, 20, 30, 40])
+    assert 30 < server.done_at < 40
+    assert runtime.cycles == 5
+    assert runtime.published == 5
+    assert [t for t, _, _ in client.published] == reads
+    assert server.closed
+
+def test_runtime_publishes_from_the_plan(tmp_path, monkeypatch):
+    client = VirtualMQTTClient()
+    runtime, reads = make_runtime(tmp_path, client, iterations=3)
+    monkeypatch.setattr(runtime.plan, "messages", MagicMock(side_effect=AssertionError))
+
+    VirtualClock().run(runtime.run())
+
+    # chemin sans chaîne allouée : aucun message texte construit
+    assert [(t, bytes(topic), msg) for t, topic, msg in client.published] == [
+        (0, b"champ/L", b"2047"), (10, b"champ/L", b"2047"), (20, b"champ/L", b"2047")]
+    assert runtime.published == 3
+
+def test_runtime_slow_connect_keeps_each_cycle(tmp_path, monkeypatch):
+    client = VirtualMQTTClient()
+    connect = client.connect
+
+    async def slow_connect(clean_session=True):
+        await asyncio.sleep(25)
+        await connect(clean_session)
+    client.connect = slow_connect
+    runtime, reads = make_runtime(tmp_path, client, iterations=4)
+    values = iter(range(1, 10))
+    runtime.plan.readers[0][0] = lambda pin: next(values)
+
+    VirtualClock().run(runtime.run())
+
+    # cycles lus pendant la connexion mis de côté, chacun avec ses valeurs
+    assert [msg for _, _, msg in client.published] == ["1", "2", b"3", b"4"]
+    assert runtime.published == 4
+
+def test_runtime_segment_grows_during_download(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    network_setup.stop_server_flag = False
+    server = SlowDownloadServer(600, 0.05)
+    store = main.SegmentStore("data")
+    runtime, reads = make_runtime(tmp_path, VirtualMQTTClient(), server, store=store)
+    sizes = []
+    poll = server.poll
+
+    def poll_and_watch(timeout_ms=0):
+        if server.sent < server.chunks:
+            sizes.append(store.total_bytes())
+        return poll(timeout_ms)
+    server.poll = poll_and_watch
+
+    VirtualClock().run(runtime.run())
+
+    # le segment du jour grandit à chaque mesure, téléchargement en cours
+    assert len(set(sizes)) == 4 and sizes == sorted(sizes)
+    records = list(store.read_range())
+    assert [r["value"] for r in records] == [2047] * 5
+    assert records[0]["name"] == "L" and records[0]["type"] == "analog"
+
+def test_open_storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tech = fake_techniques([{"name": "L", "type": "analog", "pin": 1}], {1: 5})
+
+    assert main.open_storage(tech, {"enabled": False}) is None
+    store = main.open_storage(tech)
+    assert store.prefix == "data" and tech.rollups is None
+
+    store = main.open_storage(tech, {"rollups": True, "prefix": "m_", "raw_days": 3})
+    assert store.prefix == "m_data" and store.max_age == 3 * 86400
+    assert tech.rollups is not None
+    tech.save_measure(tech.read_all(), store=store)
+    main.buffered_writer.flush_all()  # écrit dans tmp_path, pas après le test
+    assert tech.rollups.current("minute", "L") is not None
+    assert [r["value"] for r in store.read_range()] == [5]
+
+def test_runtime_broker_down_keeps_sampling(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.boot, "log", MagicMock())
+    client = VirtualMQTTClient(up=False)
+    runtime, reads = make_runtime(tmp_path, client, iterations=4,
+                                  backoff={"base_ms": 60000})
+
+    VirtualClock().run(runtime.run())
+
+    assert reads == pytest.approx([0, 10, 20, 30])
+    assert runtime.published == 0
+    assert runtime.queued == 4
+    assert len(runtime.mqtt.queue) == 4
+
+def test_runtime_outbox_overflow_goes_to_flash(tmp_path, monkeypatch):
+    client = VirtualMQTTClient()
+    runtime, reads = make_runtime(tmp_path, client, iterations=main.OUTBOX_CYCLES + 2)
+
+    async def stalled():
+        # publication bloquée (ex : connexion qui n'aboutit pas)
+        await asyncio.sleep(1e9)
+    runtime.publish = stalled
+
+    async def scenario():
+        await runtime.sample()
+
+    VirtualClock().run(scenario())
+
+    assert len(runtime.outbox) == main.OUTBOX_CYCLES
+    assert runtime.queued == 2
+    assert len(runtime.mqtt.queue) == 2
+
+def test_runtime_stop_url_keeps_measuring(tmp_path, monkeypatch):
+    network_setup.stop_server_flag = False
+    logs = []
+    monkeypatch.setattr(main.boot, "log", logs.append)
+    server = SlowDownloadServer(0, 1)
+    polled = []
+    poll = server.poll
+
+    def poll_then_stop(timeout_ms=0):
+        now = asyncio.get_event_loop().time()
+        polled.append(now)
+        if now >= 15:
+            network_setup.stop_server()
+        return poll(timeout_ms)
+    server.poll = poll_then_stop
+    runtime, reads = make_runtime(tmp_path, VirtualMQTTClient(), server)
+
+    VirtualClock().run(runtime.run())
+
+    assert server.closed
+    assert reads == pytest.approx([0, 10, 20, 30, 40])
+    assert "Serveur web arrêté, mesures poursuivies" in logs
+    # plus aucun poll après l'arrêt
+    assert [t for t in polled if t >= 15] == polled[-1:]
+
+def test_runtime_housekeeping_applies_buffer_age_policy(tmp_path, monkeypatch):
+    checks = []
+    flushes = []
+    monkeypatch.setattr(main.buffered_writer, "check_all",
+                        lambda: checks.append(asyncio.get_event_loop().time()))
+    monkeypatch.setattr(main.buffered_writer, "flush_all",
+                        lambda: flushes.append(asyncio.get_event_loop().time()))
+    runtime, reads = make_runtime(tmp_path, VirtualMQTTClient(), iterations=13)
+
+    VirtualClock().run(runtime.run())
+
+    # 120 s de mesures : deux maintenances, puis écriture finale
+    assert checks == pytest.approx([60, 120])
+    assert len(flushes) == 1
+
+def test_runtime_reports_periodically(tmp_path, monkeypatch):
+    logs = []
+    monkeypatch.setattr(main.boot, "log", logs.append)
+    monkeypatch.setattr(main, "REPORT_S", 120)
+    runtime, reads = make_runtime(tmp_path, VirtualMQTTClient(), iterations=13,
+                                  rate={"msgs_per_s": 5})
+    runtime.plan.suppressed = 3
+    runtime.plan.checked = 10
+
+    VirtualClock().run(runtime.run())
+
+    # bilan à 120 s (sans attendre la fin du runtime), puis bilan final
+    assert logs.count("Bande morte : 3 valeurs non publiées sur 10") == 2
+    rates = [log for log in logs if log.startswith("Débit MQTT : deferred=")]
+    assert len(rates) == 2 and "waits=" in rates[0]
+
+def test_runtime_survives_sampling_and_server_errors(tmp_path, monkeypatch):
+    network_setup.stop_server_flag = False
+    logs = []
+    monkeypatch.setattr(main.boot, "log", logs.append)
+    server = SlowDownloadServer(0, 1)
+    poll = server.poll
+    failures = {"poll": 2}
+
+    def flaky_poll(timeout_ms=0):
+        if failures["poll"]:
+            failures["poll"] -= 1
+            raise OSError("poller")
+        return poll(timeout_ms)
+    server.poll = flaky_poll
+    client = VirtualMQTTClient()
+    runtime, reads = make_runtime(tmp_path, client, server)
+    read = runtime.plan.read
+
+    def flaky_read():
+        if runtime.cycles == 2:
+            raise RuntimeError("capteur")
+        return read()
+    runtime.plan.read = flaky_read
+
+    VirtualClock().run(runtime.run())
+
+    assert runtime.cycles == 5
+    assert runtime.published == 4
+    assert logs.count("Serveur web en erreur : poller") == 2
+    assert "Mesure en erreur : capteur" in logs
+    assert server.polls > 10  # le serveur a continué
+
+def test_run_runtime_opens_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    net = MagicMock()
+    net.ifconfig.return_value = ("192.168.4.1", "", "", "")
+    tech = fake_techniques([{"name": "L", "type": "analog", "pin": 1}], {1: 5})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    mqtt = main.AsyncMQTTHandler({"server": "x", "topic": "t/",
+                                  "queue_file": str(tmp_path / "q")})
+    mqtt.client = VirtualMQTTClient()
+
+    runtime = main.run_runtime(net, "STA", mqtt, interval=0, iterations=2, port=0)
+
+    assert runtime.cycles == 2
+    assert runtime.published == 2
+    assert runtime.server.sock is None  # fermé en fin de runtime
+    # mesures enregistrées et servies par /range
+    assert runtime.server.store is runtime.store
+    assert [r["value"] for r in runtime.store.read_range()] == [5, 5]
+
+def test_run_runtime_without_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    logs = []
+    monkeypatch.setattr(main.boot, "log", logs.append)
+    monkeypatch.setattr(main.WebServer, "open", lambda self: False)
+    tech = fake_techniques([{"name": "L", "type": "analog", "pin": 1}], {1: 5})
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    mqtt = main.AsyncMQTTHandler({"server": "x", "topic": "t/",
+                                  "queue_file": str(tmp_path / "q")})
+    mqtt.client = VirtualMQTTClient()
+
+    runtime = main.run_runtime(MagicMock(), "AP", mqtt, interval=0, iterations=1)
+
+    assert runtime.server is None
+    assert runtime.published == 1
+    assert "Serveur web indisponible, mesures seules" in logs
@@ -0,0 +1,223 @@
+import asyncio
+import time
+import pytest
+import rate_limit
+from fake_broker import FakeBroker
+from mqtt_async import AsyncMQTTClient, AsyncMQTTHandler
+from conftest import make_tech, READINGS
+
+
+@pytest.fixture
+def broker():
+    b = FakeBroker()
+    yield b
+    b.close()
+
+def handler(broker, tmp_path, **extra):
+    config = {"server": "127.0.0.1", "port": broker.port, "topic": "sonde/",
+              "queue_file": str(tmp_path / "mqtt.queue")}
+    config.update(extra)
+    return AsyncMQTTHandler(config)
+
+def test_connect_and_publish_qos0(broker, tmp_path):
+    async def scenario():
+        mqtt = handler(broker, tmp_path)
+        assert await mqtt.connect()
+        await mqtt.publish({"temp": 25})
+        await mqtt.disconnect()
+    asyncio.run(scenario())
+    assert broker.wait_published(1)
+    assert broker.published[0][:3] == ("sonde/", b'{"temp": 25}', 0)
+
+def test_connect_failure_returns_false(tmp_path):
+    async def scenario():
+        mqtt = AsyncMQTTHandler({"server": "127.0.0.1", "port": 1,
+                                 "queue_file": str(tmp_path / "q")})
+        return await mqtt.connect()
+    assert asyncio.run(scenario()) is False
+
+def test_publish_cycle_qos1(broker, tmp_path):
+    async def scenario():
+        mqtt = handler(broker, tmp_path, qos=1, inflight=2, retry_ms=50)
+        await mqtt.connect()
+        broker.drop_acks = 1
+        plan = mqtt.compile(make_tech(dict(READINGS)))
+        plan.read()
+        assert await mqtt.publish_cycle(plan)
+        await mqtt.disconnect()
+        return mqtt.client
+    client = asyncio.run(scenario())
+    assert client.inflight == {}
+    assert client.retransmits == 1
+    assert broker.payloads() == [b"21.5", b"60.25", b"ok", b"2047", b"1"]
+
+def test_offline_cycle_is_queued_then_drained(broker, tmp_path):
+    async def scenario():
+        mqtt = handler(broker, tmp_path, port=1, backoff={"base_ms": 0})
+        plan = mqtt.compile(make_tech(dict(READINGS)))
+        plan.read()
+        assert not await mqtt.publish_cycle(plan)
+        assert len(mqtt.queue) == 5
+        mqtt.client.port = broker.port
+        plan.read()
+        assert await mqtt.publish_cycle(plan)
+        assert len(mqtt.queue) == 0
+        await mqtt.disconnect()
+    asyncio.run(scenario())
+    assert broker.wait_published(10)
+    assert len(broker.published) == 10
+
+def test_keepalive_pings_in_background(broker, tmp_path):
+    async def scenario():
+        mqtt = handler(broker, tmp_path, keepalive=1)
+        await mqtt.connect()
+        await asyncio.sleep(1.3)
+        assert mqtt.check_alive()
+        await mqtt.disconnect()
+        return mqtt.client.pings
+    assert asyncio.run(scenario()) >= 2
+    assert broker.pings >= 2
+
+def test_lost_session_detected_and_inflight_resent(broker, tmp_path):
+    async def scenario():
+        mqtt = handler(broker, tmp_path, qos=1, retry_ms=60000)
+        await mqtt.connect()
+        broker.drop_acks = 2
+        assert await mqtt.send([("sonde/t", "a"), ("sonde/t", "b")])
+        while len(broker.published) < 2:
+            await asyncio.sleep(0.01)
+        broker.kick()
+        for _ in range(100):
+            if not mqtt.check_alive():
+                break
+            await asyncio.sleep(0.01)
+        assert not mqtt.connected
+        assert len(mqtt.client.inflight) == 2
+        assert await mqtt.ensure_connected()
+        assert await mqtt.client.flush(2000)
+        await mqtt.disconnect()
+    asyncio.run(scenario())
+    assert [p[3] for p in broker.published] == [False, False, True, True]
+    assert broker.payloads() == [b"a", b"b"]
+
+def test_publish_does_not_block_other_tasks(broker, tmp_path):
+    """Pendant l'attente des PUBACK (fenêtre 1, 20 ms), les autres tâches tournent."""
+    broker.ack_delay = 0.02
+    ticks = []
+
+    async def sampler():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.005)
+
+    async def scenario():
+        mqtt = handler(broker, tmp_path, qos=1, inflight=1)
+        await mqtt.connect()
+        task = asyncio.create_task(sampler())
+        start = time.monotonic()
+        await mqtt.send([("sonde/t", str(i)) for i in range(10)])
+        await mqtt.client.flush(2000)
+        elapsed = time.monotonic() - start
+        task.cancel()
+        await mqtt.disconnect()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed >= 0.15
+    assert len(ticks) >= 15
+    # un envoi bloquant laisserait un trou de toute la durée de l'envoi
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < elapsed / 3
+
+def test_client_window_and_pids(broker):
+    async def scenario():
+        client = AsyncMQTTClient("t", "127.0.0.1", broker.port, window=3)
+        await client.connect()
+        pids = [await client.publish("t", b"x", qos=1) for _ in range(6)]
+        assert len(client.inflight) <= 3
+        assert await client.flush(2000)
+        await client.disconnect()
+        return pids, client.acked
+    pids, acked = asyncio.run(scenario())
+    assert pids == [1, 2, 3, 4, 5, 6]
+    assert acked == 6
+
+def test_full_window_wait_is_bounded(broker):
+    broker.drop_acks = 100  # broker muet : aucun PUBACK
+
+    async def scenario():
+        client = AsyncMQTTClient("t", "127.0.0.1", broker.port, window=1,
+                                 retry_ms=50, timeout=0.3)
+        await client.connect()
+        await client.publish("t", b"a", qos=1)
+        start = time.monotonic()
+        with pytest.raises(OSError, match="fenêtre pleine"):
+            await client.publish("t", b"b", qos=1)
+        return time.monotonic() - start, client
+    elapsed, client = asyncio.run(scenario())
+    assert 0.25 <= elapsed < 2
+    assert not client.connected
+    assert list(client.inflight) == [1]  # renvoyé à la reconnexion
+
+def test_retransmits_do_not_delay_pings(broker):
+    broker.drop_acks = 100
+
+    async def scenario():
+        client = AsyncMQTTClient("t", "127.0.0.1", broker.port, keepalive=1,
+                                 retry_ms=100)
+        await client.connect()
+        await client.publish("t", b"a", qos=1)
+        await asyncio.sleep(0.9)
+        await client.disconnect()
+        return client
+    client = asyncio.run(scenario())
+    assert client.retransmits >= 3
+    assert client.pings >= 1
+
+def test_rate_limited_publish_and_drain(broker, tmp_path, monkeypatch):
+    # horloge virtuelle du limiteur : seules ses attentes font avancer le temps
+    now = {"ms": 0}
+    monkeypatch.setattr(rate_limit, "ticks_ms", lambda: now["ms"])
+
+    async def sleep_ms(ms):
+        now["ms"] += ms
+        await asyncio.sleep(0)
+    monkeypatch.setattr(rate_limit, "sleep_ms_async", sleep_ms)
+
+    async def scenario():
+        mqtt = handler(broker, tmp_path, rate={"msgs_per_s": 50}, drain_batch=50)
+        mqtt.enqueue([("sonde/old", str(i)) for i in range(40)])
+        assert await mqtt.connect()
+        # 25 jetons hors réserve, puis les 15 suivants attendus à 50/s
+        assert await mqtt.drain_queue() == 40
+        drained_at = now["ms"]
+        assert await mqtt.send([("sonde/t", str(i)) for i in range(35)])
+        await mqtt.disconnect()
+        return mqtt, drained_at
+    mqtt, drained_at = asyncio.run(scenario())
+    assert 300 <= mqtt.limiter.drain_wait_ms == drained_at <= 330
+    # réserve intacte pour le direct : 25 messages, puis 10 à 50/s
+    assert mqtt.limiter.waits == 10
+    assert 190 <= now["ms"] - drained_at <= 220
+    assert len(mqtt.queue) == 0
+    assert broker.wait_published(75)
+
+def test_publish_goes_through_limiter(broker, tmp_path, monkeypatch):
+    now = {"ms": 0}
+    monkeypatch.setattr(rate_limit, "ticks_ms", lambda: now["ms"])
+
+    async def sleep_ms(ms):
+        now["ms"] += ms
+        await asyncio.sleep(0)
+    monkeypatch.setattr(rate_limit, "sleep_ms_async", sleep_ms)
+
+    async def scenario():
+        mqtt = handler(broker, tmp_path, rate={"msgs_per_s": 1})
+        assert await mqtt.connect()
+        for i in range(3):
+            await mqtt.publish({"i": i})
+        await mqtt.disconnect()
+        return mqtt
+    mqtt = asyncio.run(scenario())
+    assert mqtt.limiter.waits == 2
+    assert now["ms"] >= 2000
+    assert broker.wait_published(3)
@@ -0,0 +1,145 @@
+"""
+Publication réelle (protocole MQTT 3.1.1 sur localhost) contre FakeBroker :
+MQTTHandler et read_and_publish_sensors, puis mesure par mode de
+publication (messages/s, octets par message et par valeur, latence de
+connexion).
+"""
+import socket
+import struct
+import time
+import pytest
+import main
+from fake_broker import FakeBroker, encode_packet, read_packet
+from mqtt_client import MQTTHandler
+from mqtt_decode import decode_message
+from mqtt_qos import QoSClient, MQTTException, connect_packet, _field
+from conftest import SENSORS, READINGS, fake_techniques
+
+
+MODES = {
+    "topics qos0": {},
+    "topics qos1": {"qos": 1},
+    "batch json": {"payload": "batch", "batch_cycles": 10},
+    "batch msgpack": {"payload": "batch", "batch_cycles": 10, "codec": "msgpack"},
+    "batch struct": {"payload": "batch", "batch_cycles": 10, "codec": "struct"},
+}
+
+
+@pytest.fixture
+def broker():
+    b = FakeBroker()
+    yield b
+    b.close()
+
+def make_handler(broker, tmp_path, **extra):
+    config = {"server": "127.0.0.1", "port": broker.port, "topic": "bench/",
+              "queue_file": str(tmp_path / "mqtt.queue")}
+    config.update(extra)
+    mqtt = MQTTHandler(config)
+    if not mqtt.qos:
+        # umqtt.simple absent sur PC : même protocole QoS 0 via QoSClient
+        mqtt.client = QoSClient(mqtt.client_id, "127.0.0.1", broker.port,
+                                keepalive=mqtt.keepalive)
+    return mqtt
+
+def publish_size(topic, payload, qos):
+    body = struct.pack("!H", len(topic.encode())) + topic.encode() + payload
+    return len(encode_packet(0x30, body + (b"\x00\x01" if qos else b"")))
+
+def run_mode(broker, tmp_path, monkeypatch, extra, cycles):
+    mqtt = make_handler(broker, tmp_path, **extra)
+    tech = fake_techniques(SENSORS, READINGS)
+    monkeypatch.setattr(main, "Techniques", lambda cfg: tech)
+    monkeypatch.setattr(main.time, "sleep", lambda s: None)
+
+    start = time.perf_counter()
+    assert mqtt.connect()
+    connect_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    main.read_and_publish_sensors(mqtt, iterations=cycles)
+    mqtt.disconnect()
+    elapsed = time.perf_counter() - start
+    return mqtt, connect_ms, elapsed
+
+def decode_all(broker):
+    layouts = {}
+    values = []
+    for topic, payload, _, _, _ in broker.published:
+        values += decode_message(topic, payload, "bench/", now=0, layouts=layouts)
+    return values
+
+def test_handler_publishes_over_real_protocol(broker, tmp_path, monkeypatch):
+    mqtt, _, _ = run_mode(broker, tmp_path, monkeypatch, {}, cycles=3)
+    assert broker.wait_published(15)
+    assert broker.connects[0][:7] == b"\x00\x04MQTT\x04"
+    assert broker.disconnects == 1
+    assert [(k, v) for _, k, v in decode_all(broker)] == [
+        ("temperature", 21.5), ("humidity", 60.25), ("status", "ok"),
+        ("L", 2047), ("D", 1)] * 3
+
+def test_broker_refuses_other_protocol_levels(broker):
+    client = QoSClient("old", "127.0.0.1", broker.port)
+    sock = socket.create_connection(("127.0.0.1", broker.port))
+    packet = bytearray(connect_packet("old"))
+    packet[8] = 3  # niveau de protocole MQTT 3.1
+    sock.sendall(packet)
+    assert read_packet(sock) == (0x20, b"\x00\x01")
+    sock.close()
+    client.connect()  # 3.1.1 accepté
+    client.disconnect()
+
+def test_broker_forwards_to_subscribers(broker):
+    sub = socket.create_connection(("127.0.0.1", broker.port))
+    sub.sendall(connect_packet("sub"))
+    assert read_packet(sub)[0] == 0x20
+    sub.sendall(encode_packet(0x82, b"\x00\x07" + _field("bench/+") + b"\x00"))
+    assert read_packet(sub) == (0x90, b"\x00\x07\x00")
+
+    client = QoSClient("pub", "127.0.0.1", broker.port)
+    client.connect()
+    client.publish("bench/t", b"21.5", qos=1)
+    client.publish("autre/t", b"0")
+    client.publish("bench/h", b"60")
+    assert client.flush(2000)
+    client.disconnect()
+
+    sub.settimeout(2)
+    first, body = read_packet(sub)
+    assert first == 0x30 and body == b"\x00\x07bench/t21.5"
+    assert read_packet(sub)[1] == b"\x00\x07bench/h60"
+    sub.close()
+
+def test_benchmark_publish_modes(broker, tmp_path, monkeypatch):
+    """Débit, taille et latence de connexion de chaque mode, 50 cycles."""
+    cycles = 50
+    report = {}
+    for name, extra in MODES.items():
+        bench = FakeBroker()
+        try:
+            mqtt, connect_ms, elapsed = run_mode(bench, tmp_path / name.replace(" ", "_"),
+                                                 monkeypatch, extra, cycles)
+            if "payload" in extra:
+                # + la disposition publiée une fois en codec "struct"
+                expected = cycles // extra["batch_cycles"] + (extra.get("codec") == "struct")
+            else:
+                expected = cycles * 5
+            assert bench.wait_published(expected)
+            values = decode_all(bench)
+            sizes = [publish_size(t, p, q) for t, p, q, _, _ in bench.published]
+        finally:
+            bench.close()
+        report[name] = (len(sizes), len(sizes) / elapsed, sum(sizes) / len(sizes),
+                        sum(sizes) / len(values), connect_ms)
+        # struct ne transmet pas le statut texte du DHT22
+        assert len(values) == cycles * (4 if "struct" in name else 5)
+
+    print("\n%-14s %5s %9s %9s %9s %8s" % ("mode", "msgs", "msg/s", "o/msg",
+                                           "o/valeur", "connect"))
+    for name, (count, rate, per_msg, per_value, connect_ms) in report.items():
+        print("%-14s %5d %9.0f %9.1f %9.1f %6.2fms"
+              % (name, count, rate, per_msg, per_value, connect_ms))
+
+    per_value = {name: row[3] for name, row in report.items()}
+    assert per_value["batch json"] < per_value["topics qos0"]
+    assert per_value["batch struct"] < per_value["batch msgpack"] < per_value["batch json"]
+    assert report["topics qos1"][0] == report["topics qos0"][0] == cycles * 5
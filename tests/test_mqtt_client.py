@@ -13,7 +13,8 @@ def config():
     }
 
 @pytest.fixture
-def mqtt_handler(config):
+def mqtt_handler(config, tmp_path):
+    config["queue_file"] = str(tmp_path / "mqtt.queue")
     return MQTTHandler(config)
 
 def test_init_attributes(mqtt_handler):
@@ -62,3 +63,151 @@ def test_disconnect(mock_client, mqtt_handler):
     mqtt_handler.client = mock_client()
     mqtt_handler.disconnect()
     mqtt_handler.client.disconnect.assert_called_once()
+
+def test_send_all_ok(mqtt_handler):
+    mqtt_handler.client = MagicMock()
+    assert mqtt_handler.send([("a", "1"), ("b", "2")]) is True
+    assert mqtt_handler.client.publish.call_count == 2
+    assert len(mqtt_handler.queue) == 0
+
+def test_send_failure_enqueues_remaining(mqtt_handler):
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.client.publish.side_effect = [None, OSError("coupure"), None]
+
+    assert mqtt_handler.send([("a", "1"), ("b", "2"), ("c", "3")]) is False
+    assert [m[:2] for m in mqtt_handler.queue.peek(10)] == [("b", "2"), ("c", "3")]
+
+def test_drain_queue_is_batched(mqtt_handler):
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.drain_batch = 2
+    mqtt_handler.enqueue([("a", "1"), ("b", "2"), ("c", "3")])
+
+    assert mqtt_handler.drain_queue() == 2
+    assert mqtt_handler.drain_queue() == 1
+    assert mqtt_handler.drain_queue() == 0
+    assert [c.args for c in mqtt_handler.client.publish.call_args_list] == [
+        ("a", "1"), ("b", "2"), ("c", "3")
+    ]
+
+def test_queue_disabled(config):
+    config["queue_file"] = None
+    handler = MQTTHandler(config)
+    handler.enqueue([("a", "1")])
+    assert handler.queue is None
+    assert handler.drain_queue() == 0
+
+def test_connect_sets_connected_flag(mqtt_handler):
+    mqtt_handler.client = MagicMock()
+    assert mqtt_handler.connected is False
+    mqtt_handler.connect()
+    assert mqtt_handler.connected is True
+    mqtt_handler.disconnect()
+    assert mqtt_handler.connected is False
+
+def test_ensure_connected_reuses_live_session(mqtt_handler):
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.connect()
+
+    assert mqtt_handler.ensure_connected() is True
+    assert mqtt_handler.ensure_connected() is True
+    mqtt_handler.client.connect.assert_called_once()
+    mqtt_handler.client.ping.assert_not_called()
+
+def test_check_alive_pings_when_idle(mqtt_handler, monkeypatch):
+    import mqtt_client
+    now = {"ms": 0}
+    monkeypatch.setattr(mqtt_client, "ticks_ms", lambda: now["ms"])
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.keepalive = 60
+    mqtt_handler.connect()
+
+    now["ms"] = 29000
+    assert mqtt_handler.check_alive() is True
+    mqtt_handler.client.ping.assert_not_called()
+
+    now["ms"] = 30000
+    assert mqtt_handler.check_alive() is True
+    mqtt_handler.client.ping.assert_called_once()
+    mqtt_handler.client.check_msg.assert_called_once()
+
+def test_dead_session_is_reconnected(mqtt_handler, monkeypatch):
+    import mqtt_client
+    now = {"ms": 0}
+    monkeypatch.setattr(mqtt_client, "ticks_ms", lambda: now["ms"])
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.connect()
+
+    now["ms"] = 100000
+    mqtt_handler.client.ping.side_effect = OSError("ECONNRESET")
+
+    assert mqtt_handler.ensure_connected() is True
+    assert mqtt_handler.client.connect.call_count == 2
+    mqtt_handler.client.disconnect.assert_called()
+
+def test_publish_error_marks_session_lost(mqtt_handler):
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.connect()
+    mqtt_handler.client.publish.side_effect = OSError("EPIPE")
+
+    mqtt_handler.send([("a", "1")])
+
+    assert mqtt_handler.connected is False
+    assert len(mqtt_handler.queue) == 1
+
+def test_reconnect_waits_for_backoff(mqtt_handler, monkeypatch):
+    import backoff
+    now = {"ms": 0}
+    monkeypatch.setattr(backoff, "ticks_ms", lambda: now["ms"])
+    mqtt_handler.backoff = backoff.Backoff(base_ms=1000, jitter=0)
+    mqtt_handler.client = MagicMock()
+    mqtt_handler.client.connect.side_effect = OSError("ECONNREFUSED")
+
+    assert mqtt_handler.ensure_connected() is False
+    assert mqtt_handler.ensure_connected() is False   # délai non écoulé
+    assert mqtt_handler.client.connect.call_count == 1
+
+    now["ms"] = 1000
+    mqtt_handler.client.connect.side_effect = None
+    assert mqtt_handler.ensure_connected() is True
+    assert mqtt_handler.client.connect.call_count == 2
+    assert mqtt_handler.backoff.failures == 0
+
+def test_first_connect_waits_for_start_jitter(config, tmp_path, monkeypatch):
+    import backoff
+    monkeypatch.setattr(backoff, "ticks_ms", lambda: 0)
+    monkeypatch.setattr(backoff.random, "getrandbits", lambda bits: 32768)
+    slept = []
+    monkeypatch.setattr(backoff.time, "sleep", slept.append)
+    config["queue_file"] = str(tmp_path / "mqtt.queue")
+    config["backoff"] = {"initial_ms": 4000}
+    mqtt_handler = MQTTHandler(config)
+    mqtt_handler.client = MagicMock()
+
+    assert mqtt_handler.ensure_connected() is True
+    assert slept == [2.0]   # gigue tirée dans [0, 4 s]
+    mqtt_handler.client.connect.assert_called_once()
+
+def test_client_id_derived_from_mac(tmp_path):
+    import network_mock
+    mqtt = MQTTHandler({"server": "x", "topic": "maison/{device}/",
+                        "queue_file": str(tmp_path / "q")})
+    mac = network_mock.WLAN(network_mock.STA_IF).config("mac")
+    assert mqtt.client_id == "houblon-" + mac.hex()
+    assert mqtt.client_id == MQTTHandler({"server": "x", "queue_file": None}).client_id
+    assert mqtt.topic == "maison/" + mqtt.client_id + "/"
+    assert mqtt.batch_topic == "maison/" + mqtt.client_id + "/batch"
+
+def test_device_id_per_interface():
+    import network_mock
+    from mqtt_client import device_id
+    wlan = network_mock.WLAN(network_mock.STA_IF)
+    wlan.config(mac=b"\x24\x0a\xc4\x00\x00\x2a")
+    assert device_id(wlan) == "houblon-240ac400002a"
+    assert device_id(wlan, prefix="") == "240ac400002a"
+
+def test_configured_client_id_wins(tmp_path):
+    mqtt = MQTTHandler({"server": "x", "client_id": "salon", "topic": "m/{device}/t",
+                        "batch_topic": "lots/{device}", "queue_file": None})
+    assert mqtt.client_id == "salon"
+    assert mqtt.topic == "m/salon/t"
+    assert mqtt.batch_topic == "lots/salon"
@@ -0,0 +1,123 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from mqtt_client import MQTTHandler
+from conftest import make_tech, READINGS
+from mqtt_decode import decode_batch, decode_message, parse_value
+
+
+def make_handler(tmp_path, **config):
+    config.update({"server": "x", "topic": "sonde/",
+                   "queue_file": str(tmp_path / "mqtt.queue")})
+    handler = MQTTHandler(config)
+    handler.client = MagicMock()
+    return handler
+
+def test_parse_value():
+    assert parse_value("21") == 21
+    assert parse_value(b"21.5") == 21.5
+    assert parse_value("error") == "error"
+
+def test_roundtrip_with_device_encoder(tmp_path):
+    handler = make_handler(tmp_path, payload="batch", batch_cycles=3)
+    out = []
+    out += handler.cycle_messages([("temperature", 21.5), ("humidity", 60)], 1000)
+    out += handler.cycle_messages([("temperature", 21.6)], 1010)
+    out += handler.cycle_messages([("temperature", 21.7), ("humidity", 59)], 1020)
+
+    assert len(out) == 1
+    topic, payload = out[0]
+    assert topic == "sonde/batch"
+    assert decode_message(topic, payload, "sonde/") == [
+        (1000, "temperature", 21.5), (1000, "humidity", 60),
+        (1010, "temperature", 21.6),
+        (1020, "temperature", 21.7), (1020, "humidity", 59),
+    ]
+
+def test_decode_single_value_topic():
+    assert decode_message("sonde/temperature", b"21.5", "sonde/", now=5) == [
+        (5, "temperature", 21.5)
+    ]
+    assert decode_message("autre/x/humidity", "60", "sonde/", now=5) == [
+        (5, "humidity", 60)
+    ]
+
+def test_decode_batch_invalid():
+    with pytest.raises(ValueError):
+        decode_batch(json.dumps({"t0": 1}))
+
+def test_topics_mode_is_unchanged(tmp_path):
+    handler = make_handler(tmp_path)
+    assert handler.cycle_messages([("t", 22.5), ("h", 40)]) == [
+        ("sonde/t", "22.5"), ("sonde/h", "40")
+    ]
+
+def test_flush_batch_partial(tmp_path):
+    handler = make_handler(tmp_path, payload="batch", batch_cycles=10)
+    assert handler.cycle_messages([("t", 1)], 0) == []
+    assert handler.flush_batch() is not None
+    assert handler.flush_batch() is None
+
+def _three_cycles(handler):
+    out = []
+    out += handler.cycle_messages([("temperature", 21.5), ("humidity", 60), ("L", 7)], 1000)
+    out += handler.cycle_messages([("temperature", 21.6), ("status", "ok")], 1010)
+    return out
+
+def test_roundtrip_msgpack_codec(tmp_path):
+    handler = make_handler(tmp_path, payload="batch", batch_cycles=2, codec="msgpack")
+    (topic, payload), = _three_cycles(handler)
+    assert isinstance(payload, bytearray)
+    assert decode_message(topic, payload, "sonde/") == [
+        (1000, "temperature", 21.5), (1000, "humidity", 60), (1000, "L", 7),
+        (1010, "temperature", 21.6), (1010, "status", "ok"),
+    ]
+
+def test_roundtrip_struct_codec(tmp_path):
+    handler = make_handler(tmp_path, payload="batch", batch_cycles=2, codec="struct")
+    handler.compile(make_tech(READINGS))
+    out = _three_cycles(handler)
+    assert [t for t, _ in out] == ["sonde/layout", "sonde/batch"]
+    layouts = {}
+    assert decode_message(*out[0], "sonde/", layouts=layouts) == []
+    # le statut (texte) n'est pas transmis en binaire
+    assert decode_message(*out[1], "sonde/", layouts=layouts) == [
+        (1000, "temperature", 21.5), (1000, "humidity", 60.0), (1000, "L", 7),
+        (1010, "temperature", 21.6),
+    ]
+    # la disposition n'est publiée qu'une fois
+    assert [t for t, _ in _three_cycles(handler)] == ["sonde/batch"]
+
+def test_struct_clock_jump_closes_batch(tmp_path):
+    handler = make_handler(tmp_path, payload="batch", batch_cycles=3, codec="struct")
+    handler.compile(make_tech(READINGS))
+    layouts = {}
+    decode = lambda messages: [row for topic, payload in messages
+                               for row in decode_message(topic, payload, "sonde/", layouts=layouts)]
+    # horloge pas encore réglée (an 2000), puis mise à l'heure NTP
+    out = handler.cycle_messages([("L", 1)], 946684800)
+    out += handler.cycle_messages([("L", 2)], 1700000000)
+    assert [t for t, _ in out] == ["sonde/layout", "sonde/batch"]
+    # retour en arrière de l'horloge : écart négatif
+    out += handler.cycle_messages([("L", 3)], 1699999990)
+    out += handler.cycle_messages([("L", 4)], 1700000000)
+    assert decode(out) == [(946684800, "L", 1), (1700000000, "L", 2)]
+    assert decode([(handler.batch_topic, handler.flush_batch())]) == [
+        (1699999990, "L", 3), (1700000000, "L", 4)]
+
+def test_struct_batch_cycles_limit(tmp_path):
+    with pytest.raises(ValueError):
+        make_handler(tmp_path, payload="batch", batch_cycles=256, codec="struct")
+    assert make_handler(tmp_path, payload="batch", batch_cycles=256).batch_cycles == 256
+
+def test_layout_is_published_retained(tmp_path):
+    handler = make_handler(tmp_path, codec="struct")
+    handler.connected = True
+    handler.publish_one("sonde/layout", "{}")
+    handler.client.publish.assert_called_once_with("sonde/layout", "{}", True, 0)
+
+@pytest.mark.parametrize("payload", [b"\xc1\x07", b'{"t0": 1, "k": ["h"], "s": [[]]}',
+                                     b'{"t0": 1, "k": ["h"], "s": [5]}'])
+def test_malformed_batch_raises_value_error(payload):
+    with pytest.raises(ValueError):
+        decode_batch(payload, {7: {"fmt": "H", "k": ["L"]}})
@@ -0,0 +1,187 @@
+import time
+import pytest
+from fake_broker import FakeBroker
+from mqtt_qos import QoSClient, encode_length, decode_packet, publish_packet
+from mqtt_client import MQTTHandler
+
+
+@pytest.fixture
+def broker():
+    b = FakeBroker()
+    yield b
+    b.close()
+
+def make_client(broker, **kwargs):
+    client = QoSClient("test", "127.0.0.1", broker.port, **kwargs)
+    client.connect()
+    return client
+
+@pytest.mark.parametrize("n", [0, 127, 128, 16383, 16384, 2097151])
+def test_remaining_length_roundtrip(n):
+    packet = bytearray((0x30,)) + encode_length(n) + bytes(n)
+    first, body, size = decode_packet(packet)
+    assert first == 0x30
+    assert len(body) == n
+    assert size == len(packet)
+
+def test_decode_incomplete_packet():
+    packet = publish_packet("t", b"21.5", qos=1, pid=7)
+    assert decode_packet(packet[:1]) is None
+    assert decode_packet(packet[:-1]) is None
+
+def test_pipelined_publish_all_acked(broker):
+    client = make_client(broker, window=8)
+    for i in range(50):
+        client.publish("esp/t", str(i), qos=1)
+        assert len(client.inflight) <= 8
+    assert client.flush(2000)
+    assert client.acked == 50
+    assert broker.payloads() == [str(i).encode() for i in range(50)]
+    client.disconnect()
+
+def test_window_blocks_until_ack(broker):
+    broker.ack_delay = 0.05
+    client = make_client(broker, window=4)
+    start = time.monotonic()
+    for i in range(4):
+        client.publish("esp/t", b"x", qos=1)
+    assert time.monotonic() - start < 0.05
+    assert len(client.inflight) == 4
+    client.publish("esp/t", b"x", qos=1)  # attend un PUBACK
+    assert time.monotonic() - start >= 0.04
+    assert client.flush(2000)
+    client.disconnect()
+
+def test_unacked_messages_are_retransmitted(broker):
+    broker.drop_acks = 2
+    client = make_client(broker, window=8, retry_ms=50)
+    for i in range(5):
+        client.publish("esp/t", str(i), qos=1)
+    assert client.flush(2000)
+    assert client.retransmits == 2
+    dups = [p for p in broker.published if p[3]]
+    assert [p[1] for p in dups] == [b"0", b"1"]
+    assert broker.payloads() == [b"0", b"1", b"2", b"3", b"4"]
+    client.disconnect()
+
+def test_inflight_resent_after_reconnect(broker):
+    broker.drop_acks = 3
+    client = make_client(broker, window=8, retry_ms=60000)
+    for i in range(3):
+        client.publish("esp/t", str(i), qos=1)
+    assert broker.wait_published(3)
+    broker.kick()
+    with pytest.raises(OSError):
+        for _ in range(50):
+            client.check_msg()
+            time.sleep(0.01)
+    assert len(client.inflight) == 3
+
+    client.connect(clean_session=False)
+    assert client.flush(2000)
+    assert client.retransmits == 3
+    assert [p[3] for p in broker.published] == [False] * 3 + [True] * 3
+    assert broker.connects[-1][7] & 0x02 == 0  # clean session désactivée
+    client.disconnect()
+
+def test_payload_is_copied_for_retransmission(broker):
+    broker.drop_acks = 1
+    client = make_client(broker, retry_ms=50)
+    buf = bytearray(b"21.5")
+    client.publish(b"esp/t", memoryview(buf), qos=1)
+    buf[:] = b"99.9"
+    assert client.flush(2000)
+    assert [p[1] for p in broker.published] == [b"21.5", b"21.5"]
+    client.disconnect()
+
+def test_qos0_and_ping(broker):
+    client = make_client(broker)
+    assert client.publish("esp/t", "1") == 0
+    client.ping()
+    assert client.wait_msg(2000) == 0xD0
+    assert broker.published[0][2] == 0
+    client.disconnect()
+
+def test_full_window_gives_up_when_broker_stops_acking(broker):
+    broker.drop_acks = 1000
+    client = make_client(broker, window=2, retry_ms=50, timeout=0.3)
+    client.publish("esp/t", b"a", qos=1)
+    client.publish("esp/t", b"b", qos=1)
+    start = time.monotonic()
+    with pytest.raises(OSError):
+        client.publish("esp/t", b"c", qos=1)
+    assert 0.25 <= time.monotonic() - start < 2
+    assert sorted(client.inflight) == [1, 2]  # "c" n'est pas en vol
+    client.close()
+
+def test_handler_queues_when_window_never_frees(broker, tmp_path):
+    mqtt = MQTTHandler({"server": "127.0.0.1", "port": broker.port, "qos": 1,
+                        "inflight": 2, "retry_ms": 50,
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    mqtt.client.timeout = 0.3
+    assert mqtt.connect()
+    broker.drop_acks = 1000
+    assert not mqtt.send([("esp/t", str(i)) for i in range(5)])
+    assert not mqtt.connected
+    assert len(mqtt.queue) == 3
+
+def test_publish_without_connection_raises():
+    client = QoSClient("test", "127.0.0.1", 1)
+    with pytest.raises(OSError):
+        client.publish("esp/t", "1", qos=1)
+    assert client.inflight == {}
+
+def test_handler_qos1_session(broker, tmp_path):
+    mqtt = MQTTHandler({"server": "127.0.0.1", "port": broker.port, "qos": 1,
+                        "inflight": 4, "retry_ms": 50,
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    assert isinstance(mqtt.client, QoSClient)
+    assert mqtt.connect()
+    broker.drop_acks = 1
+    assert mqtt.send([("esp/t", str(i)) for i in range(10)])
+    assert mqtt.ensure_connected()
+    mqtt.disconnect()
+    assert mqtt.client.inflight == {}
+    assert broker.payloads() == [str(i).encode() for i in range(10)]
+    assert all(p[2] == 1 for p in broker.published)
+
+def test_handler_lost_session_resends_inflight(broker, tmp_path):
+    mqtt = MQTTHandler({"server": "127.0.0.1", "port": broker.port, "qos": 1,
+                        "retry_ms": 60000, "queue_file": str(tmp_path / "mqtt.queue")})
+    assert mqtt.connect()
+    broker.drop_acks = 2
+    mqtt.send([("esp/t", "a"), ("esp/t", "b")])
+    assert broker.wait_published(2)
+    broker.kick()
+    for _ in range(50):
+        if not mqtt.check_alive():
+            break
+        time.sleep(0.01)
+    assert not mqtt.connected
+    assert mqtt.ensure_connected()
+    mqtt.disconnect()
+    assert mqtt.client.inflight == {}
+    assert broker.payloads() == [b"a", b"b"]
+
+def _rate(window, count=100):
+    broker = FakeBroker(ack_delay=0.005)
+    try:
+        client = QoSClient("bench", "127.0.0.1", broker.port, window=window)
+        client.connect()
+        start = time.monotonic()
+        for i in range(count):
+            client.publish(b"bench/t", b"21.5", qos=1)
+        assert client.flush(5000)
+        elapsed = time.monotonic() - start
+        client.disconnect()
+    finally:
+        broker.close()
+    return count / elapsed
+
+def test_benchmark_pipelined_vs_stop_and_wait():
+    """Débit QoS 1 avec 5 ms de latence d'accusé : fenêtre 1 contre 16."""
+    stop_and_wait = _rate(1)
+    pipelined = _rate(16)
+    print("\nQoS 1 : stop-and-wait %.0f msg/s, fenêtre 16 %.0f msg/s"
+          % (stop_and_wait, pipelined))
+    assert pipelined > 3 * stop_and_wait
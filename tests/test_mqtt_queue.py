@@ -0,0 +1,85 @@
+import mqtt_queue
+from mqtt_queue import OutboundQueue
+
+
+def make(tmp_path, **kwargs):
+    return OutboundQueue(str(tmp_path / "mqtt.queue"), **kwargs)
+
+def test_put_and_drain_oldest_first(tmp_path):
+    q = make(tmp_path)
+    q.put_many([("a", "1"), ("b", "2")])
+    q.put_many([("c", "3")])
+    sent = []
+
+    assert len(q) == 3
+    assert q.drain(lambda t, p: sent.append((t, p)), batch=2) == 2
+    assert sent == [("a", "1"), ("b", "2")]
+    assert len(q) == 1
+
+def test_drain_empties_and_removes_files(tmp_path):
+    q = make(tmp_path)
+    q.put_many([("a", "1")])
+    q.drain(lambda t, p: None)
+
+    assert len(q) == 0
+    assert not (tmp_path / "mqtt.queue").exists()
+    assert not (tmp_path / "mqtt.queue.pos").exists()
+
+def test_drain_stops_on_error_and_keeps_message(tmp_path):
+    q = make(tmp_path)
+    q.put_many([("a", "1"), ("b", "2")])
+    calls = []
+
+    def publish(topic, payload):
+        calls.append(topic)
+        if topic == "b":
+            raise OSError("coupure")
+
+    assert q.drain(publish) == 1
+    assert [m[0] for m in q.peek(5)] == ["b"]
+
+def test_persistent_across_reopen(tmp_path):
+    q = make(tmp_path)
+    q.put_many([("a", "1"), ("b", "2"), ("c", "3")])
+    q.drain(lambda t, p: None, batch=1)
+
+    reopened = make(tmp_path)
+    assert len(reopened) == 2
+    assert [m[0] for m in reopened.peek(5)] == ["b", "c"]
+
+def test_cap_drops_oldest(tmp_path):
+    q = make(tmp_path, max_messages=3)
+    q.put_many([("a", "1"), ("b", "2")])
+    dropped = q.put_many([("c", "3"), ("d", "4")])
+
+    assert dropped == 1
+    assert len(q) == 3
+    assert [m[0] for m in q.peek(5)] == ["b", "c", "d"]
+
+def test_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(mqtt_queue, "_COMPACT_BYTES", 20)
+    q = make(tmp_path)
+    q.put_many([("topic", str(i)) for i in range(10)])
+    size_before = (tmp_path / "mqtt.queue").stat().st_size
+
+    q.drain(lambda t, p: None, batch=5)
+
+    assert (tmp_path / "mqtt.queue").stat().st_size < size_before
+    assert [m[1] for m in make(tmp_path).peek(10)] == [str(i) for i in range(5, 10)]
+
+def test_ignores_truncated_and_corrupted_lines(tmp_path):
+    path = tmp_path / "mqtt.queue"
+    path.write_bytes(b'["a", "1"]\nnot json\n["b", "2"]\n["c", ')
+    q = make(tmp_path)
+    sent = []
+
+    assert len(q) == 3
+    q.drain(lambda t, p: sent.append(t))
+    assert sent == ["a", "b"]
+
+def test_binary_payloads_survive_reopen(tmp_path):
+    q = make(tmp_path)
+    q.put_many([("b", bytearray(b"\xc1\x00\xff")), ("t", "21.5")])
+    sent = []
+    make(tmp_path).drain(lambda t, p: sent.append((t, p)))
+    assert sent == [("b", b"\xc1\x00\xff"), ("t", "21.5")]
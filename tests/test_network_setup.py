@@ -1,8 +1,17 @@
+import errno
+import hashlib
+import socket
+import sys
+import threading
+import time
+import tracemalloc
 import types
 import pytest
-from unittest.mock import MagicMock, mock_open
+from unittest.mock import MagicMock
 
+import buffered_writer
 import network_setup
+from conftest import fake_net, http_get, wait_for
 
 def test_stop_server():
     # Reinitialiser la variable globale avant le test
@@ -12,109 +21,53 @@ def test_stop_server():
 
     assert network_setup.stop_server_flag is True
 
-def test_start_server_basic_html(monkeypatch):
+# ==================== Serveur réel sur localhost ====================
 
-    # --- Fake network interface ---
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    # --- Fake socket client ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b"GET / HTTP/1.1"
-    fake_client.send = MagicMock()
-
-    # Lorsqu'on ferme, rien à faire
-    fake_client.close = MagicMock()
-
-    # --- Fake server socket ---
-    fake_server = MagicMock()
-    fake_server.accept.return_value = (fake_client, ("1.2.3.4", 1234))
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-
-    # --- Mock de socket.socket() ---
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-
-    # --- Mock getaddrinfo ---
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    # --- Mock os.listdir pour générer 2 fichiers json ---
-    monkeypatch.setattr(network_setup.os, "listdir",
-                        lambda: ["config.json", "data.json", "readme.txt"])
-
-    # --- Empêcher la boucle infinie : 1 requête puis exit ---
-    calls = {"n": 0}
-
-    def fake_accept():
-        calls["n"] += 1
-        if calls["n"] == 1:
-            return (fake_client, ("1.2.3.4", 1234))
-        raise KeyboardInterrupt  # quitte start_server proprement
+def test_start_server_basic_html(web, tmp_path):
+    for name in ("config.json", "data.json", "readme.txt"):
+        (tmp_path / name).write_text("{}")
+    server = web()
 
-    fake_server.accept.side_effect = fake_accept
-
-    # --- Exécution ---
-    with pytest.raises(KeyboardInterrupt):
-        network_setup.start_server(fake_net, "AP")
-
-    # --- Vérification que le HTML a été envoyé ---
-    sent_data = b"".join(
-        call.args[0] for call in fake_client.send.call_args_list
-    ).decode()
+    sent_data = http_get(server.port, "/").decode()
 
     assert "<h1>ESP8266 AP</h1>" in sent_data
+    assert "<p>IP : 192.168.4.1</p>" in sent_data
     assert 'Télécharger config.json' in sent_data
     assert 'Télécharger data.json' in sent_data
+    assert 'readme.txt' not in sent_data
 
-def test_start_server_download(monkeypatch):
-
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    # --- Fake JSON file ---
-    monkeypatch.setattr(network_setup.os, "listdir",
-                        lambda: ["cfg.json"])
+def test_start_server_download(web, tmp_path):
+    (tmp_path / "cfg.json").write_text('{"ok": true}')
+    server = web()
 
-    fake_file = mock_open(read_data='{"ok": true}')
-    monkeypatch.setattr(network_setup, "open", fake_file, raising=False)
+    sent_raw = http_get(server.port, "/download?file=cfg.json")
 
+    assert b"Content-Type: application/json" in sent_raw
+    assert b"Content-Length: 12\r\n" in sent_raw
+    assert sent_raw.endswith(b'\r\n\r\n{"ok": true}')
 
-    # --- Fake socket client ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b"GET /download?file=cfg.json HTTP/1.1"
-    fake_client.send = MagicMock()
-    fake_client.close = MagicMock()
+def test_start_server_download_404(web, tmp_path):
+    (tmp_path / "cfg.json").write_text("{}")
+    server = web()
 
-    # --- Fake server ---
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
+    sent_raw = http_get(server.port, "/download?file=fake.json")
 
-    # Boucle : 1 accept → stop
-    fake_server.accept.side_effect = [
-        (fake_client, ("1.2.3.4", 1234)),
-        KeyboardInterrupt
-    ]
+    assert b"404 NOT FOUND" in sent_raw
+    assert "Fichier non trouvé".encode() in sent_raw
 
-    # Mock socket.socket()
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
+def test_start_server_download_500(web, tmp_path, monkeypatch):
+    (tmp_path / "cfg.json").write_text("{}")
 
-    with pytest.raises(KeyboardInterrupt):
-        network_setup.start_server(fake_net, "AP")
+    # --- Mock open() pour forcer une exception ---
+    def fake_open(*args, **kwargs):
+        raise IOError("Erreur lecture fichier")
+    monkeypatch.setattr(network_setup, "open", fake_open, raising=False)
+    server = web()
 
-    # Vérifie que la réponse JSON a été envoyée
-    sent_raw = b"".join(
-        call.args[0].encode() if isinstance(call.args[0], str) else call.args[0]
-        for call in fake_client.send.call_args_list
-    )
+    sent_raw = http_get(server.port, "/download?file=cfg.json")
 
-    assert b"Content-Type: application/json" in sent_raw
-    assert b'{"ok": true}' in sent_raw
+    assert b"HTTP/1.0 500 ERROR" in sent_raw
+    assert b"Erreur lecture fichier" in sent_raw
 
 def test_start_server_bind_fails(monkeypatch):
     fake_net = MagicMock()
@@ -136,263 +89,496 @@ def test_start_server_bind_fails(monkeypatch):
 
     assert result is None
 
-def test_start_server_accept_timeout(monkeypatch):
-
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-    fake_server.accept.side_effect = [OSError, KeyboardInterrupt]
-
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    with pytest.raises(KeyboardInterrupt):
-        network_setup.start_server(fake_net, "AP")
-
-    # Vérifie que accept a bien été appelé plusieurs fois
-    assert fake_server.accept.call_count == 2
-def test_start_server_empty_request(monkeypatch):
-    """Teste le cas où recv() renvoie b'' (aucune donnée) et vérifie que cl.close() est appelé."""
-
-    # --- Fake réseau ---
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    # --- Fake client socket ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b""      # <<< CAS À TESTER : aucune donnée
-    fake_client.close = MagicMock()
-
-    # --- Fake server socket ---
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-
-    # Pour stopper la boucle après 1 tour  
-    fake_server.accept.side_effect = [
-        (fake_client, ("1.2.3.4", 1234)),
-        KeyboardInterrupt          # STOP après la première boucle
-    ]
-
-    # --- Mock de socket ---
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    # --- Mock liste de fichiers pour éviter soucis ---
-    monkeypatch.setattr(network_setup.os, "listdir", lambda: [])
-
-    with pytest.raises(KeyboardInterrupt):
-        network_setup.start_server(fake_net, "AP")
-
-    # Vérifie que close() a été appelé car request était vide
-    fake_client.close.assert_called_once()
-
-def test_start_server_download_404(monkeypatch):
-    """Teste le cas où le fichier demandé n'existe pas -> réponse 404."""
-
-    # --- Fake réseau ---
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    # --- Fake système de fichiers ---
-    # Le serveur verra seulement "cfg.json" -> "fake.json" doit faire un 404
-    monkeypatch.setattr(network_setup.os, "listdir",
-                        lambda: ["cfg.json"])
-
-    # --- Fake client socket ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b"GET /download?file=fake.json HTTP/1.1"
-    fake_client.close = MagicMock()
-    fake_client.send = MagicMock()
-
-    # --- Fake server socket ---
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-
-    # Accepte UNE connexion → puis on stoppe avec KeyboardInterrupt
-    fake_server.accept.side_effect = [
-        (fake_client, ("1.2.3.4", 1234)),
-        KeyboardInterrupt
-    ]
-
-    # Mock socket.socket() + getaddrinfo()
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    with pytest.raises(KeyboardInterrupt):
-        network_setup.start_server(fake_net, "AP")
-
-    # --- Vérification : le serveur doit avoir envoyé un 404 ---
-    sent_raw = b"".join(
-        (arg.encode() if isinstance(arg, str) else arg)
-        for call in fake_client.send.call_args_list
-        for arg in call.args
-    )
-
-    assert b"404 NOT FOUND" in sent_raw
-    assert b"Fichier non trouve" in sent_raw or b"Fichier non trouv" in sent_raw
-
-def test_start_server_stop(monkeypatch):
-    # --- Fake réseau ---
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    # --- Fake socket client ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b"GET /stop HTTP/1.1"
-    fake_client.send = MagicMock()
-    fake_client.close = MagicMock()
-
-    # --- Fake server socket ---
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-
-    # 1 accept() -> stop après
-    fake_server.accept.side_effect = [
-        (fake_client, ("1.2.3.4", 1234)),
-        KeyboardInterrupt  # pour sortir de la boucle
-    ]
-
-    # --- Mock socket.socket + getaddrinfo ---
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    # --- Lancer le serveur ---
-    network_setup.start_server(fake_net, "AP")
-
-    # --- Vérification de l'envoi HTTP ---
-    sent_raw = b"".join(
-        arg.encode() if isinstance(arg, str) else arg
-        for call in fake_client.send.call_args_list
-        for arg in call.args
-    )
+def test_poll_without_client_returns_zero(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    server = network_setup.WebServer(fake_net(), "AP", port=0)
+    assert server.open()
+    try:
+        assert server.poll(0) == 0
+    finally:
+        server.close()
+
+def test_start_server_empty_request(web):
+    """Client qui se connecte puis ferme sans rien envoyer : connexion libérée."""
+    server = web()
+    with socket.create_connection(("127.0.0.1", server.port)):
+        wait_for(lambda: len(server.conns) == 1)
+    wait_for(lambda: not server.conns)
+    assert server.served == 0
+
+def test_start_server_stop(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    # port libre pour start_server (bloquant, dans un thread)
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    thread = threading.Thread(target=network_setup.start_server,
+                              args=(fake_net(), "AP", port), daemon=True)
+    thread.start()
+
+    # attend que le serveur écoute
+    end = time.monotonic() + 5
+    while True:
+        try:
+            sent_raw = http_get(port, "/stop")
+            break
+        except ConnectionRefusedError:
+            assert time.monotonic() < end
+            time.sleep(0.01)
+    thread.join(5)
 
     assert b"HTTP/1.0 200 OK" in sent_raw
     assert b"Serveur arr" in sent_raw  # éviter accents exacts
-
-    # --- Vérifie stop_server_flag activé ---
     assert network_setup.stop_server_flag is True
+    assert not thread.is_alive()
 
-    # --- Vérifie fermeture du client ---
-    fake_client.close.assert_called_once()
-
-def test_start_server_restart(monkeypatch):
-    # --- Fake réseau ---
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
+def test_start_server_restart(web, monkeypatch):
     # --- Mock machine.reset() pour éviter un vrai reboot ---
     mock_reset = MagicMock()
     monkeypatch.setattr(network_setup.machine, "reset", mock_reset)
+    flushed = MagicMock()
+    monkeypatch.setattr(network_setup.buffered_writer, "flush_all", flushed)
+    server = web()
 
-    # --- Fake client socket ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b"GET /restart HTTP/1.1"
-    fake_client.send = MagicMock()
-    fake_client.close = MagicMock()
-
-    # --- Fake server socket ---
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-
-    fake_server.accept.side_effect = [
-        (fake_client, ("1.2.3.4", 1234)),
-        KeyboardInterrupt    # pour éviter une boucle infinie
-    ]
-
-    # --- Mock socket.socket + getaddrinfo ---
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    # --- Lancer le serveur  ---
-    network_setup.start_server(fake_net, "AP")
-
-    # --- Vérifier l'envoi HTTP ---
-    sent_raw = b"".join(
-        arg.encode() if isinstance(arg, str) else arg
-        for call in fake_client.send.call_args_list
-        for arg in call.args
-    )
+    sent_raw = http_get(server.port, "/restart")
 
     assert b"HTTP/1.0 200 OK" in sent_raw
     assert b"Red" in sent_raw  # pour éviter accents exacts
+    # réponse envoyée en entier avant le redémarrage
+    wait_for(lambda: mock_reset.called)
+    flushed.assert_called_once()
+    assert network_setup.stop_server_flag is True
 
-    # --- Vérifier que reset a bien été appelé ---
-    mock_reset.assert_called_once()
-
-    # --- Vérifier que le client a bien été fermé ---
-    fake_client.close.assert_called_once()
-
-def test_start_server_download_500(monkeypatch):
-    # --- Fake réseau ---
-    fake_net = MagicMock()
-    fake_net.ifconfig.return_value = ("192.168.4.1", "", "", "")
-
-    # --- Fake liste de fichiers ---
-    monkeypatch.setattr(network_setup.os, "listdir", lambda: ["cfg.json"])
-
-    # --- Mock open() pour forcer une exception ---
-    def fake_open(*args, **kwargs):
-        raise IOError("Erreur lecture fichier")
-    monkeypatch.setattr(network_setup, "open", fake_open, raising=False)
-
-    # --- Fake client socket ---
-    fake_client = MagicMock()
-    fake_client.recv.return_value = b"GET /download?file=cfg.json HTTP/1.1"
-    fake_client.send = MagicMock()
-    fake_client.close = MagicMock()
-
-    # --- Fake serveur ---
-    fake_server = MagicMock()
-    fake_server.bind = MagicMock()
-    fake_server.listen = MagicMock()
-    fake_server.settimeout = MagicMock()
-    
-    calls = {"n":0}
-    def fake_accept():
-        calls["n"] +=1
-        if calls["n"] == 1:
-            return fake_client, ("1.2.3.4", 1234)
-
-        # Arrêter le serveur proprement après le 1er tour
-        network_setup.stop_server_flag = True
-        return fake_client, ("1.2.3.4", 1234)
-
-    fake_server.accept.side_effect = fake_accept
-
-    # --- Mock socket.socket() + getaddrinfo() ---
-    monkeypatch.setattr(network_setup.socket, "socket", lambda: fake_server)
-    monkeypatch.setattr(network_setup.socket, "getaddrinfo",
-                        lambda *args: [(None, None, None, None, ("0.0.0.0", 8080))])
-
-    # --- Exécution du serveur (il NE bloque plus) ---
-    network_setup.start_server(fake_net, "AP")
-
-    # --- Vérification que le serveur a renvoyé le 500 ---
-    sent_raw = b"".join(
-        arg.encode() if isinstance(arg, str) else arg
-        for call in fake_client.send.call_args_list
-        for arg in call.args
-    )
-
-    assert b"HTTP/1.0 500 ERROR" in sent_raw
-    assert b"Erreur lecture fichier" in sent_raw
-
-    # --- Vérifie que le client a été fermé ---
-    assert fake_client.close.call_count >=1 # au moins un appel
+def test_query_param():
+    line = "GET /range?from=10&to=20 HTTP/1.1"
+    assert network_setup.query_param(line, "from") == "10"
+    assert network_setup.query_param(line, "to") == "20"
+    assert network_setup.query_param(line, "x") is None
+    assert network_setup.query_param("GET / HTTP/1.1", "from") is None
+
+def test_start_server_range(web, tmp_path):
+    from segment_store import SegmentStore
+    store = SegmentStore(str(tmp_path / "data"))
+    for t in (100, 200, 86400 + 100):
+        store.append([{"v": t}], timestamp=t)
+    server = web(store=store)
+
+    sent_raw = http_get(server.port, "/range?from=150&to=90000")
+
+    assert b"application/x-ndjson" in sent_raw
+    assert b'"v": 200' in sent_raw
+    assert b'"v": 86500' in sent_raw
+    assert b'"v": 100,' not in sent_raw
+
+def test_start_server_range_bad_params(web, tmp_path):
+    from segment_store import SegmentStore
+    store = SegmentStore(str(tmp_path / "data"))
+    server = web(store=store)
+
+    sent_raw = http_get(server.port, "/range?from=abc")
+
+    assert b"400 BAD REQUEST" in sent_raw
+
+# ==================== Plusieurs clients ====================
+
+def test_silent_client_does_not_block_others(web):
+    server = web()
+    # client connecté qui n'envoie jamais sa requête
+    with socket.create_connection(("127.0.0.1", server.port)):
+        wait_for(lambda: len(server.conns) == 1)
+        start = time.monotonic()
+        sent = http_get(server.port, "/")
+        assert time.monotonic() - start < 1
+    assert b"ESP8266 AP" in sent
+
+def test_request_split_over_several_packets(web):
+    server = web()
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as c:
+        c.sendall(b"GET /downl")
+        wait_for(lambda: len(server.conns) == 1)
+        time.sleep(0.05)
+        # requête incomplète : rien envoyé pour l'instant
+        assert server.served == 0
+        c.sendall(b"oad?file=x.json HTTP/1.1\r\n\r\n")
+        assert b"404 NOT FOUND" in c.recv(1024)
+
+def test_non_http_bytes_drop_only_that_client(web):
+    server = web()
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as c:
+        # début de poignée de main TLS envoyé au port HTTP
+        c.sendall(b"\x16\x03\x01\x02\x00\x01\x00\x01\xfc\x03\x03\xff\xfe\r\n\r\n")
+        assert c.recv(16) == b""
+    assert b"ESP8266 AP" in http_get(server.port, "/")
+
+def test_request_error_answers_500(web, monkeypatch):
+    server = web()
+    monkeypatch.setattr(server, "handle", MagicMock(side_effect=RuntimeError("boom")))
+    assert http_get(server.port, "/").startswith(b"HTTP/1.0 500")
+    monkeypatch.undo()
+    assert b"ESP8266 AP" in http_get(server.port, "/")
+
+def test_poll_accepts_longer_event_tuples(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = network_setup.WebServer(fake_net(), "AP", port=0)
+    assert server.open()
+    try:
+        poller = server.poller
+        # MicroPython : (objet, événements, données utilisateur...)
+        server.poller = MagicMock(wraps=poller, **{"poll.side_effect": lambda timeout: [
+            item + (None,) for item in poller.poll(timeout)]})
+        port = server.sock.getsockname()[1]
+        with socket.create_connection(("127.0.0.1", port), timeout=5):
+            wait_for(lambda: server.poll(20) and len(server.conns) == 1)
+    finally:
+        server.close()
+
+def test_idle_client_closed_after_timeout(web, monkeypatch):
+    monkeypatch.setattr(network_setup, "CLIENT_TIMEOUT_MS", 100)
+    server = web()
+    with socket.create_connection(("127.0.0.1", server.port), timeout=5) as c:
+        wait_for(lambda: len(server.conns) == 1)
+        assert c.recv(16) == b""  # fermée par le serveur
+    assert not server.conns
+
+def test_max_clients_waits_for_free_slot(web, monkeypatch):
+    monkeypatch.setattr(network_setup, "CLIENT_TIMEOUT_MS", 200)
+    server = web(max_clients=1)
+    with socket.create_connection(("127.0.0.1", server.port)):
+        wait_for(lambda: len(server.conns) == 1)
+        # second client : servi dès que le premier est fermé (inactivité)
+        start = time.monotonic()
+        sent = http_get(server.port, "/")
+        elapsed = time.monotonic() - start
+    assert b"ESP8266 AP" in sent
+    assert 0.1 < elapsed < 2
+
+def test_concurrent_downloads_interleave(web, tmp_path):
+    data = bytes(range(256)) * 2048  # 512 ko
+    (tmp_path / "big.jsonl").write_bytes(data)
+    server = web()
+    results = {}
+
+    def fetch(i):
+        results[i] = http_get(server.port, "/download?file=big.jsonl")
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert len(results) == 3
+    for sent in results.values():
+        assert sent.endswith(b"\r\n\r\n" + data)
+    assert server.served == 3
+
+# ==================== Connexion : envoi par blocs ====================
+
+class _SlowClient:
+    """Socket qui n'accepte qu'une partie de chaque envoi."""
+
+    def __init__(self, max_send):
+        self.max_send = max_send
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.calls = 0
+
+    def send(self, data):
+        n = min(len(data), self.max_send)
+        self.digest.update(data[:n])
+        self.size += n
+        self.calls += 1
+        return n
+
+    def close(self):
+        pass
+
+def _peak_during(fn):
+    """Pic d'allocation pendant fn(), traceur de couverture suspendu."""
+    tracer = sys.gettrace()
+    sys.settrace(None)
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        sys.settrace(tracer)
+
+def _send_all(conn):
+    while not conn.on_writable():
+        pass
+
+def test_connection_resumes_partial_sends():
+    client = _SlowClient(3)
+    conn = network_setup.Connection(client)
+    conn.respond(b"0123456789")
+    _send_all(conn)
+    assert client.size == 10
+    assert client.calls == 4
+    assert client.digest.digest() == hashlib.sha256(b"0123456789").digest()
+
+def test_connection_would_block_keeps_pending_bytes():
+    client = MagicMock()
+    client.send.side_effect = [4, BlockingIOError(errno.EAGAIN, "again"), 6]
+    conn = network_setup.Connection(client)
+    conn.respond(b"0123456789")
+    assert conn.on_writable() is False
+    assert bytes(conn.out) == b"456789"
+    assert conn.on_writable() is False
+    assert conn.on_writable() is True
+
+def test_connection_raises_when_connection_closed():
+    client = MagicMock()
+    client.send.return_value = 0
+    conn = network_setup.Connection(client)
+    conn.respond(b"abc")
+    with pytest.raises(OSError):
+        conn.on_writable()
+
+def test_serve_download_streams_large_file_in_constant_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chunk = bytes(range(256)) * 4096  # 1 Mo
+    with open("big.jsonl", "wb") as f:
+        for _ in range(4):
+            f.write(chunk)
+    with open("small.jsonl", "wb") as f:
+        f.write(chunk[:10000])
+
+    def download(conn, name):
+        network_setup.serve_download(conn, name)
+        _send_all(conn)
+
+    small = network_setup.Connection(_SlowClient(700))
+    small_peak = _peak_during(lambda: download(small, "small.jsonl"))
+    client = _SlowClient(700)  # envois partiels, non alignés sur les blocs
+    conn = network_setup.Connection(client)
+    peak = _peak_during(lambda: download(conn, "big.jsonl"))
+
+    header = b"HTTP/1.0 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8" \
+             b"\r\nAccept-Ranges: bytes\r\nContent-Length: 4194304\r\n\r\n"
+    assert client.size == len(header) + 4 * len(chunk)
+    body = hashlib.sha256(header)
+    body.update(chunk * 4)
+    assert client.digest.digest() == body.digest()
+    assert conn.fp is None  # fichier fermé en fin d'envoi
+    # 4 Mo envoyés : même pic que pour 10 ko (objet fichier, en-têtes)
+    assert peak < small_peak + 1024
+    assert peak < 16384
+
+def _recording_client():
+    client = MagicMock()
+    client.out = bytearray()
+    client.send.side_effect = lambda data: client.out.extend(data) or len(data)
+    return client
+
+def test_download_stops_at_content_length_while_file_grows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.jsonl").write_bytes(b"a" * 4000)
+    client = _recording_client()
+    conn = network_setup.Connection(client)
+    network_setup.serve_download(conn, "data.jsonl")
+    conn.on_writable()  # en-têtes
+    with open("data.jsonl", "ab") as f:
+        f.write(b"b" * 1000)  # mesures ajoutées pendant l'envoi
+    _send_all(conn)
+    head, _, body = bytes(client.out).partition(b"\r\n\r\n")
+    assert b"Content-Length: 4000" in head
+    assert body == b"a" * 4000
+
+def test_download_includes_buffered_measures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    writer = buffered_writer.get_writer("data.jsonl", size=4096)
+    try:
+        writer.write('{"v": 1}\n')  # encore en RAM
+        client = _recording_client()
+        conn = network_setup.Connection(client)
+        network_setup.serve_download(conn, "data.jsonl")
+        _send_all(conn)
+    finally:
+        buffered_writer.release("data.jsonl")
+    head, _, body = bytes(client.out).partition(b"\r\n\r\n")
+    assert b"Content-Length: 9" in head
+    assert body == b'{"v": 1}\n'
+
+def test_download_file_removed_after_open(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.jsonl").write_bytes(b"a" * 100)
+    opened = []
+    real_open = open
+
+    def tracking_open(*args):
+        opened.append(real_open(*args))
+        return opened[-1]
+    monkeypatch.setattr("builtins.open", tracking_open)
+
+    def evicted(name):
+        raise OSError(2, "segment supprimé")
+    monkeypatch.setattr(network_setup.os, "stat", evicted)
+    client = _recording_client()
+    conn = network_setup.Connection(client)
+
+    network_setup.serve_download(conn, "data.jsonl")
+    _send_all(conn)
+
+    assert bytes(client.out).startswith(b"HTTP/1.0 500")
+    assert opened and opened[0].closed
+
+def test_client_gone_during_download(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.json").write_bytes(b"x" * 5000)
+    server = network_setup.WebServer(fake_net(), "AP", port=0)
+    assert server.open()
+    try:
+        client = MagicMock()
+        # en-têtes acceptés, puis connexion coupée
+        client.send.side_effect = [200, OSError("ECONNRESET")]
+        conn = network_setup.Connection(client)
+        server.conns[client] = conn
+        server.poller = MagicMock()  # client factice : rien à désinscrire
+        network_setup.serve_download(conn, "data.json")
+        server._write(conn)  # en-têtes
+        server._write(conn)  # premier bloc : erreur
+        assert "Envoi interrompu" in capsys.readouterr().out
+        assert conn.state == network_setup.CLOSED
+        assert conn.fp is None
+        assert client not in server.conns
+    finally:
+        server.close()
+
+# ==================== Cache de la page d'accueil ====================
+
+def test_index_page_is_cached(web, tmp_path, monkeypatch):
+    (tmp_path / "a.json").write_text("{}")
+    listed = []
+    real_listdir = network_setup.os.listdir
+    monkeypatch.setattr(network_setup.os, "listdir",
+                        lambda *a: listed.append(1) or real_listdir(*a))
+    server = web()
+
+    first = http_get(server.port, "/")
+    second = http_get(server.port, "/")
+    http_get(server.port, "/download?file=a.json")
+
+    assert first == second
+    assert len(listed) == 1
+    assert server.renders == 1
+
+def test_storage_event_invalidates_cache(web, tmp_path):
+    from journal import Journal
+    server = web()
+    assert b"mesures.jsonl" not in http_get(server.port, "/")
+
+    Journal("mesures.jsonl").append([{"v": 1}])
+
+    page = http_get(server.port, "/")
+    assert "Télécharger mesures.jsonl".encode() in page
+    assert server.renders == 2
+    assert http_get(server.port, "/download?file=mesures.jsonl").endswith(b'1}\n')
+
+def test_segment_rotation_lists_new_segment(web, tmp_path):
+    import buffered_writer
+    from segment_store import SegmentStore
+    store = SegmentStore("data")
+    server = web(store=store)
+    http_get(server.port, "/")
+
+    store.append([{"v": 1}], timestamp=0)
+    buffered_writer.flush_all()
+
+    assert b"data_0.jsonl" in http_get(server.port, "/")
+
+def test_other_files_keep_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = network_setup.WebServer(fake_net(), "AP", port=0)
+    assert server.open()
+    try:
+        server.page()
+        network_setup.storage_events.notify(network_setup.storage_events.CREATED, "boot.log")
+        server.page()
+        assert server.renders == 1
+    finally:
+        server.close()
+    # désabonné à la fermeture
+    assert server._listener not in network_setup.storage_events._listeners
+
+# ==================== Plages (Range) ====================
+
+def test_header_value():
+    request = "GET / HTTP/1.1\r\nHost: esp\r\nrange:  bytes=5-\r\n\r\n"
+    assert network_setup.header_value(request, "Range") == "bytes=5-"
+    assert network_setup.header_value(request, "Accept") is None
+    assert network_setup.header_value("GET / HTTP/1.1", "Range") is None
+
+@pytest.mark.parametrize("value,expected", [
+    (None, None),
+    ("bytes=0-", (0, 99)),
+    ("bytes=10-19", (10, 19)),
+    ("bytes=90-500", (90, 99)),     # fin tronquée à la taille
+    ("bytes=-30", (70, 99)),        # 30 derniers octets
+    ("bytes=-500", (0, 99)),
+    ("bytes=1-2,5-6", None),        # plusieurs plages : fichier entier
+    ("bytes=a-b", None),            # mal formée : ignorée
+    ("bytes=20-10", None),          # fin avant le début : ignorée
+    ("bytes=5-3", None),
+    ("items=0-5", None),
+])
+def test_parse_range(value, expected):
+    assert network_setup.parse_range(value, 100) == expected
+
+@pytest.mark.parametrize("value", ["bytes=100-", "bytes=150-200", "bytes=-0"])
+def test_parse_range_unsatisfiable(value):
+    with pytest.raises(ValueError):
+        network_setup.parse_range(value, 100)
+
+DATA = bytes(range(256)) * 8  # 2048 octets
+
+def _split(response):
+    head, _, body = response.partition(b"\r\n\r\n")
+    return head.decode(), body
+
+def test_download_advertises_ranges(web, tmp_path):
+    (tmp_path / "d.jsonl").write_bytes(DATA)
+    server = web()
+    head, body = _split(http_get(server.port, "/download?file=d.jsonl"))
+    assert head.startswith("HTTP/1.0 200 OK")
+    assert "Accept-Ranges: bytes" in head
+    assert "Content-Length: 2048" in head
+    assert body == DATA
+
+def test_download_range_returns_206(web, tmp_path):
+    (tmp_path / "d.jsonl").write_bytes(DATA)
+    server = web()
+    head, body = _split(http_get(server.port, "/download?file=d.jsonl",
+                                 headers="Range: bytes=1000-\r\n"))
+    assert head.startswith("HTTP/1.0 206 PARTIAL CONTENT")
+    assert "Content-Range: bytes 1000-2047/2048" in head
+    assert "Content-Length: 1048" in head
+    assert body == DATA[1000:]
+
+def test_download_bounded_range_spanning_chunks(web, tmp_path):
+    (tmp_path / "d.jsonl").write_bytes(DATA)
+    server = web()
+    head, body = _split(http_get(server.port, "/download?file=d.jsonl",
+                                 headers="Range: bytes=100-1300\r\n"))
+    assert "Content-Range: bytes 100-1300/2048" in head
+    assert body == DATA[100:1301]
+
+def test_download_reversed_range_sends_whole_file(web, tmp_path):
+    (tmp_path / "d.jsonl").write_bytes(DATA)
+    server = web()
+    head, body = _split(http_get(server.port, "/download?file=d.jsonl",
+                                 headers="Range: bytes=5-3\r\n"))
+    assert head.startswith("HTTP/1.0 200")
+    assert "Content-Range" not in head
+    assert body == DATA
+
+def test_download_range_unsatisfiable(web, tmp_path):
+    (tmp_path / "d.jsonl").write_bytes(DATA)
+    server = web()
+    head, body = _split(http_get(server.port, "/download?file=d.jsonl",
+                                 headers="Range: bytes=2048-\r\n"))
+    assert head.startswith("HTTP/1.0 416")
+    assert "Content-Range: bytes */2048" in head
+    assert body == b""
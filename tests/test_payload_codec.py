@@ -0,0 +1,98 @@
+import json
+import math
+import time
+import pytest
+from payload_codec import pack, make_codec, StructLayout, JsonCodec, MsgpackCodec
+from mqtt_decode import unpack, decode_struct
+from technique_sensors import Techniques
+
+
+SENSORS = [
+    {"name": "T", "type": "DHT22", "pin": 4},
+    {"name": "L", "type": "analog", "pin": 1},
+    {"name": "D", "type": "digital", "pin": 2},
+]
+
+@pytest.mark.parametrize("obj", [
+    None, True, False, 0, 127, 128, 255, 256, 65535, 65536, 2 ** 32, 2 ** 40,
+    -1, -32, -33, -128, -129, -32768, -32769, -2 ** 31 - 1,
+    21.5, -3.25, "", "a" * 31, "b" * 32, "c" * 300, "é", b"\x00\x01",
+    [], list(range(15)), list(range(16)), {"t": 1},
+    {str(i): i for i in range(20)},
+    {"t0": 1700000000, "k": ["t", "h"], "s": [[0, 21.5, None], [10, 21.6, 60]]},
+])
+def test_pack_roundtrip(obj):
+    assert unpack(pack(obj)) == obj
+
+def test_pack_floats_are_32_bits():
+    assert len(pack(21.5)) == 5
+    assert unpack(pack(21.53)) == 21.53
+
+def test_pack_unsupported_type():
+    with pytest.raises(TypeError):
+        pack(object())
+
+def test_unpack_truncated():
+    with pytest.raises(ValueError):
+        unpack(pack("abcdef")[:-1])
+    with pytest.raises(ValueError):
+        unpack(pack(1) + b"\x00")
+
+def test_make_codec():
+    assert isinstance(make_codec("json"), JsonCodec)
+    assert isinstance(make_codec("msgpack"), MsgpackCodec)
+    assert isinstance(make_codec("struct"), MsgpackCodec)
+    with pytest.raises(ValueError):
+        make_codec("xml")
+
+def test_layout_from_sensors():
+    layout = StructLayout.from_sensors(SENSORS, Techniques.SERIES_KEYS)
+    assert layout.keys == ["temperature", "humidity", "L", "D"]
+    assert layout.fmt == "ffHB"
+    assert json.loads(layout.describe()) == {"id": layout.id, "fmt": "ffHB",
+                                             "k": layout.keys}
+    with pytest.raises(ValueError):
+        StructLayout.from_sensors([{"name": "X", "type": "???"}], {})
+
+def test_layout_roundtrip_with_missing_values():
+    layout = StructLayout.from_sensors(SENSORS, Techniques.SERIES_KEYS)
+    payload = layout.encode_batch(1000, [
+        (0, {"temperature": 21.5, "humidity": 60.25, "L": 2047, "D": 1}),
+        (10, {"temperature": "error", "L": 4095}),
+    ])
+    assert len(payload) == 8 + 2 * layout.row_size
+    layouts = {layout.id: json.loads(layout.describe())}
+    assert decode_struct(payload, layouts) == [
+        (1000, "temperature", 21.5), (1000, "humidity", 60.25),
+        (1000, "L", 2047), (1000, "D", 1),
+        (1010, "L", 4095),
+    ]
+
+def test_struct_unknown_layout():
+    layout = StructLayout(["t"], [("f", math.nan)])
+    with pytest.raises(ValueError):
+        decode_struct(layout.encode_batch(0, [(0, {"t": 1.0})]), {})
+
+def test_benchmark_encoding_size_and_time():
+    """Lot de 10 cycles (DHT22, analogique, digital) : taille et temps d'encodage."""
+    layout = StructLayout.from_sensors(SENSORS, Techniques.SERIES_KEYS)
+    rows = [(i * 10, {"temperature": 21.5 + i / 10, "humidity": 60.25,
+                      "L": 2000 + i, "D": i % 2}) for i in range(10)]
+    batch = {"t0": 1700000000, "k": layout.keys,
+             "s": [[dt] + [v[k] for k in layout.keys] for dt, v in rows]}
+    encoders = {
+        "json": lambda: json.dumps(batch),
+        "msgpack": lambda: pack(batch),
+        "struct": lambda: layout.encode_batch(1700000000, rows),
+    }
+    sizes = {}
+    print()
+    for name, encode in encoders.items():
+        start = time.perf_counter()
+        for _ in range(200):
+            payload = encode()
+        elapsed = (time.perf_counter() - start) / 200
+        sizes[name] = len(payload)
+        print("%-8s %4d octets  %6.1f us" % (name, sizes[name], elapsed * 1e6))
+    assert sizes["struct"] < sizes["msgpack"] < sizes["json"]
+    assert sizes["struct"] * 2 < sizes["json"]
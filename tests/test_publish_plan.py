@@ -0,0 +1,213 @@
+import sys
+import tracemalloc
+import pytest
+from unittest.mock import MagicMock
+from publish_plan import PublishPlan, format_value
+from mqtt_client import MQTTHandler
+from technique_sensors import Techniques
+from conftest import make_tech, READINGS
+
+
+def fmt(value, decimals=2):
+    buf = bytearray(24)
+    return bytes(buf[:format_value(buf, value, decimals)]).decode()
+
+@pytest.mark.parametrize("value,expected", [
+    (0, "0"), (7, "7"), (123, "123"), (-40, "-40"), (4095, "4095"),
+    (21.5, "21.5"), (21.0, "21.0"), (-3.25, "-3.25"), (0.05, "0.05"),
+    (0.1 + 0.2, "0.3"), (99.999, "100.0"),
+    (float("nan"), "nan"), (float("inf"), "inf"), (float("-inf"), "-inf"),
+    (1e30, "1e+30"), (-1e30, "-1e+30"),
+    (-1.7976931348623157e308, "-1.7976931348623157e+308"),
+])
+def test_format_value(value, expected):
+    assert fmt(value) == expected
+
+def test_plan_compiles_topics_once():
+    plan = PublishPlan(make_tech(READINGS), "sonde/")
+    assert plan.topics == [b"sonde/temperature", b"sonde/humidity", b"sonde/status",
+                           b"sonde/message", b"sonde/L", b"sonde/D"]
+
+def test_plan_unknown_sensor_type():
+    tech = Techniques("fichier_absent.json")
+    tech.sensors = [{"name": "X", "type": "???", "pin": 0}]
+    with pytest.raises(ValueError):
+        PublishPlan(tech, "t/")
+
+def test_plan_read_and_publish():
+    plan = PublishPlan(make_tech(READINGS), "sonde/")
+    sent = []
+    plan.read()
+    plan.publish(lambda t, p: sent.append((bytes(t), bytes(p))))
+
+    assert sent == [
+        (b"sonde/temperature", b"21.5"), (b"sonde/humidity", b"60.25"),
+        (b"sonde/status", b"ok"), (b"sonde/L", b"2047"), (b"sonde/D", b"1"),
+    ]
+
+def test_plan_publishes_non_finite_readings():
+    readings = dict(READINGS)
+    readings[4] = {"temperature": float("nan"), "humidity": 1e30, "status": "ok"}
+    plan = PublishPlan(make_tech(readings), "s/")
+    sent = []
+    plan.read()
+    plan.publish(lambda t, p: sent.append((bytes(t), bytes(p))))
+
+    assert sent[:2] == [(b"s/temperature", b"nan"), (b"s/humidity", b"1e+30")]
+
+def test_plan_records_keep_raw_readings():
+    plan = PublishPlan(make_tech(READINGS), "s/")
+    plan.read()
+
+    assert plan.records() == [
+        {"name": "T", "type": "DHT22", "value": READINGS[4]},
+        {"name": "L", "type": "analog", "value": 2047},
+        {"name": "D", "type": "digital", "value": 1},
+    ]
+
+def test_plan_dht_error_skips_missing_values():
+    readings = dict(READINGS)
+    readings[4] = {"status": "error", "message": "timeout"}
+    plan = PublishPlan(make_tech(readings), "s/")
+    plan.read()
+
+    # raison de l'erreur publiée comme avant la compilation du plan
+    assert plan.values() == [("status", "error"), ("message", "timeout"),
+                             ("L", 2047), ("D", 1)]
+    assert plan.messages()[:2] == [("s/status", "error"), ("s/message", "timeout")]
+
+def test_plan_resume_after_failure():
+    plan = PublishPlan(make_tech(READINGS), "s/")
+    plan.read()
+    publish = MagicMock(side_effect=[None, OSError("coupure")])
+
+    with pytest.raises(OSError):
+        plan.publish(publish)
+
+    assert plan.position == 1
+    assert plan.messages(plan.position) == [
+        ("s/humidity", "60.25"), ("s/status", "ok"), ("s/L", "2047"), ("s/D", "1")
+    ]
+
+def test_handler_publish_cycle_failure_enqueues_rest(tmp_path):
+    mqtt = MQTTHandler({"server": "x", "topic": "s/",
+                        "queue_file": str(tmp_path / "mqtt.queue")})
+    mqtt.client = MagicMock()
+    mqtt.client.publish.side_effect = [None, None, OSError("coupure")]
+    plan = mqtt.compile(make_tech(READINGS))
+    plan.read()
+
+    assert mqtt.publish_cycle(plan) is False
+    assert [m[0] for m in mqtt.queue.peek(10)] == ["s/status", "s/L", "s/D"]
+
+def _peak_during(fn, cycles=200):
+    fn()  # échauffement (caches, premières allocations)
+    # le traceur de pytest-cov alloue à chaque ligne : suspendu pendant la mesure
+    trace = sys.gettrace()
+    sys.settrace(None)
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(cycles):
+            fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        sys.settrace(trace)
+    return current - base, peak - base
+
+def test_steady_state_publish_allocations():
+    """Compare le plan compilé au chemin dict + concaténation + str()."""
+    readings = dict(READINGS)
+    tech = make_tech(readings)
+    # sonde chargée : 20 capteurs analogiques en plus du DHT22
+    for pin in range(10, 30):
+        readings[pin] = 1000 + pin
+        tech.sensors.append({"name": "A%d" % pin, "type": "analog", "pin": pin})
+    plan = PublishPlan(tech, "maison/sonde1/")
+    sink = lambda topic, payload: None
+
+    def legacy():
+        for item in tech.read_all():
+            value = item["value"]
+            pairs = value.items() if isinstance(value, dict) else [(item["name"], value)]
+            for key, val in pairs:
+                sink("maison/sonde1/" + key, str(val))
+
+    def compiled():
+        plan.read()
+        plan.publish(sink)
+
+    legacy_growth, legacy_peak = _peak_during(legacy)
+    plan_growth, plan_peak = _peak_during(compiled)
+    print("\npic d'allocation par cycle : ancien %d o, plan %d o" % (legacy_peak, plan_peak))
+
+    # aucune fuite, pic constant et bien plus bas que l'ancien chemin
+    assert plan_growth <= 0
+    assert plan_peak < 256
+    assert plan_peak < legacy_peak / 2
+
+def deadband_plan(sensors, readings, monkeypatch, now):
+    import publish_plan
+    monkeypatch.setattr(publish_plan, "ticks_ms", lambda: now["ms"])
+    tech = make_tech(readings)
+    tech.sensors = sensors
+    return PublishPlan(tech, "s/")
+
+def published(plan):
+    sent = []
+    plan.read()
+    plan.publish(lambda t, p: sent.append((bytes(t).decode(), bytes(p).decode())))
+    return sent
+
+def test_deadband_publishes_only_significant_changes(monkeypatch):
+    readings = {1: 2000, 2: 0}
+    now = {"ms": 0}
+    plan = deadband_plan([
+        {"name": "L", "type": "analog", "pin": 1, "deadband": 10},
+        {"name": "D", "type": "digital", "pin": 2, "deadband": 0},
+    ], readings, monkeypatch, now)
+
+    assert published(plan) == [("s/L", "2000"), ("s/D", "0")]
+    readings[1] = 2010  # écart égal au seuil : retenu
+    assert published(plan) == []
+    readings[1] = 1989  # écart mesuré depuis la dernière valeur publiée
+    readings[2] = 1
+    assert published(plan) == [("s/L", "1989"), ("s/D", "1")]
+    assert plan.suppressed == 2
+    assert plan.checked == 6
+
+def test_deadband_heartbeat(monkeypatch):
+    now = {"ms": 0}
+    plan = deadband_plan([{"name": "D", "type": "digital", "pin": 2,
+                           "deadband": 0, "heartbeat": 60}],
+                         {2: 1}, monkeypatch, now)
+    assert published(plan) == [("s/D", "1")]
+    now["ms"] = 59000
+    assert published(plan) == []
+    now["ms"] = 60000
+    assert published(plan) == [("s/D", "1")]
+    now["ms"] = 61000
+    assert published(plan) == []
+
+def test_deadband_per_key_for_dht(monkeypatch):
+    readings = {4: {"temperature": 21.5, "humidity": 60.0, "status": "ok"}}
+    now = {"ms": 0}
+    plan = deadband_plan([{"name": "T", "type": "DHT22", "pin": 4,
+                           "deadband": {"temperature": 0.2, "humidity": 1}}],
+                         readings, monkeypatch, now)
+    assert len(published(plan)) == 3
+    readings[4] = {"temperature": 21.8, "humidity": 60.5, "status": "ok"}
+    assert published(plan) == [("s/temperature", "21.8")]
+    # capteur en erreur : le statut change, les mesures absentes n'effacent rien
+    readings[4] = {"status": "error"}
+    assert published(plan) == [("s/status", "error")]
+    readings[4] = {"temperature": 21.9, "humidity": 60.9, "status": "ok"}
+    assert published(plan) == [("s/status", "ok")]
+
+def test_no_deadband_publishes_every_cycle():
+    plan = PublishPlan(make_tech(READINGS), "s/")
+    assert len(published(plan)) == 5
+    assert len(published(plan)) == 5
+    assert plan.suppressed == 0
@@ -0,0 +1,192 @@
+import socket
+import threading
+import pytest
+import network_setup
+import pull
+
+DATA = bytes(range(256)) * 400  # 100 ko
+
+
+class CuttingProxy:
+    """
+    Relais TCP vers le serveur de la sonde qui coupe les `cuts` premières
+    connexions après `after` octets de réponse (perte du Wi-Fi).
+
+    Attributes:
+        requests (list): Requêtes reçues des clients (texte).
+        relayed (int): Octets de réponse transmis au client.
+    """
+
+    def __init__(self, upstream_port, after, cuts=1):
+        self.upstream_port = upstream_port
+        self.after = after
+        self.cuts = cuts
+        self.requests = []
+        self.relayed = 0
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            self._relay(client)
+
+    def _relay(self, client):
+        cut = len(self.requests) < self.cuts
+        upstream = socket.create_connection(("127.0.0.1", self.upstream_port))
+        with client, upstream:
+            request = client.recv(4096)
+            self.requests.append(request.decode())
+            upstream.sendall(request)
+            sent = 0
+            while True:
+                data = upstream.recv(4096)
+                if not data:
+                    return
+                if cut and sent + len(data) > self.after:
+                    data = data[:self.after - sent]
+                    client.sendall(data)
+                    self.relayed += len(data)
+                    return  # coupure en plein transfert
+                client.sendall(data)
+                sent += len(data)
+                self.relayed += len(data)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def proxy():
+    running = []
+
+    def start(*args, **kwargs):
+        p = CuttingProxy(*args, **kwargs)
+        running.append(p)
+        return p
+
+    yield start
+    for p in running:
+        p.close()
+
+def test_content_range():
+    assert pull.content_range("bytes 100-199/1000") == (100, 1000)
+    assert pull.content_range("bytes */1000") == (None, 1000)
+    assert pull.content_range(None) is None
+    assert pull.content_range("octets 1-2") is None
+
+def test_list_files(web, tmp_path):
+    for name in ("data.jsonl", "config.json", "readme.txt"):
+        (tmp_path / name).write_text("{}")
+    server = web()
+    assert sorted(pull.list_files("127.0.0.1", server.port)) == ["config.json", "data.jsonl"]
+
+def test_pull_complete_file(web, tmp_path):
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web()
+    dest = str(tmp_path / "copie.jsonl")
+    stats = pull.pull("127.0.0.1", "data.jsonl", dest, port=server.port)
+    assert open(dest, "rb").read() == DATA
+    assert stats == {"size": len(DATA), "received": len(DATA), "requests": 1, "resumed": 0}
+
+def test_interrupted_transfer_resumes_where_it_stopped(web, proxy, tmp_path):
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web()
+    relay = proxy(server.port, after=30000)
+    dest = str(tmp_path / "copie.jsonl")
+
+    stats = pull.pull("127.0.0.1", "data.jsonl", dest, port=relay.port, retry_s=0)
+
+    assert open(dest, "rb").read() == DATA
+    assert len(relay.requests) == 2
+    assert "Range" not in relay.requests[0]
+    # la reprise ne demande que la suite (en-têtes HTTP exclus)
+    received = int(relay.requests[1].split("bytes=")[1].split("-")[0])
+    assert 0 < received < 30000
+    assert stats["requests"] == 2 and stats["resumed"] == 1
+    assert stats["received"] == len(DATA)
+    assert relay.relayed < len(DATA) + 1000  # pas de second téléchargement complet
+    assert not (tmp_path / "copie.jsonl.part").exists()
+
+def test_resume_from_existing_part_file(web, proxy, tmp_path):
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web()
+    relay = proxy(server.port, after=0, cuts=0)
+    dest = tmp_path / "copie.jsonl"
+    (tmp_path / "copie.jsonl.part").write_bytes(DATA[:60000])
+
+    stats = pull.pull("127.0.0.1", "data.jsonl", str(dest), port=relay.port)
+
+    assert dest.read_bytes() == DATA
+    assert "Range: bytes=60000-" in relay.requests[0]
+    assert stats["received"] == len(DATA) - 60000
+
+def test_part_already_complete(web, tmp_path):
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web()
+    dest = tmp_path / "copie.jsonl"
+    (tmp_path / "copie.jsonl.part").write_bytes(DATA)
+
+    stats = pull.pull("127.0.0.1", "data.jsonl", str(dest), port=server.port)
+
+    assert dest.read_bytes() == DATA
+    assert stats["received"] == 0  # réponse 416 : taille annoncée = partie
+
+def test_part_longer_than_remote_file_restarts(web, tmp_path):
+    (tmp_path / "data.jsonl").write_bytes(DATA[:1000])
+    server = web()
+    dest = tmp_path / "copie.jsonl"
+    (tmp_path / "copie.jsonl.part").write_bytes(b"x" * 5000)  # fichier remplacé sur la sonde
+
+    stats = pull.pull("127.0.0.1", "data.jsonl", str(dest), port=server.port)
+
+    assert dest.read_bytes() == DATA[:1000]
+    assert stats["requests"] == 2
+
+def test_server_ignoring_range_restarts_from_zero(web, tmp_path, monkeypatch):
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web()
+    original = network_setup.serve_download
+    monkeypatch.setattr(network_setup, "serve_download",
+                        lambda conn, filename, range_header=None: original(conn, filename))
+    dest = tmp_path / "copie.jsonl"
+    (tmp_path / "copie.jsonl.part").write_bytes(b"ancien")
+
+    pull.pull("127.0.0.1", "data.jsonl", str(dest), port=server.port)
+
+    assert dest.read_bytes() == DATA
+
+def test_gives_up_without_progress(tmp_path):
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    port = closed.getsockname()[1]
+    closed.close()  # personne n'écoute
+
+    with pytest.raises(OSError, match="abandon après 3 échecs"):
+        pull.pull("127.0.0.1", "data.jsonl", str(tmp_path / "d.jsonl"), port=port,
+                  retries=3, retry_s=0, timeout=1)
+    assert not (tmp_path / "d.jsonl").exists()
+
+def test_unknown_file_is_an_error(web, tmp_path):
+    server = web()
+    with pytest.raises(OSError, match="HTTP 404"):
+        pull.pull("127.0.0.1", "absent.jsonl", str(tmp_path / "a.jsonl"),
+                  port=server.port, retries=1, retry_s=0)
+
+def test_main_pulls_all_listed_files(web, tmp_path, capsys):
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    (tmp_path / "config.json").write_text("{}")
+    server = web()
+    out = tmp_path / "releves"
+
+    pull.main(["--server", "127.0.0.1", "--port", str(server.port), "--dest", str(out)])
+
+    assert (out / "data.jsonl").read_bytes() == DATA
+    assert (out / "config.json").read_text() == "{}"
+    assert "data.jsonl" in capsys.readouterr().out
@@ -0,0 +1,142 @@
+import pytest
+from unittest.mock import MagicMock
+import rate_limit
+from rate_limit import TokenBucket, RateLimiter
+from mqtt_client import MQTTHandler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge virtuelle : time.sleep avance le temps sans attendre."""
+    now = {"ms": 0}
+    monkeypatch.setattr(rate_limit, "ticks_ms", lambda: now["ms"])
+
+    def sleep(seconds):
+        now["ms"] += int(seconds * 1000)
+    monkeypatch.setattr(rate_limit.time, "sleep", sleep)
+    return now
+
+def test_bucket_burst_then_rate(clock):
+    bucket = TokenBucket(10, burst_s=1)
+    for _ in range(10):
+        assert bucket.delay_ms() == 0
+        bucket.take()
+    assert bucket.delay_ms() == 101
+    clock["ms"] += 100
+    assert bucket.delay_ms() == 0
+
+def test_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(10, burst_s=2)
+    clock["ms"] += 60000
+    assert bucket.delay_ms(20) == 0
+    assert bucket.delay_ms(21) == 0  # plus gros que le seau : seau plein suffit
+    bucket.take(30)
+    assert bucket.tokens == -10
+    assert bucket.delay_ms(1) == 1101
+
+def test_limiter_messages_per_second(clock):
+    limiter = RateLimiter(msgs_per_s=5)
+    for _ in range(20):
+        limiter.acquire(10)
+    # 5 messages immédiats puis 15 au rythme de 5/s
+    assert 2900 <= clock["ms"] <= 3100
+    assert limiter.waits == 15
+    assert limiter.max_wait_ms <= 201
+    assert limiter.stats()["wait_ms"] == clock["ms"]
+
+def test_limiter_bytes_per_second(clock):
+    limiter = RateLimiter(bytes_per_s=1000)
+    limiter.acquire(800)
+    limiter.acquire(800)
+    assert 500 <= clock["ms"] <= 700
+
+def test_try_acquire_keeps_reserve(clock):
+    limiter = RateLimiter(msgs_per_s=10, reserve=0.5)
+    granted = 0
+    while limiter.try_acquire(10):
+        granted += 1
+    assert granted == 5
+    assert limiter.deferred == 1
+    # la réserve reste disponible pour le direct, sans attente
+    for _ in range(5):
+        limiter.acquire(10)
+    assert limiter.waits == 0
+    assert clock["ms"] == 0
+
+def make_handler(tmp_path, **extra):
+    config = {"server": "x", "topic": "t/", "queue_file": str(tmp_path / "q")}
+    config.update(extra)
+    mqtt = MQTTHandler(config)
+    mqtt.client = MagicMock()
+    return mqtt
+
+def test_handler_without_rate_has_no_limiter(tmp_path):
+    assert make_handler(tmp_path).limiter is None
+
+def test_handler_live_data_has_priority_over_backlog(clock, tmp_path):
+    mqtt = make_handler(tmp_path, rate={"msgs_per_s": 10}, drain_batch=50, drain_ms=0)
+    mqtt.enqueue([("t/old", str(i)) for i in range(40)])
+    assert mqtt.connect()
+
+    # vidage : seulement les jetons hors réserve
+    assert mqtt.drain_queue() == 5
+    assert len(mqtt.queue) == 35
+    # mesures du cycle : la réserve leur suffit, aucune attente
+    assert mqtt.send([("t/live", str(i)) for i in range(5)])
+    assert mqtt.limiter.waits == 0
+    assert mqtt.client.publish.call_count == 10
+
+    # cycle suivant (10 s plus tard) : nouveau lot de la file
+    clock["ms"] += 10000
+    assert mqtt.drain_queue() == 5
+    assert mqtt.limiter.deferred == 2
+
+def test_drain_waits_within_budget_and_keeps_reserve(clock):
+    limiter = RateLimiter(msgs_per_s=10, reserve=0.5)
+    limiter.begin_drain(1000)
+    granted = 0
+    while limiter.try_acquire(10):
+        granted += 1
+    # 5 jetons hors réserve, puis 1 s d'attente à 10/s
+    assert granted == 14
+    assert clock["ms"] == limiter.drain_wait_ms <= 1000
+    assert limiter.deferred == 1
+    for _ in range(5):
+        limiter.acquire(10)
+    assert limiter.waits == 0
+
+def test_handler_backlog_drains_at_configured_rate(clock, tmp_path):
+    mqtt = make_handler(tmp_path, rate={"msgs_per_s": 10}, drain_batch=500,
+                        queue_max=500)
+    mqtt.enqueue([("t/old", str(i)) for i in range(500)])
+    assert mqtt.connect()
+    cycles = 0
+    while len(mqtt.queue):
+        start = clock["ms"]
+        mqtt.drain_queue()
+        assert clock["ms"] - start <= mqtt.drain_ms
+        # mesures du cycle : servies par la réserve, sans attente
+        assert mqtt.send([("t/live", str(i)) for i in range(5)])
+        assert mqtt.limiter.waits == 0
+        clock["ms"] = start + 10000
+        cycles += 1
+    # sans attente : 5 messages par cycle de 10 s, soit 100 cycles
+    assert cycles <= 10
+
+def test_handler_live_burst_is_paced(clock, tmp_path):
+    mqtt = make_handler(tmp_path, rate={"msgs_per_s": 100, "bytes_per_s": 50})
+    mqtt.connected = True
+    assert mqtt.send([("t/x", "12345678")] * 10)  # 11 octets par message
+    assert mqtt.client.publish.call_count == 10
+    # 4 messages dans le seau de 50 octets, puis 60 octets au rythme de 50/s
+    assert mqtt.limiter.waits == 6
+    assert 1100 <= clock["ms"] <= 1300
+
+def test_handler_publish_goes_through_limiter(clock, tmp_path):
+    mqtt = make_handler(tmp_path, rate={"msgs_per_s": 1})
+    for i in range(3):
+        mqtt.publish({"i": i})
+    assert mqtt.client.publish.call_count == 3
+    # seau d'un message : les deux suivants attendent leur jeton
+    assert mqtt.limiter.waits == 2
+    assert clock["ms"] >= 2000
@@ -0,0 +1,60 @@
+import pytest
+from ring_store import RingStore, RECORD_SIZE
+
+
+def test_preallocates_file(tmp_path):
+    path = tmp_path / "data.ring"
+    store = RingStore(str(path), capacity=10)
+
+    assert path.stat().st_size == 10 * RECORD_SIZE
+    assert len(store) == 0
+    assert list(store) == []
+    store.close()
+
+def test_append_and_iterate_in_order(tmp_path):
+    store = RingStore(str(tmp_path / "data.ring"), capacity=10)
+    for i in range(3):
+        store.append(1000 + i, i, i * 1.5)
+
+    assert list(store) == [(1000, 0, 0.0), (1001, 1, 1.5), (1002, 2, 3.0)]
+    store.close()
+
+def test_wraps_and_keeps_size_bounded(tmp_path):
+    path = tmp_path / "data.ring"
+    store = RingStore(str(path), capacity=4)
+    for i in range(10):
+        store.append(i, 0, i)
+
+    # seuls les 4 derniers enregistrements sont conservés, dans l'ordre
+    assert [r[0] for r in store] == [6, 7, 8, 9]
+    assert len(store) == 4
+    assert path.stat().st_size == 4 * RECORD_SIZE
+    store.close()
+
+def test_reopen_resumes_position(tmp_path):
+    path = str(tmp_path / "data.ring")
+    store = RingStore(path, capacity=4)
+    for i in range(6):
+        store.append(i, 0, i)
+    store.close()
+
+    store = RingStore(path, capacity=4)
+    assert store.seq == 6
+    store.append(6, 0, 6)
+    assert [r[0] for r in store] == [3, 4, 5, 6]
+    store.close()
+
+def test_capacity_mismatch(tmp_path):
+    path = str(tmp_path / "data.ring")
+    RingStore(path, capacity=4).close()
+
+    with pytest.raises(ValueError):
+        RingStore(path, capacity=8)
+
+def test_reads_across_batches(tmp_path):
+    store = RingStore(str(tmp_path / "data.ring"), capacity=100)
+    for i in range(150):
+        store.append(i, i % 3, i)
+
+    assert [r[0] for r in store] == list(range(50, 150))
+    store.close()
@@ -0,0 +1,74 @@
+import pytest
+from rollups import Rollups, tier_stores
+
+
+class MemoryStore:
+    def __init__(self):
+        self.records = []
+
+    def append(self, records, timestamp=None):
+        self.records.extend(records)
+
+def make():
+    stores = {"minute": MemoryStore(), "hour": MemoryStore(), "day": MemoryStore()}
+    return Rollups(stores), stores
+
+def test_minute_rollup_emitted_on_bucket_change():
+    rollups, stores = make()
+    for t, v in ((0, 10), (20, 14), (40, 12), (60, 1)):
+        rollups.add(t, "T", v)
+
+    assert stores["minute"].records == [
+        {"name": "T", "timestamp": 0, "min": 10, "max": 14, "mean": 12.0, "count": 3}
+    ]
+    assert stores["hour"].records == []
+    assert rollups.current("hour", "T")["count"] == 4
+
+def test_series_are_independent():
+    rollups, stores = make()
+    rollups.add(0, "A", 1)
+    rollups.add(0, "B", 100)
+    rollups.add(60, "A", 2)
+
+    assert [r["name"] for r in stores["minute"].records] == ["A"]
+    assert rollups.current("minute", "B")["mean"] == 100
+
+def test_memory_constant_over_time():
+    rollups, stores = make()
+    for t in range(0, 3 * 86400, 30):
+        rollups.add(t, "T", t % 7)
+
+    # un agrégat en cours par niveau, quelle que soit la durée
+    assert len(rollups._current) == 3
+    assert len(stores["minute"].records) == 3 * 1440 - 1
+    assert len(stores["hour"].records) == 3 * 24 - 1
+    assert len(stores["day"].records) == 2
+    assert stores["day"].records[0]["count"] == 2880
+
+def test_missing_tiers_are_skipped():
+    rollups = Rollups({"hour": MemoryStore()})
+    rollups.add(0, "T", 1)
+    assert rollups.current("minute", "T") is None
+    assert rollups.current("hour", "T") is not None
+
+def test_flush_writes_partial_buckets():
+    rollups, stores = make()
+    rollups.add(5, "T", 3)
+    rollups.flush()
+
+    assert len(stores["minute"].records) == 1
+    assert len(stores["day"].records) == 1
+    assert rollups.current("minute", "T") is None
+
+def test_tier_stores_retention(tmp_path):
+    stores = tier_stores(str(tmp_path) + "/", raw_days=1, minute_days=2)
+    rollups = Rollups(stores)
+    for day in range(5):
+        t = day * 86400
+        stores["raw"].append([{"name": "T", "value": day}], t)
+        rollups.add(t, "T", day)
+
+    # brut : rétention courte, agrégats : toute la période
+    assert len(stores["raw"].segments) <= 2
+    assert len(stores["minute"].segments) <= 3
+    assert [r["mean"] for r in stores["day"].read_range()] == [0, 1, 2, 3]
@@ -0,0 +1,99 @@
+import json
+import buffered_writer
+from segment_store import SegmentStore
+
+DAY = 86400
+
+
+def make_store(tmp_path, **kwargs):
+    return SegmentStore(str(tmp_path / "data"), **kwargs)
+
+def test_append_creates_daily_segments(tmp_path):
+    store = make_store(tmp_path)
+
+    store.append([{"v": 1}], timestamp=10)
+    store.append([{"v": 2}], timestamp=20)
+    store.append([{"v": 3}], timestamp=DAY + 5)
+    buffered_writer.flush_all()
+
+    assert [s[0] for s in store.segments] == [0, DAY]
+    assert (tmp_path / "data_0.jsonl").exists()
+    assert (tmp_path / ("data_%d.jsonl" % DAY)).exists()
+
+    index = json.loads((tmp_path / "data.idx").read_text())
+    assert [s[0] for s in index] == [0, DAY]
+
+def test_read_range_touches_only_needed_segments(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    for day in range(3):
+        store.append([{"v": day}], timestamp=day * DAY + 100)
+
+    opened = []
+    import segment_store
+    real_journal = segment_store.Journal
+
+    def spy(name):
+        opened.append(name)
+        return real_journal(name)
+    monkeypatch.setattr(segment_store, "Journal", spy)
+
+    records = list(store.read_range(DAY, DAY + 200))
+
+    assert [r["v"] for r in records] == [1]
+    assert opened == [str(tmp_path / ("data_%d.jsonl" % DAY))]
+
+def test_read_range_filters_inside_segment(tmp_path):
+    store = make_store(tmp_path)
+    for t in (10, 20, 30):
+        store.append([{"v": t}], timestamp=t)
+
+    assert [r["v"] for r in store.read_range(15, 25)] == [20]
+    assert [r["v"] for r in store.read_range()] == [10, 20, 30]
+
+def test_size_quota_evicts_oldest(tmp_path):
+    store = make_store(tmp_path, max_bytes=60)
+    for day in range(4):
+        store.append([{"v": "x" * 20}], timestamp=day * DAY)
+
+    assert store.total_bytes() <= 60
+    assert store.segments[-1][0] == 3 * DAY
+    assert not (tmp_path / "data_0.jsonl").exists()
+
+def test_age_quota_evicts_old_segments(tmp_path):
+    store = make_store(tmp_path, max_bytes=None, max_age=2 * DAY)
+    for day in range(5):
+        store.append([{"v": day}], timestamp=day * DAY)
+
+    assert [s[0] for s in store.segments] == [2 * DAY, 3 * DAY, 4 * DAY]
+
+def test_current_segment_never_evicted(tmp_path):
+    store = make_store(tmp_path, max_bytes=1)
+    store.append([{"v": 1}], timestamp=0)
+
+    assert len(store.segments) == 1
+
+def test_reopen_and_rebuild_index(tmp_path):
+    store = make_store(tmp_path)
+    store.append([{"v": 1}], timestamp=0)
+    store.append([{"v": 2}], timestamp=DAY)
+    buffered_writer.flush_all()
+
+    # index perdu -> reconstruit depuis les fichiers
+    (tmp_path / "data.idx").unlink()
+    reopened = make_store(tmp_path)
+
+    assert [s[0] for s in reopened.segments] == [0, DAY]
+    assert reopened.total_bytes() == store.total_bytes()
+    assert [r["v"] for r in reopened.read_range()] == [1, 2]
+
+def test_segment_writes_are_buffered(tmp_path):
+    store = make_store(tmp_path)
+    for t in range(10):
+        store.append([{"v": t}], timestamp=t)
+
+    writer = buffered_writer.get_writer(str(tmp_path / "data_0.jsonl"))
+    assert writer.write_count == 10
+    assert writer.flush_count == 0
+    # la lecture vide le tampon avant d'ouvrir le fichier
+    assert len(list(store.read_range())) == 10
+    assert writer.flush_count == 1
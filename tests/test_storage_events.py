@@ -0,0 +1,84 @@
+import json
+import pytest
+import buffered_writer
+import storage_events
+from buffered_writer import BufferedWriter
+from journal import Journal, migrate_json_array
+from segment_store import SegmentStore
+from storage_events import CREATED, ROTATED, DELETED
+
+DAY = 86400
+
+
+@pytest.fixture
+def events():
+    seen = []
+    listener = lambda event, filename: seen.append((event, filename))
+    storage_events.add_listener(listener)
+    yield seen
+    storage_events.remove_listener(listener)
+
+def test_first_write_only_is_notified(events, tmp_path):
+    name = str(tmp_path / "a.jsonl")
+    storage_events.written(name)
+    storage_events.written(name)
+    assert events == [(CREATED, name)]
+
+def test_delete_resets_first_write(events, tmp_path):
+    name = str(tmp_path / "a.jsonl")
+    storage_events.written(name)
+    storage_events.notify(DELETED, name)
+    storage_events.written(name)
+    assert events == [(CREATED, name), (DELETED, name), (CREATED, name)]
+
+def test_listener_errors_are_ignored(events, tmp_path, capsys):
+    def broken(event, filename):
+        raise RuntimeError("boom")
+    storage_events.add_listener(broken)
+    try:
+        storage_events.written(str(tmp_path / "b.jsonl"))
+    finally:
+        storage_events.remove_listener(broken)
+    assert len(events) == 1
+    assert "boom" in capsys.readouterr().out
+
+def test_add_listener_twice_and_remove_unknown(events, tmp_path):
+    listener = lambda event, filename: None
+    storage_events.add_listener(listener)
+    storage_events.add_listener(listener)
+    assert storage_events._listeners.count(listener) == 1
+    storage_events.remove_listener(listener)
+    storage_events.remove_listener(listener)
+    assert listener not in storage_events._listeners
+
+def test_buffered_writer_notifies_on_first_flush(events, tmp_path):
+    name = str(tmp_path / "log.jsonl")
+    w = BufferedWriter(name, size=64)
+    w.write("x\n")
+    assert events == []  # rien sur la flash
+    w.flush()
+    w.write("y\n")
+    w.flush()
+    assert events == [(CREATED, name)]
+
+def test_journal_notifies_creation(events, tmp_path):
+    name = str(tmp_path / "data.jsonl")
+    Journal(name).append([{"v": 1}])
+    Journal(name).append([{"v": 2}])
+    assert events == [(CREATED, name)]
+
+def test_segment_rotation_and_eviction(events, tmp_path):
+    store = SegmentStore(str(tmp_path / "data"), max_bytes=60)
+    for day in range(3):
+        store.append([{"v": "x" * 20}], timestamp=day * DAY)
+    buffered_writer.flush_all()
+
+    segment = lambda day: str(tmp_path / ("data_%d.jsonl" % (day * DAY)))
+    assert [e for e in events if e[0] == ROTATED] == [(ROTATED, segment(d)) for d in range(3)]
+    assert (DELETED, segment(0)) in events
+
+def test_migration_notifies_legacy_removal(events, tmp_path):
+    legacy = tmp_path / "data.json"
+    legacy.write_text(json.dumps([{"v": 1}]))
+    migrate_json_array(str(legacy), str(tmp_path / "data.jsonl"))
+    assert (DELETED, str(legacy)) in events
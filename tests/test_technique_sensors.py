@@ -2,6 +2,7 @@ import os
 import json
 import pytest
 from unittest.mock import MagicMock, patch
+import buffered_writer
 from technique_sensors import Techniques
 
 
@@ -62,7 +63,7 @@ def test_read_all(monkeypatch):
 # ============================
 
 def test_save_measure(tmp_path, monkeypatch):
-    filename = tmp_path / "data.json"
+    filename = tmp_path / "data.jsonl"
     tech = Techniques()
     
     # Données simulées
@@ -72,11 +73,114 @@ def test_save_measure(tmp_path, monkeypatch):
     monkeypatch.setattr("technique_sensors.time.time", lambda: 1111111.0)
 
     tech.save_measure(data, filename)
+    buffered_writer.flush_all()
 
-    # Vérification JSON écrit
-    content = json.loads(filename.read_text())
-    assert content[0]["name"] == "S1"
-    assert content[0]["timestamp"] == 1111111.0
+    # Vérification : une ligne JSON par mesure
+    lines = filename.read_text().splitlines()
+    content = json.loads(lines[0])
+    assert content["name"] == "S1"
+    assert content["timestamp"] == 1111111.0
+
+def test_save_measure_appends_only(tmp_path, monkeypatch):
+    filename = tmp_path / "data.jsonl"
+    tech = Techniques()
+    monkeypatch.setattr("technique_sensors.time.time", lambda: 1.0)
+
+    tech.save_measure([{"name": "S1", "value": 1}], filename)
+    buffered_writer.flush_all()
+    size_1 = filename.stat().st_size
+    tech.save_measure([{"name": "S1", "value": 2}], filename)
+    buffered_writer.flush_all()
+
+    # La seconde écriture n'ajoute que la nouvelle ligne
+    assert filename.stat().st_size == 2 * size_1
+    assert [m["value"] for m in tech.load_measures(filename)] == [1, 2]
+
+def test_save_measure_migrates_legacy_array(tmp_path, monkeypatch):
+    legacy = tmp_path / "data.json"
+    legacy.write_text('[{"name": "OLD", "value": 7, "timestamp": 1}]')
+    filename = tmp_path / "data.jsonl"
+    tech = Techniques()
+    monkeypatch.setattr("technique_sensors.time.time", lambda: 2.0)
+
+    tech.save_measure([{"name": "NEW", "value": 8}], filename)
+
+    names = [m["name"] for m in tech.load_measures(filename)]
+    assert names == ["OLD", "NEW"]
+    assert not legacy.exists()
+    assert (tmp_path / "data.json.bak").exists()
+
+def test_save_measure_into_segment_store(tmp_path, monkeypatch):
+    from segment_store import SegmentStore
+    store = SegmentStore(str(tmp_path / "data"))
+    tech = Techniques()
+    monkeypatch.setattr("technique_sensors.time.time", lambda: 86400 * 3 + 5)
+
+    tech.save_measure([{"name": "S1", "value": 1}], store=store)
+    buffered_writer.flush_all()
+
+    assert (tmp_path / "data_259200.jsonl").exists()
+    assert [m["value"] for m in store.read_range()] == [1]
+
+# ============================
+#     TEST séries / stockage binaire
+# ============================
+
+def test_series_from_config():
+    tech = Techniques()
+    tech.sensors = [
+        {"name": "A1", "type": "analog", "pin": 1},
+        {"name": "T", "type": "DHT22", "pin": 4},
+    ]
+    assert tech.series() == ["A1", "T.temperature", "T.humidity"]
+
+def test_iter_series_skips_non_numeric():
+    tech = Techniques()
+    tech.sensors = [
+        {"name": "A1", "type": "analog", "pin": 1},
+        {"name": "T", "type": "DHT22", "pin": 4},
+    ]
+    data = [
+        {"name": "A1", "type": "analog", "value": 123},
+        {"name": "T", "type": "DHT22",
+         "value": {"temperature": 21.5, "humidity": 60, "status": "ok"}},
+        {"name": "X", "type": "analog", "value": 1},
+    ]
+    assert tech.iter_series(data) == [
+        (0, "A1", 123), (1, "T.temperature", 21.5), (2, "T.humidity", 60)
+    ]
+
+def test_save_measure_ring(tmp_path):
+    from ring_store import RingStore
+    tech = Techniques()
+    tech.sensors = [{"name": "A1", "type": "analog", "pin": 1}]
+    store = RingStore(str(tmp_path / "data.ring"), capacity=8)
+
+    tech.save_measure_ring([{"name": "A1", "type": "analog", "value": 123}],
+                           store, timestamp=42)
+
+    assert list(store) == [(42, 0, 123.0)]
+    store.close()
+
+def test_update_rollups_from_read_all(tmp_path, monkeypatch):
+    from rollups import tier_stores
+    tech = Techniques()
+    tech.sensors = [{"name": "A1", "type": "analog", "pin": 1}]
+    stores = tier_stores(str(tmp_path) + "/")
+    tech.enable_rollups(stores)
+
+    for t, v in ((0, 10), (30, 20), (60, 30)):
+        monkeypatch.setattr("technique_sensors.time.time", lambda t=t: t)
+        tech.save_measure([{"name": "A1", "type": "analog", "value": v}],
+                          store=stores["raw"])
+
+    assert [r["mean"] for r in stores["minute"].read_range()] == [15]
+    assert tech.rollups.current("hour", "A1")["max"] == 30
+
+def test_update_rollups_disabled():
+    tech = Techniques()
+    tech.update_rollups([{"name": "A1", "type": "analog", "value": 1}])
+    assert tech.rollups is None
 
 def test_read_dht22_no_machine():
     """Test fallback quand machine n'est pas disponible"""
@@ -0,0 +1,146 @@
+import json
+import random
+import sys
+import tracemalloc
+import pytest
+from ts_codec import (zigzag, unzigzag, write_varint, read_varint,
+                      encode_block, decode_block, CompressedStore, iter_file)
+
+
+def test_zigzag_roundtrip():
+    for n in (0, -1, 1, -64, 63, 1000, -100000):
+        assert unzigzag(zigzag(n)) == n
+    assert [zigzag(n) for n in (0, -1, 1, -2)] == [0, 1, 2, 3]
+
+def test_varint_roundtrip():
+    out = bytearray()
+    for n in (0, 127, 128, 300, 2 ** 32):
+        write_varint(out, n)
+    pos = 0
+    decoded = []
+    for _ in range(5):
+        n, pos = read_varint(out, pos)
+        decoded.append(n)
+    assert decoded == [0, 127, 128, 300, 2 ** 32]
+    assert len(out) == 1 + 1 + 2 + 2 + 5
+
+def test_read_varint_truncated():
+    with pytest.raises(ValueError):
+        read_varint(bytes([0x80]), 0)
+
+def test_block_roundtrip():
+    timestamps = [1000, 1010, 1020, 1031, 1040]
+    values = [21.5, 21.5, 21.6, 21.4, -3.2]
+
+    ts, vs, _ = decode_block(encode_block(timestamps, values, decimals=1))
+
+    assert ts == timestamps
+    assert vs == pytest.approx(values)
+
+def test_block_integers_and_edge_sizes():
+    assert decode_block(encode_block([], []))[:2] == ([], [])
+    assert decode_block(encode_block([5], [7], decimals=0))[:2] == ([5], [7])
+
+def test_decode_invalid_block():
+    with pytest.raises(ValueError):
+        decode_block(b"\x09\x01\x00")
+
+def test_regular_sampling_is_one_byte_per_timestamp():
+    timestamps = list(range(0, 600, 10))
+    block = encode_block(timestamps, [0] * 60, decimals=0)
+    # en-tête (3) + t0 (1) + 59 écarts d'un octet + 60 valeurs d'un octet
+    assert len(block) == 3 + 1 + 59 + 60
+
+def test_compressed_store_roundtrip(tmp_path):
+    path = str(tmp_path / "data.tsc")
+    store = CompressedStore(path, block_size=4)
+    for i in range(10):
+        store.append(100 + i * 10, 0, 20 + i / 10)
+        store.append(100 + i * 10, 1, 55)
+    store.flush()
+
+    records = list(store)
+    serie_0 = [(t, v) for t, i, v in records if i == 0]
+    serie_1 = [(t, v) for t, i, v in records if i == 1]
+    assert [t for t, _ in serie_0] == [100 + i * 10 for i in range(10)]
+    assert [v for _, v in serie_0] == pytest.approx([20 + i / 10 for i in range(10)])
+    assert [v for _, v in serie_1] == [55] * 10
+
+def test_iter_file_ignores_truncated_tail(tmp_path):
+    path = tmp_path / "data.tsc"
+    store = CompressedStore(str(path), block_size=2)
+    for i in range(4):
+        store.append(i, 0, i)
+    raw = path.read_bytes()
+    path.write_bytes(raw[:-2])
+
+    assert [t for t, _, _ in iter_file(str(path))] == [0, 1]
+    assert list(iter_file(str(tmp_path / "absent.tsc"))) == []
+
+def test_iter_file_stops_on_corrupt_length(tmp_path):
+    path = tmp_path / "data.tsc"
+    store = CompressedStore(str(path), block_size=2)
+    for i in range(2):
+        store.append(i, 0, i)
+    with open(str(path), "ab") as f:
+        # longueur corrompue (~34 Go), index puis quelques octets
+        f.write(b"\xff\xff\xff\xff\x7f\x00" + b"\x00" * 16)
+
+    assert [t for t, _, _ in iter_file(str(path))] == [0, 1]
+
+def test_iter_file_streams_in_constant_memory(tmp_path):
+    def peak_for(blocks):
+        path = tmp_path / ("d%d.tsc" % blocks)
+        store = CompressedStore(str(path), block_size=64)
+        for i in range(blocks * 64):
+            store.append(i * 10, 0, 20 + (i % 7) / 10)
+        tracer = sys.gettrace()
+        sys.settrace(None)  # traceur de couverture hors mesure
+        tracemalloc.start()
+        try:
+            count = 0
+            for _ in iter_file(str(path)):
+                count += 1
+            return count, path.stat().st_size, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            sys.settrace(tracer)
+
+    count_small, _, small = peak_for(4)
+    count_big, size, big = peak_for(400)
+    assert (count_small, count_big) == (4 * 64, 400 * 64)
+    # fichier de plus de 30 ko lu avec le même pic qu'un fichier de 4 blocs
+    assert size > 30000
+    assert big < small + 1024
+
+def test_benchmark_bytes_per_sample(tmp_path):
+    """Compare l'encodage compact au format JSON de save_measure."""
+    rnd = random.Random(1)
+    n = 1440  # une journée à une mesure par minute
+    t0 = 700000000
+    temp, hum, adc = 18.0, 60.0, 2000
+    json_bytes = 0
+    store = CompressedStore(str(tmp_path / "data.tsc"), block_size=64)
+    for i in range(n):
+        t = t0 + i * 60
+        temp += rnd.choice((-0.1, 0, 0.1))
+        hum += rnd.choice((-0.1, 0, 0.1))
+        adc += rnd.randint(-3, 3)
+        record = [
+            {"name": "T", "type": "DHT22",
+             "value": {"temperature": round(temp, 1), "humidity": round(hum, 1), "status": "ok"},
+             "timestamp": float(t)},
+            {"name": "L", "type": "analog", "value": adc, "timestamp": float(t)},
+        ]
+        json_bytes += sum(len(json.dumps(r)) + 1 for r in record)
+        store.append(t, 0, temp)
+        store.append(t, 1, hum)
+        store.append(t, 2, adc)
+    store.flush()
+
+    samples = 3 * n
+    tsc_bytes = (tmp_path / "data.tsc").stat().st_size
+    print("\nJSON : %.1f octets/valeur, compact : %.2f octets/valeur (x%.0f)"
+          % (json_bytes / samples, tsc_bytes / samples, json_bytes / tsc_bytes))
+    assert tsc_bytes / samples < 3
+    assert json_bytes > 10 * tsc_bytes
@@ -0,0 +1,133 @@
+"""
+Serveur web embarqué (WebServer) sur localhost : plusieurs clients
+simultanés, clients silencieux, et mesure par scénario (requêtes/s,
+latence p50/p99). Coût d'une requête de page d'accueil avec et sans
+cache (liste des fichiers et page pré-encodée).
+"""
+import socket
+import threading
+import time
+from unittest.mock import MagicMock
+import network_setup
+from fleet import percentile
+from conftest import http_get, wait_for
+
+
+DATA = bytes(range(256)) * 256  # 64 ko
+
+def run_clients(port, clients, requests):
+    """
+    Lance `clients` threads faisant chacun `requests` requêtes (page
+    d'accueil et téléchargement en alternance).
+
+    Returns:
+        tuple: (latences en ms, durée totale en s, réponses incomplètes)
+    """
+    latencies = []
+    bad = []
+
+    def client(i):
+        for n in range(requests):
+            path = "/" if (i + n) % 2 else "/download?file=data.jsonl"
+            start = time.monotonic()
+            sent = http_get(port, path, timeout=10)
+            latencies.append((time.monotonic() - start) * 1000)
+            if path == "/" and b"</html>" not in sent or path != "/" and not sent.endswith(DATA):
+                bad.append(path)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    return latencies, time.monotonic() - start, bad
+
+def open_silent(port, n):
+    """Ouvre n connexions qui n'envoient jamais de requête."""
+    return [socket.create_connection(("127.0.0.1", port)) for _ in range(n)]
+
+def test_benchmark_concurrent_clients(web, tmp_path, monkeypatch):
+    monkeypatch.setattr(network_setup, "CLIENT_TIMEOUT_MS", 300)
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web(max_clients=4)
+
+    scenarios = [("1 client", 1, 0), ("4 clients", 4, 0), ("8 clients", 8, 0),
+                 ("4 + 2 muets", 4, 2)]
+    print("\n%-12s %5s %8s %9s %9s" % ("scénario", "req", "req/s", "p50", "p99"))
+    results = {}
+    for name, clients, silent in scenarios:
+        idle = open_silent(server.port, silent)
+        if silent:
+            wait_for(lambda: len(server.conns) == silent)
+        latencies, elapsed, bad = run_clients(server.port, clients, 10)
+        for s in idle:
+            s.close()
+        assert not bad
+        assert len(latencies) == clients * 10
+        results[name] = latencies
+        print("%-12s %5d %8.0f %7.1fms %7.1fms"
+              % (name, len(latencies), len(latencies) / elapsed,
+                 percentile(latencies, 50), percentile(latencies, 99)))
+
+    # clients muets : les autres sont servis sans attendre leur fermeture
+    assert percentile(results["4 + 2 muets"], 50) < 300
+
+def test_benchmark_single_slot_stalls_behind_silent_client(web, tmp_path, monkeypatch):
+    """Référence : une seule connexion à la fois (comportement d'avant)."""
+    monkeypatch.setattr(network_setup, "CLIENT_TIMEOUT_MS", 300)
+    (tmp_path / "data.jsonl").write_bytes(DATA)
+    server = web(max_clients=1)
+
+    idle = open_silent(server.port, 1)
+    wait_for(lambda: len(server.conns) == 1)
+    latencies, elapsed, bad = run_clients(server.port, 1, 1)
+    idle[0].close()
+
+    assert not bad
+    print("\n1 emplacement, 1 client muet : %.0f ms" % latencies[0])
+    # servi seulement après la fermeture du client muet (inactivité)
+    assert latencies[0] >= 200
+
+class _NullSocket:
+    """Socket qui accepte tout envoi (mesure du seul traitement)."""
+
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+def index_latency_us(server, n, cached):
+    """Durée moyenne (µs) du traitement complet d'une requête GET /."""
+    start = time.perf_counter()
+    for _ in range(n):
+        if not cached:
+            server.invalidate()
+        conn = network_setup.Connection(_NullSocket())
+        server.handle(conn, "GET / HTTP/1.1\r\n\r\n")
+        while not conn.on_writable():
+            pass
+    return (time.perf_counter() - start) / n * 1e6
+
+def test_benchmark_cached_index_page(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # une saison de segments journaliers, plus quelques fichiers ignorés
+    for day in range(60):
+        (tmp_path / ("data_%d.jsonl" % (day * 86400))).write_text("{}")
+    for name in ("boot.log", "data.idx", "data.ring"):
+        (tmp_path / name).write_text("")
+    server = network_setup.WebServer(MagicMock(**{"ifconfig.return_value": ("10.0.0.1",)}),
+                                     "AP", port=0)
+    assert server.open()
+    try:
+        uncached = index_latency_us(server, 300, cached=False)
+        cached = index_latency_us(server, 300, cached=True)
+        page = server.page()
+    finally:
+        server.close()
+
+    print("\npage d'accueil (%d octets) : reconstruite %.1f µs, en cache %.1f µs (x%.0f)"
+          % (len(page), uncached, cached, uncached / cached))
+    assert page.count(b"<li>") == 60
+    assert cached < uncached / 3
@@ -13,7 +13,8 @@ cfg_ap = {
 
 cfg_sta = {
     "ssid": "HomeWifi",
-    "password": "mypassword"
+    "password": "mypassword",
+    "start_jitter_ms": 0
 }
 
 def test_disable_all_wifi():
@@ -32,10 +33,41 @@ def test_start_sta_returns_wlan():
     assert sta.isconnected() is True
     assert sta.ifconfig()[0].startswith("192.")
 
-def test_start_sta_fails_if_empty_ssid():
+def test_start_sta_fails_if_empty_ssid(monkeypatch):
+    monkeypatch.setattr(wifi_utils.time, "sleep", lambda x: None)
     sta = wifi_utils.start_sta({"ssid": "", "password": ""})
     assert sta is None
 
+def test_start_sta_retries_with_backoff(monkeypatch):
+    """Gigue de démarrage, deux échecs puis succès : délais croissants."""
+    import backoff
+    now = {"ms": 0}
+    monkeypatch.setattr(backoff, "ticks_ms", lambda: now["ms"])
+    monkeypatch.setattr(backoff, "jittered", lambda ms, jitter: ms)
+    waits = []
+    def fake_sleep(seconds):
+        if seconds != 0.5:
+            waits.append(seconds)
+        now["ms"] += int(seconds * 1000)
+    monkeypatch.setattr(wifi_utils.time, "sleep", fake_sleep)
+
+    fake_sta = make_fake_iface(active_state=False)
+    joins = {"n": 0}
+    def fake_connect(ssid, password):
+        joins["n"] += 1
+        fake_sta.isconnected.return_value = joins["n"] == 3
+    fake_sta.connect.side_effect = fake_connect
+    monkeypatch.setattr(wifi_utils, "network", types.SimpleNamespace(
+        STA_IF=0, AP_IF=1, WLAN=MagicMock(return_value=fake_sta)))
+    monkeypatch.setattr(wifi_utils, "boot", types.SimpleNamespace(log=MagicMock()))
+
+    sta = wifi_utils.start_sta({"ssid": "HomeWifi", "password": "pw", "retry_ms": 1000})
+
+    assert sta is fake_sta
+    assert joins["n"] == 3
+    # premier essai retardé (gigue de démarrage), puis 1 s et 2 s
+    assert waits == [3.0, 1.0, 2.0]
+
 def make_fake_iface(active_state=True, connected=False, ip="192.168.4.1"):
     """créer un faux objet WLAN simulant une interface AP/STA."""
     iface = MagicMock()
@@ -0,0 +1,50 @@
+"""
+Horloge virtuelle pour asyncio (tests PC).
+
+Le temps de la boucle n'avance que lorsque toutes les tâches attendent :
+il saute alors directement à la prochaine échéance. Une heure de
+fonctionnement simulée s'exécute en quelques millisecondes, et les
+instants observés sont exacts (pas de gigue de l'ordonnanceur).
+
+Utilisation :
+    clock = VirtualClock()
+    clock.run(scenario())       # comme asyncio.run()
+    clock.now                   # secondes virtuelles écoulées
+"""
+import asyncio
+
+
+class VirtualClock:
+    """
+    Attributes:
+        now (float): Heure virtuelle de la boucle (s).
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def run(self, coro):
+        """
+        Exécute une coroutine sur une boucle à horloge virtuelle.
+
+        Returns:
+            Résultat de la coroutine.
+        """
+        loop = asyncio.new_event_loop()
+        loop.time = lambda: self.now
+        select = loop._selector.select
+
+        def virtual_select(timeout=None):
+            events = select(0)
+            if not events and timeout:
+                # rien de prêt : on saute à la prochaine échéance
+                self.now += timeout
+            return events
+
+        loop._selector.select = virtual_select
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(coro)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()